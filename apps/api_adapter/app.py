@@ -25,6 +25,9 @@ for _proxy_var in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy',
     os.environ.pop(_proxy_var, None)
 
 from common.sys_init import init_yml_cfg
+from apps.api_adapter.sse_translator import translate_stream, FINISH_REASON_MAP, MAX_COALESCE_MS
+from apps.api_adapter.upstream import (UpstreamClient, UpstreamOverloaded, DEFAULT_POOL_SIZE,
+                                       DEFAULT_MAX_CONCURRENCY, DEFAULT_QUEUE_TIMEOUT_S, DEFAULT_TIMEOUT_S)
 
 app = Flask(__name__)
 
@@ -41,14 +44,23 @@ llm_api_uri = my_cfg['api']['llm_api_uri'].rstrip('/')
 llm_api_key = my_cfg['api']['llm_api_key']
 llm_model_name = my_cfg['api']['llm_model_name']
 
-ANTHROPIC_VERSION = "2023-06-01"
+# 上游连接池与并发限制（所有请求共用）
+upstream_cfg = my_cfg.get('upstream', {})
+upstream = UpstreamClient(
+    llm_api_uri,
+    llm_api_key,
+    pool_size=upstream_cfg.get('pool_size', DEFAULT_POOL_SIZE),
+    max_concurrency=upstream_cfg.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+    queue_timeout=upstream_cfg.get('queue_timeout_s', DEFAULT_QUEUE_TIMEOUT_S),
+    timeout=upstream_cfg.get('timeout_s', DEFAULT_TIMEOUT_S),
+)
+# 流式转换时跨网络读取批次的合并窗口（毫秒），每次读取时检查，0 表示只合并同一批次内的增量，上限 MAX_COALESCE_MS
+sse_coalesce_ms = upstream_cfg.get('sse_coalesce_ms', 0)
+if sse_coalesce_ms > MAX_COALESCE_MS:
+    logger.warning(f"sse_coalesce_ms={sse_coalesce_ms} exceeds {MAX_COALESCE_MS}, use {MAX_COALESCE_MS}")
+    sse_coalesce_ms = MAX_COALESCE_MS
 
-FINISH_REASON_MAP = {
-    "stop": "end_turn",
-    "length": "max_tokens",
-    "tool_calls": "tool_use",
-    "content_filter": "end_turn",
-}
+ANTHROPIC_VERSION = "2023-06-01"
 
 
 def anthropic_tools_to_openai_tools(anthropic_tools):
@@ -382,182 +394,10 @@ def openai_to_anthropic_response(openai_response, anthropic_model, request_id=No
 
 def generate_anthropic_sse(openai_stream_response, anthropic_model):
     """将 OpenAI SSE 流式响应转换为 Anthropic SSE 流式响应，
-    同时处理 thinking、文本和 tool_use 内容块。"""
-    msg_id = f"msg_{uuid.uuid4().hex[:12]}"
-    thinking_block_index = -1    # 推理/思考内容块的 Anthropic content index
-    text_block_index = -1        # 文本内容块的 Anthropic content index
-    tool_block_indices = {}      # OpenAI tool_call index -> Anthropic content index
-    next_block_index = 0         # 下一个可用的 Anthropic content index
-    closed_blocks = set()        # 已提前关闭的 content block index
-    input_tokens = 0
-    output_tokens = 0
-    finish_reason = None
-    last_ping = time.time()
-    ping_interval = 30           # 每 30 秒发送一次 ping，防止连接超时
-
-    # message_start
-    start_event = {
-        "type": "message_start",
-        "message": {
-            "id": msg_id,
-            "type": "message",
-            "role": "assistant",
-            "content": [],
-            "model": anthropic_model,
-            "stop_reason": None,
-            "stop_sequence": None,
-            "usage": {"input_tokens": 0, "output_tokens": 0}
-        }
-    }
-    yield (f"event: message_start\ndata: {json.dumps(start_event, ensure_ascii=False)}\n\n").encode('utf-8')
-
-    def _emit_block_start(index, block):
-        event = {
-            "type": "content_block_start",
-            "index": index,
-            "content_block": block
-        }
-        return (f"event: content_block_start\ndata: {json.dumps(event, ensure_ascii=False)}\n\n").encode('utf-8')
-
-    def _emit_block_delta(index, delta):
-        event = {
-            "type": "content_block_delta",
-            "index": index,
-            "delta": delta
-        }
-        return (f"event: content_block_delta\ndata: {json.dumps(event, ensure_ascii=False)}\n\n").encode('utf-8')
-
-    def _emit_block_stop(index):
-        event = {"type": "content_block_stop", "index": index}
-        return (f"event: content_block_stop\ndata: {json.dumps(event, ensure_ascii=False)}\n\n").encode('utf-8')
-
-    line_count = 0
-    try:
-        for line in openai_stream_response.iter_lines(decode_unicode=False):
-            line_count += 1
-            if not line:
-                continue
-
-            try:
-                line_str = line.decode('utf-8')
-            except UnicodeDecodeError:
-                line_str = line.decode('utf-8', errors='replace')
-            except AttributeError:
-                line_str = line
-
-            if not line_str.startswith("data: "):
-                continue
-
-            data_str = line_str[6:].strip()
-            if data_str == "[DONE]":
-                break
-
-            try:
-                chunk = json.loads(data_str)
-            except json.JSONDecodeError:
-                continue
-
-            # 先提取 usage（可能和 choices 在同一个 chunk 中）
-            chunk_usage = chunk.get("usage")
-            if chunk_usage:
-                input_tokens = chunk_usage.get("prompt_tokens", input_tokens)
-                output_tokens = chunk_usage.get("completion_tokens", output_tokens)
-
-            choices = chunk.get("choices", [])
-            if not choices:
-                continue
-
-            choice = choices[0]
-            delta = choice.get("delta", {})
-            chunk_finish = choice.get("finish_reason")
-            if chunk_finish:
-                finish_reason = chunk_finish
-
-            # 处理推理/思考 delta（如 DeepSeek-R1 的 reasoning_content）
-            reasoning_text = delta.get("reasoning_content") or ""
-            if reasoning_text:
-                if thinking_block_index < 0:
-                    thinking_block_index = next_block_index
-                    next_block_index += 1
-                    yield _emit_block_start(thinking_block_index, {
-                        "type": "thinking", "thinking": "", "signature": ""
-                    })
-                yield _emit_block_delta(thinking_block_index, {
-                    "type": "thinking_delta", "thinking": reasoning_text
-                })
-
-            # 处理文本 delta
-            content_text = delta.get("content") or ""
-            if content_text:
-                # 如果 thinking 内容块还开着，先关闭（推理结束后才开始正文）
-                if thinking_block_index >= 0 and thinking_block_index not in closed_blocks:
-                    yield _emit_block_stop(thinking_block_index)
-                    closed_blocks.add(thinking_block_index)
-
-                if text_block_index < 0:
-                    text_block_index = next_block_index
-                    next_block_index += 1
-                    yield _emit_block_start(text_block_index, {"type": "text", "text": ""})
-
-                yield _emit_block_delta(text_block_index, {"type": "text_delta", "text": content_text})
-
-            # 处理 tool_calls delta
-            for tc in delta.get("tool_calls", []):
-                tc_index = tc.get("index", 0)
-
-                if tc_index not in tool_block_indices:
-                    tool_block_indices[tc_index] = next_block_index
-                    next_block_index += 1
-                    tc_id = tc.get("id", "")
-                    tc_name = tc.get("function", {}).get("name", "")
-                    yield _emit_block_start(tool_block_indices[tc_index], {
-                        "type": "tool_use",
-                        "id": tc_id,
-                        "name": tc_name,
-                        "input": {}
-                    })
-
-                args = tc.get("function", {}).get("arguments", "")
-                if args:
-                    yield _emit_block_delta(tool_block_indices[tc_index], {
-                        "type": "input_json_delta",
-                        "partial_json": args
-                    })
-
-            # 定期发送 ping 事件，防止代理/网关因超时断开 SSE 连接
-            now = time.time()
-            if now - last_ping >= ping_interval:
-                yield f"event: ping\ndata: {{}}\n\n".encode('utf-8')
-                last_ping = now
-
-    except (requests.exceptions.ChunkedEncodingError,
-            requests.exceptions.ConnectionError,
-            urllib3.exceptions.ProtocolError) as e:
-        logger.warning(f"Upstream stream connection lost after {line_count} lines: {e}")
-    except Exception as e:
-        logger.warning(f"Unexpected error reading upstream stream after {line_count} lines: {e}", exc_info=True)
-
-    # 为每个未关闭的 content block 发送 content_block_stop
-    for i in range(next_block_index):
-        if i not in closed_blocks:
-            yield _emit_block_stop(i)
-
-    anthropic_stop = FINISH_REASON_MAP.get(finish_reason, "end_turn") if finish_reason else "end_turn"
-
-    # message_delta
-    msg_delta = {
-        "type": "message_delta",
-        "delta": {
-            "stop_reason": anthropic_stop,
-            "stop_sequence": None
-        },
-        "usage": {"output_tokens": output_tokens}
-    }
-    yield (f"event: message_delta\ndata: {json.dumps(msg_delta, ensure_ascii=False)}\n\n").encode('utf-8')
-
-    # message_stop
-    msg_stop = {"type": "message_stop"}
-    yield (f"event: message_stop\ndata: {json.dumps(msg_stop, ensure_ascii=False)}\n\n").encode('utf-8')
+    同时处理 thinking、文本和 tool_use 内容块（见 sse_translator）。"""
+    # chunk_size=None：数据到达即交给转换器，不等凑满固定字节数
+    yield from translate_stream(openai_stream_response.iter_content(chunk_size=None), anthropic_model,
+                                coalesce_ms=sse_coalesce_ms)
 
 
 def verify_api_key(auth_header):
@@ -651,43 +491,35 @@ def create_message():
     try:
         openai_request, anthropic_model = anthropic_to_openai_request(data)
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {llm_api_key}"
-        }
-
         upstream_url = f"{llm_api_uri}/chat/completions"
         logger.info(f"forward_to {upstream_url}, model={llm_model_name}, stream={stream}")
 
-        if stream:
-            logger.debug("stream request")
-            upstream_response = requests.post(
-                upstream_url,
-                headers=headers,
-                json=openai_request,
-                timeout=300,
-                stream=True,
-                verify=False,
-                proxies={}
+        upstream_call = upstream.post_chat(openai_request, stream)
+        if upstream_call.status_code != 200:
+            logger.error(f"Upstream error: {upstream_call.status_code} - {upstream_call.text}")
+            upstream_call.close()
+            return make_json_response(
+                {
+                    "type": "error",
+                    "error": {
+                        "type": "api_error",
+                        "message": f"Upstream API returned {upstream_call.status_code}"
+                    }
+                },
+                status=502
             )
 
-            if upstream_response.status_code != 200:
-                logger.error(f"Upstream error: {upstream_response.status_code} - {upstream_response.text}")
-                return make_json_response(
-                    {
-                        "type": "error",
-                        "error": {
-                            "type": "api_error",
-                            "message": f"Upstream API returned {upstream_response.status_code}"
-                        }
-                    },
-                    status=502
-                )
+        if stream:
+            logger.debug("stream request")
 
             def generate():
-                yield from generate_anthropic_sse(upstream_response, anthropic_model)
+                # 流结束时立即归还上游并发名额和连接
+                try:
+                    yield from generate_anthropic_sse(upstream_call, anthropic_model)
+                finally:
+                    upstream_call.close()
 
-            return Response(
+            resp = Response(
                 stream_with_context(generate()),
                 mimetype="text/event-stream",
                 headers={
@@ -696,31 +528,16 @@ def create_message():
                     "x-request-id": f"msg_{uuid.uuid4().hex[:12]}"
                 }
             )
+            # 客户端在取到第一个数据块前断开时 generate() 尚未启动，其 finally 不会执行，
+            # 由响应关闭回调兜底归还（close() 可重复调用）
+            resp.call_on_close(upstream_call.close)
+            return resp
         else:
             logger.debug("not_stream_request")
-            upstream_response = requests.post(
-                upstream_url,
-                headers=headers,
-                json=openai_request,
-                timeout=300,
-                verify=False,
-                proxies={}
-            )
-
-            if upstream_response.status_code != 200:
-                logger.error(f"Upstream error: {upstream_response.status_code} - {upstream_response.text}")
-                return make_json_response(
-                    {
-                        "type": "error",
-                        "error": {
-                            "type": "api_error",
-                            "message": f"Upstream API returned {upstream_response.status_code}"
-                        }
-                    },
-                    status=502
-                )
-
-            openai_response = upstream_response.json()
+            try:
+                openai_response = upstream_call.json()
+            finally:
+                upstream_call.close()
             anthropic_response = openai_to_anthropic_response(openai_response, anthropic_model)
 
             processing_time = time.time() - start_time
@@ -731,6 +548,14 @@ def create_message():
                 headers={"x-request-id": anthropic_response["id"]}
             )
 
+    except UpstreamOverloaded as e:
+        return make_json_response(
+            {
+                "type": "error",
+                "error": {"type": "overloaded_error", "message": str(e)}
+            },
+            status=529
+        )
     except requests.exceptions.Timeout:
         logger.error("Upstream API timeout")
         return make_json_response(
@@ -819,6 +644,12 @@ def health_check():
     })
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """上游请求统计：并发/排队/拒绝数，排队、TTFB、流式时长分位数"""
+    return jsonify(upstream.metrics())
+
+
 @app.route('/', methods=['GET'])
 def welcome():
     return make_json_response({
@@ -830,7 +661,8 @@ def welcome():
         "endpoints": {
             "messages": "/v1/messages",
             "models": "/v1/models",
-            "health": "/health"
+            "health": "/health",
+            "metrics": "/metrics"
         },
         "timestamp": int(time.time())
     })
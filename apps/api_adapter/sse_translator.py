@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+"""
+OpenAI SSE -> Anthropic SSE 流式转换（快速路径）
+- JSON 编解码优先使用 orjson（未安装时退回标准库 json）
+- 高频的 content_block_delta / content_block_stop 事件使用预先拼好的字节模板，只序列化增量文本
+- 按网络读取批次处理上游数据：同一批次内同一内容块的连续小增量合并为一个事件发出，不增加延迟；
+  coalesce_ms > 0 时为跨批次的合并窗口：缓冲只在每次网络读取结束时检查是否已超过该时长，没有定时器，
+  上游停顿期间缓冲的内容要等到下一批数据到达（或流结束）才会发出，因此窗口上限为 MAX_COALESCE_MS
+"""
+import logging
+import time
+import uuid
+
+import requests
+import urllib3
+
+try:
+    import orjson
+
+    def _loads(data):
+        return orjson.loads(data)
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # pragma: no cover
+    import json
+
+    def _loads(data):
+        return json.loads(data)
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+logger = logging.getLogger(__name__)
+
+FINISH_REASON_MAP = {
+    "stop": "end_turn",
+    "length": "max_tokens",
+    "tool_calls": "tool_use",
+    "content_filter": "end_turn",
+}
+PING_INTERVAL_S = 30            # 每 30 秒发送一次 ping，防止连接超时
+MAX_COALESCE_CHARS = 4096       # 单个合并事件的最大字符数
+MAX_COALESCE_MS = 50            # 跨批次合并窗口上限（毫秒），超出的配置值按该值处理
+
+_PING = b"event: ping\ndata: {}\n\n"
+_DELTA_FIELDS = {
+    "text_delta": b"text",
+    "thinking_delta": b"thinking",
+    "input_json_delta": b"partial_json",
+}
+
+
+def _event(name: str, obj) -> bytes:
+    return b"event: " + name.encode() + b"\ndata: " + _dumps(obj) + b"\n\n"
+
+
+class _Templates:
+    """按内容块 index 缓存事件字节前缀"""
+
+    def __init__(self):
+        self._delta = {}
+        self._stop = {}
+
+    def delta(self, index: int, kind: str, value: str) -> bytes:
+        prefix = self._delta.get((index, kind))
+        if prefix is None:
+            prefix = (b'event: content_block_delta\ndata: {"type":"content_block_delta","index":%d,'
+                      b'"delta":{"type":"%s","%s":' % (index, kind.encode(), _DELTA_FIELDS[kind]))
+            self._delta[(index, kind)] = prefix
+        return prefix + _dumps(value) + b"}}\n\n"
+
+    def stop(self, index: int) -> bytes:
+        event = self._stop.get(index)
+        if event is None:
+            event = b'event: content_block_stop\ndata: {"type":"content_block_stop","index":%d}\n\n' % index
+            self._stop[index] = event
+        return event
+
+
+def iter_data_lines(chunks):
+    """把上游字节块切分为 SSE data 负载；每个网络读取批次结束时产出 None 作为批次边界"""
+    pending = b""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.startswith(b"data:"):
+                yield line[5:].strip()
+        yield None
+    if pending.startswith(b"data:"):
+        yield pending[5:].strip()
+
+
+def translate_stream(chunks, anthropic_model: str, coalesce_ms: float = 0, ping_interval: float = PING_INTERVAL_S):
+    """将 OpenAI SSE 字节流（可迭代的字节块）转换为 Anthropic SSE 事件字节流，
+    同时处理 thinking、文本和 tool_use 内容块。
+
+    coalesce_ms 为跨网络读取批次的合并窗口，每次读取结束时检查，取值限制在 [0, MAX_COALESCE_MS]。
+    """
+    msg_id = f"msg_{uuid.uuid4().hex[:12]}"
+    tpl = _Templates()
+    thinking_block_index = -1    # 推理/思考内容块的 Anthropic content index
+    text_block_index = -1        # 文本内容块的 Anthropic content index
+    tool_block_indices = {}      # OpenAI tool_call index -> Anthropic content index
+    next_block_index = 0         # 下一个可用的 Anthropic content index
+    closed_blocks = set()        # 已提前关闭的 content block index
+    output_tokens = 0
+    finish_reason = None
+    last_ping = time.time()
+    coalesce_s = min(max(coalesce_ms, 0), MAX_COALESCE_MS) / 1000
+
+    # 待合并的增量：同一 (index, kind) 的连续片段
+    buf_key = None
+    buf_parts = []
+    buf_chars = 0
+    buf_since = 0.0
+
+    def flush():
+        nonlocal buf_key, buf_parts, buf_chars
+        if buf_key is None:
+            return b""
+        event = tpl.delta(buf_key[0], buf_key[1], "".join(buf_parts))
+        buf_key, buf_parts, buf_chars = None, [], 0
+        return event
+
+    yield _event("message_start", {
+        "type": "message_start",
+        "message": {
+            "id": msg_id,
+            "type": "message",
+            "role": "assistant",
+            "content": [],
+            "model": anthropic_model,
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {"input_tokens": 0, "output_tokens": 0}
+        }
+    })
+
+    line_count = 0
+    out = []    # 当前批次待发出的事件
+    try:
+        for data in iter_data_lines(chunks):
+            if data is None:
+                # 网络读取批次边界：发出本批次的事件，合并窗口未到则留到下一批（只在此处检查）
+                if buf_key is not None and (not coalesce_s or time.monotonic() - buf_since >= coalesce_s):
+                    out.append(flush())
+                if out:
+                    yield b"".join(out)
+                    out = []
+                now = time.time()
+                if now - last_ping >= ping_interval:
+                    yield _PING
+                    last_ping = now
+                continue
+
+            line_count += 1
+            if data == b"[DONE]":
+                break
+            try:
+                chunk = _loads(data)
+            except ValueError:
+                continue
+
+            # 先提取 usage（可能和 choices 在同一个 chunk 中）
+            chunk_usage = chunk.get("usage")
+            if chunk_usage:
+                output_tokens = chunk_usage.get("completion_tokens", output_tokens)
+
+            choices = chunk.get("choices")
+            if not choices:
+                continue
+            choice = choices[0]
+            delta = choice.get("delta") or {}
+            chunk_finish = choice.get("finish_reason")
+            if chunk_finish:
+                finish_reason = chunk_finish
+
+            pieces = []
+            # 处理推理/思考 delta（如 DeepSeek-R1 的 reasoning_content）
+            reasoning_text = delta.get("reasoning_content")
+            if reasoning_text:
+                if thinking_block_index < 0:
+                    thinking_block_index = next_block_index
+                    next_block_index += 1
+                    out.append(flush())
+                    out.append(_event("content_block_start", {
+                        "type": "content_block_start", "index": thinking_block_index,
+                        "content_block": {"type": "thinking", "thinking": "", "signature": ""}
+                    }))
+                pieces.append((thinking_block_index, "thinking_delta", reasoning_text))
+
+            # 处理文本 delta
+            content_text = delta.get("content")
+            if content_text:
+                # 如果 thinking 内容块还开着，先关闭（推理结束后才开始正文）
+                if thinking_block_index >= 0 and thinking_block_index not in closed_blocks:
+                    out.append(flush())
+                    out.append(tpl.stop(thinking_block_index))
+                    closed_blocks.add(thinking_block_index)
+                if text_block_index < 0:
+                    text_block_index = next_block_index
+                    next_block_index += 1
+                    out.append(flush())
+                    out.append(_event("content_block_start", {
+                        "type": "content_block_start", "index": text_block_index,
+                        "content_block": {"type": "text", "text": ""}
+                    }))
+                pieces.append((text_block_index, "text_delta", content_text))
+
+            # 处理 tool_calls delta
+            for tc in delta.get("tool_calls") or ():
+                tc_index = tc.get("index", 0)
+                function = tc.get("function") or {}
+                if tc_index not in tool_block_indices:
+                    tool_block_indices[tc_index] = next_block_index
+                    next_block_index += 1
+                    out.append(flush())
+                    out.append(_event("content_block_start", {
+                        "type": "content_block_start", "index": tool_block_indices[tc_index],
+                        "content_block": {"type": "tool_use", "id": tc.get("id", ""),
+                                          "name": function.get("name", ""), "input": {}}
+                    }))
+                args = function.get("arguments")
+                if args:
+                    pieces.append((tool_block_indices[tc_index], "input_json_delta", args))
+
+            for index, kind, value in pieces:
+                if buf_key != (index, kind) or buf_chars >= MAX_COALESCE_CHARS:
+                    out.append(flush())
+                    buf_key = (index, kind)
+                    buf_since = time.monotonic()
+                buf_parts.append(value)
+                buf_chars += len(value)
+
+    except (requests.exceptions.ChunkedEncodingError,
+            requests.exceptions.ConnectionError,
+            urllib3.exceptions.ProtocolError) as e:
+        logger.warning(f"Upstream stream connection lost after {line_count} lines: {e}")
+    except Exception as e:
+        logger.warning(f"Unexpected error reading upstream stream after {line_count} lines: {e}", exc_info=True)
+
+    out.append(flush())
+    # 为每个未关闭的 content block 发送 content_block_stop
+    for i in range(next_block_index):
+        if i not in closed_blocks:
+            out.append(tpl.stop(i))
+
+    anthropic_stop = FINISH_REASON_MAP.get(finish_reason, "end_turn") if finish_reason else "end_turn"
+    out.append(_event("message_delta", {
+        "type": "message_delta",
+        "delta": {"stop_reason": anthropic_stop, "stop_sequence": None},
+        "usage": {"output_tokens": output_tokens}
+    }))
+    out.append(_event("message_stop", {"type": "message_stop"}))
+    yield b"".join(out)
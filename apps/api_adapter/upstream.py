@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+"""
+上游 OpenAI 兼容接口客户端
+- 复用 keep-alive 连接池（requests.Session + HTTPAdapter），不再每个请求新建 TCP/TLS 连接
+- 限制同时发往上游的请求数，超出的请求排队等待，等待超时则拒绝（UpstreamOverloaded）
+- 记录每个请求的耗时拆分：排队、上游首字节（TTFB）、流式传输时长，供 /metrics 汇总
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 32
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_QUEUE_TIMEOUT_S = 30
+DEFAULT_TIMEOUT_S = 300
+# /metrics 统计最近多少个请求的耗时分位数
+METRICS_WINDOW = 1000
+
+
+class UpstreamOverloaded(Exception):
+    """排队等待上游并发名额超时"""
+
+
+class RequestTiming:
+    """单个请求的耗时打点（time.monotonic 秒）"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.acquired = None
+        self.first_byte = None
+        self.end = None
+
+    def as_dict(self) -> dict:
+        def ms(a, b):
+            return round((b - a) * 1000, 1) if a is not None and b is not None else None
+        return {
+            "queue_ms": ms(self.start, self.acquired),
+            "ttfb_ms": ms(self.acquired, self.first_byte),
+            "stream_ms": ms(self.first_byte, self.end),
+            "total_ms": ms(self.start, self.end),
+        }
+
+
+class UpstreamCall:
+    """一次上游调用：持有并发名额和响应，close() 时归还名额、释放连接并记录耗时"""
+
+    def __init__(self, client, response, timing):
+        self._client = client
+        self.response = response
+        self.timing = timing
+        self.status_code = response.status_code
+        self._closed = False
+
+    def iter_lines(self, **kwargs):
+        """同 requests.Response.iter_lines，并记录首个数据块到达时间"""
+        for line in self.response.iter_lines(**kwargs):
+            if self.timing.first_byte is None:
+                self.timing.first_byte = time.monotonic()
+            yield line
+
+    def iter_content(self, **kwargs):
+        """同 requests.Response.iter_content，并记录首个数据块到达时间"""
+        for chunk in self.response.iter_content(**kwargs):
+            if self.timing.first_byte is None:
+                self.timing.first_byte = time.monotonic()
+            yield chunk
+
+    def json(self):
+        data = self.response.json()
+        if self.timing.first_byte is None:
+            self.timing.first_byte = time.monotonic()
+        return data
+
+    @property
+    def text(self):
+        return self.response.text
+
+    def close(self, error: bool = False):
+        if self._closed:
+            return
+        self._closed = True
+        self.timing.end = time.monotonic()
+        try:
+            self.response.close()
+        finally:
+            self._client._finish(self.timing, error or self.status_code != 200)
+
+
+class UpstreamClient:
+    """连接池 + 并发限制的上游客户端，线程安全"""
+
+    def __init__(self, base_url: str, api_key: str, pool_size: int = DEFAULT_POOL_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT_S,
+                 timeout: float = DEFAULT_TIMEOUT_S):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        })
+        self._session.verify = False
+        self._session.trust_env = False     # 忽略代理环境变量
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=METRICS_WINDOW)
+        self._counters = {"requests": 0, "errors": 0, "rejected": 0, "in_flight": 0, "queued": 0}
+
+    def post_chat(self, payload: dict, stream: bool) -> UpstreamCall:
+        """占用并发名额后请求 /chat/completions；调用方用完后必须 close()。
+
+        名额排队超时抛 UpstreamOverloaded，请求异常时自动归还名额并向上抛出。
+        """
+        timing = RequestTiming()
+        self._acquire()
+        timing.acquired = time.monotonic()
+        try:
+            # 总是以流式读取，非流式请求由调用方 json() 读完响应体
+            response = self._session.post(f"{self.base_url}/chat/completions", json=payload,
+                                          timeout=self.timeout, stream=True)
+        except Exception:
+            timing.end = time.monotonic()
+            self._finish(timing, True)
+            raise
+        if not stream or response.status_code != 200:
+            timing.first_byte = time.monotonic()
+        return UpstreamCall(self, response, timing)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            result = dict(self._counters)
+            recent = list(self._recent)
+        result["max_concurrency"] = self.max_concurrency
+        result["window"] = len(recent)
+        for name in ("queue_ms", "ttfb_ms", "stream_ms", "total_ms"):
+            values = sorted(t[name] for t in recent if t[name] is not None)
+            result[name] = {
+                "p50": _percentile(values, 0.5),
+                "p95": _percentile(values, 0.95),
+                "p99": _percentile(values, 0.99),
+                "max": values[-1] if values else None,
+            }
+        result["last"] = recent[-1] if recent else None
+        return result
+
+    def _acquire(self):
+        if self._slots is None:
+            with self._lock:
+                self._counters["in_flight"] += 1
+            return
+        with self._lock:
+            self._counters["queued"] += 1
+        ok = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self._counters["queued"] -= 1
+            if not ok:
+                self._counters["rejected"] += 1
+            else:
+                self._counters["in_flight"] += 1
+        if not ok:
+            logger.warning(f"upstream_overloaded, max_concurrency={self.max_concurrency}, "
+                           f"queue_timeout={self.queue_timeout}s")
+            raise UpstreamOverloaded(f"upstream busy, waited {self.queue_timeout}s")
+
+    def _finish(self, timing: RequestTiming, error: bool):
+        record = timing.as_dict()
+        with self._lock:
+            self._counters["in_flight"] -= 1
+            self._counters["requests"] += 1
+            if error:
+                self._counters["errors"] += 1
+            self._recent.append(record)
+        if self._slots is not None:
+            self._slots.release()
+        logger.info(f"upstream_request_done, error={error}, {record}")
+
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q))]
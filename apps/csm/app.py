@@ -24,6 +24,7 @@ from apps.csm.kb_manager import KBManager
 from apps.csm.embedding_client import EmbeddingClient
 from apps.csm.handler import Handler
 from apps.csm.handler.auth import AuthHandler, extract_token, parse_token
+from common import embedding_cache, statistic_util
 
 # ============================================================
 # 日志初始化
@@ -111,6 +112,18 @@ def create_app():
     # ============================================================
     # 5. 初始化 Embedding 客户端
     # ============================================================
+    emb_cache_cfg = my_cfg["embedding_cache"]
+    try:
+        embedding_cache.configure_cache(
+            enabled=emb_cache_cfg.get("enabled", True),
+            db_path=emb_cache_cfg.get("path", embedding_cache.DEFAULT_DB_PATH),
+            max_entries=emb_cache_cfg.get("max_entries", embedding_cache.DEFAULT_MAX_ENTRIES),
+            ttl_days=emb_cache_cfg.get("ttl_days", embedding_cache.DEFAULT_TTL_DAYS),
+        )
+    except Exception as e:
+        logger.warning("embedding 缓存初始化失败，不启用缓存: %s", e)
+        embedding_cache.configure_cache(enabled=False)
+
     emb_client = None
     if my_cfg["api"].get("embedding_api_uri") and my_cfg["api"].get("embedding_api_key"):
         try:
@@ -181,7 +194,16 @@ def register_routes(app):
     # ============================================================
     @app.route('/health')
     def health_check():
-        return jsonify({"status": "ok"})
+        # 附带工作流引擎 Agent 缓存 / LLM 客户端池、embedding 缓存命中统计
+        emb_cache = embedding_cache.get_cache()
+        return jsonify({
+            "status": "ok",
+            "workflow_cache": handler.Chat.engine.cache_stats(),
+            "embedding_cache": {
+                "store": emb_cache.stats() if emb_cache is not None else None,
+                "models": statistic_util.get_embedding_cache_stats(),
+            },
+        })
 
     @app.route('/login')
     def login_page():
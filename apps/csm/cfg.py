@@ -33,6 +33,12 @@ DEFAULT_CONFIG = {
         "score_threshold": 0.1,
         "rerank_enabled": False,
         "rerank_retrieve_n": 15,
+        # rerank 整体超时预算（超出则保持向量顺序）、(query, chunk) 分数缓存条数
+        "rerank_timeout_ms": 800,
+        "rerank_cache_size": 4096,
+        # 多知识库检索：单个知识库最多贡献的结果数（0 不限制）、并发检索线程数
+        "per_kb_quota": 0,
+        "search_workers": 8,
     },
     "llm": {
         "temperature": 0.7,
@@ -42,8 +48,20 @@ DEFAULT_CONFIG = {
     "faq": {
         "match_threshold": 0.85,
     },
+    # DAG 工作流：节点共享线程池大小、单个工作流同时运行的节点数上限
+    "workflow": {
+        "pool_size": 16,
+        "max_concurrency": 4,
+    },
+    # embedding 磁盘缓存：条目上限（按最近访问淘汰）、有效期（天，0 不过期）
+    "embedding_cache": {
+        "enabled": True,
+        "path": "embedding_cache.db",
+        "max_entries": 200000,
+        "ttl_days": 30,
+    },
     "store": {"backend": "sqlite"},
-    "vector": {"backend": "local"},
+    "vector": {"backend": "local", "local_dtype": "float32"},
     "mysql": {"dsn": ""},
     "milvus": {"uri": "", "token": ""},
     "qdrant": {"host": "localhost", "port": 6334, "api_key": "", "use_tls": False},
@@ -62,8 +62,11 @@ class LLMClient:
             logger.error("LLM API 返回错误: status=%d, body=%s", resp.status_code, error_body)
             raise ValueError(f"LLM API 返回错误 {resp.status_code}: {error_body}")
 
-        # 读取 SSE 流
-        for line in resp.iter_lines(decode_unicode=True):
+        # 读取 SSE 流；chunked 响应按到达的 HTTP chunk 即时切行，避免凑满 512 字节才产出首个片段
+        if resp.encoding is None or resp.encoding.lower() == "iso-8859-1":
+            resp.encoding = "utf-8"
+        chunked = "chunked" in resp.headers.get("Transfer-Encoding", "").lower()
+        for line in resp.iter_lines(chunk_size=None if chunked else 512, decode_unicode=True):
             if not line:
                 continue
             line = line.strip()
@@ -167,21 +167,17 @@ class CsmEngine:
         logger.info("csm_kb_search_start: vdb_ids=%s, query=%s",
                     self.CSM_VDB_IDS, truncate_str(user_query, 80))
 
-        parts = []
-        for vdb_id in self.CSM_VDB_IDS:
-            try:
-                ctx = self.kb_mgr.search_in_kb(
-                    user_query, vdb_id, uid,
-                    self.cfg["kb"].get("top_k", 3),
-                    self.cfg["kb"].get("score_threshold", 0.1),
-                )
-                if ctx:
-                    parts.append(ctx)
-            except Exception as e:
-                logger.warning("csm_kb_search_failed: vdb_id=%s, error=%s", vdb_id, e)
-                continue
-
-        context = "\n".join(parts)
+        try:
+            results = self.kb_mgr.retrieve(
+                user_query, self.CSM_VDB_IDS,
+                self.cfg["kb"].get("top_k", 3),
+                self.cfg["kb"].get("score_threshold", 0.1),
+            )
+        except Exception as e:
+            logger.warning("csm_kb_search_failed: vdb_ids=%s, error=%s", self.CSM_VDB_IDS, e)
+            results = []
+
+        context = self.kb_mgr.format_results(results)
         logger.info("csm_kb_search_done: duration_ms=%d, context_len=%d",
                     int((time.time() - start) * 1000), len(context))
         return context
@@ -3,14 +3,20 @@
 """
 Embedding 客户端 — 对标 Go 版本 internal/embedding/client.go
 OpenAI 兼容接口，支持批量 embedding 和维度探测。
+默认先查共享的 embedding 磁盘缓存（common.embedding_cache），只把未命中的文本发往上游。
+向上游请求 base64（小端 float32）编码的向量，直接解码为 NumPy 数组。
 """
 import json
 import logging
 import time
 from typing import Optional
 
+import numpy as np
 import requests
 
+from common.embedding_cache import embed_with_cache
+from common.embedding_codec import ENCODING_FORMAT, decode_vector
+
 logger = logging.getLogger(__name__)
 
 MAX_BATCH_SIZE = 32
@@ -19,10 +25,11 @@ MAX_BATCH_SIZE = 32
 class EmbeddingClient:
     """Embedding 客户端"""
 
-    def __init__(self, api_uri: str, api_key: str, model_name: str):
+    def __init__(self, api_uri: str, api_key: str, model_name: str, use_cache: bool = True):
         self.base_url = api_uri.rstrip("/")
         self.api_key = api_key
         self.model_name = model_name
+        self.use_cache = use_cache
         self._session = requests.Session()
         self._session.headers.update({
             "Content-Type": "application/json",
@@ -41,7 +48,13 @@ class EmbeddingClient:
         """将文本列表转为向量"""
         if not texts:
             return []
+        if self.use_cache:
+            vectors = embed_with_cache(self.model_name, texts, self._embed_remote)
+        else:
+            vectors = self._embed_remote(texts)
+        return [vec.tolist() for vec in vectors]
 
+    def _embed_remote(self, texts: list[str]) -> list[np.ndarray]:
         all_embeddings = []
         for i in range(0, len(texts), MAX_BATCH_SIZE):
             batch = texts[i:i + MAX_BATCH_SIZE]
@@ -64,7 +77,7 @@ class EmbeddingClient:
         logger.info("embedding 模型探测成功: model=%s, dim=%d", self.model_name, dim)
         return dim
 
-    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+    def _embed_batch(self, texts: list[str]) -> list[np.ndarray]:
         if not self.base_url:
             raise ValueError("Embedding API 地址未配置")
 
@@ -72,6 +85,7 @@ class EmbeddingClient:
         payload = {
             "model": self.model_name,
             "input": texts,
+            "encoding_format": ENCODING_FORMAT,
         }
 
         resp = self._session.post(url, json=payload, timeout=60)
@@ -80,4 +94,5 @@ class EmbeddingClient:
             raise ValueError(f"embedding API 返回错误 {resp.status_code}: {resp.text}")
 
         data = resp.json()
-        return [item["embedding"] for item in data["data"]]
\ No newline at end of file
+        # 不支持 base64 的服务端仍返回浮点列表，decode_vector 两种格式都能处理
+        return [decode_vector(item["embedding"]) for item in data["data"]]
\ No newline at end of file
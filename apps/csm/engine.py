@@ -8,10 +8,13 @@ import hashlib
 import json
 import logging
 import os
+import queue
 import re
 import subprocess
 import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, Generator
 
@@ -121,12 +124,17 @@ NONE_SAMPLES = [
 class FastTextPredictor:
     """fastText 意图分类器。
     从类别关键词+描述自动生成训练数据，训练模型，执行预测。
+    模型常驻：优先进程内加载，否则使用常驻 CLI 子进程，避免每次预测 fork 进程。
     """
 
     def __init__(self, work_dir: str = DEFAULT_WORK_DIR):
         self._lock = threading.Lock()
         self.work_dir = work_dir
         self.model_hash = ""  # 当前已训练模型的类别 hash
+        # 常驻预测后端，按 model.ftz 的 (mtime, size) 判断是否需要重新加载
+        self._backend_lock = threading.Lock()
+        self._backend = None
+        self._backend_key = None
         os.makedirs(work_dir, exist_ok=True)
 
     def train(self, categories: list[dict], prompt: str = "") -> bool:
@@ -168,48 +176,177 @@ class FastTextPredictor:
         返回 {"label": str, "confidence": float} 或 None。
         如果预测结果是 "none"（无关输入），视为不匹配返回 None。
         """
-        model_path = os.path.join(self.work_dir, "model.ftz")
-        if not os.path.exists(model_path):
-            return None
+        return self.predict_many([query])[0]
 
-        tokens = _tokenize(query)
+    def predict_many(self, queries: list[str]) -> list[Optional[dict]]:
+        """批量预测，返回与 queries 一一对应的结果列表（含义同 predict）"""
+        results = [None] * len(queries)
+        backend = self._get_backend()
+        if backend is None:
+            return results
+
+        # 空文本无需预测；换行会破坏按行协议，替换为空格
+        idx = [i for i, q in enumerate(queries) if q and q.strip()]
+        lines = [_tokenize(queries[i].replace("\r", " ").replace("\n", " ")) for i in idx]
+        if not lines:
+            return results
 
         try:
-            # 调用 fasttext predict-prob
-            result = subprocess.run(
-                ["fasttext", "predict-prob", model_path, "-", "1"],
-                input=tokens + "\n",
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-            if result.returncode != 0:
-                logger.warning("fastText predict 失败: %s", result.stderr.strip())
-                return None
+            parsed_list = backend.predict_lines(lines)
+        except Exception as e:
+            logger.warning("fastText predict 异常: %s", e)
+            self._close_backend(backend)
+            return results
 
-            output = result.stdout.strip()
-            parsed = _parse_predict_output(output)
+        for i, parsed in zip(idx, parsed_list):
             if not parsed:
-                return None
-
-            label = parsed["label"]
-            if label == "none":
+                continue
+            if parsed["label"] == "none":
                 logger.info("fastText 分类为 none（无关输入）: confidence=%.4f, query=%s",
-                            parsed["confidence"], query[:50])
-                return None
-
-            return parsed
-        except FileNotFoundError:
-            logger.warning("fasttext CLI 未安装，跳过 fastText 分类层")
-            return None
-        except Exception as e:
-            logger.warning("fastText predict 异常: %s", e)
-            return None
+                            parsed["confidence"], queries[i][:50])
+                continue
+            results[i] = parsed
+        return results
 
     def is_trained(self) -> bool:
         """判断模型是否已训练"""
         return os.path.exists(os.path.join(self.work_dir, "model.ftz"))
 
+    def close(self):
+        """释放常驻模型 / 子进程"""
+        with self._backend_lock:
+            backend, self._backend = self._backend, None
+            self._backend_key = None
+        if backend is not None:
+            backend.close()
+
+    def _get_backend(self):
+        """返回常驻预测后端；model.ftz 变化（重新训练/替换）时自动重新加载"""
+        model_path = os.path.join(self.work_dir, "model.ftz")
+        try:
+            st = os.stat(model_path)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        if self._backend is not None and self._backend_key == key:
+            return self._backend
+
+        with self._backend_lock:
+            if self._backend is not None and self._backend_key == key:
+                return self._backend
+            old = self._backend
+            self._backend = _load_predict_backend(model_path)
+            self._backend_key = key if self._backend is not None else None
+        if old is not None:
+            logger.info("fastText 模型文件已变化，重新加载: %s", model_path)
+            old.close()
+        return self._backend
+
+    def _close_backend(self, backend):
+        """后端出错时丢弃，下次调用重新加载"""
+        with self._backend_lock:
+            if self._backend is backend:
+                self._backend = None
+                self._backend_key = None
+        backend.close()
+
+
+# 子进程单次读取预测结果的超时（秒）
+FT_PREDICT_TIMEOUT = 10
+# 子进程模式下单次写入的最大行数，避免输入输出管道同时写满
+FT_CLI_BATCH = 256
+
+
+def _load_predict_backend(model_path: str):
+    """优先使用 fasttext Python 绑定在进程内加载模型，否则启动常驻 CLI 子进程"""
+    try:
+        import fasttext
+        model = fasttext.load_model(model_path)
+        logger.info("fastText 模型已加载到进程内: %s", model_path)
+        return _FastTextModelBackend(model)
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.warning("fastText Python 绑定加载模型失败，改用 CLI 子进程: %s", e)
+
+    try:
+        backend = _FastTextCliBackend(model_path)
+        logger.info("fastText 常驻子进程已启动: pid=%d, model=%s", backend.proc.pid, model_path)
+        return backend
+    except FileNotFoundError:
+        logger.warning("fasttext CLI 未安装，跳过 fastText 分类层")
+    except Exception as e:
+        logger.warning("fastText 子进程启动失败: %s", e)
+    return None
+
+
+class _FastTextModelBackend:
+    """进程内 fastText 模型（fasttext Python 绑定）"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict_lines(self, lines: list[str]) -> list[Optional[dict]]:
+        labels, probs = self.model.predict(lines, k=1)
+        results = []
+        for label, prob in zip(labels, probs):
+            if not len(label) or not label[0].startswith("__label__"):
+                results.append(None)
+                continue
+            results.append({"label": label[0][len("__label__"):], "confidence": float(prob[0])})
+        return results
+
+    def close(self):
+        self.model = None
+
+
+class _FastTextCliBackend:
+    """常驻 `fasttext predict-prob model -` 子进程，每行输入对应一行输出"""
+
+    def __init__(self, model_path: str):
+        self._lock = threading.Lock()
+        self._lines = queue.Queue()
+        self.proc = subprocess.Popen(
+            ["fasttext", "predict-prob", model_path, "-", "1"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        # 独立线程读取 stdout，使读取可以带超时
+        threading.Thread(target=self._read_loop, daemon=True, name="fasttext_reader").start()
+
+    def _read_loop(self):
+        for line in self.proc.stdout:
+            self._lines.put(line)
+        self._lines.put(None)
+
+    def predict_lines(self, lines: list[str]) -> list[Optional[dict]]:
+        results = []
+        with self._lock:
+            for i in range(0, len(lines), FT_CLI_BATCH):
+                batch = lines[i:i + FT_CLI_BATCH]
+                self.proc.stdin.write("".join(f"{line}\n" for line in batch))
+                self.proc.stdin.flush()
+                for _ in batch:
+                    output = self._lines.get(timeout=FT_PREDICT_TIMEOUT)
+                    if output is None:
+                        raise RuntimeError(f"fasttext 子进程已退出: code={self.proc.poll()}")
+                    results.append(_parse_predict_output(output))
+        return results
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
 
 def _tokenize(s: str) -> str:
     """按字切分中文文本（空格分隔每个字符）"""
@@ -323,6 +460,8 @@ SEMANTIC_THRESHOLD = 0.6
 
 # 类别向量缓存
 _cat_embedding_cache = {}  # key -> list of {"name": str, "vector": list[float]}
+# 关键词自动机缓存，与类别向量缓存使用相同的分类器配置 key
+_keyword_matcher_cache = {}  # key -> KeywordMatcher
 _cache_lock = threading.Lock()
 
 
@@ -365,7 +504,7 @@ def classify_with_details(classifier_cfg: Optional[dict], user_query: str,
 
     # 1. 关键词匹配
     t0 = time.time()
-    name = _match_keyword(user_query, categories)
+    name = _match_keyword(user_query, classifier_cfg)
     if name:
         elapsed = int((time.time() - t0) * 1000)
         tiers.append(TierResult("keyword", matched=True, result=name, elapsed=elapsed))
@@ -433,12 +572,12 @@ def classify(classifier_cfg: Optional[dict], user_query: str,
 
     categories = classifier_cfg["categories"]
 
-    # 1. 关键词匹配（最快，0ms）
-    name = _match_keyword(user_query, categories)
+    # 1. 关键词匹配（最快，0ms，Aho–Corasick 单次扫描）
+    name = _match_keyword(user_query, classifier_cfg)
     if name:
         return name
 
-    # 2. 本地模型（~5ms，比关键词准）
+    # 2. 本地模型（常驻模型，<1ms，比关键词准）
     if ft_predictor is not None:
         if not ft_predictor.is_trained():
             logger.warning("fastText 模型未找到，跳过 fastText 层: path=dt/ft/model.ftz")
@@ -473,21 +612,68 @@ def classify(classifier_cfg: Optional[dict], user_query: str,
     return ""
 
 
-def _match_keyword(query: str, categories: list[dict]) -> str:
-    """关键词匹配：在类别关键词中查找匹配"""
-    query_lower = query.lower()
-    best_match = ""
-    best_len = 0
+def _match_keyword(query: str, classifier_cfg: dict) -> str:
+    """关键词匹配：返回命中的最长关键词所属类别"""
+    return _get_keyword_matcher(classifier_cfg).match(query)
 
-    for cat in categories:
-        for kw in cat.get("keywords", []):
-            kw_lower = kw.lower()
-            if kw_lower in query_lower:
-                if len(kw) > best_len:
-                    best_len = len(kw)
-                    best_match = cat.get("name", "")
 
-    return best_match
+def _get_keyword_matcher(classifier_cfg: dict) -> "KeywordMatcher":
+    """获取分类器的关键词自动机（带缓存）。"""
+    cache_key = _build_category_cache_key(classifier_cfg)
+    with _cache_lock:
+        matcher = _keyword_matcher_cache.get(cache_key)
+    if matcher is not None:
+        return matcher
+
+    matcher = KeywordMatcher(classifier_cfg.get("categories", []))
+    with _cache_lock:
+        _keyword_matcher_cache[cache_key] = matcher
+    return matcher
+
+
+class KeywordMatcher:
+    """所有类别关键词编译成的 Aho–Corasick 自动机，一次扫描 query 找出最长命中。
+
+    最长关键词优先；长度相同时按类别及关键词的配置顺序取最靠前者。
+    未安装 pyahocorasick 时退化为逐个关键词子串查找。
+    """
+
+    def __init__(self, categories: list[dict]):
+        # 小写关键词 -> (关键词长度, 配置顺序, 类别名)，重复关键词保留第一次出现
+        self._keywords = {}
+        order = 0
+        for cat in categories:
+            for kw in cat.get("keywords", []):
+                kw_lower = kw.lower()
+                if kw_lower and kw_lower not in self._keywords:
+                    self._keywords[kw_lower] = (len(kw), order, cat.get("name", ""))
+                order += 1
+
+        self._automaton = None
+        try:
+            import ahocorasick
+        except ImportError:
+            logger.warning("未安装 pyahocorasick，关键词匹配使用逐个子串查找")
+            return
+        if self._keywords:
+            automaton = ahocorasick.Automaton()
+            for kw_lower, payload in self._keywords.items():
+                automaton.add_word(kw_lower, payload)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def match(self, query: str) -> str:
+        query_lower = query.lower()
+        if self._automaton is not None:
+            hits = (payload for _, payload in self._automaton.iter(query_lower))
+        else:
+            hits = (payload for kw_lower, payload in self._keywords.items() if kw_lower in query_lower)
+
+        best = None
+        for payload in hits:
+            if best is None or payload[0] > best[0] or (payload[0] == best[0] and payload[1] < best[1]):
+                best = payload
+        return best[2] if best else ""
 
 
 # ============================================================
@@ -764,6 +950,17 @@ def _topological_levels(dag: dict) -> list[list[dict]]:
     return levels
 
 
+# DAG 节点共享线程池大小，及单个工作流同时运行的节点数上限（可被工作流的 max_concurrency 覆盖）
+DEFAULT_NODE_POOL_SIZE = 16
+DEFAULT_WORKFLOW_MAX_CONCURRENCY = 4
+
+
+class _NodeFinished:
+    """DAG 节点结束标记（内部使用，不对外发送）"""
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+
+
 class WorkflowEngine:
     """工作流执行引擎"""
 
@@ -775,6 +972,15 @@ class WorkflowEngine:
         self.emb_client = emb_client
         self.ft_predictor = ft_predictor or FastTextPredictor()
 
+        # DAG 节点共享线程池（所有请求共用，有界）
+        wf_cfg = self.cfg.get("workflow", {})
+        # 并发上限至少为 1，否则 DAG 不会提交任何节点
+        self.max_concurrency = max(1, int(wf_cfg.get("max_concurrency", DEFAULT_WORKFLOW_MAX_CONCURRENCY)))
+        self._node_pool = ThreadPoolExecutor(
+            max_workers=wf_cfg.get("pool_size", DEFAULT_NODE_POOL_SIZE),
+            thread_name_prefix="wf_node",
+        )
+
         # 默认 LLM 客户端
         from apps.csm.chat_agent import LLMClient
         api = self.cfg["api"]
@@ -788,6 +994,16 @@ class WorkflowEngine:
             max_tokens=llm.get("max_tokens", 2048),
         )
 
+        # Agent 定义缓存（update_agent/delete_agent 时失效）与 LLM 客户端池
+        # 客户端按 (uri, key, model, 采样参数) 复用，保持 requests.Session 的长连接
+        self._cache_lock = threading.Lock()
+        self._agent_cache: dict = {}
+        self._agent_gen = 0
+        self._llm_clients: dict = {self._llm_client_key(self.base_llm): self.base_llm}
+        self._cache_stats = {"agent_hit": 0, "agent_miss": 0, "client_hit": 0, "client_miss": 0}
+        if store is not None and hasattr(store, "add_agent_listener"):
+            store.add_agent_listener(self.invalidate_agent)
+
     def execute_stream(self, workflow: dict, messages: list[dict],
                        uid: str, user_query: str) -> Generator[EngineEvent, None, None]:
         """流式执行工作流，通过 Generator 返回 EngineEvent
@@ -853,7 +1069,9 @@ class WorkflowEngine:
 
         # 执行节点（DAG 或线性模式）
         if has_next_nodes(nodes):
-            yield from self._execute_dag(nodes, vars_dict, classifier_output_var, uid, user_query)
+            max_concurrency = max(1, int(workflow.get("max_concurrency") or self.max_concurrency))
+            yield from self._execute_dag(nodes, vars_dict, classifier_output_var, uid, user_query,
+                                         max_concurrency)
         else:
             yield from self._execute_linear(nodes, total, vars_dict, classifier_output_var, uid, user_query)
 
@@ -881,8 +1099,7 @@ class WorkflowEngine:
                                 node.get("id"), node.get("agent_name"), condition, current_intent)
                     continue
 
-            evt = self._execute_node(node, i + 1, total, vars_dict, uid, user_query)
-            if evt is not None:
+            for evt in self._execute_node(node, i + 1, total, vars_dict, uid, user_query):
                 yield evt
                 if evt.type == "error":
                     return
@@ -893,9 +1110,18 @@ class WorkflowEngine:
 
     def _execute_dag(self, nodes: list[dict], vars_dict: dict,
                      classifier_output_var: str, uid: str,
-                     user_query: str) -> Generator[EngineEvent, None, None]:
-        """DAG 模式执行"""
-        logger.info("workflow nodes 开始 (DAG): total_nodes=%d", len(nodes))
+                     user_query: str, max_concurrency: int = DEFAULT_WORKFLOW_MAX_CONCURRENCY
+                     ) -> Generator[EngineEvent, None, None]:
+        """DAG 模式执行：节点的全部上游完成后立即提交到共享线程池，事件产生即返回。
+
+        step/total 仍按 Kahn 分层计算（节点所在层级 / 总层数），仅用于进度展示；
+        同一工作流同时运行的节点数不超过 max_concurrency。任一节点返回 error 事件即终止。
+        多个最终节点同时流式输出时，同一时刻只实时转发一个节点的 chunk，其余节点的 chunk 先缓存，
+        待当前节点结束后按首个 chunk 到达顺序整段输出，保证每个节点的输出在流中连续。
+        """
+        max_concurrency = max(1, max_concurrency)
+        logger.info("workflow nodes 开始 (DAG): total_nodes=%d, max_concurrency=%d",
+                    len(nodes), max_concurrency)
 
         dag = _build_dag(nodes)
         if dag is None:
@@ -903,124 +1129,152 @@ class WorkflowEngine:
                               error=ValueError("build DAG failed"))
             return
 
+        # 上游未完成计数（_topological_levels 会修改 in_degree，先保存）
+        pending = {nid: dn["in_degree"] for nid, dn in dag.items()}
         try:
             levels = _topological_levels(dag)
         except ValueError as e:
             yield EngineEvent("error", content=f"工作流图拓扑排序失败: {e}", error=e)
             return
 
-        logger.info("dag levels computed: levels=%d", len(levels))
+        total_levels = len(levels)
+        level_of = {}
         for li, level in enumerate(levels):
-            logger.info("dag level start: level=%d, nodes=%d, total_levels=%d",
-                        li + 1, len(level), len(levels))
-            if len(level) == 1:
-                # 单节点：同步执行
-                node = level[0]
-                condition = node.get("condition", "")
-                if condition:
-                    if vars_dict.get(classifier_output_var, "") != condition:
-                        logger.info("skip node by condition (DAG): node=%s, agent=%s, condition=%s",
-                                    node.get("id"), node.get("agent_name"), condition)
-                        continue
-                evt = self._execute_node(node, li + 1, len(levels), vars_dict, uid, user_query)
-                if evt is not None:
-                    yield evt
-                    if evt.type == "error":
-                        return
-            else:
-                # 多节点：并行执行
-                yield from self._execute_parallel_level(level, li + 1, len(levels),
-                                                        vars_dict, uid, user_query,
-                                                        classifier_output_var)
-
-    def _execute_parallel_level(self, level: list[dict], step: int, total: int,
-                                vars_dict: dict, uid: str, user_query: str,
-                                classifier_output_var: str) -> Generator[EngineEvent, None, None]:
-        """并行执行同一层级的多个节点"""
-        import queue
+            for node in level:
+                level_of[node.get("id", "")] = (li + 1, len(level) > 1)
+        logger.info("dag levels computed: levels=%d", total_levels)
 
-        results = []
-        result_queue = queue.Queue()
-        threads = []
         vars_lock = threading.Lock()
-
-        def _run_node(node):
-            try:
-                # 条件路由
+        events = queue.Queue()
+        ready = deque((dn["node"], time.time()) for dn in dag.values() if pending[dn["node"].get("id", "")] == 0)
+        running = 0
+        finished = 0
+        dag_start = time.time()
+        live_node = None        # 正在实时转发 chunk 的节点
+        buffered_chunks = {}    # node_id -> 缓存的 chunk 事件，按首个 chunk 到达顺序
+        finished_ids = set()
+
+        def _release(node_id: str):
+            for target_id in dag[node_id]["out_edges"]:
+                pending[target_id] -= 1
+                if pending[target_id] == 0:
+                    ready.append((dag[target_id]["node"], time.time()))
+
+        while finished < len(dag):
+            # 提交所有就绪节点（受并发上限约束）
+            while ready and running < max_concurrency:
+                node, ready_at = ready.popleft()
+                node_id = node.get("id", "")
+                step, in_parallel = level_of[node_id]
                 condition = node.get("condition", "")
                 if condition:
                     with vars_lock:
                         intent = vars_dict.get(classifier_output_var, "")
                     if intent != condition:
-                        logger.info("skip node by condition (DAG parallel): node=%s, agent=%s, condition=%s",
-                                    node.get("id"), node.get("agent_name"), condition)
-                        # 发送跳过进度事件
-                        label = node.get("agent_name", "") + " (已跳过)"
-                        pg = node.get("parallel_group", "")
-                        result_queue.put(EngineEvent(
-                            "progress", step=step, total=total,
-                            agent=label, node_id=node.get("id", ""),
-                            parallel_group=pg,
-                        ))
-                        return
-
-                # 发送进度事件
+                        logger.info("skip node by condition (DAG): node=%s, agent=%s, condition=%s",
+                                    node_id, node.get("agent_name"), condition)
+                        if in_parallel:
+                            yield EngineEvent(
+                                "progress", step=step, total=total_levels,
+                                agent=node.get("agent_name", "") + " (已跳过)",
+                                node_id=node_id, parallel_group=node.get("parallel_group", ""),
+                            )
+                        finished += 1
+                        _release(node_id)
+                        continue
+
+                self._node_pool.submit(self._run_dag_node, node, step, total_levels, in_parallel,
+                                       vars_dict, vars_lock, uid, user_query, events, ready_at)
+                running += 1
+
+            if running == 0:
+                break
+
+            item = events.get()
+            if isinstance(item, _NodeFinished):
+                running -= 1
+                finished += 1
+                finished_ids.add(item.node_id)
+                _release(item.node_id)
+                if item.node_id == live_node:
+                    live_node = None
+                # 当前节点输出结束：依次输出缓存的节点，遇到仍在运行的节点则改为实时转发它
+                while live_node is None and buffered_chunks:
+                    node_id = next(iter(buffered_chunks))
+                    yield from buffered_chunks.pop(node_id)
+                    if node_id not in finished_ids:
+                        live_node = node_id
+                continue
+
+            if item.type == "chunk":
+                if live_node is None:
+                    live_node = item.node_id
+                if item.node_id != live_node:
+                    buffered_chunks.setdefault(item.node_id, []).append(item)
+                    continue
+
+            yield item
+            if item.type == "error":
+                logger.warning("dag aborted by node error: node=%s, running=%d", item.node_id, running)
+                return
+
+        logger.info("dag done: nodes=%d, duration_ms=%d", finished, int((time.time() - dag_start) * 1000))
+
+    def _run_dag_node(self, node: dict, step: int, total: int, in_parallel: bool,
+                      vars_dict: dict, vars_lock: threading.Lock, uid: str, user_query: str,
+                      events: "queue.Queue", ready_at: float):
+        """在线程池中执行单个 DAG 节点，事件写入 events，结束时写入 _NodeFinished"""
+        node_id = node.get("id", "")
+        start = time.time()
+        try:
+            if in_parallel:
                 pg = node.get("parallel_group", "")
                 label = node.get("agent_name", "")
-                if pg:
-                    label = f"[并行:{pg}] {label}"
-                else:
-                    label = f"[并行] {label}"
-                result_queue.put(EngineEvent(
+                label = f"[并行:{pg}] {label}" if pg else f"[并行] {label}"
+                events.put(EngineEvent(
                     "progress", step=step, total=total,
-                    agent=label, node_id=node.get("id", ""),
-                    parallel_group=pg,
-                ))
-
-                evt = self._execute_node_internal(node, step, total, vars_dict, uid, user_query, vars_lock)
-                if evt is not None:
-                    result_queue.put(evt)
-            except Exception as e:
-                logger.error("parallel node error: node=%s, error=%s", node.get("id"), e)
-                result_queue.put(EngineEvent(
-                    "error", content=f"节点 {node.get('id')} 执行异常: {e}",
-                    error=e, node_id=node.get("id", ""),
+                    agent=label, node_id=node_id, parallel_group=pg,
                 ))
 
-        for node in level:
-            t = threading.Thread(target=_run_node, args=(node,), daemon=True)
-            threads.append(t)
-            t.start()
-
-        # 等待所有线程完成，同时收集事件
-        for t in threads:
-            t.join()
-
-        # 收集所有事件
-        while not result_queue.empty():
-            evt = result_queue.get_nowait()
-            yield evt
+            for evt in self._execute_node_internal(node, step, total, vars_dict, uid, user_query, vars_lock):
+                events.put(evt)
+        except Exception as e:
+            logger.error("dag node error: node=%s, error=%s", node_id, e)
+            events.put(EngineEvent(
+                "error", content=f"节点 {node_id} 执行异常: {e}",
+                error=e, node_id=node_id,
+            ))
+        finally:
+            end = time.time()
+            logger.info("dag node timing: node=%s, agent=%s, queue_ms=%d, run_ms=%d",
+                        node_id, node.get("agent_name"),
+                        int((start - ready_at) * 1000), int((end - start) * 1000))
+            events.put(_NodeFinished(node_id))
 
     # ============================================================
     # 单节点执行
     # ============================================================
 
     def _execute_node(self, node: dict, step: int, total: int,
-                      vars_dict: dict, uid: str, user_query: str) -> Optional[EngineEvent]:
+                      vars_dict: dict, uid: str, user_query: str) -> Generator[EngineEvent, None, None]:
         """执行单个节点（无锁包装）"""
         return self._execute_node_internal(node, step, total, vars_dict, uid, user_query, None)
 
     def _execute_node_internal(self, node: dict, step: int, total: int,
                                vars_dict: dict, uid: str, user_query: str,
-                               mu: Optional[threading.Lock]) -> Optional[EngineEvent]:
-        """执行单个节点（核心逻辑），mu 非 None 时加锁访问 vars_dict"""
+                               mu: Optional[threading.Lock]) -> Generator[EngineEvent, None, None]:
+        """执行单个节点（核心逻辑），mu 非 None 时加锁访问 vars_dict。
+
+        最终节点流式调用 LLM，每个文本片段产生一个 chunk 事件；非最终节点不产生事件。
+        """
         # 加载 Agent
         agent_id = node.get("agent_id")
-        agent = self.store.get_agent(agent_id)
+        agent = self._get_agent(agent_id)
         if not agent:
             msg = f"节点 {node.get('id')} 引用的智能体 (ID: {agent_id}) 不存在"
             logger.error("agent not found: node=%s, agent_id=%s", node.get("id"), agent_id)
-            return EngineEvent("error", content=msg, error=ValueError(msg))
+            yield EngineEvent("error", content=msg, error=ValueError(msg))
+            return
 
         if mu is None:
             logger.info("node start: node=%s, agent=%s, step=%d, total=%d",
@@ -1050,16 +1304,12 @@ class WorkflowEngine:
                 logger.info("kb search start: node=%s, agent=%s, vdb_ids=%s",
                             node.get("id"), agent.get("name"), vdb_ids)
                 kb_start = time.time()
-                kb_parts = []
-                for vdb_id in vdb_ids:
-                    ctx = self.kb_mgr.search_in_kb(
-                        user_query, vdb_id, uid,
-                        self.cfg["kb"].get("top_k", 3),
-                        self.cfg["kb"].get("score_threshold", 0.1),
-                    )
-                    if ctx:
-                        kb_parts.append(ctx)
-                kb_context = "\n".join(kb_parts)
+                results = self.kb_mgr.retrieve(
+                    user_query, vdb_ids,
+                    self.cfg["kb"].get("top_k", 3),
+                    self.cfg["kb"].get("score_threshold", 0.1),
+                )
+                kb_context = self.kb_mgr.format_results(results)
                 if mu:
                     mu.acquire()
                 try:
@@ -1092,22 +1342,37 @@ class WorkflowEngine:
         is_final = node.get("is_final", False) or not has_downstream
 
         if is_final:
-            # 最终节点：同步调用
+            # 最终节点：流式调用，逐段产生 chunk 事件，完整输出仍写入变量池
+            parts = []
             try:
-                full_output = llm_client.chat(system_prompt, node_input)
+                first_token_ms = -1
+                for piece in llm_client.chat_stream(system_prompt, node_input):
+                    if not piece:
+                        continue
+                    if first_token_ms < 0:
+                        first_token_ms = int((time.time() - llm_start) * 1000)
+                    parts.append(piece)
+                    yield EngineEvent(
+                        "chunk", content=piece,
+                        step=step, total=total,
+                        agent=agent.get("name", ""),
+                        node_id=node.get("id", ""),
+                    )
             except Exception as e:
                 logger.error("node error: node=%s, agent=%s, error=%s",
                              node.get("id"), agent.get("name"), e)
-                return EngineEvent(
+                parts.append(f"[错误] {e}")
+                yield EngineEvent(
                     "chunk", content=f"[错误] {e}",
                     step=step, total=total,
                     agent=agent.get("name", ""),
                     node_id=node.get("id", ""),
                 )
+            full_output = "".join(parts)
 
             llm_elapsed = int((time.time() - llm_start) * 1000)
-            logger.info("node done: node=%s, agent=%s, type=sync, duration_ms=%d, output_len=%d",
-                        node.get("id"), agent.get("name"), llm_elapsed, len(full_output))
+            logger.info("node done: node=%s, agent=%s, type=stream, ttft_ms=%d, duration_ms=%d, output_len=%d",
+                        node.get("id"), agent.get("name"), first_token_ms, llm_elapsed, len(full_output))
 
             # 存储输出
             if mu:
@@ -1120,13 +1385,7 @@ class WorkflowEngine:
             finally:
                 if mu:
                     mu.release()
-
-            return EngineEvent(
-                "chunk", content=full_output,
-                step=step, total=total,
-                agent=agent.get("name", ""),
-                node_id=node.get("id", ""),
-            )
+            return
 
         # 非最终节点：同步调用
         try:
@@ -1152,11 +1411,10 @@ class WorkflowEngine:
         finally:
             if mu:
                 mu.release()
-
-        return None  # 非最终节点不发送 chunk 事件
+        # 非最终节点不发送 chunk 事件
 
     def _get_llm_client(self, agent: dict):
-        """获取 LLM 客户端（使用 Agent 特定参数或默认）"""
+        """获取 LLM 客户端（使用 Agent 特定参数或默认），相同参数复用池中的客户端"""
         from apps.csm.chat_agent import LLMClient
         api = self.cfg["api"]
         llm_defaults = self.cfg.get("llm", {})
@@ -1172,12 +1430,71 @@ class WorkflowEngine:
         if max_tokens is None:
             max_tokens = llm_defaults.get("max_tokens", 2048)
 
-        client = LLMClient(
-            api.get("llm_api_uri", ""),
-            api.get("llm_api_key", ""),
-            model_name,
-            temperature=temperature,
-            top_p=top_p,
-            max_tokens=max_tokens,
-        )
+        key = (api.get("llm_api_uri", "").rstrip("/"), api.get("llm_api_key", ""),
+               model_name, temperature, top_p, max_tokens)
+        with self._cache_lock:
+            client = self._llm_clients.get(key)
+            if client is not None:
+                self._cache_stats["client_hit"] += 1
+                return client
+            self._cache_stats["client_miss"] += 1
+            client = LLMClient(
+                api.get("llm_api_uri", ""),
+                api.get("llm_api_key", ""),
+                model_name,
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+            )
+            self._llm_clients[key] = client
+        logger.info("llm client created: model=%s, temperature=%s, top_p=%s, max_tokens=%s, pool_size=%d",
+                    model_name, temperature, top_p, max_tokens, len(self._llm_clients))
         return client
+
+    @staticmethod
+    def _llm_client_key(client) -> tuple:
+        return (client.base_url, client.api_key, client.model_name,
+                client.temperature, client.top_p, client.max_tokens)
+
+    # ============================================================
+    # Agent 定义缓存
+    # ============================================================
+
+    def _get_agent(self, agent_id) -> Optional[dict]:
+        """读取 Agent 定义，命中缓存时不访问数据库；返回值只读，调用方不得修改"""
+        with self._cache_lock:
+            agent = self._agent_cache.get(agent_id)
+            if agent is not None:
+                self._cache_stats["agent_hit"] += 1
+                return agent
+            self._cache_stats["agent_miss"] += 1
+            gen = self._agent_gen
+
+        agent = self.store.get_agent(agent_id)
+        if agent:
+            with self._cache_lock:
+                # 读库期间发生过失效则不回填，避免缓存旧定义
+                if gen == self._agent_gen:
+                    self._agent_cache[agent_id] = agent
+        return agent
+
+    def invalidate_agent(self, agent_id=None):
+        """使 Agent 定义缓存失效，agent_id 为 None 时清空全部"""
+        with self._cache_lock:
+            self._agent_gen += 1
+            if agent_id is None:
+                self._agent_cache.clear()
+            else:
+                self._agent_cache.pop(agent_id, None)
+                try:
+                    self._agent_cache.pop(int(agent_id), None)
+                except (TypeError, ValueError):
+                    pass
+
+    def cache_stats(self) -> dict:
+        """Agent 缓存与 LLM 客户端池的命中统计"""
+        with self._cache_lock:
+            stats = dict(self._cache_stats)
+            stats["agent_cached"] = len(self._agent_cache)
+            stats["client_pooled"] = len(self._llm_clients)
+        return stats
@@ -192,6 +192,7 @@ class ConfigHandler:
                     emb_uri,
                     data.get("embedding_api_key", ""),
                     data.get("embedding_model_name", ""),
+                    use_cache=False,
                 )
                 dim = client.dimension()
                 elapsed = int((time.time() - t0) * 1000)
@@ -209,17 +210,17 @@ class ConfigHandler:
         if rerank_uri:
             t0 = time.time()
             try:
-                # 简单的 rerank API 测试（OpenAI 兼容接口可能不直接支持 rerank，跳过）
-                # 对标 Go 版本，如果项目中有 rerank 模块则使用
-                from apps.csm.embedding_client import EmbeddingClient
-                # Rerank 通常使用专门的 API endpoint，这里做基本连通性测试
-                client = EmbeddingClient(
+                from apps.csm.rerank_client import RerankClient
+                client = RerankClient(
                     rerank_uri,
                     data.get("rerank_api_key", ""),
                     data.get("rerank_model_name", ""),
                 )
-                # 用 embedding 接口测试连通性（rerank 接口可能类似）
-                client.embed_single("connectivity test")
+                try:
+                    if client.rerank("connectivity test", ["connectivity test"], 10000) is None:
+                        raise ValueError("rerank 接口调用失败，请检查地址与模型名称")
+                finally:
+                    client.close()
                 elapsed = int((time.time() - t0) * 1000)
                 results.append({"name": "Rerank 重排序模型", "ok": True, "message": "连接成功", "elapsed_ms": elapsed})
             except Exception as e:
@@ -3,10 +3,12 @@
 """
 FAQ 管理处理器 — 对标 Go 版本 internal/handler/faq.go
 支持 FAQ 条目的 CRUD、上传、向量匹配。
+FAQ 问题向量常驻内存(FaqIndex)，增删改时增量维护，匹配为一次矩阵-向量乘法。
 """
-import json
 import logging
-import math
+import threading
+
+import numpy as np
 from flask import request, jsonify
 
 logger = logging.getLogger(__name__)
@@ -35,12 +37,93 @@ A: 您好，人工客服工作时间为周一至周五 9:00-18:00。您可以在
 """
 
 
+class FaqIndex:
+    """进程内 FAQ 向量索引: 归一化问题矩阵 + 行对应的 entry_id + 答案表"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._entry_ids = np.zeros(0, dtype=np.int64)
+        self._answers = {}  # entry_id -> answer
+        self.loaded = False
+
+    def build(self, questions: list, answers: dict):
+        """由存储中的全部问题与答案重建索引"""
+        entry_ids, vectors = [], []
+        for q in questions:
+            if q.get("embedding"):
+                entry_ids.append(q["entry_id"])
+                vectors.append(np.frombuffer(q["embedding"], dtype="<f4"))
+        with self._lock:
+            self._answers = dict(answers)
+            self._set_rows(entry_ids, vectors)
+            self.loaded = True
+        logger.info("FAQ 索引已构建: entries=%d, questions=%d", len(self._answers), len(self._entry_ids))
+
+    def add(self, entry_id: int, answer: str, vectors: list):
+        """新增(或替换)一个条目及其问题向量"""
+        with self._lock:
+            self._drop_rows(entry_id)
+            self._answers[entry_id] = answer
+            entry_ids = self._entry_ids.tolist() + [entry_id] * len(vectors)
+            self._set_rows(entry_ids, list(self._matrix) + list(vectors))
+
+    def remove(self, entry_id: int):
+        with self._lock:
+            self._drop_rows(entry_id)
+            self._answers.pop(entry_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._answers = {}
+            self._set_rows([], [])
+
+    @property
+    def entry_count(self) -> int:
+        return len(self._answers)
+
+    def match(self, query_vec) -> tuple:
+        """返回 (entry_id, answer, score), 无可比对向量时 entry_id 为 None"""
+        query = np.asarray(query_vec, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        with self._lock:
+            if not len(self._entry_ids) or norm == 0 or len(query) != self._matrix.shape[1]:
+                return None, None, 0.0
+            scores = self._matrix @ (query / norm)
+            best = int(np.argmax(scores))
+            entry_id = int(self._entry_ids[best])
+            return entry_id, self._answers.get(entry_id), float(scores[best])
+
+    def _drop_rows(self, entry_id: int):
+        keep = self._entry_ids != entry_id
+        if not keep.all():
+            self._matrix = self._matrix[keep]
+            self._entry_ids = self._entry_ids[keep]
+
+    def _set_rows(self, entry_ids: list, vectors: list):
+        # 维度以第一条为准, 不一致的向量(如更换过模型)忽略
+        dim = len(vectors[0]) if vectors else 0
+        rows = [(e, v) for e, v in zip(entry_ids, vectors) if len(v) == dim]
+        if len(rows) != len(vectors):
+            logger.warning("FAQ 索引忽略 %d 条维度不一致的向量", len(vectors) - len(rows))
+        if not rows:
+            self._matrix = np.zeros((0, dim), dtype=np.float32)
+            self._entry_ids = np.zeros(0, dtype=np.int64)
+            return
+        matrix = np.stack([v for _, v in rows]).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._matrix = matrix / norms
+        self._entry_ids = np.asarray([e for e, _ in rows], dtype=np.int64)
+
+
 class FaqHandler:
     """FAQ 管理 API 处理器"""
 
     def __init__(self, store, embedding_client=None):
         self.store = store
         self.emb_client = embedding_client
+        self.index = FaqIndex()
 
     def list(self):
         """获取所有 FAQ 条目 GET /api/faq"""
@@ -141,25 +224,8 @@ class FaqHandler:
 
         # 删除旧问题，重新向量化
         self.store.delete_faq_questions_by_entry_id(faq_id)
-
-        # 为新问题计算向量并入库
-        if self.emb_client:
-            for q in questions:
-                q = q.strip()
-                if not q:
-                    continue
-                try:
-                    emb = self.emb_client.embed_single(q)
-                    emb_json = json.dumps(emb)
-                    self.store.create_faq_question(faq_id, q, emb_json)
-                except Exception as e:
-                    logger.warning("FAQ 问题向量化失败: question=%s, error=%s", q[:30], e)
-        else:
-            # 没有 embedding 客户端，只存问题不存向量
-            for q in questions:
-                q = q.strip()
-                if q:
-                    self.store.create_faq_question(faq_id, q, "")
+        vectors = self._save_questions(faq_id, questions)
+        self._get_index().add(faq_id, answer, vectors)
 
         return jsonify({"status": "ok"})
 
@@ -168,11 +234,13 @@ class FaqHandler:
         if not faq_id:
             return jsonify({"error": "无效的 ID"}), 400
         self.store.delete_faq_entry(faq_id)
+        self._get_index().remove(faq_id)
         return jsonify({"status": "ok"})
 
     def clear_all(self):
         """清空所有 FAQ DELETE /api/faq"""
         self.store.clear_all_faq()
+        self.index.clear()
         return jsonify({"status": "ok"})
 
     # ============================================================
@@ -181,16 +249,15 @@ class FaqHandler:
 
     def get_faq_count(self) -> int:
         """返回 FAQ 条目数量"""
-        entries = self.store.get_faq_entries()
-        return len(entries) if entries else 0
+        return self._get_index().entry_count
 
     def match_faq(self, query: str, threshold: float = 0.85):
         """匹配用户问题到 FAQ，返回 (答案, 分数) 或 (None, 0)"""
         if not self.emb_client:
             return None, 0
 
-        questions = self.store.get_all_faq_questions_with_embedding()
-        if not questions:
+        index = self._get_index()
+        if not index.entry_count:
             return None, 0
 
         # 计算查询向量
@@ -200,51 +267,54 @@ class FaqHandler:
             logger.error("FAQ 匹配: query embedding 失败: %s", e)
             return None, 0
 
-        best_score = 0.0
-        best_entry_id = None
-
-        for q in questions:
-            if not q.get("embedding"):
-                continue
-            score = self._cosine_similarity(query_vec, q["embedding"])
-            if score > best_score:
-                best_score = score
-                best_entry_id = q["entry_id"]
-
-        if best_score < threshold or best_entry_id is None:
+        entry_id, answer, best_score = index.match(query_vec)
+        if entry_id is None:
+            return None, 0
+        if best_score < threshold or answer is None:
             return None, best_score
-
-        # 根据 entry_id 获取答案
-        entries = self.store.get_faq_entries()
-        for e in entries:
-            if e["id"] == best_entry_id:
-                return e["answer"], best_score
-
-        return None, 0
+        return answer, best_score
 
     # ============================================================
     # 辅助函数
     # ============================================================
 
+    def _get_index(self) -> FaqIndex:
+        """首次使用时从存储构建索引, 之后由增删改接口增量维护"""
+        if not self.index.loaded:
+            with self.index._lock:
+                if not self.index.loaded:
+                    self.index.build(
+                        self.store.get_all_faq_questions_with_embedding(),
+                        self.store.get_faq_answers(),
+                    )
+        return self.index
+
     def _create_faq_entry(self, questions: list, answer: str, source_file: str):
         entry_id = self.store.create_faq_entry(answer, source_file)
+        vectors = self._save_questions(entry_id, questions)
+        self._get_index().add(entry_id, answer, vectors)
 
-        if self.emb_client:
-            for q in questions:
-                q = q.strip()
-                if not q:
-                    continue
-                try:
-                    emb = self.emb_client.embed_single(q)
-                    emb_json = json.dumps(emb)
-                    self.store.create_faq_question(entry_id, q, emb_json)
-                except Exception as e:
-                    logger.warning("FAQ 问题向量化失败: question=%s, error=%s", q[:30], e)
-        else:
+    def _save_questions(self, entry_id: int, questions: list) -> list:
+        """批量向量化并保存问题，返回成功向量化的向量列表"""
+        questions = [q.strip() for q in questions if q and q.strip()]
+        if not self.emb_client:
+            # 没有 embedding 客户端，只存问题不存向量
             for q in questions:
-                q = q.strip()
-                if q:
-                    self.store.create_faq_question(entry_id, q, "")
+                self.store.create_faq_question(entry_id, q)
+            return []
+
+        try:
+            embeddings = self.emb_client.embed(questions)
+        except Exception as e:
+            logger.warning("FAQ 问题向量化失败: entry_id=%s, error=%s", entry_id, e)
+            return []
+
+        vectors = []
+        for q, emb in zip(questions, embeddings):
+            vec = np.asarray(emb, dtype="<f4")
+            self.store.create_faq_question(entry_id, q, vec.tobytes())
+            vectors.append(vec)
+        return vectors
 
     @staticmethod
     def _parse_faq_content(content: str) -> list:
@@ -282,14 +352,3 @@ class FaqHandler:
             pairs.append(current)
 
         return pairs
-
-    @staticmethod
-    def _cosine_similarity(a: list, b: list) -> float:
-        if len(a) != len(b) or len(a) == 0:
-            return 0.0
-        dot_product = sum(x * y for x, y in zip(a, b))
-        norm_a = sum(x * x for x in a)
-        norm_b = sum(x * x for x in b)
-        if norm_a == 0 or norm_b == 0:
-            return 0.0
-        return dot_product / (math.sqrt(norm_a) * math.sqrt(norm_b))
\ No newline at end of file
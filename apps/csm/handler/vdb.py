@@ -120,14 +120,22 @@ class VdbHandler:
         top_k = self.cfg["kb"].get("top_k", 3)
         threshold = self.cfg["kb"].get("score_threshold", 0.1)
 
+        kb_names = None
+        with_kb_name = True
         if vdb_ids and isinstance(vdb_ids, list) and len(vdb_ids) > 0:
-            result = self.kb_mgr.search_in_kbs(query, [int(v) for v in vdb_ids], uid, top_k, threshold)
+            ids = [int(v) for v in vdb_ids]
         elif vdb_id:
-            result = self.kb_mgr.search_in_kb(query, int(vdb_id), uid, top_k, threshold)
+            ids = [int(vdb_id)]
+            with_kb_name = False
         else:
-            result = self.kb_mgr.search_all_kbs(query, uid, top_k, threshold)
-
-        return jsonify({"data": result or ""})
+            kb_list = self.store.get_user_vdbs(uid)
+            ids = [kb["id"] for kb in kb_list]
+            kb_names = {kb["id"]: kb["name"] for kb in kb_list}
+
+        # data 为拼接后的上下文（兼容旧前端），results 为结构化结果
+        results = self.kb_mgr.retrieve(query, ids, top_k, threshold, kb_names=kb_names)
+        result = self.kb_mgr.format_results(results, with_kb_name=with_kb_name)
+        return jsonify({"data": result or "", "results": results})
 
     def chunks(self, file_id: int):
         """获取文件的分块列表 GET /api/vdb/file/<id>/chunks"""
@@ -5,6 +5,8 @@
 """
 import json
 import logging
+from typing import Optional
+
 from flask import request, jsonify
 
 from apps.csm.engine import has_next_nodes, validate_workflow_graph, auto_detect_is_final
@@ -12,6 +14,16 @@ from apps.csm.engine import has_next_nodes, validate_workflow_graph, auto_detect
 logger = logging.getLogger(__name__)
 
 
+def _parse_max_concurrency(value) -> Optional[int]:
+    """解析工作流节点并发上限，0 表示使用全局配置，非法值忽略"""
+    if value is None or value == "":
+        return None
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
 class WorkflowHandler:
     """工作流管理处理器"""
 
@@ -76,6 +88,7 @@ class WorkflowHandler:
             description=data.get("description", ""),
             classifier=data.get("classifier"),
             nodes=nodes,
+            max_concurrency=_parse_max_concurrency(data.get("max_concurrency")) or 0,
         )
         return jsonify({"status": "ok", "id": id})
 
@@ -109,6 +122,7 @@ class WorkflowHandler:
             description=data.get("description"),
             classifier=data.get("classifier"),
             nodes=nodes,
+            max_concurrency=_parse_max_concurrency(data.get("max_concurrency")),
         )
         return jsonify({"status": "ok"})
 
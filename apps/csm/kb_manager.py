@@ -11,16 +11,22 @@ import re
 import shutil
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
 from apps.csm.embedding_client import EmbeddingClient
+from apps.csm.rerank_client import RerankClient, DEFAULT_CACHE_SIZE, DEFAULT_TIMEOUT_MS
 from apps.csm.vdb_store import LocalVectorStore, VDB_DIR
 
 logger = logging.getLogger(__name__)
 
 UPLOAD_DIR = "./upload_doc"
 FILE_POLL_INTERVAL = 5
+# 多知识库检索的共享线程池大小
+DEFAULT_SEARCH_WORKERS = 8
+# 目录页等无效分块的特征
+TOC_MARK = "......................."
 
 
 class KBManager:
@@ -30,9 +36,15 @@ class KBManager:
         self.cfg = cfg
         self.store = store
         self._emb_client = None
+        self._rerank_client = None
+        self._rerank_lock = threading.Lock()
         self._stores = {}  # vdb_id -> LocalVectorStore
         self._stores_lock = threading.Lock()
         self._stop_ch = threading.Event()
+        self._search_pool = ThreadPoolExecutor(
+            max_workers=cfg.get("kb", {}).get("search_workers", DEFAULT_SEARCH_WORKERS),
+            thread_name_prefix="kb_search",
+        )
 
     def _get_emb_client(self) -> EmbeddingClient:
         if not self._emb_client:
@@ -44,6 +56,30 @@ class KBManager:
             )
         return self._emb_client
 
+    def _get_rerank_client(self) -> Optional[RerankClient]:
+        """启用 rerank 且配置完整时返回客户端（配置变更后重建），否则返回 None"""
+        api = self.cfg["api"]
+        if not (self.cfg["kb"].get("rerank_enabled", False) and
+                api.get("rerank_api_uri") and api.get("rerank_model_name")):
+            return None
+        key = (api["rerank_api_uri"].rstrip("/"), api.get("rerank_api_key", ""), api["rerank_model_name"])
+        with self._rerank_lock:
+            old = self._rerank_client
+            if old is not None and (old.base_url, old.api_key, old.model_name) == key:
+                return old
+            client = RerankClient(
+                api["rerank_api_uri"],
+                api.get("rerank_api_key", ""),
+                api["rerank_model_name"],
+                cache_size=self.cfg["kb"].get("rerank_cache_size", DEFAULT_CACHE_SIZE),
+            )
+            self._rerank_client = client
+        if old is not None:
+            # 配置变更：关闭旧客户端的线程池与连接池
+            old.close()
+            logger.info("rerank 配置变更，已重建客户端: model=%s", key[2])
+        return client
+
     # ============================================================
     # 知识库 CRUD
     # ============================================================
@@ -170,77 +206,131 @@ class KBManager:
 
     def search_in_kb(self, query: str, vdb_id: int, uid: str,
                      top_k: int = None, score_threshold: float = None) -> str:
+        results = self.retrieve(query, [vdb_id], top_k, score_threshold)
+        return self.format_results(results)
+
+    def search_all_kbs(self, query: str, uid: str,
+                       top_k: int = None, score_threshold: float = None) -> str:
+        kb_list = self.store.get_user_vdbs(uid)
+        results = self.retrieve(query, [kb["id"] for kb in kb_list], top_k, score_threshold,
+                                kb_names={kb["id"]: kb["name"] for kb in kb_list})
+        return self.format_results(results, with_kb_name=True)
+
+    def search_in_kbs(self, query: str, vdb_ids: list, uid: str,
+                      top_k: int = None, score_threshold: float = None) -> str:
+        """在多个指定知识库中检索"""
+        results = self.retrieve(query, vdb_ids, top_k, score_threshold)
+        return self.format_results(results, with_kb_name=True)
+
+    def retrieve(self, query: str, vdb_ids: list, top_k: int = None,
+                 score_threshold: float = None, per_kb_quota: int = None,
+                 kb_names: dict = None) -> list[dict]:
+        """多知识库检索：query 只向量化一次，各知识库并发检索，按分数合并为全局 top_k。
+
+        per_kb_quota > 0 时单个知识库最多贡献 per_kb_quota 条结果。
+        启用 rerank 时按 rerank 分数排序（结果带 rerank_score），超时则保持向量分数顺序。
+        返回 [{"vdb_id", "kb_name", "id", "content", "source", "score"}]，按分数降序。
+        """
         if top_k is None:
             top_k = self.cfg["kb"].get("top_k", 3)
         if score_threshold is None:
             score_threshold = self.cfg["kb"].get("score_threshold", 0.1)
+        if per_kb_quota is None:
+            per_kb_quota = self.cfg["kb"].get("per_kb_quota", 0)
 
-        vs = self._get_or_create_store(vdb_id)
+        vdb_ids = list(dict.fromkeys(int(v) for v in vdb_ids))
+        if not vdb_ids or top_k <= 0:
+            return []
 
-        # 计算 query 向量
         query_vec = self._get_emb_client().embed_single(query)
+        retrieve_n = self._retrieve_n(top_k)
 
-        # 确定检索条数
+        if len(vdb_ids) == 1:
+            per_kb = [self._search_one(vdb_ids[0], query_vec, retrieve_n, score_threshold)]
+        else:
+            futures = [self._search_pool.submit(self._search_one, vdb_id, query_vec,
+                                                retrieve_n, score_threshold)
+                       for vdb_id in vdb_ids]
+            per_kb = [f.result() for f in futures]
+
+        candidates = [r for hits in per_kb for r in hits]
+        candidates.sort(key=lambda r: r["score"], reverse=True)
+
+        # Rerank 重排序：对全局前 retrieve_n 条候选打分，超时或失败时保持向量顺序
+        reranker = self._get_rerank_client()
+        if reranker and len(candidates) > 1:
+            candidates = candidates[:retrieve_n]
+            scores = reranker.rerank(
+                query, [r["content"] for r in candidates],
+                self.cfg["kb"].get("rerank_timeout_ms", DEFAULT_TIMEOUT_MS),
+            )
+            if scores is not None:
+                for r, score in zip(candidates, scores):
+                    r["rerank_score"] = score
+                candidates.sort(key=lambda r: r["rerank_score"], reverse=True)
+
+        results = []
+        taken = {}
+        for r in candidates:
+            if per_kb_quota and per_kb_quota > 0 and taken.get(r["vdb_id"], 0) >= per_kb_quota:
+                continue
+            taken[r["vdb_id"]] = taken.get(r["vdb_id"], 0) + 1
+            results.append(r)
+            if len(results) >= top_k:
+                break
+
+        names = dict(kb_names or {})
+        for r in results:
+            if r["vdb_id"] not in names:
+                info = self.store.get_vdb_by_id(r["vdb_id"])
+                names[r["vdb_id"]] = info.get("name", f"KB_{r['vdb_id']}") if info else f"KB_{r['vdb_id']}"
+            r["kb_name"] = names[r["vdb_id"]]
+        return results
+
+    @staticmethod
+    def format_results(results: list[dict], with_kb_name: bool = False) -> str:
+        """将 retrieve() 结果拼接为提示词上下文；with_kb_name 时按知识库分组并加 [名称] 标题"""
+        if not with_kb_name:
+            return "\n".join(r["content"] for r in results)
+
+        groups = {}
+        for r in results:
+            groups.setdefault(r["kb_name"], []).append(r["content"])
+        return "\n".join(f"[{name}]\n" + "\n".join(parts) for name, parts in groups.items())
+
+    def _retrieve_n(self, top_k: int) -> int:
+        """确定每个知识库的召回条数（启用 rerank 时多召回）"""
         retrieve_n = top_k
-        use_rerank = self.cfg["kb"].get("rerank_enabled", False) and \
-                     self.cfg["api"].get("rerank_api_uri") and \
-                     self.cfg["api"].get("rerank_model_name")
-        if use_rerank:
+        if self._get_rerank_client():
             retrieve_n = self.cfg["kb"].get("rerank_retrieve_n", 15)
             if retrieve_n <= top_k:
                 retrieve_n = top_k * 3
             if retrieve_n > 50:
                 retrieve_n = 50
+        return retrieve_n
 
-        results = vs.search(query_vec, retrieve_n, score_threshold)
+    def _search_one(self, vdb_id: int, query_vec: list, retrieve_n: int,
+                    score_threshold: float) -> list[dict]:
+        """在单个知识库中检索，失败时记录日志并返回空列表"""
+        try:
+            hits = self._get_or_create_store(vdb_id).search(query_vec, retrieve_n, score_threshold)
+        except Exception as e:
+            logger.error("搜索知识库失败: vdb_id=%s, error=%s", vdb_id, e)
+            return []
 
-        # Rerank 重排序（简化版，暂不实现完整 rerank 客户端）
-        parts = []
-        for r in results[:top_k]:
+        results = []
+        for r in hits:
             content = r["content"].replace("\n", "")
-            if "......................." in content:
+            if TOC_MARK in content:
                 continue
-            parts.append(content)
-
-        return "\n".join(parts)
-
-    def search_all_kbs(self, query: str, uid: str,
-                       top_k: int = None, score_threshold: float = None) -> str:
-        if top_k is None:
-            top_k = self.cfg["kb"].get("top_k", 3)
-        if score_threshold is None:
-            score_threshold = self.cfg["kb"].get("score_threshold", 0.1)
-
-        kb_list = self.store.get_user_vdbs(uid)
-        all_parts = []
-
-        for kb in kb_list:
-            ctx = self.search_in_kb(query, kb["id"], uid, top_k, score_threshold)
-            if ctx:
-                all_parts.append(f"[{kb['name']}]\n{ctx}")
-
-        return "\n".join(all_parts)
-
-    def search_in_kbs(self, query: str, vdb_ids: list, uid: str,
-                      top_k: int = None, score_threshold: float = None) -> str:
-        """在多个指定知识库中检索"""
-        if top_k is None:
-            top_k = self.cfg["kb"].get("top_k", 3)
-        if score_threshold is None:
-            score_threshold = self.cfg["kb"].get("score_threshold", 0.1)
-
-        all_parts = []
-        for vdb_id in vdb_ids:
-            try:
-                ctx = self.search_in_kb(query, int(vdb_id), uid, top_k, score_threshold)
-                if ctx:
-                    info = self.store.get_vdb_by_id(int(vdb_id))
-                    kb_name = info.get("name", f"KB_{vdb_id}") if info else f"KB_{vdb_id}"
-                    all_parts.append(f"[{kb_name}]\n{ctx}")
-            except Exception as e:
-                logger.error("搜索知识库失败: vdb_id=%s, error=%s", vdb_id, e)
-
-        return "\n".join(all_parts)
+            results.append({
+                "vdb_id": vdb_id,
+                "id": r["id"],
+                "content": content,
+                "source": r["metadata"].get("source", ""),
+                "score": r["score"],
+            })
+        return results
 
     def get_file_chunks(self, file_id: int) -> list:
         """获取文件的所有 chunk（从向量数据库中按 source 查询）"""
@@ -346,6 +436,9 @@ class KBManager:
                 f"已处理 {end}/{total_chunks} 个文本块",
             )
 
+        # 写入向量旁路文件，重启后可直接内存映射加载
+        vs.flush()
+
         self.store.update_file_progress(
             finfo["id"], 100,
             f"处理完成，共 {total_chunks} 个文本块",
@@ -361,7 +454,7 @@ class KBManager:
             if vdb_id in self._stores:
                 return self._stores[vdb_id]
 
-            vs = LocalVectorStore(vdb_id)
+            vs = LocalVectorStore(vdb_id, self.cfg.get("vector", {}).get("local_dtype", "float32"))
             self._stores[vdb_id] = vs
             return vs
 
@@ -370,6 +463,7 @@ class KBManager:
             vs = self._stores.get(vdb_id)
             if vs:
                 vs.delete_by_source(source)
+                vs.flush()
 
     # ============================================================
     # 文本提取
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rerank 客户端 — 兼容 Jina / Cohere / TEI / vLLM 的 /rerank 接口
+分批并发打分，整体超时预算内未完成则返回 None（调用方回退到向量顺序），
+(query, sha1(文本)) 分数 LRU 缓存（按内容缓存，文件重新上传后 chunk id 不变但内容变化时不会命中旧分数）。
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 32
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_TIMEOUT_MS = 800
+
+
+class RerankClient:
+    """Rerank 客户端"""
+
+    def __init__(self, api_uri: str, api_key: str, model_name: str,
+                 batch_size: int = MAX_BATCH_SIZE, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.base_url = api_uri.rstrip("/")
+        self.api_key = api_key
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        })
+        # 连接池
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=100,
+            max_retries=0,
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rerank")
+
+        self._cache = OrderedDict()  # (query, sha1(text)) -> score
+        self._lock = threading.Lock()
+        self._stats = {"cache_hit": 0, "cache_miss": 0, "timeout": 0, "error": 0}
+
+    def rerank(self, query: str, docs: list[str],
+               timeout_ms: int = DEFAULT_TIMEOUT_MS) -> Optional[list[float]]:
+        """为 docs 中的文本打分，返回与 docs 等长的分数列表。
+
+        超出 timeout_ms 或接口出错时返回 None。
+        """
+        if not docs:
+            return []
+
+        scores = [None] * len(docs)
+        keys = [(query, hashlib.sha1(text.encode("utf-8")).hexdigest()) for text in docs]
+        pending = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                score = self._cache.get(key)
+                if score is None:
+                    pending.append(i)
+                    continue
+                self._cache.move_to_end(key)
+                scores[i] = score
+            self._stats["cache_hit"] += len(docs) - len(pending)
+            self._stats["cache_miss"] += len(pending)
+        if not pending:
+            return scores
+
+        timeout = timeout_ms / 1000
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        try:
+            futures = [self._pool.submit(self._rerank_batch, query, [docs[j] for j in batch], timeout)
+                       for batch in batches]
+        except RuntimeError as e:
+            # 配置变更后客户端已被 close()，仍持有旧客户端的调用回退到向量顺序
+            logger.warning("rerank 客户端已关闭，回退到向量顺序: error=%s", e)
+            return None
+        done, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            for f in not_done:
+                f.cancel()
+            with self._lock:
+                self._stats["timeout"] += 1
+            logger.warning("rerank 超时，回退到向量顺序: docs=%d, timeout_ms=%d", len(pending), timeout_ms)
+            return None
+
+        try:
+            for batch, f in zip(batches, futures):
+                for j, score in zip(batch, f.result()):
+                    scores[j] = score
+        except Exception as e:
+            with self._lock:
+                self._stats["error"] += 1
+            logger.warning("rerank 失败，回退到向量顺序: error=%s", e)
+            return None
+
+        with self._lock:
+            for j in pending:
+                self._cache[keys[j]] = scores[j]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached"] = len(self._cache)
+        return stats
+
+    def close(self):
+        """关闭打分线程池与 HTTP 连接池，已提交的批次执行完后线程退出，不阻塞调用方"""
+        self._pool.shutdown(wait=False)
+        self._session.close()
+
+    def _rerank_batch(self, query: str, texts: list[str], timeout: float) -> list[float]:
+        if not self.base_url:
+            raise ValueError("Rerank API 地址未配置")
+
+        url = f"{self.base_url}/rerank"
+        payload = {
+            "model": self.model_name,
+            "query": query,
+            "documents": texts,
+            "texts": texts,  # TEI 使用 texts 字段
+            "top_n": len(texts),
+            "return_documents": False,
+        }
+
+        resp = self._session.post(url, json=payload, timeout=timeout)
+        if resp.status_code != 200:
+            logger.error("rerank API 返回错误: status=%d, body=%s", resp.status_code, resp.text)
+            raise ValueError(f"rerank API 返回错误 {resp.status_code}: {resp.text}")
+
+        data = resp.json()
+        # Jina/Cohere/vLLM: {"results": [{"index", "relevance_score"}]}；TEI: [{"index", "score"}]
+        items = data.get("results", []) if isinstance(data, dict) else data
+        scores = [0.0] * len(texts)
+        for item in items:
+            score = item.get("relevance_score", item.get("score", 0.0))
+            scores[item["index"]] = float(score)
+        return scores
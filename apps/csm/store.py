@@ -7,6 +7,7 @@ SQLite 元数据存储 — 对标 Go 版本 internal/store/sqlite.go
 import json
 import os
 import sqlite3
+import struct
 import threading
 import time
 import hashlib
@@ -68,6 +69,7 @@ class SQLiteStore:
 
     def __init__(self, db_path: str):
         self._lock = threading.Lock()
+        self._agent_listeners = []
         self.db_path = db_path
         # 检查数据库文件是否存在
         if not os.path.exists(db_path):
@@ -185,6 +187,7 @@ class SQLiteStore:
             description TEXT NOT NULL DEFAULT '',
             classifier TEXT NOT NULL DEFAULT '',
             nodes TEXT NOT NULL DEFAULT '[]',
+            max_concurrency INTEGER NOT NULL DEFAULT 0,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
         );
@@ -215,6 +218,16 @@ class SQLiteStore:
         """
         self.conn.executescript(schema)
         self.conn.commit()
+        self._add_column_if_missing("workflow_def", "max_concurrency", "INTEGER NOT NULL DEFAULT 0")
+        self._migrate_faq_embeddings()
+
+    def _add_column_if_missing(self, table: str, column: str, definition: str):
+        """旧库补充新增字段"""
+        columns = {r[1] for r in self.conn.execute(f"PRAGMA table_info({table})").fetchall()}
+        if column not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            self.conn.commit()
+            logger.info("数据库字段已补充: %s.%s", table, column)
 
     # ============================================================
     # 种子数据
@@ -507,6 +520,17 @@ class SQLiteStore:
         ).fetchall()
         return [self._row_to_dict(r) for r in rows]
 
+    def add_agent_listener(self, callback):
+        """注册 Agent 变更回调 callback(agent_id)，update_agent/delete_agent 提交后调用（供引擎缓存失效）"""
+        self._agent_listeners.append(callback)
+
+    def _notify_agent_changed(self, id: int):
+        for callback in self._agent_listeners:
+            try:
+                callback(id)
+            except Exception as e:
+                logger.warning("agent listener error: agent_id=%s, error=%s", id, e)
+
     def update_agent(self, id: int, name: str = None, description: str = None,
                      system_prompt: str = None, model_name: str = None,
                      temperature=None, top_p=None, max_tokens=None, vdb_ids: str = None):
@@ -543,30 +567,34 @@ class SQLiteStore:
                 f"UPDATE agent_def SET {', '.join(fields)} WHERE id = ?", values,
             )
             self.conn.commit()
+        self._notify_agent_changed(id)
 
     def delete_agent(self, id: int):
         self.conn.execute("DELETE FROM agent_def WHERE id = ?", (id,))
         self.conn.commit()
+        self._notify_agent_changed(id)
 
     # ============================================================
     # Workflow (workflow_def) CRUD
     # ============================================================
 
     def create_workflow(self, name: str, description: str = "",
-                        classifier: dict = None, nodes: list = None) -> int:
+                        classifier: dict = None, nodes: list = None,
+                        max_concurrency: int = 0) -> int:
         with self._lock:
             classifier_json = json.dumps(classifier) if classifier else ""
             nodes_json = json.dumps(nodes) if nodes else "[]"
             cur = self.conn.execute(
-                "INSERT INTO workflow_def (name, description, classifier, nodes) VALUES (?, ?, ?, ?)",
-                (name, description, classifier_json, nodes_json),
+                "INSERT INTO workflow_def (name, description, classifier, nodes, max_concurrency) VALUES (?, ?, ?, ?, ?)",
+                (name, description, classifier_json, nodes_json, max_concurrency or 0),
             )
             self.conn.commit()
             return cur.lastrowid
 
     def get_workflow(self, id: int) -> Optional[dict]:
         row = self.conn.execute(
-            "SELECT id, name, description, classifier, nodes, created_at, updated_at FROM workflow_def WHERE id = ?",
+            "SELECT id, name, description, classifier, nodes, max_concurrency, created_at, updated_at "
+            "FROM workflow_def WHERE id = ?",
             (id,),
         ).fetchone()
         if not row:
@@ -586,7 +614,8 @@ class SQLiteStore:
 
     def list_workflows(self) -> list:
         rows = self.conn.execute(
-            "SELECT id, name, description, classifier, nodes, created_at, updated_at FROM workflow_def ORDER BY id",
+            "SELECT id, name, description, classifier, nodes, max_concurrency, created_at, updated_at "
+            "FROM workflow_def ORDER BY id",
         ).fetchall()
         result = []
         for row in rows:
@@ -605,7 +634,8 @@ class SQLiteStore:
         return result
 
     def update_workflow(self, id: int, name: str = None, description: str = None,
-                        classifier: dict = None, nodes: list = None):
+                        classifier: dict = None, nodes: list = None,
+                        max_concurrency: int = None):
         with self._lock:
             fields = []
             values = []
@@ -621,6 +651,9 @@ class SQLiteStore:
             if nodes is not None:
                 fields.append("nodes = ?")
                 values.append(json.dumps(nodes))
+            if max_concurrency is not None:
+                fields.append("max_concurrency = ?")
+                values.append(max_concurrency)
             fields.append("updated_at = CURRENT_TIMESTAMP")
             values.append(id)
             self.conn.execute(
@@ -645,11 +678,12 @@ class SQLiteStore:
             self.conn.commit()
             return cur.lastrowid
 
-    def create_faq_question(self, entry_id: int, question: str, embedding_json: str = "") -> int:
+    def create_faq_question(self, entry_id: int, question: str, embedding: bytes = b"") -> int:
+        """embedding 为小端 float32 二进制向量, 无向量时为空"""
         with self._lock:
             cur = self.conn.execute(
                 "INSERT INTO faq_questions (entry_id, question, embedding) VALUES (?, ?, ?)",
-                (entry_id, question, embedding_json),
+                (entry_id, question, embedding or ""),
             )
             self.conn.commit()
             return cur.lastrowid
@@ -673,22 +707,42 @@ class SQLiteStore:
         return [self._row_to_dict(r) for r in rows] if rows else []
 
     def get_all_faq_questions_with_embedding(self) -> list:
+        """返回所有 FAQ 问题, embedding 为小端 float32 二进制向量(无向量时为 b"")"""
         rows = self.conn.execute(
             "SELECT id, entry_id, question, embedding FROM faq_questions",
         ).fetchall()
         result = []
         for row in rows:
             d = self._row_to_dict(row)
-            if d["embedding"]:
-                try:
-                    d["embedding"] = json.loads(d["embedding"])
-                except json.JSONDecodeError:
-                    continue
-            else:
-                d["embedding"] = []
+            if not isinstance(d["embedding"], bytes):
+                d["embedding"] = b""
             result.append(d)
         return result
 
+    def get_faq_answers(self) -> dict:
+        """返回 {entry_id: answer}"""
+        rows = self.conn.execute("SELECT id, answer FROM faq_entries").fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    def _migrate_faq_embeddings(self):
+        """将旧版 JSON 文本格式的 FAQ 向量转为 float32 二进制"""
+        rows = self.conn.execute(
+            "SELECT id, embedding FROM faq_questions WHERE typeof(embedding) = 'text' AND embedding != ''",
+        ).fetchall()
+        if not rows:
+            return
+        converted = []
+        for row in rows:
+            try:
+                vec = json.loads(row[1])
+            except json.JSONDecodeError:
+                continue
+            converted.append((struct.pack(f"<{len(vec)}f", *vec), row[0]))
+        with self._lock:
+            self.conn.executemany("UPDATE faq_questions SET embedding = ? WHERE id = ?", converted)
+            self.conn.commit()
+        logger.info("已将 %d 条 FAQ 向量从 JSON 转为二进制格式", len(converted))
+
     def delete_faq_entry(self, id: int):
         with self._lock:
             self.conn.execute("DELETE FROM faq_questions WHERE entry_id = ?", (id,))
@@ -2,30 +2,59 @@
 # -*- coding: utf-8 -*-
 """
 本地向量存储 — 对标 Go 版本 internal/vdb/local.go
-使用 SQLite 存储向量，内存缓存加速检索，余弦相似度检索。
+SQLite 保存文本、来源与 float32 向量（数据源），每个 vdb_id 另有一组
+旁路文件保存预归一化的向量矩阵（float32 或 int8 量化），启动时以
+内存映射方式零拷贝打开；检索为一次矩阵-向量乘法 + argpartition 取 top-k，
+文本内容仅在命中时按需从 SQLite 读取。
+
+旁路文件（位于 VDB_DIR）：
+  {vdb_id}.vec.npy    归一化向量矩阵, float32 或 int8
+  {vdb_id}.scale.npy  int8 模式下每行的反量化系数
+  {vdb_id}.meta.json  版本号、维度、类型及与矩阵行对应的 id 列表
+旁路文件版本号与 vector_meta 表不一致时，从 SQLite 重建。
 """
-import math
+import json
 import sqlite3
 import threading
 import os
-import struct
 import logging
 from typing import Optional
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 VDB_DIR = "./vdb"
 VECTORS_DB = "./vdb/vectors.db"
 
+# 内存矩阵扩容时的最小行数
+MIN_CAPACITY = 1024
+# int8 模式下分块反量化的行数，限制检索时的临时内存
+INT8_SEARCH_BLOCK = 65536
+# 向量在 SQLite 中的存储格式: f8 为旧版 struct.pack("%dd") 格式
+BLOB_DTYPE = "f4"
+SUPPORTED_DTYPES = ("float32", "int8")
+
 
 class LocalVectorStore:
     """本地 SQLite 向量存储"""
 
-    def __init__(self, vdb_id: int):
+    def __init__(self, vdb_id: int, dtype: str = "float32"):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"不支持的向量类型: {dtype}")
         self.vdb_id = vdb_id
+        self.dtype = dtype
         self._lock = threading.RLock()
         self.dim = 0
-        self.docs = []  # 内存缓存: list of dict
+
+        # 内存缓存: 归一化矩阵(可能为只读 memmap), 前 self._size 行有效
+        self._matrix = np.zeros((0, 0), dtype=self._np_dtype)
+        self._scales: Optional[np.ndarray] = None  # int8 模式的每行反量化系数
+        self._size = 0
+        self._ids: list[str] = []
+        self._row_of: dict[str, int] = {}  # id -> 矩阵行号
+        self._version = 0
+        self._dirty = False  # 内存矩阵与旁路文件不一致
 
         os.makedirs(VDB_DIR, exist_ok=True)
         self.conn = sqlite3.connect(VECTORS_DB, check_same_thread=False)
@@ -34,6 +63,10 @@ class LocalVectorStore:
         self._migrate()
         self._load_mem()
 
+    @property
+    def _np_dtype(self):
+        return np.int8 if self.dtype == "int8" else np.float32
+
     def _migrate(self):
         self.conn.execute("""
             CREATE TABLE IF NOT EXISTS vectors (
@@ -51,29 +84,82 @@ class LocalVectorStore:
         self.conn.execute("""
             CREATE INDEX IF NOT EXISTS idx_vectors_source ON vectors(vdb_id, source)
         """)
+        # 每个知识库的向量格式与写入版本号, 无记录表示旧版 float64 BLOB
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS vector_meta (
+                vdb_id     INTEGER PRIMARY KEY,
+                dim        INTEGER NOT NULL DEFAULT 0,
+                blob_dtype TEXT NOT NULL DEFAULT 'f4',
+                version    INTEGER NOT NULL DEFAULT 0
+            )
+        """)
         self.conn.commit()
+        self._migrate_blobs()
+
+    def _migrate_blobs(self):
+        """将旧版 float64 BLOB 转为 float32 BLOB, 每个 vdb_id 只执行一次"""
+        meta = self.conn.execute(
+            "SELECT blob_dtype FROM vector_meta WHERE vdb_id = ?", (self.vdb_id,)
+        ).fetchone()
+        if meta and meta[0] == BLOB_DTYPE:
+            return
+
+        rows = self.conn.execute(
+            "SELECT id, vector FROM vectors WHERE vdb_id = ?", (self.vdb_id,)
+        ).fetchall()
+        dim = 0
+        with self.conn:
+            for doc_id, blob in rows:
+                vec = np.frombuffer(blob, dtype="<f8").astype("<f4")
+                dim = dim or len(vec)
+                self.conn.execute(
+                    "UPDATE vectors SET vector = ? WHERE vdb_id = ? AND id = ?",
+                    (vec.tobytes(), self.vdb_id, doc_id),
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO vector_meta (vdb_id, dim, blob_dtype, version) "
+                "VALUES (?, ?, ?, COALESCE((SELECT version FROM vector_meta WHERE vdb_id = ?), 0) + 1)",
+                (self.vdb_id, dim, BLOB_DTYPE, self.vdb_id),
+            )
+        if rows:
+            logger.info("已将 %d 条向量从 float64 迁移为 float32, vdb_id=%d", len(rows), self.vdb_id)
 
     def _load_mem(self):
+        dim, version = self.conn.execute(
+            "SELECT dim, version FROM vector_meta WHERE vdb_id = ?", (self.vdb_id,)
+        ).fetchone()
+        self._version = version
+        if self._open_sidecar(version):
+            logger.debug("已映射 %d 条向量, vdb_id=%d", self._size, self.vdb_id)
+            return
+
         rows = self.conn.execute(
-            "SELECT id, content, vector, source FROM vectors WHERE vdb_id = ?",
+            "SELECT id, vector FROM vectors WHERE vdb_id = ? ORDER BY rowid",
             (self.vdb_id,),
         ).fetchall()
-        self.docs = []
-        for row in rows:
-            vec = self._bytes_to_floats(row[2])
-            self.docs.append({
-                "id": row[0],
-                "content": row[1],
-                "vector": vec,
-                "source": row[3],
-            })
-            if self.dim == 0 and vec:
-                self.dim = len(vec)
-        logger.debug("已加载 %d 条向量记录到内存, vdb_id=%d", len(self.docs), self.vdb_id)
+        self._reset_mem()
+        self.dim = dim
+        if rows:
+            # 维度不一致的脏数据直接跳过
+            byte_len = len(rows[0][1]) if not dim else dim * 4
+            keep = [r for r in rows if len(r[1]) == byte_len]
+            if len(keep) != len(rows):
+                logger.warning("跳过 %d 条维度不一致的向量记录, vdb_id=%d",
+                               len(rows) - len(keep), self.vdb_id)
+            vectors = np.frombuffer(b"".join(r[1] for r in keep), dtype="<f4")
+            self._append_rows([r[0] for r in keep], vectors.reshape(len(keep), -1))
+        self._dirty = True
+        self.flush()
+        logger.debug("已从 SQLite 加载 %d 条向量记录, vdb_id=%d", self._size, self.vdb_id)
 
     def ensure_collection(self, dimension: int):
         with self._lock:
-            self.dim = dimension
+            if self._size == 0:
+                self.dim = dimension
+
+    @property
+    def count(self) -> int:
+        return self._size
 
     def insert(self, records: list) -> list:
         """批量插入向量记录，返回新插入的文档列表"""
@@ -98,45 +184,66 @@ class LocalVectorStore:
                 }
                 new_docs.append(doc)
 
-            self.conn.commit()
-
-            # 更新内存缓存
-            index = {d["id"]: i for i, d in enumerate(self.docs)}
+            # 更新内存矩阵: 已存在的 id 先删除再追加到尾部(与 rowid 顺序一致)
+            # 同一批次内重复的 id 以最后一条为准
+            latest = {}
             for nd in new_docs:
-                if nd["id"] in index:
-                    self.docs[index[nd["id"]]] = nd
-                else:
-                    self.docs.append(nd)
-                    index[nd["id"]] = len(self.docs) - 1
+                latest[nd["id"]] = np.asarray(nd["vector"], dtype=np.float32)
+            if self._size == 0 and not self.dim:
+                self.dim = len(next(iter(latest.values())))
+            valid = {k: v for k, v in latest.items() if len(v) == self.dim}
+            if len(valid) != len(latest):
+                logger.warning("忽略 %d 条维度不一致的向量, vdb_id=%d, dim=%d",
+                               len(latest) - len(valid), self.vdb_id, self.dim)
+            self._remove_rows([self._row_of[k] for k in latest if k in self._row_of])
+            if valid:
+                self._append_rows(list(valid.keys()), np.stack(list(valid.values())))
 
-            if self.dim == 0 and new_docs and new_docs[0]["vector"]:
-                self.dim = len(new_docs[0]["vector"])
+            self._bump_version()
+            self.conn.commit()
 
         return new_docs
 
     def search(self, query_vector: list[float], top_k: int, score_threshold: float) -> list:
         """余弦相似度检索"""
+        if top_k <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        q_norm = float(np.linalg.norm(query))
+
         with self._lock:
-            docs = list(self.docs)
+            size = self._size
+            if size == 0 or len(query) != self.dim or q_norm == 0:
+                return []
+            # 矩阵行已归一化, 点积即余弦相似度
+            scores = self._scores(query / q_norm)
+            k = min(top_k, size)
+            if k < size:
+                top_idx = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top_idx = np.arange(size)
+            top_idx = top_idx[np.argsort(-scores[top_idx], kind="stable")]
 
-        if not docs:
-            return []
+            hits = []
+            for i in top_idx:
+                score = float(scores[i])
+                if score < score_threshold:
+                    break
+                hits.append((self._ids[i], score))
 
-        scored = []
-        for doc in docs:
-            if len(doc["vector"]) != len(query_vector):
-                continue
-            score = self._cosine_similarity(query_vector, doc["vector"])
-            if score >= score_threshold:
-                scored.append({
-                    "id": doc["id"],
-                    "content": doc["content"],
-                    "metadata": {"source": doc["source"]},
-                    "score": score,
-                })
-
-        scored.sort(key=lambda x: x["score"], reverse=True)
-        return scored[:top_k]
+            # 仅为命中的记录读取文本内容
+            docs = self._fetch_docs([doc_id for doc_id, _ in hits])
+
+        results = []
+        for doc_id, score in hits:
+            content, source = docs.get(doc_id, ("", ""))
+            results.append({
+                "id": doc_id,
+                "content": content,
+                "metadata": {"source": source},
+                "score": score,
+            })
+        return results
 
     def delete_by_ids(self, ids: list[str]):
         if not ids:
@@ -148,64 +255,236 @@ class LocalVectorStore:
                     "DELETE FROM vectors WHERE vdb_id = ? AND id = ?",
                     (self.vdb_id, id),
                 )
+            self._remove_rows([self._row_of[i] for i in set(ids) if i in self._row_of])
+            self._bump_version()
             self.conn.commit()
 
-            id_set = set(ids)
-            self.docs = [d for d in self.docs if d["id"] not in id_set]
-
     def delete_by_source(self, source: str):
         with self._lock:
+            ids = [r[0] for r in self.conn.execute(
+                "SELECT id FROM vectors WHERE vdb_id = ? AND source = ?",
+                (self.vdb_id, source),
+            ).fetchall()]
             self.conn.execute(
                 "DELETE FROM vectors WHERE vdb_id = ? AND source = ?",
                 (self.vdb_id, source),
             )
+            self._remove_rows([self._row_of[i] for i in ids if i in self._row_of])
+            self._bump_version()
             self.conn.commit()
-            self.docs = [d for d in self.docs if d["source"] != source]
 
     def list_by_source(self, source: str) -> list:
         """根据 source 列出所有 chunks"""
         with self._lock:
-            import copy
-            results = []
-            for d in self.docs:
-                if d["source"] == source:
-                    results.append({
-                        "id": d["id"],
-                        "content": d["content"],
-                        "metadata": {"source": d["source"]},
-                        "score": 0,
-                    })
-            return results
+            rows = self.conn.execute(
+                "SELECT id, content FROM vectors WHERE vdb_id = ? AND source = ? ORDER BY rowid",
+                (self.vdb_id, source),
+            ).fetchall()
+        return [{
+            "id": row[0],
+            "content": row[1],
+            "metadata": {"source": source},
+            "score": 0,
+        } for row in rows]
 
     def purge(self):
         with self._lock:
             self.conn.execute("DELETE FROM vectors WHERE vdb_id = ?", (self.vdb_id,))
+            self._reset_mem()
+            self._bump_version()
             self.conn.commit()
-            self.docs = []
+            self._dirty = False
+            for path in self._sidecar_paths().values():
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def flush(self):
+        """将内存矩阵写入旁路文件, 之后以 memmap 方式重新打开"""
+        with self._lock:
+            if not self._dirty:
+                return
+            paths = self._sidecar_paths()
+            self._atomic_save(paths["vec"], self._matrix[:self._size])
+            if self._scales is not None:
+                self._atomic_save(paths["scale"], self._scales[:self._size])
+            meta = {
+                "version": self._version,
+                "dim": self.dim,
+                "dtype": self.dtype,
+                "count": self._size,
+                "ids": self._ids,
+            }
+            tmp_path = paths["meta"] + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_path, paths["meta"])
+            self._dirty = False
+            self._open_sidecar(self._version)
 
     def close(self):
+        try:
+            self.flush()
+        except OSError as e:
+            logger.error("写入向量旁路文件失败: vdb_id=%d, error=%s", self.vdb_id, e)
         self.conn.close()
 
     # ============================================================
-    # 辅助方法
+    # 旁路文件
     # ============================================================
 
-    @staticmethod
-    def _floats_to_bytes(floats: list[float]) -> bytes:
-        return struct.pack(f"{len(floats)}d", *floats)
+    def _sidecar_paths(self) -> dict:
+        prefix = os.path.join(VDB_DIR, str(self.vdb_id))
+        return {
+            "vec": f"{prefix}.vec.npy",
+            "scale": f"{prefix}.scale.npy",
+            "meta": f"{prefix}.meta.json",
+        }
+
+    def _open_sidecar(self, version: int) -> bool:
+        """以只读 memmap 打开旁路文件, 版本或类型不匹配时返回 False"""
+        paths = self._sidecar_paths()
+        try:
+            with open(paths["meta"], "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["version"] != version or meta["dtype"] != self.dtype:
+                return False
+            matrix = np.load(paths["vec"], mmap_mode="r") if meta["count"] else \
+                np.zeros((0, meta["dim"]), dtype=self._np_dtype)
+            scales = None
+            if self.dtype == "int8":
+                scales = np.load(paths["scale"], mmap_mode="r") if meta["count"] else \
+                    np.zeros(0, dtype=np.float32)
+        except (OSError, ValueError, KeyError) as e:
+            logger.debug("向量旁路文件不可用, vdb_id=%d, %s", self.vdb_id, e)
+            return False
+        if matrix.shape[0] != meta["count"] or len(meta["ids"]) != meta["count"]:
+            return False
+
+        self._matrix = matrix
+        self._scales = scales
+        self._size = meta["count"]
+        self.dim = meta["dim"]
+        self._ids = meta["ids"]
+        self._row_of = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        return True
 
     @staticmethod
-    def _bytes_to_floats(data: bytes) -> list[float]:
-        count = len(data) // 8
-        return list(struct.unpack(f"{count}d", data))
+    def _atomic_save(path: str, arr: np.ndarray):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(arr))
+        os.replace(tmp_path, path)
+
+    # ============================================================
+    # 内存矩阵维护
+    # ============================================================
+
+    def _reset_mem(self):
+        self._matrix = np.zeros((0, self.dim), dtype=self._np_dtype)
+        self._scales = np.zeros(0, dtype=np.float32) if self.dtype == "int8" else None
+        self._size = 0
+        self._ids = []
+        self._row_of = {}
+
+    def _bump_version(self):
+        """在当前写事务内递增版本号, 使旧的旁路文件失效"""
+        self.conn.execute(
+            "INSERT INTO vector_meta (vdb_id, dim, blob_dtype, version) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT(vdb_id) DO UPDATE SET dim = excluded.dim, version = version + 1",
+            (self.vdb_id, self.dim, BLOB_DTYPE),
+        )
+        self._version = self.conn.execute(
+            "SELECT version FROM vector_meta WHERE vdb_id = ?", (self.vdb_id,)
+        ).fetchone()[0]
+        self._dirty = True
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        size = self._size
+        if self._scales is None:
+            return self._matrix[:size] @ query
+        scores = np.empty(size, dtype=np.float32)
+        for start in range(0, size, INT8_SEARCH_BLOCK):
+            end = min(start + INT8_SEARCH_BLOCK, size)
+            block = self._matrix[start:end].astype(np.float32)
+            scores[start:end] = (block @ query) * self._scales[start:end]
+        return scores
+
+    def _quantize(self, vectors: np.ndarray):
+        """按行对称量化为 int8, 返回 (int8 矩阵, 反量化系数)"""
+        max_abs = np.abs(vectors).max(axis=1)
+        max_abs[max_abs == 0] = 1.0
+        scales = (max_abs / 127.0).astype(np.float32)
+        quantized = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return quantized, scales
+
+    def _ensure_writable(self, capacity: int, dim: int):
+        """保证矩阵可写且容量足够, memmap 会在此复制到内存"""
+        writable = isinstance(self._matrix, np.ndarray) and not isinstance(self._matrix, np.memmap)
+        if writable and self._matrix.shape[0] >= capacity and self._matrix.shape[1] == dim:
+            return
+        capacity = max(capacity, self._matrix.shape[0] * 2, MIN_CAPACITY)
+        grown = np.empty((capacity, dim), dtype=self._np_dtype)
+        if self._size:
+            grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+        if self._scales is not None:
+            scales = np.empty(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+
+    def _append_rows(self, ids: list[str], vectors: Optional[np.ndarray]):
+        """在矩阵尾部追加若干行，容量不足时按倍数扩容"""
+        if vectors is None or not len(ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if self._size == 0:
+            self.dim = dim
+        need = self._size + n
+        self._ensure_writable(need, dim)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        if self._scales is not None:
+            vectors, scales = self._quantize(vectors)
+            self._scales[self._size:need] = scales
+        self._matrix[self._size:need] = vectors
+        for offset, doc_id in enumerate(ids):
+            self._row_of[doc_id] = self._size + offset
+        self._ids.extend(ids)
+        self._size = need
+
+    def _remove_rows(self, rows: list[int]):
+        """删除若干行并保持剩余行的相对顺序"""
+        if not rows:
+            return
+        self._ensure_writable(self._size, self.dim)
+        keep = np.ones(self._size, dtype=bool)
+        keep[rows] = False
+        remain = int(keep.sum())
+        self._matrix[:remain] = self._matrix[:self._size][keep]
+        if self._scales is not None:
+            self._scales[:remain] = self._scales[:self._size][keep]
+        self._ids = [v for v, k in zip(self._ids, keep.tolist()) if k]
+        self._row_of = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._size = remain
+
+    def _fetch_docs(self, ids: list[str]) -> dict:
+        """按 id 批量读取 (content, source)"""
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self.conn.execute(
+            f"SELECT id, content, source FROM vectors WHERE vdb_id = ? AND id IN ({placeholders})",
+            (self.vdb_id, *ids),
+        ).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    # ============================================================
+    # 辅助方法
+    # ============================================================
 
     @staticmethod
-    def _cosine_similarity(a: list[float], b: list[float]) -> float:
-        if len(a) != len(b) or len(a) == 0:
-            return 0.0
-        dot_product = sum(x * y for x, y in zip(a, b))
-        norm_a = sum(x * x for x in a)
-        norm_b = sum(x * x for x in b)
-        if norm_a == 0 or norm_b == 0:
-            return 0.0
-        return dot_product / (math.sqrt(norm_a) * math.sqrt(norm_b))
\ No newline at end of file
+    def _floats_to_bytes(floats: list[float]) -> bytes:
+        return np.asarray(floats, dtype="<f4").tobytes()
@@ -22,10 +22,11 @@ from common.const import UPLOAD_FOLDER, JSON_MIME_TYPE, DOCX_MIME_TYPE, OUTPUT_D
 from common.docx_cmt_util import get_comments_dict
 from apps.docx.txt_gen_util import gen_docx_outline_stream
 from apps.docx.doc_writer import DocxWriter
+from apps.docx.mermaid_render import prune_cache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB, DEFAULT_CACHE_MAX_AGE_DAYS
 from common.docx_md_util import convert_docx_to_md
 from common.docx_meta_util import save_doc_info, get_doc_info, update_process_info
 from common.docx_para_util import gen_docx_template_with_outline_txt, get_outline_txt
-from common import my_enums, statistic_util, docx_meta_util, cm_utils
+from common import my_enums, statistic_util, docx_meta_util, cm_utils, llm_scheduler
 from common.html_util import get_html_ctx_from_md
 from common.i18n._hooks import register_i18n
 from common.i18n import get_msg
@@ -47,6 +48,15 @@ logger = logging.getLogger(__name__)
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 my_cfg = init_yml_cfg()
+# 进程内所有文档任务共用的大模型请求调度器
+llm_sched_cfg = my_cfg.get('llm_scheduler') or {}
+llm_scheduler.configure_scheduler(
+    max_in_flight=llm_sched_cfg.get('max_in_flight', llm_scheduler.DEFAULT_MAX_IN_FLIGHT),
+    requests_per_s=llm_sched_cfg.get('requests_per_s', llm_scheduler.DEFAULT_REQUESTS_PER_S),
+    tokens_per_s=llm_sched_cfg.get('tokens_per_s', llm_scheduler.DEFAULT_TOKENS_PER_S),
+    backoff_s=llm_sched_cfg.get('backoff_s', llm_scheduler.DEFAULT_BACKOFF_S),
+    max_backoff_s=llm_sched_cfg.get('max_backoff_s', llm_scheduler.DEFAULT_MAX_BACKOFF_S),
+)
 os.system(
     "unset https_proxy ftp_proxy NO_PROXY FTP_PROXY HTTPS_PROXY HTTP_PROXY http_proxy ALL_PROXY all_proxy no_proxy"
 )
@@ -54,6 +64,9 @@ os.system(
 # 全局变量，用于存储后台任务状态
 background_tasks_started = False
 background_tasks_lock = threading.Lock()
+# 正在执行的文档写作任务ID，避免同一任务被重复执行
+running_docx_tasks = set()
+running_docx_tasks_lock = threading.Lock()
 
 
 def create_app():
@@ -517,6 +530,44 @@ def register_routes(app):
         # logger.info(f"get_doc_process_info, {info}")
         return json.dumps(file_info, ensure_ascii=False), 200
 
+    @app.route('/docx/llm/metrics', methods=['GET'])
+    def get_llm_metrics():
+        """大模型请求调度器的排队、在途、退避和排队耗时统计"""
+        return jsonify(llm_scheduler.get_scheduler().metrics())
+
+    @app.route('/docx/retry/task', methods=['POST'])
+    def retry_docx_task():
+        """
+        重试文档写作任务，只重新生成尚未生成文本（失败、超时或中断）的段落
+        """
+        task_id = request.json.get("task_id")
+        uid = request.json.get("uid")
+        if not task_id or not uid:
+            return jsonify({"error": get_msg("docx.missing_task_params")}), 400
+        session_key = f"{uid}_{get_client_ip()}"
+        if (not auth_info.get(session_key, None)
+                or time.time() - auth_info.get(session_key) > SESSION_TIMEOUT):
+            warning_info = get_msg("common.session_expired")
+            logger.warning(f"{uid}, {warning_info}")
+            return redirect_to_portal_login(AppType.DOCX.name.lower(), warning_info)
+        task_id = int(task_id)
+        file_info = docx_meta_util.get_doc_info(task_id)
+        if not file_info:
+            return json.dumps({"error": get_msg("docx.task_info_not_found")}, ensure_ascii=False), 400
+        if str(file_info[0]['uid']) != str(uid):
+            # 只能重试自己的任务，不暴露其他用户的任务是否存在
+            logger.warning(f"{uid}, retry_docx_task_uid_mismatch, {task_id}")
+            return json.dumps({"error": get_msg("docx.task_info_not_found")}, ensure_ascii=False), 403
+        with running_docx_tasks_lock:
+            is_running = task_id in running_docx_tasks
+        if is_running:
+            return json.dumps({"error": get_msg("docx.task_is_running")}, ensure_ascii=False), 400
+        update_process_info(uid, task_id, "任务重试，继续生成未完成的段落", 0)
+        threading.Thread(target=process_doc, args=(uid, task_id)).start()
+        info = {"status": "started", "task_id": task_id}
+        logger.info(f"{uid}, retry_docx_task, {info}")
+        return json.dumps(info, ensure_ascii=False), 200
+
 
 
     @app.post("/analyze/doc")
@@ -588,6 +639,10 @@ def start_background_tasks():
         time.sleep(2)
         logger.info("Starting background tasks...")
 
+        # 恢复服务重启前未完成的文档写作任务
+        resume_thread = threading.Thread(target=resume_docx_task, daemon=True, name="resume_docx_task")
+        resume_thread.start()
+
         # 启动文档清理任务
         doc_clean_thread = threading.Thread(target=clean_docx_task, daemon=True, name="clean_docx_task")
         doc_clean_thread.start()
@@ -622,6 +677,11 @@ def clean_docx_task():
                     logger.info(f"Cleaning expired task: {task_id}")
                     docx_meta_util.delete_task(task_id)
                     docx_meta_util.delete_doc_para_task(task_id)
+            # 清理 Mermaid 图片缓存，限制缓存目录的大小和文件的保留时间
+            docx_cfg = my_cfg.get('docx') or {}
+            prune_cache(docx_cfg.get('mermaid_cache_dir', DEFAULT_CACHE_DIR),
+                        docx_cfg.get('mermaid_cache_max_mb', DEFAULT_CACHE_MAX_MB),
+                        docx_cfg.get('mermaid_cache_max_age_days', DEFAULT_CACHE_MAX_AGE_DAYS))
 
             time.sleep(1000)  # 每1000秒检查一次
         except Exception as e:
@@ -629,11 +689,42 @@ def clean_docx_task():
             time.sleep(60)  # 出错后等待1分钟再重试
 
 
+def resume_docx_task():
+    """
+    服务启动时恢复未完成（已生成段落任务清单、未过期）的文档写作任务，只重新生成 status=0 的段落
+    """
+    try:
+        now_ms = time.time() * 1000
+        for file in docx_meta_util.get_processing_file_list():
+            task_id = file.get('task_id')
+            if task_id is None or not file.get('is_para_task_created'):
+                continue
+            if now_ms - task_id > TASK_EXPIRE_TIME_MS:
+                continue
+            logger.info(f"{file['uid']}, {task_id}, resume_unfinished_docx_task")
+            threading.Thread(target=process_doc, args=(file['uid'], task_id), daemon=True).start()
+    except Exception as e:
+        logger.error(f"Error in resume_docx_task: {e}")
+
+
 def process_doc(uid: int, task_id: int):
     """
-    开始处理 Word 文档
+    开始处理 Word 文档，同一任务同时只执行一次
     """
     logger.info(f"uid: {uid}, task_id: {task_id}")
+    with running_docx_tasks_lock:
+        if task_id in running_docx_tasks:
+            logger.warning(f"{uid}, {task_id}, docx_task_already_running")
+            return
+        running_docx_tasks.add(task_id)
+    try:
+        _process_doc(uid, task_id)
+    finally:
+        with running_docx_tasks_lock:
+            running_docx_tasks.discard(task_id)
+
+
+def _process_doc(uid: int, task_id: int):
     file_info = docx_meta_util.get_doc_info(task_id)
     if not file_info or not file_info[0]:
         raise FileNotFoundError(f"doc_file_info_not_found_for_task_id, {task_id}")
@@ -682,4 +773,4 @@ if __name__ == '__main__':
     # port = get_console_arg1()
     port = 19003
     logger.info(f"docx_service_listen_on_port {port}")
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -10,7 +10,7 @@ import multiprocessing
 import os
 import time
 import zipfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, wait
 import threading
 from typing import Any
 
@@ -21,13 +21,15 @@ from docx import Document
 from docx.shared import RGBColor, Cm
 
 from common.docx_cmt_util import refresh_current_heading_xml
-from common import cfg_util,docx_meta_util
+from common import cfg_util, docx_meta_util, llm_scheduler
 from apps.docx.txt_gen_util import gen_txt
 from common.docx_meta_util import get_doc_info, save_gen_para_txt, get_para_list_with_status, \
     count_mermaid_para, set_doc_info_para_task_created_flag, save_para_task, count_para_task
-from common.docx_para_util import get_elapsed_time, get_reference_from_vdb, \
+from common.docx_para_util import get_elapsed_time, get_reference_from_vdb, get_references_from_vdb, \
     is_3rd_heading, is_txt_para, refresh_current_heading
-from apps.docx.mermaid_render import MermaidRenderer
+from apps.docx.mermaid_render import MermaidRenderer, DEFAULT_RENDER_WORKERS, DEFAULT_CACHE_DIR
+from apps.docx.para_runner import ParaTaskRunner, get_shared_runner, priority_for, elapsed_s, \
+    DEFAULT_PARA_TIMEOUT_S, DEFAULT_SMALL_DOC_PARAS
 
 log_config_path = 'logging.conf'
 if os.path.exists(log_config_path):
@@ -37,6 +39,11 @@ else:
     logging.basicConfig(level=logging.INFO,format= LOG_FORMATTER, force=True)
 logger = logging.getLogger(__name__)
 
+# 参考资料预检索时每批处理的段落数，每批检索完成后立即提交该批的文本生成任务
+RETRIEVAL_BATCH_SIZE = 64
+# 检查段落超时的间隔（秒）
+PARA_TIMEOUT_CHECK_INTERVAL_S = 1
+
 
 class DocxWriter:
     """
@@ -54,23 +61,29 @@ class DocxWriter:
         （2）不含批注的文档，则使用 python-docx 处理，按照段落 index，插入相应的段落内容；
     """
 
-    def __init__(self, max_workers=None, timeout=300, consider_memory=True):
+    def __init__(self, max_workers=None, timeout=DEFAULT_PARA_TIMEOUT_S, consider_memory=True):
         """
         进行类的初始化
-        :param max_workers: 固定工作线程数，None则自动计算
-        :param timeout: 任务超时时间
+        :param max_workers: 固定工作线程数，使用独立的线程池；None则使用进程内共享的优先级线程池，
+            首次创建时线程数取自动计算值与大模型调度器在途上限中的较大者，实际并发由调度器控制
+        :param timeout: 单个段落从开始执行算起的超时时间（秒），可被配置 docx.para_timeout_s 覆盖
         :param consider_memory: 是否考虑内存使用情况
         """
         self.consider_memory = consider_memory
 
         if max_workers is None:
-            max_workers = self._calc_worker()
-
-        self.max_workers = max_workers
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+            workers = max(self._calc_worker(), llm_scheduler.get_scheduler().max_in_flight)
+            self.executor = get_shared_runner(workers)
+            self.is_shared_executor = True
+        else:
+            self.executor = ParaTaskRunner(max_workers)
+            self.is_shared_executor = False
+        self.max_workers = self.executor.max_workers
         self.timeout = timeout
         self.lock = threading.Lock()
         self.start_time = None
+        # 最近一次 _submit_tasks 的分阶段耗时（秒）
+        self.stage_timings = {}
 
         logger.info(f"初始化文档生成器 - 工作线程: {self.max_workers}, "
                     f"CPU核心: {multiprocessing.cpu_count()}, "
@@ -142,7 +155,7 @@ class DocxWriter:
             logger.info(f"{uid}, {task_id}, 开始处理文档 {input_file_path}")
             if doc_info['is_para_task_created']:
                 task_count = count_para_task(task_id)[0]['count(1)']
-                logger.info(f"{uid}, {task_id}, para_task_created_ignore_collect_task")
+                logger.info(f"{uid}, {task_id}, para_task_created_ignore_collect_task, task_count={task_count}")
             else:
                 task_count = DocxWriter._collect_doc_with_prompt_task(uid, task_id, input_file_path)
             if task_count == 0:
@@ -153,11 +166,11 @@ class DocxWriter:
                 logger.info(f"{uid}, {task_id}, {final_info}, {input_file_path}, 输出文件 {output_file_path}")
                 return final_info
 
-            initial_info = f"需处理 {task_count} 个段落，计划启动 {self.executor._max_workers} 个任务"
+            initial_info = f"需处理 {task_count} 个段落，计划启动 {self.max_workers} 个任务"
             logger.info(f"{uid}, {task_id}, {initial_info}")
             docx_meta_util.update_process_info(uid, task_id, initial_info)
 
-            doc_gen_results = self._submit_tasks(uid, task_id, doc_info, sys_cfg, include_mermaid=True)
+            self._submit_tasks(uid, task_id, doc_info, sys_cfg, include_mermaid=True)
             success = DocxWriter._insert_para_to_doc(uid, task_id)
             if not success:
                 error_info = "文档更新失败"
@@ -166,7 +179,8 @@ class DocxWriter:
                 return error_info
             logger.info(f"{uid}, {task_id}, 保存文档完成，{output_file_path}, 耗时 {get_elapsed_time(doc_info['start_time'])}")
             # 计算详细统计信息
-            success_count = len([r for r in doc_gen_results.values() if r.get('success')])
+            # 断点续写时，之前已生成的段落同样计入成功数
+            success_count = task_count - count_para_task(task_id, 0)[0]['count(1)']
             failed_count = task_count - success_count
             # 处理Mermaid图表
             img_count = 0
@@ -178,7 +192,8 @@ class DocxWriter:
                 mermaid_process_info = DocxWriter._submit_mermaid_task(
                     uid, task_id,
                     output_file_path,
-                    sys_cfg['api']['mermaid_api_uri']
+                    sys_cfg['api']['mermaid_api_uri'],
+                    sys_cfg.get('docx')
                 )
                 img_count = mermaid_process_info.get('img_count', 0)
                 docx_meta_util.update_img_count_by_task_id(task_id, img_count)
@@ -190,7 +205,8 @@ class DocxWriter:
                 logger.error(f"{uid}, {task_id}, Mermaid图表处理失败: {str(e)}")
             total_time = get_elapsed_time(doc_info['start_time'])
             final_info = (f"文档处理完成，共执行 {task_count} 个文本生成任务，"
-                          f"成功生成 {success_count} 段文本和 {img_count} 张配图，失败任务 {failed_count} 个，{total_time}")
+                          f"成功生成 {success_count} 段文本和 {img_count} 张配图，失败任务 {failed_count} 个，{total_time}"
+                          f"{self._stage_timing_info()}")
             if failed_count > 0:
                 final_info += f"，失败任务的原因可在日志中查看具体的失败原因"
             docx_meta_util.update_process_info(uid, task_id, final_info, 100)
@@ -243,7 +259,10 @@ class DocxWriter:
     def _submit_tasks(self, uid: int, task_id: int, doc_info: dict, sys_cfg: dict,
             include_mermaid: bool = False) -> dict[str, dict]:
         """
-        提交文本生成任务，开始并行处
+        提交文本生成任务，开始并行处理。只提交尚未生成文本（status=0）的段落，任务中断后重新执行即可断点续写。
+        段落按文档大小确定优先级提交到线程池，每个段落从开始执行算起超过 para_timeout_s 即判定为超时
+        （在大模型调度器中排队的时间不计入），
+        超时段落保持 status=0，重试任务时重新生成
         :param uid: user id
         :param task_id: 任务ID
         :param doc_info: docx_file_info 字典
@@ -263,13 +282,37 @@ class DocxWriter:
         total_tasks = len(para_info_list)
         logger.debug(f"{uid}, para_tasks_count, {total_tasks}")
         actual_total_tasks = total_tasks + 1 if include_mermaid else total_tasks
-        # 提交所有任务到线程池
-        for para_info in para_info_list:
-            future = self.executor.submit(DocxWriter._gen_doc_para, doc_info, para_info, sys_cfg)
-            future_to_key[future] = para_info['unique_key']
+        docx_cfg = sys_cfg.get('docx') or {}
+        para_timeout = docx_cfg.get('para_timeout_s', self.timeout)
+        priority = priority_for(total_tasks, docx_cfg.get('small_doc_paras', DEFAULT_SMALL_DOC_PARAS))
+        # 分批预检索参考资料（一次打开向量库、批量生成查询向量），每批检索完即提交该批的生成任务
+        batch_size = docx_cfg.get('retrieval_batch_size', RETRIEVAL_BATCH_SIZE)
+        retrieval_seconds = 0.0
+        gen_start = time.time()
+        for start in range(0, total_tasks, batch_size):
+            batch = para_info_list[start:start + batch_size]
+            retrieval_begin = time.time()
+            references = get_references_from_vdb([p['para_text'] for p in batch], doc_info['vdb_dir'], sys_cfg['api'])
+            retrieval_seconds += time.time() - retrieval_begin
+            if start == 0:
+                gen_start = time.time()
+            for para_info, reference in zip(batch, references):
+                future = self.executor.submit(DocxWriter._gen_doc_para, doc_info, para_info, sys_cfg, reference,
+                                              priority=priority, timeout_s=para_timeout)
+                future_to_key[future] = para_info['unique_key']
+            if total_tasks > batch_size:
+                retrieval_info = (f"已检索 {start + len(batch)}/{total_tasks} 个段落的参考资料，"
+                                  f"检索耗时 {retrieval_seconds:.1f} 秒")
+                docx_meta_util.update_process_info(uid, task_id, retrieval_info)
+        logger.info(f"{uid}, {task_id}, references_retrieved, {total_tasks} paras, {retrieval_seconds:.2f}s, "
+                    f"priority={priority}, para_timeout={para_timeout}s")
+        self.stage_timings = {'para_count': total_tasks, 'retrieval_s': retrieval_seconds, 'generation_s': 0.0}
         # 监控任务进度并收集结果
-        try:
-            for future in as_completed(future_to_key, timeout=self.timeout):
+        pending = set(future_to_key)
+        timeout_count = 0
+        while pending:
+            done, pending = wait(pending, timeout=PARA_TIMEOUT_CHECK_INTERVAL_S, return_when=FIRST_COMPLETED)
+            for future in done:
                 key = future_to_key[future]
                 try:
                     result = future.result()
@@ -280,53 +323,62 @@ class DocxWriter:
                         'success': False,
                         'error': str(e),
                     }
-
                 completed += 1
-                update_interval = 2
-                current_time = time.time()
-                if current_time - last_update_time >= update_interval or completed == total_tasks:
-                    percent = int(completed / actual_total_tasks * 100)
-                    elapsed_time = get_elapsed_time(start_time)
-                    if completed > 0:
-                        elapsed_seconds = (time.time() * 1000 - start_time) / 1000
-                        avg_time_per_task = elapsed_seconds / completed
-                        remaining_tasks = actual_total_tasks - completed
-                        estimated_remaining = avg_time_per_task * remaining_tasks
-                        if estimated_remaining < 60:
-                            remaining_str = f"约 {int(estimated_remaining)} 秒"
-                        else:
-                            remaining_str = f"约 {int(estimated_remaining / 60)} 分 {int(estimated_remaining % 60)} 秒"
-                        progress_info = f"正在处理第 {completed}/{actual_total_tasks} 个任务，{elapsed_time}，剩余{remaining_str}"
-                    else:
-                        progress_info = f"正在处理第 {completed}/{actual_total_tasks} 个任务，{elapsed_time}"
-                    docx_meta_util.update_process_info(uid, task_id, progress_info, percent)
-                    last_update_time = current_time
-
-        except TimeoutError:
-            logger.warning(f"{uid}, {task_id}, 总体任务执行超时，取消未完成的任务")
-            # 在 as_completed 外部取消未完成的任务
-            cancelled_count = 0
-            completed_before_timeout = completed
-            for future, key in future_to_key.items():
-                if not future.done():
-                    future.cancel()
-                    cancelled_count += 1
-                    results[key] = {
-                        'success': False,
-                        'error': '任务执行超时被取消',
-                    }
-            logger.info(
-                f"{uid}, {task_id}, 超时前已完成 {completed_before_timeout} 个任务，已取消 {cancelled_count} 个超时任务")
+            # 段落超时：不再等待该段落，执行线程无法中断，若之后生成完成，文本仍会保存
+            now = time.monotonic()
+            for future in [f for f in pending if (elapsed_s(f, now) or 0) > para_timeout]:
+                pending.discard(future)
+                key = future_to_key[future]
+                logger.warning(f"{uid}, {task_id}, 段落生成超时 {key}, para_timeout={para_timeout}s")
+                results[key] = {
+                    'success': False,
+                    'error': '段落生成超时',
+                }
+                timeout_count += 1
+                completed += 1
 
-            # 更新最终进度信息
-            timeout_info = f"任务执行超时，已完成 {completed_before_timeout}/{total_tasks} 个任务，{cancelled_count} 个任务因超时取消"
+            update_interval = 2
+            current_time = time.time()
+            if current_time - last_update_time >= update_interval or completed == total_tasks:
+                percent = int(completed / actual_total_tasks * 100)
+                elapsed_time = get_elapsed_time(start_time)
+                if completed > 0:
+                    elapsed_seconds = (time.time() * 1000 - start_time) / 1000
+                    avg_time_per_task = elapsed_seconds / completed
+                    remaining_tasks = actual_total_tasks - completed
+                    estimated_remaining = avg_time_per_task * remaining_tasks
+                    if estimated_remaining < 60:
+                        remaining_str = f"约 {int(estimated_remaining)} 秒"
+                    else:
+                        remaining_str = f"约 {int(estimated_remaining / 60)} 分 {int(estimated_remaining % 60)} 秒"
+                    progress_info = f"正在处理第 {completed}/{actual_total_tasks} 个任务，{elapsed_time}，剩余{remaining_str}"
+                else:
+                    progress_info = f"正在处理第 {completed}/{actual_total_tasks} 个任务，{elapsed_time}"
+                docx_meta_util.update_process_info(uid, task_id, progress_info, percent)
+                last_update_time = current_time
+
+        if timeout_count:
+            timeout_info = (f"已完成 {completed - timeout_count}/{total_tasks} 个任务，"
+                            f"{timeout_count} 个段落生成超时，重试任务时将重新生成超时的段落")
+            logger.info(f"{uid}, {task_id}, {timeout_info}")
             docx_meta_util.update_process_info(uid, task_id, timeout_info)
+        self.stage_timings['generation_s'] = time.time() - gen_start
+        logger.info(f"{uid}, {task_id}, stage_timings, {self.stage_timings}")
         return results
 
+    def _stage_timing_info(self) -> str:
+        """分阶段耗时说明，附加在任务进度信息中"""
+        if not self.stage_timings:
+            return ""
+        return (f"，参考资料检索 {self.stage_timings['retrieval_s']:.1f} 秒，"
+                f"文本生成 {self.stage_timings['generation_s']:.1f} 秒")
+
     @staticmethod
-    def _gen_doc_para(doc_info:dict[str, Any], para_info: dict[str, Any], sys_cfg: dict) -> dict:
+    def _gen_doc_para(doc_info:dict[str, Any], para_info: dict[str, Any], sys_cfg: dict,
+                      references: str | None = None) -> dict:
         """
         按照指定的要求生成单个段落的文本和图表（支持Mermaid图表）
+        :param references: 预检索得到的参考文本，为 None 时在此处检索
         """
         task_id = para_info['task_id']
         if not task_id:
@@ -341,11 +393,12 @@ class DocxWriter:
         doc_outline = doc_info['doc_outline']
         try:
             # 获取参考文本
-            references = get_reference_from_vdb(
-                para_info['para_text'],
-                vdb_dir,
-                sys_cfg['api']
-            )
+            if references is None:
+                references = get_reference_from_vdb(
+                    para_info['para_text'],
+                    vdb_dir,
+                    sys_cfg['api']
+                )
             logger.debug(f"gen_txt_user_comment, {para_info['user_comment']}")
             llm_txt = gen_txt(
                 uid=uid,
@@ -355,7 +408,8 @@ class DocxWriter:
                 catalogue=doc_outline,
                 current_sub_title=current_sub_title,
                 user_comment=para_info['user_comment'],
-                cfg=sys_cfg
+                cfg=sys_cfg,
+                task_id=task_id,
             )
             logger.info(f"{uid}, {task_id}, {para_id}, gen_txt, {llm_txt}")
             word_count = len(llm_txt)
@@ -373,18 +427,25 @@ class DocxWriter:
             raise
 
     @staticmethod
-    def _submit_mermaid_task(uid: int, task_id: int, output_file_path: str, mermaid_api_uri: str,) -> dict[str, Any]:
+    def _submit_mermaid_task(uid: int, task_id: int, output_file_path: str, mermaid_api_uri: str,
+                             docx_cfg: dict | None = None) -> dict[str, Any]:
         """
         提交处理文档中的Mermaid script 脚本的任务
+        :param docx_cfg: 配置中的 docx 部分，可设置 mermaid_workers（并发渲染线程数）、mermaid_cache_dir（图片缓存目录）
         :return: 处理结果信息
         """
+        docx_cfg = docx_cfg or {}
         doc_para_mermaid_count = count_mermaid_para(task_id)
-        mermaid_count = doc_para_mermaid_count[0][0]
+        mermaid_count = doc_para_mermaid_count[0]['count(1)']
         logger.debug(f"mermaid_count = {mermaid_count}")
         try:
             if mermaid_count > 0:
                 logger.info(f"{uid}, {task_id}, 检测到文档包含Mermaid图表 {mermaid_count}，开始处理: {output_file_path}")
-                mermaid_instance = MermaidRenderer(kroki_url=mermaid_api_uri)
+                mermaid_instance = MermaidRenderer(
+                    kroki_url=mermaid_api_uri,
+                    max_workers=docx_cfg.get('mermaid_workers', DEFAULT_RENDER_WORKERS),
+                    cache_dir=docx_cfg.get('mermaid_cache_dir', DEFAULT_CACHE_DIR),
+                )
                 img_count = mermaid_instance.batch_process_mermaid_in_docx(task_id, output_file_path)
                 logger.info(f"{uid}, {task_id}, 文档包含Mermaid图表处理完成: {output_file_path}")
                 return {
@@ -486,7 +547,7 @@ class DocxWriter:
             docx_meta_util.update_process_info(uid, task_id, info)
             if doc_info['is_para_task_created']:
                 task_count = count_para_task(task_id)[0]['count(1)']
-                logger.info(f"{uid}, {task_id}, para_task_created_ignore_collect_task")
+                logger.info(f"{uid}, {task_id}, para_task_created_ignore_collect_task, task_count={task_count}")
             else:
                 task_count = DocxWriter._collect_doc_with_comment_task(uid, task_id, comments_dict, input_file_path)
             if task_count == 0:
@@ -496,10 +557,10 @@ class DocxWriter:
                 import shutil
                 shutil.copy2(input_file_path, output_file_path)
                 return final_info
-            initial_info = f"需处理 {task_count} 个批注段落，启动 {self.executor._max_workers} 个任务"
+            initial_info = f"需处理 {task_count} 个批注段落，启动 {self.max_workers} 个任务"
             logger.info(f"{uid}, {task_id}, {initial_info}")
             docx_meta_util.update_process_info(uid, task_id, initial_info)
-            doc_gen_results = self._submit_tasks(uid, task_id, doc_info, sys_cfg, include_mermaid=True)
+            self._submit_tasks(uid, task_id, doc_info, sys_cfg, include_mermaid=True)
             success = DocxWriter._update_doc_with_comments(uid, task_id, doc_info)
             if not success:
                 error_info = "XML方式更新文档失败"
@@ -508,7 +569,8 @@ class DocxWriter:
                 return error_info
             logger.info(f"{uid}, {task_id}, 保存批注处理文档完成: {output_file_path}")
             # 统计结果
-            success_count = len([r for r in doc_gen_results.values() if r.get('success')])
+            # 断点续写时，之前已生成的段落同样计入成功数
+            success_count = task_count - count_para_task(task_id, 0)[0]['count(1)']
             failed_count = task_count - success_count
             # 处理Mermaid图表
             img_count = 0
@@ -518,7 +580,7 @@ class DocxWriter:
                 process_info = f"{current_info[0]['process_info']}, 开始处理文档配图"
                 docx_meta_util.update_process_info(uid, task_id, process_info, 95)
                 mermaid_process_info = DocxWriter._submit_mermaid_task(
-                    uid, task_id, output_file_path, sys_cfg['api']['mermaid_api_uri']
+                    uid, task_id, output_file_path, sys_cfg['api']['mermaid_api_uri'], sys_cfg.get('docx')
                 )
                 img_count = mermaid_process_info.get('img_count', 0)
                 docx_meta_util.update_img_count_by_task_id(task_id, img_count)
@@ -530,7 +592,8 @@ class DocxWriter:
                 logger.error(f"{uid}, {task_id}, Mermaid图表处理失败: {str(e)}")
             total_time = get_elapsed_time(doc_info['start_time'])
             final_info = (f"批注文档处理完成，共处理 {task_count} 个批注段落，"
-                f"成功生成 {success_count} 段文本和 {img_count} 张配图，失败 {failed_count} 段，{total_time}")
+                f"成功生成 {success_count} 段文本和 {img_count} 张配图，失败 {failed_count} 段，{total_time}"
+                f"{self._stage_timing_info()}")
             if failed_count > 0:
                 final_info += "，失败段落可在日志中查看详情"
             docx_meta_util.update_process_info(uid, task_id, final_info, 100)
@@ -740,17 +803,18 @@ class DocxWriter:
                 shutil.copy2(input_file_path, output_file_path)
                 return final_info
 
-            initial_info = f"需处理 {task_count} 个三级标题，启动 {self.executor._max_workers} 个任务"
+            initial_info = f"需处理 {task_count} 个三级标题，启动 {self.max_workers} 个任务"
             logger.info(f"{uid}, {initial_info}")
             docx_meta_util.update_process_info(uid, task_id, initial_info)
-            doc_gen_results = self._submit_tasks(uid, task_id, doc_info, sys_cfg, include_mermaid=True)
+            self._submit_tasks(uid, task_id, doc_info, sys_cfg, include_mermaid=True)
             success = DocxWriter._insert_para_to_doc(uid, task_id)
             if not success:
                 error_info = "文档更新失败"
                 logger.error(f"{uid}, {task_id}, {error_info}")
                 return error_info
             logger.info(f"{uid}, 保存无提示词文档完成: {output_file_path}")
-            success_count = len([r for r in doc_gen_results.values() if r.get('success')])
+            # 断点续写时，之前已生成的段落同样计入成功数
+            success_count = task_count - count_para_task(task_id, 0)[0]['count(1)']
             failed_count = task_count - success_count
             # 处理Mermaid图表
             img_count = 0
@@ -760,7 +824,7 @@ class DocxWriter:
                 process_info = f"{current_info[0]['process_info']}, 开始处理文档配图"
                 docx_meta_util.update_process_info(uid, task_id, process_info, 95)
                 mermaid_process_info = DocxWriter._submit_mermaid_task(
-                    uid, task_id, output_file_path, sys_cfg['api']['mermaid_api_uri']
+                    uid, task_id, output_file_path, sys_cfg['api']['mermaid_api_uri'], sys_cfg.get('docx')
                 )
                 img_count = mermaid_process_info.get('img_count', 0)
                 docx_meta_util.update_img_count_by_task_id(task_id, img_count)
@@ -772,7 +836,8 @@ class DocxWriter:
                 logger.error(f"{uid}, {task_id}, Mermaid图表处理失败: {str(e)}")
             total_time = get_elapsed_time(doc_info['start_time'])
             final_info = (f"文档处理完成，共执行 {task_count} 个文本生成任务，"
-                f"成功生成 {success_count} 段文本和 {img_count} 张配图，失败 {failed_count} 段，{total_time}")
+                f"成功生成 {success_count} 段文本和 {img_count} 张配图，失败 {failed_count} 段，{total_time}"
+                f"{self._stage_timing_info()}")
 
             if failed_count > 0:
                 final_info += ", 失败标题可在日志中查看详情"
@@ -816,14 +881,17 @@ class DocxWriter:
         return len(tasks)
 
     def shutdown(self):
-        """主动关闭线程池"""
+        """主动关闭线程池，共享线程池由所有文档任务共用，不关闭"""
+        if self.is_shared_executor:
+            return
         self.executor.shutdown(wait=True)
         logger.info("文档生成器线程池已关闭")
 
     def __del__(self):
         """清理线程池"""
         try:
-            self.executor.shutdown(wait=False)
+            if not self.is_shared_executor:
+                self.executor.shutdown(wait=False)
         except Exception:
             pass
 
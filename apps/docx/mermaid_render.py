@@ -4,18 +4,29 @@
 
 """
 mermaid script render
+- 多个脚本并发渲染（线程数有上限），复用进程内共享的 HTTP 连接池
+- 渲染结果按脚本内容哈希缓存在磁盘上，重新生成的文档中相同的图表不再重复渲染；
+  命中时刷新文件修改时间，prune_cache() 按修改时间清理过期文件并限制缓存总大小
+- 全部图片渲染完成后一次性插入文档并只保存一次
 """
 
+import hashlib
+import io
 import logging.config
 import os
 import re
-import requests
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
 from docx import Document
 from docx.shared import Inches
 from PIL import Image
 
-from common import cfg_util
+from common.const import AI_GEN_TAG
 
 log_config_path = 'logging.conf'
 if os.path.exists(log_config_path):
@@ -25,15 +36,121 @@ else:
     logging.basicConfig(level=logging.INFO,format= LOG_FORMATTER, force=True)
 logger = logging.getLogger(__name__)
 
+# 并发渲染的最大线程数
+DEFAULT_RENDER_WORKERS = 4
+# 渲染结果缓存目录，为空则不缓存
+DEFAULT_CACHE_DIR = "mermaid_cache"
+# 缓存总大小上限（MB），超出后按最近使用时间从旧到新删除
+DEFAULT_CACHE_MAX_MB = 512
+# 超过该天数未使用的缓存文件直接删除，0 表示不按时间清理
+DEFAULT_CACHE_MAX_AGE_DAYS = 30
+
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+
+def _get_session(pool_size: int = DEFAULT_RENDER_WORKERS) -> requests.Session:
+    """进程内共享的 Kroki 连接池，连接数按调用方的并发渲染线程数扩容"""
+    global _session, _session_pool_size
+    if _session is not None and _session_pool_size >= pool_size:
+        return _session
+    with _session_lock:
+        if _session is None or _session_pool_size < pool_size:
+            # 扩容时换一个新的 session，正在使用旧 session 的请求不受影响
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session, _session_pool_size = session, pool_size
+    return _session
+
+
+def prune_cache(cache_dir: str | None, max_mb: float = DEFAULT_CACHE_MAX_MB,
+                max_age_days: float = DEFAULT_CACHE_MAX_AGE_DAYS) -> int:
+    """
+    清理图片缓存：删除超过 max_age_days 未使用的文件，总大小仍超过 max_mb 时按修改时间从旧到新删除
+    :return: 删除的文件数
+    """
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return 0
+    files = []
+    for entry in os.scandir(cache_dir):
+        try:
+            if entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            continue
+    files.sort()
+    expire_before = time.time() - max_age_days * 86400 if max_age_days else 0
+    total = sum(size for _, size, _ in files)
+    max_bytes = max_mb * 1024 * 1024
+    removed = 0
+    for mtime, size, path in files:
+        if mtime >= expire_before and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"删除Mermaid图片缓存失败: {path}, {e}")
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"mermaid_cache_pruned, dir={cache_dir}, removed={removed}, remaining_bytes={total}")
+    return removed
+
 
 class MermaidRenderer:
     """
     Mermaid图表渲染器，将Mermaid脚本转换为图片并插入Word文档
     """
 
-    def __init__(self, kroki_url="http://localhost:8000"):
+    def __init__(self, kroki_url="http://localhost:8000", max_workers: int = DEFAULT_RENDER_WORKERS,
+                 cache_dir: str | None = DEFAULT_CACHE_DIR):
+        """
+        :param kroki_url: Kroki 服务地址
+        :param max_workers: 并发渲染的最大线程数
+        :param cache_dir: 渲染结果缓存目录，为空则不缓存
+        """
         self.kroki_url = kroki_url
         self.supported_formats = ['png', 'svg']
+        self.max_workers = max(1, max_workers)
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, cleaned_script: str, output_format: str) -> str | None:
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha256(cleaned_script.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.{output_format}")
+
+    def _read_cache(self, cache_path: str | None) -> bytes | None:
+        if not cache_path or not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, "rb") as f:
+                data = f.read()
+            # 刷新修改时间，清理缓存时按最近使用时间淘汰
+            os.utime(cache_path)
+            return data
+        except OSError as e:
+            logger.warning(f"读取Mermaid图片缓存失败: {cache_path}, {e}")
+            return None
+
+    @staticmethod
+    def _write_cache(cache_path: str | None, image_data: bytes):
+        if not cache_path:
+            return
+        try:
+            # 先写临时文件再改名，并发写同一个图表时不会读到写了一半的文件
+            with tempfile.NamedTemporaryFile(delete=False, dir=os.path.dirname(cache_path), suffix=".tmp") as f:
+                f.write(image_data)
+            os.replace(f.name, cache_path)
+        except OSError as e:
+            logger.warning(f"写入Mermaid图片缓存失败: {cache_path}, {e}")
 
     def render_script_to_img(self, mermaid_script: str, output_format: str = 'png') -> bytes:
         """
@@ -48,16 +165,22 @@ class MermaidRenderer:
         try:
             # 清理Mermaid脚本
             cleaned_script = MermaidRenderer._clean_mermaid_script(mermaid_script)
+            cache_path = self._cache_path(cleaned_script, output_format)
+            image_data = self._read_cache(cache_path)
+            if image_data:
+                logger.info(f"Mermaid图片缓存命中: {cache_path}")
+                return image_data
             logger.info(f"cleaned_script:{cleaned_script}, original_script:{mermaid_script}")
             # 发送到Kroki服务
-            response = requests.post(
+            response = _get_session(self.max_workers).post(
                 f"{self.kroki_url}/{output_format}",
-                data=cleaned_script,
+                data=cleaned_script.encode("utf-8"),
                 headers={"Content-Type": "text/plain"},
                 timeout=30
             )
 
             if response.status_code == 200:
+                self._write_cache(cache_path, response.content)
                 return response.content
             else:
                 error_msg = (f"Kroki渲染失败[kroki_mermaid_script_render_fail]: "
@@ -76,6 +199,28 @@ class MermaidRenderer:
             logger.error(error_msg)
             raise Exception(error_msg)
 
+    def render_scripts(self, mermaid_scripts: list[str], output_format: str = 'png') -> list:
+        """
+        并发渲染多个Mermaid脚本，相同的脚本只渲染一次
+        :return: 与输入顺序一致的列表，元素为图片字节流，渲染失败的为对应的异常
+        """
+        unique_scripts = list(dict.fromkeys(mermaid_scripts))
+
+        def render(script):
+            try:
+                return self.render_script_to_img(script, output_format)
+            except Exception as e:
+                return e
+
+        workers = min(self.max_workers, len(unique_scripts))
+        if workers <= 1:
+            rendered = [render(script) for script in unique_scripts]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                rendered = list(executor.map(render, unique_scripts))
+        result = dict(zip(unique_scripts, rendered))
+        return [result[script] for script in mermaid_scripts]
+
     @staticmethod
     def _clean_mermaid_script(mermaid_script: str) -> str:
         """
@@ -154,23 +299,19 @@ class MermaidRenderer:
             img_count = len(mermaid_scripts)
             logger.info(f"{task_id}, 找到需要处理的Mermaid脚本 {img_count} 个")
 
-            # 处理每个Mermaid脚本
-            for i, item in enumerate(mermaid_scripts):
+            # 先并发渲染全部脚本，再一次性插入文档
+            rendered = self.render_scripts([item['script'] for item in mermaid_scripts], img_format)
+            for i, (item, image_data) in enumerate(zip(mermaid_scripts, rendered)):
                 try:
-                    # 渲染图表
-                    image_data = self.render_script_to_img(item['script'], img_format)
-                    # 创建临时图片文件
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{img_format}') as temp_file:
-                        temp_file.write(image_data)
-                        temp_path = temp_file.name
-
+                    if isinstance(image_data, Exception):
+                        raise image_data
                     # 在Mermaid脚本段落后面插入图片
                     parent = item['paragraph']._p.getparent()
                     pic_para = doc.add_paragraph()
                     pic_para.alignment = 1          # 图片左右居中
                     run = pic_para.add_run()
                     # 读取图片原始尺寸
-                    with Image.open(temp_path) as img:
+                    with Image.open(io.BytesIO(image_data)) as img:
                         width, height = img.size
                         aspect_ratio = width / height
 
@@ -178,24 +319,22 @@ class MermaidRenderer:
                     max_width = Inches(5.0)
                     max_height = Inches(4.0)
                     if aspect_ratio > 1:  # 横向图
-                        run.add_picture(temp_path, width=max_width)
+                        run.add_picture(io.BytesIO(image_data), width=max_width)
                     else:  # 竖向图
-                        run.add_picture(temp_path, height=max_height)
+                        run.add_picture(io.BytesIO(image_data), height=max_height)
 
                     # 将图片段落插入到原段落后面
                     parent.insert(parent.index(item['paragraph']._p) + 1, pic_para._p)
 
                     # 再插入文本段落
                     text_para = doc.add_paragraph()
-                    text_run = text_para.add_run(f"{cfg_util.AI_GEN_TAG} 图 {i + 1}")
+                    text_run = text_para.add_run(f"{AI_GEN_TAG} 图 {i + 1}")
                     # 设置文本居中和加粗
                     text_para.alignment = 1  # 居中对齐
                     text_run.bold = True  # 加粗
                     # 将文本段落插入到图片段落后面
                     parent.insert(parent.index(pic_para._p) + 1, text_para._p)
 
-                    # 清理临时文件
-                    os.unlink(temp_path)
                     original_text = item['paragraph'].text
                     cleaned_text = re.sub(r'<mermaid>.*?</mermaid>', '', original_text, flags=re.DOTALL)
                     item['paragraph'].text = cleaned_text.strip()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+"""
+段落生成任务执行器
+- 进程内所有文档写作任务共用一个带优先级的线程池，小文档（交互式）段落优先于大文档（批量）段落执行，
+  同一优先级内按提交顺序执行
+- 记录每个段落任务开始执行的时间（future.started_at，time.monotonic 秒），
+  供调用方按段落而不是按整个文档判断超时；排队等待的时间不计入段落超时
+- 任务在执行器线程中可通过 remaining_s() 获取距段落超时还剩的时间，用于超时后不再重试；
+  在 clock_paused() 内的时间（如在大模型调度器中排队）同样不计入段落超时，见 elapsed_s()
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+# 单个段落从开始执行算起的超时时间（秒）
+DEFAULT_PARA_TIMEOUT_S = 300
+# 待生成段落数不超过该值的文档视为交互式小文档
+DEFAULT_SMALL_DOC_PARAS = 30
+
+_shared_runner = None
+_shared_lock = threading.Lock()
+# 当前线程正在执行的任务 future
+_local = threading.local()
+
+
+def priority_for(para_count: int, small_doc_paras: int = DEFAULT_SMALL_DOC_PARAS) -> int:
+    """根据待生成段落数确定任务优先级"""
+    return PRIORITY_INTERACTIVE if para_count <= small_doc_paras else PRIORITY_BATCH
+
+
+class ParaTaskRunner:
+    """优先级线程池，工作线程按需创建，最多 max_workers 个"""
+
+    def __init__(self, max_workers: int, name: str = "para_runner"):
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        self.max_workers = max_workers
+        self.name = name
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._idle = 0
+        self._running = 0
+        self._shutdown = False
+
+    def submit(self, fn, *args, priority: int = PRIORITY_BATCH, timeout_s: float | None = None, **kwargs) -> Future:
+        """提交任务，priority 越小越先执行；timeout_s 为任务从开始执行算起的超时时间，供 remaining_s() 使用"""
+        future = Future()
+        future.started_at = None
+        future.timeout_s = timeout_s
+        future.paused_s = 0.0
+        future.paused_since = None
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+            heapq.heappush(self._queue, (priority, next(self._seq), future, fn, args, kwargs))
+            # 被唤醒但尚未取到任务的线程仍计为空闲，按排队任务数与空闲线程数比较决定是否新建线程
+            if len(self._queue) > self._idle and len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._worker, daemon=True,
+                                     name=f"{self.name}_{len(self._threads)}")
+                self._threads.append(t)
+                t.start()
+            self._cond.notify()
+        return future
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._shutdown:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                if not self._queue:
+                    return
+                _, _, future, fn, args, kwargs = heapq.heappop(self._queue)
+                self._running += 1
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                future.started_at = time.monotonic()
+                _local.future = future
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            finally:
+                _local.future = None
+                with self._cond:
+                    self._running -= 1
+
+    def stats(self) -> dict:
+        """当前排队（按优先级）和执行中的任务数"""
+        with self._cond:
+            queued = {}
+            for item in self._queue:
+                queued[item[0]] = queued.get(item[0], 0) + 1
+            return {"workers": len(self._threads), "running": self._running, "queued": queued}
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        """关闭线程池，默认执行完已排队的任务后退出"""
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                while self._queue:
+                    heapq.heappop(self._queue)[2].cancel()
+            self._cond.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for t in threads:
+                t.join()
+
+
+def elapsed_s(future: Future, now: float | None = None) -> float | None:
+    """任务已执行的秒数，不含 clock_paused() 内的时间；尚未开始执行时返回 None"""
+    if future.started_at is None:
+        return None
+    now = time.monotonic() if now is None else now
+    paused_since = future.paused_since
+    paused = future.paused_s + (now - paused_since if paused_since is not None else 0.0)
+    return now - future.started_at - paused
+
+
+def remaining_s() -> float | None:
+    """当前线程执行的任务距超时还剩多少秒（可能为负）；不在执行器线程中或未设置超时时返回 None"""
+    future = getattr(_local, "future", None)
+    if future is None or future.timeout_s is None:
+        return None
+    return future.timeout_s - elapsed_s(future)
+
+
+@contextmanager
+def clock_paused():
+    """with 块内的时间不计入当前线程所执行任务的超时，不在执行器线程中时不做任何处理"""
+    future = getattr(_local, "future", None)
+    if future is None:
+        yield
+        return
+    future.paused_since = time.monotonic()
+    try:
+        yield
+    finally:
+        future.paused_s += time.monotonic() - future.paused_since
+        future.paused_since = None
+
+
+def get_shared_runner(max_workers: int) -> ParaTaskRunner:
+    """获取进程内共享的段落执行器，首次调用时按 max_workers 创建"""
+    global _shared_runner
+    with _shared_lock:
+        if _shared_runner is None:
+            _shared_runner = ParaTaskRunner(max_workers, name="docx_para")
+            logger.info(f"shared_para_runner_created, max_workers={max_workers}")
+        return _shared_runner
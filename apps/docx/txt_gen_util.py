@@ -12,7 +12,8 @@ import time
 
 from langchain_core.prompts import ChatPromptTemplate
 
-from common import cfg_util, agt_util, cm_utils, statistic_util
+from apps.docx import para_runner
+from common import cfg_util, agt_util, cm_utils, statistic_util, llm_scheduler
 from common.cm_utils import rmv_think_block, estimate_tokens
 from common.my_enums import AppType
 
@@ -48,15 +49,17 @@ def gen_docx_outline_stream(uid:int, doc_type: str, doc_title: str, keywords: st
     try:
         # 流式调用模型
         output_txt = ''
-        for chunk in model.stream(input_text):
-            if hasattr(chunk, 'content'):
-                output_text = cm_utils.rmv_think_block(chunk.content)
-                output_txt += chunk.content
-                yield output_text
-            elif hasattr(chunk, 'text'):
-                output_text = cm_utils.rmv_think_block(chunk.text())
-                output_txt += chunk.text()
-                yield output_text
+        with llm_scheduler.get_scheduler().slot((uid, None), input_tokens) as slot:
+            for chunk in model.stream(input_text):
+                if hasattr(chunk, 'content'):
+                    output_text = cm_utils.rmv_think_block(chunk.content)
+                    output_txt += chunk.content
+                    yield output_text
+                elif hasattr(chunk, 'text'):
+                    output_text = cm_utils.rmv_think_block(chunk.text())
+                    output_txt += chunk.text()
+                    yield output_text
+            slot.output_tokens = estimate_tokens(output_txt)
         output_tokens = estimate_tokens(output_txt[:-1])
         # logger.info(f"{uid}, output_tokens, {output_tokens}")
         logger.info(f"{uid}, gen_doc_outline, {output_txt}")
@@ -70,7 +73,7 @@ def gen_docx_outline_stream(uid:int, doc_type: str, doc_title: str, keywords: st
         dispose(model)
 
 def gen_txt(uid: int, write_context: str, references: str, para_text: str, user_comment: str, catalogue: str,
-            current_sub_title: str, cfg: dict, max_retries=6) -> str | None:
+            current_sub_title: str, cfg: dict, max_retries=6, task_id: int | None = None) -> str | None:
     """
     根据提供的三级目录、参考资料，以及每个章节的具体文本写作要求，输出文本
     :param uid:                 用户请求ID
@@ -82,6 +85,9 @@ def gen_txt(uid: int, write_context: str, references: str, para_text: str, user_
     :param current_sub_title:   当前写作章节的目录标题
     :param cfg:                 系统配置
     :param max_retries:         最大尝试次数， 需处于集合 [1, 7]
+    :param task_id:             文档任务ID，与 uid 一起作为调度器公平排队的 key
+    在段落执行器中运行时，若等待下次重试期间段落即会超时，则不再重试，
+    避免超时段落在后台继续重试，与重新执行任务时再次提交的同一段落并行生成
     """
     # logger.info(
     #     f"catalogue[{catalogue}], "
@@ -100,6 +106,12 @@ def gen_txt(uid: int, write_context: str, references: str, para_text: str, user_
     last_exception = None
     model = None
     for attempt in range(max_retries + 1):
+        if attempt > 0:
+            remaining = para_runner.remaining_s()
+            if remaining is not None and remaining <= backoff_times[attempt - 1]:
+                dispose(model)
+                logger.warning(f"{uid}, {task_id}, stop_retry_gen_txt_para_timeout, remaining={remaining:.1f}s")
+                raise last_exception
         try:
             if attempt > 0:
                 time.sleep(backoff_times[attempt - 1])
@@ -128,9 +140,14 @@ def gen_txt(uid: int, write_context: str, references: str, para_text: str, user_
             logger.info(f"{uid}, input_tokens, {input_tokens}")
             statistic_util.add_input_token_by_uid(uid, input_tokens, AppType.DOCX.name.lower())
             logger.info(f"gen_txt_arg, {arg_dict}, {cfg['api']['llm_api_uri']}, {cfg['api']['llm_model_name']}")
-            response = chain.invoke(arg_dict)
+            # 经进程级调度器排队，限制并发数和速率，上游返回 429/5xx 时统一退避；排队时间不计入段落超时
+            with para_runner.clock_paused():
+                llm_slot = llm_scheduler.get_scheduler().slot((uid, task_id), input_tokens)
+            with llm_slot as slot:
+                response = chain.invoke(arg_dict)
+                output_tokens = estimate_tokens(response.content)
+                slot.output_tokens = output_tokens
             output_txt = rmv_think_block(response.content)
-            output_tokens = estimate_tokens(response.content)
             logger.info(f"{uid}, output_tokens, {output_tokens}")
             statistic_util.add_output_token_by_uid(uid, output_tokens, AppType.DOCX.name.lower())
             dispose(model)
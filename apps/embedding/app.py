@@ -14,6 +14,8 @@ from pydantic import BaseModel
 from typing import Optional, List, Union
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from apps.embedding.batcher import EmbeddingBatcher, DEFAULT_MAX_WAIT_MS, DEFAULT_MAX_BATCH_TEXTS
+from common.embedding_codec import ENCODING_FORMAT, encode_vector
 from common.sys_init import init_yml_cfg
 from common.i18n import get_msg
 
@@ -40,6 +42,13 @@ print(f"尝试加载模型路径: {model_path}")  # 调试信息
 model = SentenceTransformer(model_path, device='cpu')
 model_dimension = model.get_sentence_embedding_dimension()
 print(f"模型加载完毕, {model_path}, 向量维度: {model_dimension}")  # 调试信息
+# 动态微批处理：并发请求在 batch_max_wait_ms 内合并（最多 batch_max_texts 条），在工作线程中编码
+batch_cfg = my_cfg.get("embedding", {})
+batcher = EmbeddingBatcher(
+    lambda texts: model.encode(texts, convert_to_numpy=True),
+    max_wait_ms=batch_cfg.get("batch_max_wait_ms", DEFAULT_MAX_WAIT_MS),
+    max_batch_texts=batch_cfg.get("batch_max_texts", DEFAULT_MAX_BATCH_TEXTS),
+)
 # # 明确指定使用 CPU
 # model = SentenceTransformer('your_model_name', device='cpu')
 # # 或明确指定使用 GPU
@@ -62,7 +71,7 @@ class EmbeddingRequest(BaseModel):
 class EmbeddingData(BaseModel):
     object: str = "embedding"
     index: int
-    embedding: List[float]
+    embedding: Union[List[float], str]  # base64 时为小端 float32 的 base64 字符串
 
 
 class EmbeddingResponse(BaseModel):
@@ -121,21 +130,14 @@ async def create_embedding(
             if len(text) > 8192:  # 限制单个文本长度
                 raise HTTPException(status_code=400, detail=get_msg('embedding.text_n_too_long', n=i + 1))
 
-        # 计算嵌入
-        embeddings = model.encode(input_texts).tolist()
+        # 计算嵌入（与其他并发请求合并为一批，在工作线程中编码）
+        embeddings = await batcher.encode(input_texts)
 
-        # 构建 OpenAI 兼容的响应
-        data = []
-        for i, emb in enumerate(embeddings):
-            # 处理 encoding_format 参数
-            if request.encoding_format == "base64":
-                # 如果需要 base64 格式，这里可以转换
-                # 但通常使用 float 格式
-                embedding_data = emb
-            else:
-                embedding_data = emb
-
-            data.append(EmbeddingData(index=i, embedding=embedding_data))
+        # 构建 OpenAI 兼容的响应，base64 时直接编码 float32 字节，不经过 Python 浮点列表
+        if request.encoding_format == ENCODING_FORMAT:
+            data = [EmbeddingData(index=i, embedding=encode_vector(emb)) for i, emb in enumerate(embeddings)]
+        else:
+            data = [EmbeddingData(index=i, embedding=emb) for i, emb in enumerate(embeddings.tolist())]
 
         # 模拟 token 使用量（实际可以根据文本长度计算）
         total_tokens = sum(len(text) for text in input_texts)
@@ -171,7 +173,7 @@ async def create_embedding_legacy(
 async def health():
     """健康检查端点（不需要认证）"""
     logger.info("health_check")
-    return {"status": "healthy", "model": "bge-large-zh-v1.5"}
+    return {"status": "healthy", "model": "bge-large-zh-v1.5", "batcher": batcher.stats()}
 
 
 @app.get("/v1/models")
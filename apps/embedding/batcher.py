@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+"""
+embedding 动态微批处理
+并发请求的文本在 max_wait_ms 内或凑满 max_batch_texts 条后合并为一批，按长度排序减少填充，
+在独立工作线程中编码（不阻塞事件循环），结果按请求拆分返回。
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WAIT_MS = 5
+DEFAULT_MAX_BATCH_TEXTS = 64
+
+
+class _Pending:
+    def __init__(self, texts, future):
+        self.texts = texts
+        self.future = future
+
+
+class EmbeddingBatcher:
+    """合并并发 embedding 请求的异步批处理器
+
+    encode_fn(texts: list[str]) -> np.ndarray，在工作线程中串行调用（模型同一时刻只跑一批）。
+    """
+
+    def __init__(self, encode_fn, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 max_batch_texts=DEFAULT_MAX_BATCH_TEXTS):
+        self.encode_fn = encode_fn
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_texts = max(1, max_batch_texts)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="emb_encode")
+        self._queue = None
+        self._task = None
+        self._stats = {"requests": 0, "texts": 0, "batches": 0, "encode_ms": 0.0}
+
+    async def encode(self, texts: list[str]) -> np.ndarray:
+        """提交文本并等待所在批次编码完成，返回 [len(texts), dim]"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Pending(texts, future))
+        return await future
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        stats["avg_batch_texts"] = round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["encode_ms"] = round(stats["encode_ms"], 1)
+        stats["max_wait_ms"] = self.max_wait * 1000
+        stats["max_batch_texts"] = self.max_batch_texts
+        return stats
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = loop.time() + self.max_wait
+            # 在等待窗口内继续收集，凑满 max_batch_texts 立即发出
+            while size < self.max_batch_texts:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item.texts)
+            await self._encode_batch(loop, batch)
+
+    async def _encode_batch(self, loop, batch):
+        texts = [t for p in batch for t in p.texts]
+        # 按长度排序，同一子批内长度接近，减少 padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        begin = time.perf_counter()
+        try:
+            sorted_emb = await loop.run_in_executor(self._executor, self.encode_fn, [texts[i] for i in order])
+        except Exception as e:
+            logger.error("embedding batch failed, requests=%d, texts=%d, error=%s", len(batch), len(texts), e)
+            for p in batch:
+                if not p.future.done():
+                    p.future.set_exception(e)
+            return
+        elapsed = (time.perf_counter() - begin) * 1000
+
+        embeddings = np.empty_like(sorted_emb)
+        embeddings[order] = sorted_emb
+        offset = 0
+        for p in batch:
+            n = len(p.texts)
+            if not p.future.done():
+                p.future.set_result(embeddings[offset:offset + n])
+            offset += n
+
+        self._stats["requests"] += len(batch)
+        self._stats["texts"] += len(texts)
+        self._stats["batches"] += 1
+        self._stats["encode_ms"] += elapsed
+        logger.debug("embedding batch done, requests=%d, texts=%d, encode_ms=%.1f",
+                     len(batch), len(texts), elapsed)
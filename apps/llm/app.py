@@ -12,11 +12,16 @@ import time
 import uuid
 import functools
 import random
+import threading
+from collections import deque
 
 from flask import Flask, request, Response, stream_with_context
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+from transformers import (AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig,
+                          StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer)
 import torch
 
+from apps.llm.batch_scheduler import BatchScheduler, HFBatchBackend, MockBatchBackend, DEFAULT_MAX_BATCH_SIZE
+from apps.llm.prefix_cache import PrefixCache, DEFAULT_BLOCK_SIZE, cache_object, legacy_kv
 from common.sys_init import init_yml_cfg
 
 app = Flask(__name__)
@@ -36,11 +41,74 @@ model_path = my_cfg['model']['path']
 model_name = my_cfg['model']['name']
 api_key = my_cfg['model'].get('key', '')  # 从配置读取API密钥
 is_mock = my_cfg['model'].get('is_mock', False)
+# 连续批处理：并发请求共享一个运行批次（Mock 模式同样可用，便于无 GPU 压测）
+# 真实模型的批处理后端（HFBatchBackend）尚未在真实模型上验证，未显式配置时只在 Mock 模式下默认开启
+batching = my_cfg['model'].get('batching', is_mock)
+max_batch_size = my_cfg['model'].get('max_batch_size', DEFAULT_MAX_BATCH_SIZE)
+mock_step_ms = my_cfg['model'].get('mock_step_ms', 20)
+# prompt 前缀 KV cache 内存上限（MB），0 表示关闭；按 prefix_block_size 个 token 对齐
+# 与 batching 相同，前缀复用尚未在真实模型上验证，未显式配置时默认关闭（开启时可参考 prefix_cache.DEFAULT_MAX_MB）
+prefix_cache_mb = my_cfg['model'].get('prefix_cache_mb', 0)
+prefix_block_size = my_cfg['model'].get('prefix_block_size', DEFAULT_BLOCK_SIZE)
 print(f"on host or in container, model_path={model_path}, model_name={model_name}, is_mock={is_mock}")
 
 # 全局变量
 tokenizer = None
 model = None
+scheduler = None
+prefix_cache = None
+
+# 流式生成：等待下一段文本的最长时间（秒），超时视为生成线程异常
+STREAM_TOKEN_TIMEOUT = 120
+
+
+class StreamMetrics:
+    """流式生成指标：最近 N 次请求的首 token 延迟（TTFT）与生成速率（tokens/s）"""
+
+    def __init__(self, window=100):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)  # (ttft_ms, tokens_per_sec)
+        self.total = 0
+        self.cancelled = 0
+
+    def record(self, ttft_ms, tokens, duration, cancelled=False):
+        tps = tokens / duration if duration > 0 else 0.0
+        with self._lock:
+            self.total += 1
+            if cancelled:
+                self.cancelled += 1
+            if ttft_ms is not None:
+                self._samples.append((ttft_ms, tps))
+
+    def snapshot(self):
+        with self._lock:
+            samples = list(self._samples)
+            total, cancelled = self.total, self.cancelled
+        data = {"streams": total, "cancelled": cancelled, "window": len(samples)}
+        if samples:
+            ttfts = sorted(t for t, _ in samples)
+            data["ttft_ms_avg"] = round(sum(ttfts) / len(ttfts), 1)
+            data["ttft_ms_p50"] = round(ttfts[len(ttfts) // 2], 1)
+            data["ttft_ms_last"] = round(samples[-1][0], 1)
+            data["tokens_per_sec_avg"] = round(sum(t for _, t in samples) / len(samples), 2)
+            data["tokens_per_sec_last"] = round(samples[-1][1], 2)
+        return data
+
+
+stream_metrics = StreamMetrics()
+
+
+class CancelCriteria(StoppingCriteria):
+    """客户端断开时终止 generate，并统计已生成 token 数"""
+
+    def __init__(self, cancel_event, prompt_length):
+        self.cancel_event = cancel_event
+        self.prompt_length = prompt_length
+        self.new_tokens = 0
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.new_tokens = input_ids.shape[-1] - self.prompt_length
+        return self.cancel_event.is_set()
 
 
 def timeout(seconds=60):
@@ -173,10 +241,8 @@ def load_model():
         raise
 
 
-def generate_mock_response(prompt, max_length=512, temperature=0.7):
-    """生成模拟响应"""
-    start_time = time.time()
-
+def mock_response_text(prompt, temperature=0.7):
+    """按用户输入选择模拟响应文本（不含模拟耗时）"""
     # 模拟不同的响应内容基于用户输入
     user_input_lower = prompt.lower()
 
@@ -219,6 +285,13 @@ def generate_mock_response(prompt, max_length=512, temperature=0.7):
     else:
         # 低温时选择固定响应
         response = random.choice(responses)
+    return response
+
+
+def generate_mock_response(prompt, max_length=512, temperature=0.7):
+    """生成模拟响应"""
+    start_time = time.time()
+    response = mock_response_text(prompt, temperature)
 
     # 模拟生成时间
     generation_time = time.time() - start_time
@@ -237,31 +310,54 @@ def generate_response(prompt, max_length=512, temperature=0.7):
     start_time = time.time()
     inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=1024)
 
+    prefix_kwargs, cached_len = prefix_generate_kwargs(inputs["input_ids"])
     with torch.no_grad():
         outputs = model.generate(
             **inputs,
+            **prefix_kwargs,
             max_length=max_length,
             temperature=temperature,
             do_sample=temperature > 0.1,
             pad_token_id=tokenizer.eos_token_id,
             repetition_penalty=1.1,
             early_stopping=True,
+            return_dict_in_generate=True,
         )
+    save_prefix(inputs["input_ids"], outputs, cached_len)
 
-    response = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    response = tokenizer.decode(outputs.sequences[0], skip_special_tokens=True)
     final_response = response[len(prompt):].strip()
     generation_time = time.time() - start_time
     logger.info(f"Generation completed in {generation_time:.2f}s, tokens: {len(tokenizer.encode(final_response))}")
     return final_response
 
 
+def prefix_generate_kwargs(input_ids):
+    """命中前缀缓存时返回 generate 的 past_key_values 参数及命中长度"""
+    if prefix_cache is None:
+        return {}, 0
+    cached_len, kv = prefix_cache.lookup(input_ids[0].tolist())
+    if kv is None:
+        return {}, 0
+    return {"past_key_values": cache_object(kv)}, cached_len
+
+
+def save_prefix(input_ids, outputs, cached_len):
+    """generate 结束后缓存 prompt 前缀的 KV"""
+    past = getattr(outputs, "past_key_values", None)
+    if prefix_cache is not None and past is not None:
+        prefix_cache.insert(input_ids[0].tolist(), legacy_kv(past), cached_len)
+
+
 def build_prompt(messages):
-    """构建prompt"""
+    """构建prompt，system 消息放在最前，便于相同系统提示词命中前缀缓存"""
     prompt = ""
     for msg in messages:
         role = msg.get('role', '')
         content = msg.get('content', '')
-        if role == 'user':
+        if role == 'system':
+            prompt += f"system: {content}\n"
+        elif role == 'user':
             prompt += f"user: {content}\n"
         elif role == 'assistant':
             prompt += f"assistant: {content}\n"
@@ -276,6 +372,10 @@ def gen_mock_stream(prompt, max_tokens, temperature):
 
     logger.info(f"Starting MOCK stream generation for prompt length: {len(prompt)}")
 
+    start_time = time.time()
+    ttft_ms = None
+    sent = 0
+    finished = False
     try:
         yield f"data: {json.dumps({'id': request_id, 'object': 'doc_forge.completion.chunk',
                                    'created': timestamp, 'model': model_name,
@@ -289,12 +389,16 @@ def gen_mock_stream(prompt, max_tokens, temperature):
         for i, word in enumerate(words):
             # 模拟打字效果
             chunk_text = word + (" " if i < len(words) - 1 else "")
+            if ttft_ms is None:
+                ttft_ms = (time.time() - start_time) * 1000
+            sent += 1
             yield f"data: {json.dumps({'id': request_id, 'object': 'doc_forge.completion.chunk',
                                        'created': timestamp, 'model': model_name,
                                        'choices': [{'index': 0, 'delta': {'content': chunk_text}, 'finish_reason': None}]}, ensure_ascii=False)}\n\n"
             time.sleep(0.05)  # 模拟流式输出的延迟
 
         logger.info(f"Mock stream generation completed: {mock_response[:100]}...")
+        finished = True
 
         yield f"data: {json.dumps({'id': request_id, 'object': 'doc_forge.completion.chunk',
                                    'created': timestamp, 'model': model_name,
@@ -307,10 +411,29 @@ def gen_mock_stream(prompt, max_tokens, temperature):
                                    'created': timestamp, 'model': model_name,
                                    'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}, ensure_ascii=False)}\n\n"
         yield "data: [DONE]\n\n"
+    finally:
+        stream_metrics.record(ttft_ms, sent, time.time() - start_time, cancelled=not finished)
+
+
+def _stream_chunk(request_id, timestamp, delta, finish_reason=None):
+    """构造一条 SSE chunk"""
+    return f"data: {json.dumps({'id': request_id, 'object': 'doc_forge.completion.chunk',
+                               'created': timestamp, 'model': model_name,
+                               'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]},
+                              ensure_ascii=False)}\n\n"
 
 
 def gen_stream(prompt, max_tokens, temperature):
-    """生成流式响应的生成器函数"""
+    """生成流式响应的生成器函数
+
+    generate 在后台线程运行，TextIteratorStreamer 在生成过程中逐段解码输出
+    （未凑齐的多字节 UTF-8 字符会等到后续 token 到达后再输出）；
+    客户端断开时生成器被关闭，通过 StoppingCriteria 终止 generate。
+    启用连续批处理时由调度器统一生成。
+    """
+    if scheduler is not None:
+        yield from gen_batched_stream(prompt, max_tokens, temperature)
+        return
     if is_mock:
         yield from gen_mock_stream(prompt, max_tokens, temperature)
         return
@@ -320,57 +443,114 @@ def gen_stream(prompt, max_tokens, temperature):
 
     logger.info(f"Starting stream generation for prompt length: {len(prompt)}")
 
+    start_time = time.time()
+    ttft_ms = None
+    finished = False
+    cancel_event = threading.Event()
+    criteria = None
+    worker = None
     try:
-        yield f"data: {json.dumps({'id': request_id, 'object': 'doc_forge.completion.chunk',
-                                   'created': timestamp, 'model': model_name,
-                                   'choices': [{'index': 0, 'delta': {'role': 'assistant'}, 'finish_reason': None}]})}\n\n"
+        yield _stream_chunk(request_id, timestamp, {'role': 'assistant'})
 
         inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=2048)
         prompt_length = len(inputs['input_ids'][0])
 
         logger.info(f"Input tokens: {prompt_length}, max_new_tokens: {max_tokens}")
 
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=max_tokens,
-                temperature=temperature,
-                do_sample=True,
-                pad_token_id=tokenizer.eos_token_id,
-                repetition_penalty=1.1,
-                early_stopping=True,
-                return_dict_in_generate=True,
-                output_scores=False
-            )
-
-        generated_ids = outputs.sequences[0]
-        total_length = len(generated_ids)
-        logger.info(f"Generated {total_length - prompt_length} new tokens")
-        accumulated_text = ""
-        for i in range(prompt_length, total_length):
-            token_id = generated_ids[i].unsqueeze(0)
-            token_text = tokenizer.decode(token_id, skip_special_tokens=True,
-                                          clean_up_tokenization_spaces=False)
-            if token_text.strip():
-                accumulated_text += token_text
-                yield f"data: {json.dumps({'id': request_id, 'object': 'doc_forge.completion.chunk',
-                                           'created': timestamp, 'model': model_name,
-                                           'choices': [{'index': 0, 'delta': {'content': token_text}, 'finish_reason': None}]}, ensure_ascii=False)}\n\n"
-                time.sleep(0.01)
-
-        logger.info(f"Stream generation completed: {accumulated_text[:100]}...")
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, timeout=STREAM_TOKEN_TIMEOUT,
+                                        skip_special_tokens=True, clean_up_tokenization_spaces=False)
+        criteria = CancelCriteria(cancel_event, prompt_length)
+        prefix_kwargs, cached_len = prefix_generate_kwargs(inputs["input_ids"])
+        gen_kwargs = dict(
+            **inputs,
+            **prefix_kwargs,
+            max_new_tokens=max_tokens,
+            temperature=temperature,
+            do_sample=True,
+            pad_token_id=tokenizer.eos_token_id,
+            repetition_penalty=1.1,
+            streamer=streamer,
+            stopping_criteria=StoppingCriteriaList([criteria]),
+            return_dict_in_generate=True,
+        )
 
-        yield f"data: {json.dumps({'id': request_id, 'object': 'doc_forge.completion.chunk',
-                                   'created': timestamp, 'model': model_name,
-                                   'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}, ensure_ascii=False)}\n\n"
+        def _generate():
+            try:
+                with torch.no_grad():
+                    outputs = model.generate(**gen_kwargs)
+                save_prefix(inputs["input_ids"], outputs, cached_len)
+            except Exception as ex:
+                logger.error(f"Stream generation thread error: {str(ex)}")
+                streamer.end()
+
+        worker = threading.Thread(target=_generate, name=f"gen-{request_id}", daemon=True)
+        worker.start()
+
+        accumulated_text = []
+        for token_text in streamer:
+            if not token_text:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.time() - start_time) * 1000
+            accumulated_text.append(token_text)
+            yield _stream_chunk(request_id, timestamp, {'content': token_text})
+
+        finished = True
+        logger.info(f"Stream generation completed, new_tokens={criteria.new_tokens}, "
+                    f"ttft_ms={ttft_ms or 0:.0f}: {''.join(accumulated_text)[:100]}...")
+
+        yield _stream_chunk(request_id, timestamp, {}, 'stop')
         yield "data: [DONE]\n\n"
 
+    except GeneratorExit:
+        # 客户端断开连接
+        logger.info(f"Client disconnected, cancel generation: {request_id}")
+        raise
     except Exception as e:
         logger.error(f"Stream generation error: {str(e)}")
-        yield f"data: {json.dumps({'id': request_id, 'object': 'doc_forge.completion.chunk',
-                                   'created': timestamp, 'model': model_name,
-                                   'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}, ensure_ascii=False)}\n\n"
+        yield _stream_chunk(request_id, timestamp, {}, 'stop')
         yield "data: [DONE]\n\n"
+    finally:
+        cancel_event.set()
+        if worker is not None:
+            worker.join(timeout=5)
+        stream_metrics.record(ttft_ms, criteria.new_tokens if criteria else 0,
+                              time.time() - start_time, cancelled=not finished)
+
+
+def gen_batched_stream(prompt, max_tokens, temperature):
+    """连续批处理模式的流式响应：请求提交给调度器，逐段读取生成文本；客户端断开时取消请求"""
+    request_id = f"chatcmpl-{uuid.uuid4().hex[:8]}"
+    timestamp = int(time.time())
+
+    start_time = time.time()
+    ttft_ms = None
+    finished = False
+    req = None
+    try:
+        yield _stream_chunk(request_id, timestamp, {'role': 'assistant'})
+        req = scheduler.submit(prompt, max_tokens, temperature)
+        for text in req.stream():
+            if ttft_ms is None:
+                ttft_ms = (time.time() - start_time) * 1000
+            yield _stream_chunk(request_id, timestamp, {'content': text})
+        finished = True
+        logger.info(f"Batched stream completed, request_id={request_id}, "
+                    f"new_tokens={req.completion_tokens}, ttft_ms={ttft_ms or 0:.0f}")
+        yield _stream_chunk(request_id, timestamp, {}, 'length' if req.finish_reason == 'length' else 'stop')
+        yield "data: [DONE]\n\n"
+    except GeneratorExit:
+        logger.info(f"Client disconnected, cancel generation: {request_id}")
+        raise
+    except Exception as e:
+        logger.error(f"Batched stream generation error: {str(e)}")
+        yield _stream_chunk(request_id, timestamp, {}, 'stop')
+        yield "data: [DONE]\n\n"
+    finally:
+        if req is not None:
+            req.cancel()
+        stream_metrics.record(ttft_ms, req.completion_tokens if req else 0,
+                              time.time() - start_time, cancelled=not finished)
 
 
 def gen_normal_response(prompt, max_tokens, temperature):
@@ -379,7 +559,12 @@ def gen_normal_response(prompt, max_tokens, temperature):
     timestamp = int(time.time())
 
     try:
-        if is_mock:
+        if scheduler is not None:
+            req = scheduler.submit(prompt, max_tokens, temperature)
+            response_text = req.result().strip()
+            prompt_tokens = req.prompt_tokens
+            completion_tokens = req.completion_tokens
+        elif is_mock:
             response_text = generate_mock_response(prompt, max_tokens, temperature)
             prompt_tokens = len(prompt.split())  # 简单估算
             completion_tokens = len(response_text.split())
@@ -494,6 +679,11 @@ def health_check():
         "model_loaded": not is_mock,  # mock模式下显示模型未真实加载
         "mock_mode": is_mock,
         "model": model_name,
+        "stream": stream_metrics.snapshot(),  # 最近流式请求的 TTFT 与 tokens/s
+        # 连续批处理：排队请求数、运行批次占用率
+        "scheduler": scheduler.stats() if scheduler is not None else None,
+        # prompt 前缀 KV cache 命中统计
+        "prefix_cache": prefix_cache.stats() if prefix_cache is not None else None,
         "timestamp": int(time.time())
     }
     return Response(
@@ -524,8 +714,26 @@ def welcome():
     )
 
 
+def start_scheduler():
+    """启动前缀缓存与连续批处理调度器"""
+    global scheduler, prefix_cache
+    if not is_mock and prefix_cache_mb > 0:
+        prefix_cache = PrefixCache(prefix_cache_mb * 1024 * 1024, prefix_block_size)
+        logger.info(f"Prefix KV cache enabled, max_mb={prefix_cache_mb}, block_size={prefix_block_size}")
+    if not batching:
+        logger.info("Continuous batching disabled")
+        return
+    if is_mock:
+        backend = MockBatchBackend(lambda p, n, t: mock_response_text(p, t), step_ms=mock_step_ms)
+    else:
+        backend = HFBatchBackend(model, tokenizer, prefix_cache=prefix_cache)
+    scheduler = BatchScheduler(backend, max_batch_size)
+    logger.info(f"Continuous batching scheduler started, max_batch_size={max_batch_size}, mock_mode={is_mock}")
+
+
 # 在应用启动时加载模型
 load_model()
+start_scheduler()
 
 if __name__ == '__main__':
     # port = get_console_arg1()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+"""
+连续批处理（continuous batching）调度器
+调度线程在每个解码步之间把排队的请求加入共享的运行批次，完成或取消的请求立即移出，
+每个请求有自己的 max_tokens / temperature，生成的文本逐段推送给等待中的请求线程。
+
+后端:
+  HFBatchBackend    transformers 模型，左填充 + KV cache 按批次合并/裁剪，CPU 可用；
+                    可选 PrefixCache 复用相同 prompt 前缀的 KV
+  MockBatchBackend  Mock 模式，无模型，按固定步长模拟逐 token 生成，用于无 GPU 压测
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from apps.llm.prefix_cache import cache_object, legacy_kv
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 8
+# 请求线程等待下一段文本的最长时间（秒）
+DEFAULT_STREAM_TIMEOUT = 120
+
+_END = object()
+
+
+class GenRequest:
+    """一次生成请求，请求线程通过 stream() 读取增量文本"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, prompt, max_tokens, temperature):
+        self.id = next(self._ids)
+        self.prompt = prompt
+        self.max_tokens = max(1, int(max_tokens))
+        self.temperature = float(temperature)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.finish_reason = None
+        self.submitted_at = time.time()
+        self.first_token_at = None
+        self.tokens = []
+        self._prefix_offset = 0
+        self._read_offset = 0
+        self._out = queue.Queue()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """客户端断开时调用，调度线程在下一个解码步释放该请求"""
+        self._cancelled.set()
+
+    def stream(self, timeout=DEFAULT_STREAM_TIMEOUT):
+        """逐段返回生成的文本，生成结束后返回；调度出错时抛出异常"""
+        while True:
+            try:
+                item = self._out.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"generation timeout, request_id={self.id}")
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def result(self, timeout=DEFAULT_STREAM_TIMEOUT):
+        return "".join(self.stream(timeout))
+
+    def _push_token(self, token, backend):
+        """追加 token 并增量解码：未凑齐的多字节字符（解码为 U+FFFD）暂不输出"""
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+        self.tokens.append(token)
+        self.completion_tokens += 1
+        prefix_text = backend.detokenize(self.tokens[self._prefix_offset:self._read_offset])
+        new_text = backend.detokenize(self.tokens[self._prefix_offset:])
+        if len(new_text) > len(prefix_text) and not new_text.endswith("\ufffd"):
+            self._out.put(new_text[len(prefix_text):])
+            self._prefix_offset = self._read_offset
+            self._read_offset = len(self.tokens)
+
+    def _finish(self, reason, error=None):
+        self.finish_reason = reason
+        if error is not None:
+            self._out.put(error)
+        self._out.put(_END)
+
+
+class BatchScheduler:
+    """连续批处理调度器，单个后台线程驱动后端逐步解码"""
+
+    def __init__(self, backend, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        self.backend = backend
+        self.max_batch_size = max(1, int(max_batch_size))
+        self._waiting = deque()
+        self._running = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._stats = {"admitted": 0, "finished": 0, "cancelled": 0, "failed": 0,
+                       "steps": 0, "tokens": 0, "occupied_slots": 0}
+        self._thread = threading.Thread(target=self._loop, name="batch_scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt, max_tokens, temperature) -> GenRequest:
+        req = GenRequest(prompt, max_tokens, temperature)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("scheduler stopped")
+            self._waiting.append(req)
+            self._cond.notify()
+        return req
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._waiting)
+            stats["running"] = len(self._running)
+        steps = stats.pop("steps")
+        occupied = stats.pop("occupied_slots")
+        stats["max_batch_size"] = self.max_batch_size
+        stats["batch_occupancy"] = round(stats["running"] / self.max_batch_size, 3)
+        stats["batch_occupancy_avg"] = round(occupied / steps / self.max_batch_size, 3) if steps else 0.0
+        stats["decode_steps"] = steps
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._waiting and not self._running:
+                    self._cond.wait()
+                if self._stopped:
+                    pending = list(self._waiting) + self._running
+                    self._waiting.clear()
+                    break
+                admit = []
+                while self._waiting and len(self._running) + len(admit) < self.max_batch_size:
+                    req = self._waiting.popleft()
+                    if req.cancelled:
+                        self._stats["cancelled"] += 1
+                        req._finish("cancelled")
+                        continue
+                    admit.append(req)
+
+            try:
+                self._release_cancelled()
+                if admit:
+                    # 新请求 prefill 后并入运行批次，首个 token 同步产出
+                    first_tokens = self.backend.prefill(admit)
+                    with self._cond:
+                        self._running.extend(admit)
+                        self._stats["admitted"] += len(admit)
+                    self._accept(first_tokens)
+                if self._running:
+                    running = len(self._running)
+                    next_tokens = self.backend.decode(list(self._running))
+                    with self._cond:
+                        self._stats["steps"] += 1
+                        self._stats["occupied_slots"] += running
+                    self._accept(next_tokens)
+            except Exception as e:
+                logger.exception("batch step failed, running=%d, admit=%d", len(self._running), len(admit))
+                failed = self._running + [r for r in admit if r not in self._running]
+                with self._cond:
+                    self._running = []
+                    self._stats["failed"] += len(failed)
+                self.backend.reset()
+                for req in failed:
+                    req._finish("error", e)
+
+        for req in pending:
+            req._finish("cancelled")
+
+    def _accept(self, tokens: dict):
+        """处理本步产出的 token，达到 eos / max_tokens 的请求移出批次"""
+        done = []
+        for req, token in tokens.items():
+            if token == self.backend.eos_token_id:
+                done.append((req, "stop"))
+                continue
+            req._push_token(token, self.backend)
+            if req.completion_tokens >= req.max_tokens:
+                done.append((req, "length"))
+        with self._cond:
+            self._stats["tokens"] += len(tokens)
+        for req, reason in done:
+            self._release(req, reason)
+
+    def _release_cancelled(self):
+        for req in [r for r in self._running if r.cancelled]:
+            self._release(req, "cancelled")
+
+    def _release(self, req, reason):
+        self.backend.release(req)
+        with self._cond:
+            self._running.remove(req)
+            self._stats["cancelled" if reason == "cancelled" else "finished"] += 1
+        req._finish(reason)
+
+
+class MockBatchBackend:
+    """Mock 后端：每个请求的输出为 respond(prompt) 的逐字切分；
+    每个解码步耗时 step_ms（与批大小基本无关，模拟 GPU/CPU 批量矩阵运算），用于无模型压测"""
+
+    eos_token_id = None
+
+    def __init__(self, respond, step_ms=20.0, prefill_ms=5.0):
+        self.respond = respond
+        self.step_s = step_ms / 1000
+        self.prefill_s = prefill_ms / 1000
+        self._pending = {}  # req -> 剩余待输出字符
+
+    def prefill(self, reqs):
+        time.sleep(self.prefill_s)
+        out = {}
+        for req in reqs:
+            text = list(self.respond(req.prompt, req.max_tokens, req.temperature)) or [""]
+            req.prompt_tokens = len(req.prompt.split())
+            self._pending[req] = deque(text)
+            out[req] = self._next(req)
+        return out
+
+    def decode(self, reqs):
+        time.sleep(self.step_s)
+        return {req: self._next(req) for req in reqs}
+
+    def release(self, req):
+        self._pending.pop(req, None)
+
+    def reset(self):
+        self._pending.clear()
+
+    @staticmethod
+    def detokenize(tokens):
+        return "".join(tokens)
+
+    def _next(self, req):
+        pending = self._pending[req]
+        return pending.popleft() if pending else self.eos_token_id
+
+
+class HFBatchBackend:
+    """transformers 后端：prompt 左填充后 prefill，KV cache 在 batch 维度拼接；
+    解码时按 attention_mask 计算每行的 position_ids，请求移出后裁剪全批都为填充的前导列"""
+
+    def __init__(self, model, tokenizer, max_prompt_tokens=2048, repetition_penalty=1.1,
+                 prefix_cache=None):
+        import torch
+        self.torch = torch
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_cache = prefix_cache
+        self.max_prompt_tokens = max_prompt_tokens
+        self.repetition_penalty = repetition_penalty
+        self.eos_token_id = tokenizer.eos_token_id
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        self.reset()
+
+    def reset(self):
+        self._rows = []
+        self._cache = None   # [(k, v)]，k/v: [B, H, T, D]
+        self._mask = None    # [B, T]
+        self._last = None    # [B, 1] 下一步的输入 token
+        self._history = {}   # req -> 已出现的 token id（重复惩罚用）
+
+    def prefill(self, reqs):
+        if self.prefix_cache is not None:
+            # 启用前缀缓存时逐个 prefill：命中的前缀直接复用 KV，只计算剩余 token
+            out = {}
+            for req in reqs:
+                out.update(self._prefill_cached(req))
+            return out
+
+        torch = self.torch
+        self.tokenizer.padding_side = "left"
+        enc = self.tokenizer([r.prompt for r in reqs], return_tensors="pt", padding=True,
+                             truncation=True, max_length=self.max_prompt_tokens)
+        mask = enc["attention_mask"]
+        for i, req in enumerate(reqs):
+            req.prompt_tokens = int(mask[i].sum())
+            self._history[req] = set(enc["input_ids"][i][mask[i].bool()].tolist())
+
+        with torch.no_grad():
+            out = self.model(input_ids=enc["input_ids"], attention_mask=mask,
+                             position_ids=self._positions(mask), use_cache=True)
+        tokens = self._sample(out.logits[:, -1, :], reqs)
+        self._merge(reqs, legacy_kv(out.past_key_values), mask, tokens)
+        return dict(zip(reqs, tokens.tolist()))
+
+    def _prefill_cached(self, req):
+        torch = self.torch
+        ids = self.tokenizer(req.prompt, return_tensors="pt", truncation=True,
+                             max_length=self.max_prompt_tokens)["input_ids"]
+        token_ids = ids[0].tolist()
+        req.prompt_tokens = len(token_ids)
+        self._history[req] = set(token_ids)
+
+        cached_len, past = self.prefix_cache.lookup(token_ids)
+        mask = torch.ones((1, len(token_ids)), dtype=torch.long)
+        with torch.no_grad():
+            out = self.model(input_ids=ids[:, cached_len:], attention_mask=mask,
+                             past_key_values=cache_object(past) if past is not None else None,
+                             position_ids=torch.arange(cached_len, len(token_ids)).unsqueeze(0),
+                             use_cache=True)
+        cache = legacy_kv(out.past_key_values)
+        self.prefix_cache.insert(token_ids, cache, cached_len)
+        tokens = self._sample(out.logits[:, -1, :], [req])
+        self._merge([req], cache, mask, tokens)
+        return {req: int(tokens[0])}
+
+    def decode(self, reqs):
+        torch = self.torch
+        mask = torch.cat([self._mask, self._mask.new_ones((len(self._rows), 1))], dim=1)
+        with torch.no_grad():
+            out = self.model(input_ids=self._last, attention_mask=mask,
+                             past_key_values=cache_object(self._cache),
+                             position_ids=mask.sum(dim=1, keepdim=True) - 1, use_cache=True)
+        tokens = self._sample(out.logits[:, -1, :], self._rows)
+        self._cache = legacy_kv(out.past_key_values)
+        self._mask = mask
+        self._last = tokens.unsqueeze(1)
+        return dict(zip(self._rows, tokens.tolist()))
+
+    def release(self, req):
+        torch = self.torch
+        self._history.pop(req, None)
+        if req not in self._rows:
+            return
+        keep = [i for i, r in enumerate(self._rows) if r is not req]
+        self._rows = [self._rows[i] for i in keep]
+        if not keep:
+            self.reset()
+            return
+        idx = torch.tensor(keep)
+        mask = self._mask.index_select(0, idx)
+        # 裁剪剩余请求全为填充的前导列
+        start = int((mask.sum(dim=0) > 0).nonzero()[0])
+        self._mask = mask[:, start:]
+        self._last = self._last.index_select(0, idx)
+        self._cache = [(k.index_select(0, idx)[:, :, start:], v.index_select(0, idx)[:, :, start:])
+                       for k, v in self._cache]
+
+    def detokenize(self, tokens):
+        return self.tokenizer.decode(tokens, skip_special_tokens=True, clean_up_tokenization_spaces=False)
+
+    def _merge(self, reqs, cache, mask, tokens):
+        """新请求的 KV cache 左填充到与运行批次等长后在 batch 维度拼接"""
+        torch = self.torch
+        self._rows.extend(reqs)
+        if self._cache is None:
+            self._cache, self._mask, self._last = cache, mask, tokens.unsqueeze(1)
+            return
+        old_len, new_len = self._mask.shape[1], mask.shape[1]
+        width = max(old_len, new_len)
+
+        def pad(t, n, dim):
+            if n == 0:
+                return t
+            shape = list(t.shape)
+            shape[dim] = n
+            return torch.cat([t.new_zeros(shape), t], dim=dim)
+
+        self._cache = [(torch.cat([pad(ok, width - old_len, 2), pad(nk, width - new_len, 2)]),
+                        torch.cat([pad(ov, width - old_len, 2), pad(nv, width - new_len, 2)]))
+                       for (ok, ov), (nk, nv) in zip(self._cache, cache)]
+        self._mask = torch.cat([pad(self._mask, width - old_len, 1), pad(mask, width - new_len, 1)])
+        self._last = torch.cat([self._last, tokens.unsqueeze(1)])
+
+    def _positions(self, mask):
+        return (mask.cumsum(dim=1) - 1).clamp(min=0)
+
+    def _sample(self, logits, reqs):
+        """逐行应用重复惩罚与温度；temperature <= 0.1 时贪心解码"""
+        torch = self.torch
+        logits = logits.float()
+        tokens = []
+        for i, req in enumerate(reqs):
+            row = logits[i]
+            seen = self._history.get(req)
+            if seen and self.repetition_penalty != 1.0:
+                idx = torch.tensor(list(seen))
+                score = row[idx]
+                row[idx] = torch.where(score < 0, score * self.repetition_penalty,
+                                       score / self.repetition_penalty)
+            if req.temperature <= 0.1:
+                token = int(row.argmax())
+            else:
+                probs = torch.softmax(row / req.temperature, dim=-1)
+                token = int(torch.multinomial(probs, 1))
+            if seen is not None:
+                seen.add(token)
+            tokens.append(token)
+        return torch.tensor(tokens)
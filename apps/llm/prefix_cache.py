@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+"""
+Prompt 前缀 KV cache
+按固定 token 块对 prompt 做链式哈希，缓存前缀的 past key/values；新请求与已缓存前缀的
+任一块边界一致时，直接复用该前缀的 KV，只需 prefill 剩余部分。
+按条目 LRU 淘汰，总占用不超过 max_bytes。
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 32
+DEFAULT_MAX_MB = 512
+
+
+class _Entry:
+    def __init__(self, kv, length, hashes, nbytes):
+        self.kv = kv            # [(k, v)]，k/v: [1, H, length, D]
+        self.length = length
+        self.hashes = hashes    # 该条目覆盖的各块边界哈希
+        self.nbytes = nbytes
+
+
+class PrefixCache:
+    """token 前缀 → past key/values 的 LRU 缓存（线程安全）"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, block_size=DEFAULT_BLOCK_SIZE):
+        self.max_bytes = max_bytes
+        self.block_size = max(1, block_size)
+        self._entries = OrderedDict()   # 最长块边界哈希 -> _Entry
+        self._index = {}                # 任一块边界哈希 -> (_Entry, 前缀长度)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "hit_tokens": 0, "lookup_tokens": 0,
+                       "inserts": 0, "evictions": 0}
+
+    def lookup(self, token_ids):
+        """返回 (前缀长度, kv)，kv 已截断到该长度；未命中返回 (0, None)。
+
+        至少保留最后一个 token 不命中，保证调用方仍有输入可以 prefill 出 logits。
+        """
+        hashes = self._block_hashes(token_ids, len(token_ids) - 1)
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats["lookup_tokens"] += len(token_ids)
+            for h in reversed(hashes):
+                hit = self._index.get(h)
+                if hit is None:
+                    continue
+                entry, length = hit
+                self._entries.move_to_end(entry.hashes[-1])
+                self._stats["hits"] += 1
+                self._stats["hit_tokens"] += length
+                break
+            else:
+                return 0, None
+        if length == entry.length:
+            return length, entry.kv
+        return length, [(k[:, :, :length], v[:, :, :length]) for k, v in entry.kv]
+
+    def insert(self, token_ids, kv, cached_len=0):
+        """缓存 token_ids 的最长块对齐前缀（不含最后一个 token）。
+
+        kv 至少覆盖该前缀；cached_len 为本次命中的前缀长度，已完整覆盖时不重复存储。
+        """
+        hashes = self._block_hashes(token_ids, len(token_ids) - 1)
+        if not hashes:
+            return
+        length = len(hashes) * self.block_size
+        if length <= cached_len:
+            return
+        with self._lock:
+            if hashes[-1] in self._entries:
+                self._entries.move_to_end(hashes[-1])
+                return
+
+        # 复制出独立存储，避免视图引用整段 KV 导致内存无法释放
+        kv = [(_copy(k[:, :, :length]), _copy(v[:, :, :length])) for k, v in kv]
+        nbytes = sum(_nbytes(k) + _nbytes(v) for k, v in kv)
+        if nbytes > self.max_bytes:
+            return
+        entry = _Entry(kv, length, hashes, nbytes)
+        with self._lock:
+            self._entries[hashes[-1]] = entry
+            for i, h in enumerate(hashes):
+                self._index[h] = (entry, (i + 1) * self.block_size)
+            self._bytes += nbytes
+            self._stats["inserts"] += 1
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        stats["max_bytes"] = self.max_bytes
+        stats["hit_token_ratio"] = round(stats["hit_tokens"] / stats["lookup_tokens"], 3) \
+            if stats["lookup_tokens"] else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        _, entry = self._entries.popitem(last=False)
+        self._bytes -= entry.nbytes
+        self._stats["evictions"] += 1
+        for h in entry.hashes:
+            hit = self._index.get(h)
+            if hit is not None and hit[0] is entry:
+                # 较短的边界可能仍被其他条目覆盖，指向其中最近使用的一个
+                other = next((e for e in reversed(self._entries.values()) if h in e.hashes), None)
+                if other is None:
+                    del self._index[h]
+                else:
+                    self._index[h] = (other, hit[1])
+
+    def _block_hashes(self, token_ids, limit):
+        """前 limit 个 token 中每个完整块边界的链式哈希"""
+        hashes = []
+        prev = b""
+        for end in range(self.block_size, limit + 1, self.block_size):
+            block = ",".join(str(int(t)) for t in token_ids[end - self.block_size:end])
+            prev = hashlib.sha1(prev + block.encode()).digest()
+            hashes.append(prev)
+        return hashes
+
+
+def legacy_kv(past_key_values):
+    """统一为 [(k, v)] 形式，兼容 transformers 的 Cache 对象"""
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return list(past_key_values.to_legacy_cache())
+    return list(past_key_values)
+
+
+def cache_object(kv):
+    """[(k, v)] 转为模型 forward / generate 接受的 past_key_values"""
+    try:
+        from transformers import DynamicCache
+        return DynamicCache.from_legacy_cache(tuple(kv))
+    except ImportError:
+        return tuple(kv)
+
+
+def _copy(t):
+    return t.clone() if hasattr(t, "clone") else t.copy()
+
+
+def _nbytes(t):
+    nbytes = getattr(t, "nbytes", None)
+    if nbytes is None:
+        nbytes = t.numel() * t.element_size()
+    return int(nbytes)
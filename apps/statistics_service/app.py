@@ -8,9 +8,7 @@
 """
 import os
 import sys
-import sqlite3
 import logging.config
-from datetime import datetime
 
 import requests
 import urllib3
@@ -24,6 +22,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 from common.sys_init import init_yml_cfg
 from common.cm_utils import get_console_arg1
 from common.i18n import get_msg
+from apps.statistics_service.stats_store import StatsStore, COUNTER_FIELDS
 
 # ---------------------------------------------------------------------------
 # 日志
@@ -42,35 +41,6 @@ logger = logging.getLogger(__name__)
 my_cfg = init_yml_cfg()
 STS_DB_FILE = "statistics.db"
 
-# ---------------------------------------------------------------------------
-# 数据库初始化
-# ---------------------------------------------------------------------------
-def init_db():
-    with sqlite3.connect(STS_DB_FILE) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS statistics (
-                id INTEGER NOT NULL UNIQUE,
-                uid INTEGER NOT NULL,
-                nickname TEXT NOT NULL,
-                app TEXT NOT NULL DEFAULT '',
-                date TEXT NOT NULL,
-                access_count INTEGER NOT NULL DEFAULT 0,
-                input_token INTEGER NOT NULL DEFAULT 0,
-                output_token INTEGER NOT NULL DEFAULT 0,
-                embedding_token INTEGER NOT NULL DEFAULT 0,
-                PRIMARY KEY("id" AUTOINCREMENT)
-            )
-        """)
-        conn.commit()
-        # 兼容旧表：如果旧表缺少 app 列，则自动添加
-        try:
-            conn.execute("ALTER TABLE statistics ADD COLUMN app TEXT NOT NULL DEFAULT ''")
-            conn.commit()
-        except sqlite3.OperationalError:
-            pass  # 列已存在，忽略
-
-init_db()
-
 # ---------------------------------------------------------------------------
 # FastAPI 应用
 # ---------------------------------------------------------------------------
@@ -100,6 +70,17 @@ class TokenRequest(BaseModel):
     app: str = Field("", description="来源应用名称")
 
 
+class CounterItem(BaseModel):
+    uid: int = Field(..., description="用户 ID")
+    app: str = Field("", description="来源应用名称")
+    field: str = Field(..., description="计数字段: " + ", ".join(COUNTER_FIELDS))
+    count: int = Field(..., description="增量")
+
+
+class BulkRequest(BaseModel):
+    items: list[CounterItem] = Field(..., description="计数增量列表")
+
+
 # ---------------------------------------------------------------------------
 # 工具函数
 # ---------------------------------------------------------------------------
@@ -124,47 +105,18 @@ def _get_user_name(uid: int) -> str:
     return ''
 
 
-def _ensure_row(conn, uid: int, nickname: str, date: str, app_name: str = ""):
-    """确保当天该 uid 的记录存在，返回当前记录"""
-    cur = conn.execute(
-        "SELECT access_count, input_token, output_token, embedding_token, app "
-        "FROM statistics WHERE uid=? AND date=? AND app=?",
-        (uid, date, app_name)
-    )
-    row = cur.fetchone()
-    if row:
-        return row
-    conn.execute(
-        "INSERT INTO statistics (uid, nickname, date, app) VALUES (?, ?, ?, ?)",
-        (uid, nickname, date, app_name)
-    )
-    conn.commit()
-    return 0, 0, 0, 0, app_name
+# 持久连接 + UPSERT；nickname 按 TTL 缓存
+store = StatsStore(STS_DB_FILE, _get_user_name)
 
 
 def _add_field(uid: int, field: str, count: int, app_name: str = "") -> bool:
     """通用：给 uid 的当天记录累加某个字段"""
     if not count or not uid:
         return False
-    nickname = _get_user_name(uid)
-    if not nickname:
-        logger.error(f"cannot_get_nickname_for_uid={uid}")
-        return False
-    today = datetime.today().strftime('%Y-%m-%d')
-    with sqlite3.connect(STS_DB_FILE) as conn:
-        try:
-            _ensure_row(conn, uid, nickname, today, app_name)
-            conn.execute(
-                f"UPDATE statistics SET {field}={field}+? WHERE uid=? AND date=? AND app=?",
-                (count, uid, today, app_name)
-            )
-            conn.commit()
-            logger.info(f"add_{field}_success, uid={uid}, count={count}, app={app_name}")
-            return True
-        except Exception as e:
-            conn.rollback()
-            logger.exception(f"add_{field}_failed, uid={uid}, err={e}")
-    return False
+    success = store.add(uid, field, count, app_name)
+    if success:
+        logger.info(f"add_{field}_success, uid={uid}, count={count}, app={app_name}")
+    return success
 
 
 # ---------------------------------------------------------------------------
@@ -207,15 +159,18 @@ def add_embedding_token(req: TokenRequest):
     return {"status": "ok"}
 
 
+@app.post("/statistics/bulk")
+def add_bulk(req: BulkRequest):
+    """批量记录计数增量（common.statistic_util 后台聚合提交）"""
+    applied, failed = store.add_many([(item.uid, item.app, item.field, item.count) for item in req.items])
+    logger.info(f"add_bulk, applied={applied}, failed={failed}")
+    return {"status": "ok", "applied": applied, "failed": failed}
+
+
 @app.get("/statistics/list")
 def get_list():
     """获取统计数据列表（最近100条）"""
-    with sqlite3.connect(STS_DB_FILE) as conn:
-        cur = conn.execute(
-            "SELECT uid, nickname, app, date, access_count, input_token, output_token, embedding_token "
-            "FROM statistics ORDER BY date DESC LIMIT 100"
-        )
-        rows = cur.fetchall()
+    rows = store.list(100)
     result = []
     for row in rows:
         result.append({
@@ -234,12 +189,7 @@ def get_list():
 @app.get("/statistics/user/{uid}")
 def get_by_uid(uid: int):
     """获取指定用户的统计数据"""
-    with sqlite3.connect(STS_DB_FILE) as conn:
-        cur = conn.execute(
-            "SELECT uid, nickname, app, date, access_count, input_token, output_token "
-            "FROM statistics WHERE uid=? LIMIT 1", (uid,)
-        )
-        row = cur.fetchone()
+    row = store.get_by_uid(uid)
     if not row:
         raise HTTPException(status_code=404, detail=get_msg('backend.user_stats_not_found'))
     return {
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+
+"""
+统计数据存储 - SQLite
+(uid, date, app) 唯一，计数累加使用单条 UPSERT；进程内复用一个 WAL 模式的连接；
+uid -> nickname 查询结果按 TTL 缓存，避免每次累加都请求 auth_service。
+"""
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# 允许累加的计数字段
+COUNTER_FIELDS = ("access_count", "input_token", "output_token", "embedding_token")
+NICKNAME_TTL_S = 600
+
+
+class StatsStore:
+    """统计数据读写，线程安全"""
+
+    def __init__(self, db_path: str, name_resolver: Callable[[int], str], nickname_ttl: float = NICKNAME_TTL_S):
+        self.db_path = db_path
+        self.name_resolver = name_resolver
+        self.nickname_ttl = nickname_ttl
+        self._nicknames: dict[int, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+
+    def _init_schema(self):
+        conn = self._conn
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS statistics (
+                id INTEGER NOT NULL UNIQUE,
+                uid INTEGER NOT NULL,
+                nickname TEXT NOT NULL,
+                app TEXT NOT NULL DEFAULT '',
+                date TEXT NOT NULL,
+                access_count INTEGER NOT NULL DEFAULT 0,
+                input_token INTEGER NOT NULL DEFAULT 0,
+                output_token INTEGER NOT NULL DEFAULT 0,
+                embedding_token INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY("id" AUTOINCREMENT)
+            )
+        """)
+        conn.commit()
+        # 兼容旧表：如果旧表缺少 app 列，则自动添加
+        try:
+            conn.execute("ALTER TABLE statistics ADD COLUMN app TEXT NOT NULL DEFAULT ''")
+            conn.commit()
+        except sqlite3.OperationalError:
+            pass  # 列已存在，忽略
+        self._merge_duplicates()
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_statistics_uid_date_app ON statistics(uid, date, app)")
+        conn.commit()
+
+    def _merge_duplicates(self):
+        """旧表可能存在同一 (uid, date, app) 的多行，建唯一索引前合并到 id 最小的一行"""
+        conn = self._conn
+        dups = conn.execute(
+            "SELECT uid, date, app, MIN(id) FROM statistics GROUP BY uid, date, app HAVING COUNT(*) > 1"
+        ).fetchall()
+        if not dups:
+            return
+        sums = ", ".join(f"{f}=(SELECT SUM({f}) FROM statistics WHERE uid=? AND date=? AND app=?)"
+                         for f in COUNTER_FIELDS)
+        for uid, date, app, keep_id in dups:
+            conn.execute(f"UPDATE statistics SET {sums} WHERE id=?",
+                         (*[v for _ in COUNTER_FIELDS for v in (uid, date, app)], keep_id))
+            conn.execute("DELETE FROM statistics WHERE uid=? AND date=? AND app=? AND id<>?",
+                         (uid, date, app, keep_id))
+        conn.commit()
+        logger.info(f"merged_duplicate_statistics_rows, groups={len(dups)}")
+
+    def nickname(self, uid: int) -> str:
+        """带 TTL 缓存的 uid -> nickname，查询失败不缓存"""
+        now = time.monotonic()
+        hit = self._nicknames.get(uid)
+        if hit and hit[1] > now:
+            return hit[0]
+        name = self.name_resolver(uid)
+        if name:
+            self._nicknames[uid] = (name, now + self.nickname_ttl)
+        return name
+
+    def add(self, uid: int, field: str, count: int, app_name: str = "") -> bool:
+        """给 uid 的当天记录累加某个字段"""
+        applied, _ = self.add_many([(uid, app_name, field, count)])
+        return applied == 1
+
+    def add_many(self, items: list[tuple[int, str, str, int]]) -> tuple[int, int]:
+        """在一个事务内累加多条 (uid, app, field, count)，返回 (成功数, 失败数)"""
+        today = datetime.today().strftime('%Y-%m-%d')
+        rows_by_field: dict[str, list[tuple]] = {}
+        failed = 0
+        for uid, app_name, field, count in items:
+            if field not in COUNTER_FIELDS or not count or not uid:
+                failed += 1
+                continue
+            nickname = self.nickname(uid)
+            if not nickname:
+                logger.error(f"cannot_get_nickname_for_uid={uid}")
+                failed += 1
+                continue
+            rows_by_field.setdefault(field, []).append((uid, nickname, today, app_name or "", count))
+        applied = sum(len(rows) for rows in rows_by_field.values())
+        if not applied:
+            return 0, failed
+
+        with self._lock:
+            try:
+                for field, rows in rows_by_field.items():
+                    self._conn.executemany(
+                        f"INSERT INTO statistics (uid, nickname, date, app, {field}) VALUES (?, ?, ?, ?, ?) "
+                        f"ON CONFLICT(uid, date, app) DO UPDATE SET {field}={field}+excluded.{field}",
+                        rows,
+                    )
+                self._conn.commit()
+            except Exception as e:
+                self._conn.rollback()
+                logger.exception(f"add_counters_failed, items={len(items)}, err={e}")
+                return 0, len(items)
+        logger.debug(f"add_counters_success, applied={applied}, failed={failed}")
+        return applied, failed
+
+    def list(self, limit: int = 100) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT uid, nickname, app, date, access_count, input_token, output_token, embedding_token "
+                "FROM statistics ORDER BY date DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+    def get_by_uid(self, uid: int) -> tuple | None:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT uid, nickname, app, date, access_count, input_token, output_token "
+                "FROM statistics WHERE uid=? LIMIT 1", (uid,)
+            ).fetchone()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -14,10 +14,11 @@ import logging.config
 from decimal import Decimal
 from typing import Any
 import functools
-import platform
 
+from common import meta_db
+from common.meta_db import LIMIT_1
 from common.cm_utils import get_time_str, decrypt, encrypt
-from common.const import CFG_DB_FILE, USER_SAMPLE_DATA_DB, CFG_DB_URI
+from common.const import CFG_DB_FILE, USER_SAMPLE_DATA_DB
 from common.my_enums import DataType
 
 log_config_path = 'logging.conf'
@@ -30,20 +31,17 @@ logger = logging.getLogger(__name__)
 
 def get_user_hack_info(uid: int, cfg: dict)-> str | None:
     user_hack_info = None
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        try:
-            sql = f"select hack_info from user where id={uid} limit 1"
-            check_info = query_sqlite(my_conn, sql)
-            user_dt = check_info['data']
-            if user_dt and user_dt[0] and user_dt[0][0]:
-                user_hack_info = decrypt(user_dt[0][0], cfg['sys']['cypher_key'])
-            else:
-                user_hack_info = ""
-            logger.debug(f"uid {uid}, user_hack_info {user_hack_info[:20]}...")
-        except Exception as e:
-            logger.exception(f"no_user_hack_info_found_for_uid, {uid}")
+    try:
+        user_dt = meta_db.query_one("select hack_info from user where id = ? limit 1", (uid,))
+        if user_dt and user_dt['hack_info']:
+            user_hack_info = decrypt(user_dt['hack_info'], cfg['sys']['cypher_key'])
+        else:
+            user_hack_info = ""
+        logger.debug(f"uid {uid}, user_hack_info {user_hack_info[:20]}...")
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.exception(f"no_user_hack_info_found_for_uid, {uid}")
     return user_hack_info
 
 def save_user_hack_info(uid: int, user_hack_info: str, cfg: dict) -> bool:
@@ -58,53 +56,31 @@ def save_user_hack_info(uid: int, user_hack_info: str, cfg: dict) -> bool:
         return save_result
     logger.info("start_encrypt_user_hack_info")
     user_hack_info1 = encrypt(user_hack_info, cfg['sys']['cypher_key'])
-    exec_sql = f"update user set hack_info ='{user_hack_info1}' where id = {uid}"
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        try:
-            exec_sql = re.sub(r'\s+', ' ', exec_sql).strip()
-            result = insert_del_sqlite(my_conn, exec_sql)
-            logger.info(f"exec_sql_success {exec_sql}")
-            if result.get('result'):
-                save_result = True
-                logger.info("save_user_hack_info_success")
-        except Exception as e:
-            logger.exception(f"err_in_exec_sql, {exec_sql}")
+    exec_sql = "update user set hack_info = ? where id = ?"
+    result = meta_db.execute(exec_sql, (user_hack_info1, uid))
+    if result.get('result'):
+        save_result = True
+        logger.info("save_user_hack_info_success")
     return save_result
 
 def get_ds_cfg_by_uid(uid:int, cfg: dict) -> dict:
     config = {}
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        check_sql = (
-            f"select uid, db_type, db_name, db_host, db_port, "
-            f"db_usr, db_psw, tables, add_chart, is_strict, llm_ctx from db_config where uid={uid} limit 1")
-        db_config_info = query_sqlite(my_conn, check_sql)
-        logger.debug(f"check_sql, {check_sql}")
-        check_info = db_config_info['data']
-        if not check_info:
-            logger.info(f"no_db_config_for_uid {uid}")
-            return config
-        try:
-            check_uid = check_info[0][0]
-            config = {
-                "uid":          check_uid,
-                "db_type":      check_info[0][1],
-                "db_name":      check_info[0][2],
-                "db_host":      check_info[0][3],
-                "db_port":      check_info[0][4],
-                "db_usr":       decrypt(check_info[0][5], cfg['sys']['cypher_key']),
-                "db_psw":       decrypt(check_info[0][6], cfg['sys']['cypher_key']),
-                "tables":       check_info[0][7],
-                "add_chart":    check_info[0][8],
-                "is_strict":    check_info[0][9],
-                "llm_ctx":      check_info[0][10]
-            }
-        except Exception as e:
-            logger.exception("exception_occurred_get_data_source_config_by_uid")
-            logger.info(f"no_db_config_for_uid {uid}")
+    check_sql = (
+        "select uid, db_type, db_name, db_host, db_port, "
+        "db_usr, db_psw, tables, add_chart, is_strict, llm_ctx from db_config where uid = ? limit 1")
+    check_info = meta_db.query_one(check_sql, (uid,))
+    logger.debug(f"check_sql, {check_sql}, {uid}")
+    if not check_info:
+        logger.info(f"no_db_config_for_uid {uid}")
+        return config
+    try:
+        config = dict(check_info)
+        config["db_usr"] = decrypt(check_info["db_usr"], cfg['sys']['cypher_key'])
+        config["db_psw"] = decrypt(check_info["db_psw"], cfg['sys']['cypher_key'])
+    except Exception as e:
+        config = {}
+        logger.exception("exception_occurred_get_data_source_config_by_uid")
+        logger.info(f"no_db_config_for_uid {uid}")
     logger.info(f"db_config_info_for_uid, {uid}, {config}")
     return config
 
@@ -124,55 +100,20 @@ def save_ds_cfg(ds_cfg: dict, cfg: dict) -> bool:
         llm_ctx = ds_cfg["llm_ctx"].replace("'", '"')
     else:
         llm_ctx = ''
+    params = (ds_cfg["db_type"], ds_cfg["db_host"], ds_cfg["db_port"], ds_cfg["db_name"],
+              ds_cfg["db_usr_cypher"], ds_cfg["db_psw_cypher"], ds_cfg["tables"],
+              ds_cfg["add_chart"], ds_cfg["is_strict"], llm_ctx, ds_cfg["uid"])
     current_config = get_ds_cfg_by_uid(ds_cfg['uid'], cfg)
     if current_config:
-        exec_sql = (f'''
-                    UPDATE 
-                        db_config 
-                    SET 
-                        db_type ='{ds_cfg["db_type"]}', 
-                        db_host ='{ds_cfg["db_host"]}', 
-                        db_port ='{ds_cfg["db_port"]}',
-                        db_name ='{ds_cfg["db_name"]}', 
-                        db_usr ='{ds_cfg["db_usr_cypher"]}', 
-                        db_psw ='{ds_cfg["db_psw_cypher"]}',
-                        tables ='{ds_cfg["tables"]}',
-                        add_chart = '{ds_cfg["add_chart"]}',
-                        is_strict = '{ds_cfg["is_strict"]}',
-                        llm_ctx = '{llm_ctx}'
-                    WHERE 
-                        uid = '{ds_cfg["uid"]}'
-                    ''')
+        exec_sql = ("UPDATE db_config SET db_type = ?, db_host = ?, db_port = ?, db_name = ?, db_usr = ?, "
+                    "db_psw = ?, tables = ?, add_chart = ?, is_strict = ?, llm_ctx = ? WHERE uid = ?")
     else:
-        exec_sql = (f'''
-            INSERT INTO db_config 
-                (uid, db_type, db_host, db_port, db_name, db_usr, db_psw, tables, add_chart, is_strict, llm_ctx)
-            values (
-                '{ds_cfg["uid"]}', 
-                '{ds_cfg["db_type"]}',
-                '{ds_cfg["db_host"]}', 
-                '{ds_cfg["db_port"]}', 
-                '{ds_cfg["db_name"]}', 
-                '{ds_cfg["db_usr_cypher"]}', 
-                '{ds_cfg["db_psw_cypher"]}',
-                '{ds_cfg["tables"]}',
-                '{ds_cfg["add_chart"]}',
-                '{ds_cfg["is_strict"]}',
-                '{llm_ctx}'
-            )
-            ''')
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        try:
-            exec_sql = exec_sql.replace('\n', ' ')
-            exec_sql = re.sub(r'\s+', ' ', exec_sql).strip()
-            result = insert_del_sqlite(my_conn, exec_sql)
-            logger.info(f"exec_sql_success {exec_sql}")
-            if result.get('result'):
-                save_result = True
-        except Exception as e:
-            logger.exception(f"err_in_exec_sql, {exec_sql}")
+        exec_sql = ("INSERT INTO db_config (db_type, db_host, db_port, db_name, db_usr, db_psw, tables, "
+                    "add_chart, is_strict, llm_ctx, uid) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    result = meta_db.execute(exec_sql, params)
+    logger.info(f"exec_sql {exec_sql}, {result}")
+    if result.get('result'):
+        save_result = True
     return save_result
 
 
@@ -183,46 +124,22 @@ def set_db_cache(key: str, value: str, timestamp: str, cypher_key: str) -> bool:
     :param timestamp: cache timestamp
     :param cypher_key: key used to encrypt data
     """
-    save_result = False
     if not cypher_key:
         raise Exception("cypher_key_null_err")
     encrypt_value = encrypt(value, cypher_key)
-    exec_sql = f"INSERT INTO cache_info (key, value, timestamp) values ('{key}','{encrypt_value}', '{timestamp}')"
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        try:
-            exec_sql = exec_sql.replace('\n', ' ')
-            exec_sql = re.sub(r'\s+', ' ', exec_sql).strip()
-            result = insert_del_sqlite(my_conn, exec_sql)
-            logger.info(f"exec_sql_success {exec_sql}")
-            if result.get('result'):
-                save_result = True
-        except Exception as e:
-            logger.exception(f"err_in_exec_sql, {exec_sql}")
-    return save_result
+    exec_sql = "INSERT INTO cache_info (key, value, timestamp) values (?, ?, ?)"
+    result = meta_db.execute(exec_sql, (key, encrypt_value, timestamp))
+    logger.info(f"exec_sql {exec_sql}, {key}, {result}")
+    return bool(result.get('result'))
 
 def del_db_cache(key: str) -> bool:
     """
     :param key: cache key
     """
-    del_result = False
-    exec_sql = f"delete from cache_info where key='{key}'"
-    if platform.system() == "Linux":
-        exec_sql += " limit 1"
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        try:
-            exec_sql = exec_sql.replace('\n', ' ')
-            exec_sql = re.sub(r'\s+', ' ', exec_sql).strip()
-            result = insert_del_sqlite(my_conn, exec_sql)
-            logger.info(f"exec_sql_success {exec_sql}")
-            if result.get('result'):
-                del_result = True
-        except Exception as e:
-            logger.exception(f"err_in_exec_sql, {exec_sql}")
-    return del_result
+    exec_sql = "delete from cache_info where key = ?" + LIMIT_1
+    result = meta_db.execute(exec_sql, (key,))
+    logger.info(f"exec_sql {exec_sql}, {key}, {result}")
+    return bool(result.get('result'))
 
 def get_db_cache(key:str, cypher_key: str)->tuple | None:
     """
@@ -231,44 +148,29 @@ def get_db_cache(key:str, cypher_key: str)->tuple | None:
     """
     if not cypher_key:
         raise Exception("cypher_key_null_err")
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        try:
-            sql = f"select value ,timestamp from cache_info where key='{key}' limit 1"
-            cache_info = query_sqlite(my_conn, sql)
-            value_dt = cache_info['data']
-            value = value_dt[0][0]
-            timestamp = value_dt[0][1]
-            decrypt_value = decrypt(value, cypher_key)
-            # logger.info(f"get_cache_with_key {key}, {decrypt_value}")
-            return decrypt_value, timestamp
-        except Exception as e:
-            logger.info(f"no_cache_info_found_for_key, {key}")
+    try:
+        cache_info = meta_db.query_one("select value, timestamp from cache_info where key = ? limit 1", (key,))
+        decrypt_value = decrypt(cache_info['value'], cypher_key)
+        # logger.info(f"get_cache_with_key {key}, {decrypt_value}")
+        return decrypt_value, cache_info['timestamp']
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.info(f"no_cache_info_found_for_key, {key}")
     return None
 
 def delete_data_source_config(uid: int, cfg: dict) -> bool:
-    delete_result = False
     if not uid:
         logger.error("uid_null_err")
-        return delete_result
+        return False
     current_config = get_ds_cfg_by_uid(uid, cfg)
-    if current_config:
-        delete_sql = f"delete from db_config where uid = {uid}"
-    else:
+    if not current_config:
         logger.error(f"no_db_source_cfg_found_for_uid_{uid}")
         return False
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        try:
-            result = insert_del_sqlite(my_conn, delete_sql)
-            logger.info(f"exec_sql_success {delete_sql}")
-            if result.get('result'):
-                delete_result = True
-        except Exception as e:
-            logger.exception(f"err_in_exec_sql, {delete_sql}")
-    return delete_result
+    delete_sql = "delete from db_config where uid = ?"
+    result = meta_db.execute(delete_sql, (uid,))
+    logger.info(f"exec_sql {delete_sql}, {uid}, {result}")
+    return bool(result.get('result'))
 
 def build_data_source_cfg_with_uid(uid: int, sys_cfg:dict)->dict:
     source_cfg = get_ds_cfg_by_uid(uid, sys_cfg)
@@ -289,46 +191,36 @@ def build_data_source_cfg_with_uid(uid: int, sys_cfg:dict)->dict:
 
 def get_consts(app: str)-> dict:
     const = {}
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        sql = f"select key, value from const where app='{app}' limit 100"
-        try:
-            check_info = query_sqlite(my_conn, sql)
-            value_dt = check_info['data']
-            for key, value in value_dt:
-                const[key] = value
-        except Exception as e:
-            logger.exception(f"err_occurred_for_db {CFG_DB_FILE}, sql {sql}")
+    sql = "select key, value from const where app = ? limit 100"
+    try:
+        for row in meta_db.query(sql, (app,)):
+            const[row['key']] = row['value']
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.exception(f"err_occurred_for_db {CFG_DB_FILE}, sql {sql}")
     return const
 
 def get_user_list():
-    user_list = []
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        sql = f"select id, name from user limit 100"
-        try:
-            check_info = query_sqlite(my_conn, sql)
-            value_dt = check_info['data']
-            for id, name in value_dt:
-                user_list.append({"id": id, "name": name})
-        except Exception as e:
-            logger.exception(f"err_occurred_for_db {CFG_DB_FILE}, sql {sql}")
-    return user_list
+    sql = "select id, name from user limit 100"
+    try:
+        return meta_db.query(sql)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.exception(f"err_occurred_for_db {CFG_DB_FILE}, sql {sql}")
+    return []
 
 def get_hack_info(uid: int)-> dict:
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        sql = f"select hack_q_dict from hack_list where uid = {uid} limit 1"
-        try:
-            check_info = query_sqlite(my_conn, sql)
-            hack_q_list = check_info['data']
-            if hack_q_list:
-                return json.loads(hack_q_list[0][0])
-        except Exception as e:
-            logger.exception(f"err_occur_in_get_hack_q_dict_for_db {CFG_DB_FILE}, sql {sql}")
+    sql = "select hack_q_dict from hack_list where uid = ? limit 1"
+    try:
+        hack_q = meta_db.query_one(sql, (uid,))
+        if hack_q:
+            return json.loads(hack_q['hack_q_dict'])
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.exception(f"err_occur_in_get_hack_q_dict_for_db {CFG_DB_FILE}, sql {sql}")
     return {}
 
 def get_usr_prompt_template(template_name: str,  sys_cfg: dict, uid=0)-> str:
@@ -342,28 +234,24 @@ def get_usr_prompt_template(template_name: str,  sys_cfg: dict, uid=0)-> str:
     if not template_name or template_name == '':
         logger.warning(f"template_name_is_null_direct_return, {template_name}")
         return ""
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        sql = f"select value from prompt_template where name = '{template_name}' and  uid = {uid} limit 1"
-        try:
-            prompt_info = query_sqlite(my_conn, sql)
-            prompt = prompt_info.get('data', [])
-            if prompt and prompt[0]:
-                return prompt[0][0]
-            if uid != 0:
-                sql = f"select value from prompt_template where name = '{template_name}' and  uid = 0 limit 1"
-                prompt_info = query_sqlite(my_conn, sql)
-                prompt = prompt_info.get('data', [])
-                if prompt and prompt[0]:
-                    return prompt[0][0]
-            if not sys_cfg or not sys_cfg.get('prompts'):
-                raise RuntimeError(f"no_sys_cfg_prompts_err")
-            prompt = sys_cfg['prompts'].get(template_name, None)
-            if prompt:
-                return prompt
-        except Exception as e:
-            logger.exception(f"err_occur_in_get_usr_prompt_template_for_db {CFG_DB_FILE}, sql {sql}")
+    sql = "select value from prompt_template where name = ? and uid = ? limit 1"
+    try:
+        prompt = meta_db.query_one(sql, (template_name, uid))
+        if prompt and prompt['value']:
+            return prompt['value']
+        if uid != 0:
+            prompt = meta_db.query_one(sql, (template_name, 0))
+            if prompt and prompt['value']:
+                return prompt['value']
+        if not sys_cfg or not sys_cfg.get('prompts'):
+            raise RuntimeError(f"no_sys_cfg_prompts_err")
+        prompt = sys_cfg['prompts'].get(template_name, None)
+        if prompt:
+            return prompt
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.exception(f"err_occur_in_get_usr_prompt_template_for_db {CFG_DB_FILE}, sql {sql}")
     raise RuntimeError(f"no_prompt_template_config_err_for_key {template_name}")
 
 def save_usr_prompt_template(uid: int, template_name: str, template_value: str):
@@ -379,58 +267,44 @@ def save_usr_prompt_template(uid: int, template_name: str, template_value: str):
     if uid == 0:
         logger.error("illegal_uid_to_set_template_err")
         return save_result
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        sql = f"select value from prompt_template where name = '{template_name}' and  uid = {uid} limit 1"
-        try:
-            prompt_info = query_sqlite(my_conn, sql)
-            if not prompt_info:
-                logger.error(f"table_not_exist_for_sql, {sql}")
-                return save_result
-            prompt = prompt_info['data']
-            if prompt:
-                logger.info(f"user_prompt_template_for_key_{template_name}_exist_to_update")
-                exec_sql = f"""update prompt_template set value = '{template_value}' where uid = {uid} and name = '{template_name}'"""
-                if platform.system() == "Linux":
-                    exec_sql += " limit 1"
-            else:
-                exec_sql = f"""insert into prompt_template (uid, name, value) values ({uid}, '{template_name}', '{template_value}')"""
-            result = insert_del_sqlite(my_conn, exec_sql)
-
-            if result.get('result'):
-                logger.info(f"exec_sql_success {exec_sql}")
-                save_result = True
-            else:
-                logger.info(f"exec_sql_fail {exec_sql}")
-                save_result = False
-        except Exception as e:
-            logger.exception(f"err_occur_in_save_usr_prompt_template_for_db {CFG_DB_FILE}, sql {sql}")
-        return save_result
+    sql = "select value from prompt_template where name = ? and uid = ? limit 1"
+    try:
+        prompt = meta_db.query_one(sql, (template_name, uid))
+        if prompt:
+            logger.info(f"user_prompt_template_for_key_{template_name}_exist_to_update")
+            exec_sql = "update prompt_template set value = ? where uid = ? and name = ?" + LIMIT_1
+            params = (template_value, uid, template_name)
+        else:
+            exec_sql = "insert into prompt_template (value, uid, name) values (?, ?, ?)"
+            params = (template_value, uid, template_name)
+        result = meta_db.execute(exec_sql, params)
+
+        if result.get('result'):
+            logger.info(f"exec_sql_success {exec_sql}")
+            save_result = True
+        else:
+            logger.info(f"exec_sql_fail {exec_sql}")
+            save_result = False
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.exception(f"err_occur_in_save_usr_prompt_template_for_db {CFG_DB_FILE}, sql {sql}")
+    return save_result
 
 def del_usr_prompt_template(uid: int):
     """
     :param uid: user id
     """
-    save_result = False
     if not uid or uid == 0:
         logger.error("illegal_uid_to_del_usr_template_err")
-        return save_result
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        exec_sql = f"delete from prompt_template where uid = {uid} and name in ('refine_q_msg', 'sql_gen_msg')"
-        try:
-            result = insert_del_sqlite(my_conn, exec_sql)
-            if result.get('result'):
-                logger.info(f"exec_sql_success {exec_sql}")
-                save_result = True
-            else:
-                logger.info(f"exec_sql_fail {exec_sql}")
-                save_result = False
-        except Exception as e:
-            logger.exception(f"err_occur_in_del_usr_prompt_template_for_db {CFG_DB_FILE}, sql {exec_sql}")
-        return save_result
+        return False
+    exec_sql = "delete from prompt_template where uid = ? and name in ('refine_q_msg', 'sql_gen_msg')"
+    result = meta_db.execute(exec_sql, (uid,))
+    if result.get('result'):
+        logger.info(f"exec_sql_success {exec_sql}, {uid}")
+        return True
+    logger.info(f"exec_sql_fail {exec_sql}, {uid}")
+    return False
 
 @functools.lru_cache(maxsize=128)
 def get_hack_dict(uid: int) -> dict:
@@ -496,17 +370,15 @@ def get_user_sample_data_rd_cfg_dict(cfg_dict: dict) -> dict:
 def sqlite_output(db_uri: str, sql: str, data_format: str) -> str | Any:
     """
     cfg["db_uri"] = "sqlite:///test1.db"
+    JSON 格式直接返回 list[dict]（经 meta_db 持久连接执行），HTML / Markdown 格式才需要 pandas
     """
 
     db_file = db_uri.split('/')[-1]
+    if DataType.JSON.value == data_format:
+        return meta_db.query(sql.replace('\n', ' '), db_file=db_file)
     with sqlite3.connect(db_file) as my_conn:
         # logger.debug(f"connect_to_db_file {db_file}")
         my_dt = output_data(my_conn, sql, data_format)
-    if DataType.JSON.value == data_format:
-        try:
-            my_dt = json.loads(my_dt)
-        except Exception as ex:
-            logger.error(f"json_parse_error_for_dt: {my_dt}, {ex}")
     # logger.debug(f"sqlite_output, data_format {data_format}, my_dt, {my_dt}")
     return my_dt
 
@@ -598,27 +470,22 @@ def save_file_info(uid: int, fid: str, full_path: str, file_suffix:int = 0) -> d
     """
     logger.debug(f"save_file_info, {uid}, {fid}, {full_path}")
     timestamp = get_time_str()
-    sql = (f"insert into file_info(uid, fid, full_path, file_suffix, timestamp) values "
-           f"({uid}, '{fid}', '{full_path}', '{file_suffix}', '{timestamp}')")
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        logger.debug(f"save_file_info_sql, {sql}")
-        my_dt = insert_del_sqlite(my_conn, sql)
-        return my_dt
+    sql = "insert into file_info(uid, fid, full_path, file_suffix, timestamp) values (?, ?, ?, ?, ?)"
+    logger.debug(f"save_file_info_sql, {sql}")
+    return meta_db.execute(sql, (uid, fid, full_path, str(file_suffix), timestamp))
 
-def get_file_info(uid: int, fid: str) -> dict:
+def get_file_info(uid: int, fid: str) -> list:
     """
     根据文件ID查询文件信息
     :param uid 用户 ID
     :param fid: 文件 ID
-    :return: a dict
+    :return: a list of dict
     """
     if not fid or not uid:
         raise RuntimeError(f"param_null_err, {uid}, {fid}")
-    sql = f"select * from file_info where uid = {uid} and fid = '{fid}' limit 1"
-    logger.debug(f"get_file_info_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = "select * from file_info where uid = ? and fid = ? limit 1"
+    logger.debug(f"get_file_info_sql, {sql}, {uid}, {fid}")
+    my_dt = meta_db.query(sql, (uid, fid))
     logger.debug(f"get_file_info_dt {my_dt}")
     return my_dt
 
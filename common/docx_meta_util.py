@@ -7,12 +7,9 @@
 import json
 import logging.config
 import os
-import platform
-import sqlite3
 
-from common.cfg_util import insert_del_sqlite, sqlite_output
-from common.const import CFG_DB_URI, CFG_DB_FILE
-from common.my_enums import DataType
+from common import meta_db
+from common.meta_db import LIMIT_1
 from common.cm_utils import get_time_str
 
 log_config_path = 'logging.conf'
@@ -45,26 +42,16 @@ def save_doc_info(uid: int, task_id: int, doc_type: str, doc_title: str, doc_out
     """
     logger.debug(f"save_doc_info, {uid}, {task_id}, {doc_type}, {doc_title}, {keywords}, {input_file_path}")
     create_time = get_time_str()
-    esc_doc_type = doc_type.replace("'", "''") if doc_type else ""
-    esc_doc_title = doc_title.replace("'", "''") if doc_title else ""
-    esc_doc_outline = doc_outline.replace("'", "''") if doc_outline else ""
-    esc_keywords = keywords.replace("'", "''") if keywords else ""
-    esc_input_file_path = input_file_path.replace("'", "''") if input_file_path else ""
-    esc_doc_ctx = doc_ctx.replace("'", "''") if doc_ctx else ""
-    esc_output_file_path = output_file_path.replace("'", "''") if output_file_path else ""
-    escaped_vdb_dir = vdb_dir.replace("'", "''") if vdb_dir else ""
-    sql = (f"insert into doc_file_info(uid, task_id, doc_type, doc_title, doc_outline, "
-           f"keywords, input_file_path, vdb_id, is_include_para_txt, "
-           f"doc_ctx, output_file_path, vdb_dir, output_file_type, create_time) values "
-           f"({uid}, {task_id}, '{esc_doc_type}', '{esc_doc_title}', '{esc_doc_outline}',"
-           f"'{esc_keywords}', '{esc_input_file_path}', {vdb_id}, {is_include_para_txt}, "
-           f"'{esc_doc_ctx}', '{esc_output_file_path}', '{escaped_vdb_dir}', {output_file_type},'{create_time}')")
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        logger.debug(f"save_doc_info_sql, {sql}")
-        my_dt = insert_del_sqlite(my_conn, sql)
-        return my_dt
+    sql = ("insert into doc_file_info(uid, task_id, doc_type, doc_title, doc_outline, "
+           "keywords, input_file_path, vdb_id, is_include_para_txt, "
+           "doc_ctx, output_file_path, vdb_dir, output_file_type, create_time) values "
+           "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    params = (uid, task_id, doc_type or "", doc_title or "", doc_outline or "",
+              keywords or "", input_file_path or "", vdb_id, is_include_para_txt,
+              doc_ctx or "", output_file_path or "", vdb_dir or "", output_file_type, create_time)
+    logger.debug(f"save_doc_info_sql, {sql}")
+    my_dt = meta_db.execute(sql, params)
+    return my_dt
 
 def get_doc_info(task_id: int) -> dict:
     """
@@ -74,9 +61,9 @@ def get_doc_info(task_id: int) -> dict:
     """
     if not task_id:
         raise RuntimeError(f"param_null_err {task_id}")
-    sql = f"select * from doc_file_info where task_id = {task_id} limit 1"
-    logger.info(f"get_docx_info_by_task_id_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = "select * from doc_file_info where task_id = ? limit 1"
+    logger.info(f"get_docx_info_by_task_id_sql, {sql}, {task_id}")
+    my_dt = meta_db.query(sql, (task_id,))
     logger.info(f"get_docx_info_by_task_id_dt {my_dt}")
     return my_dt
 
@@ -88,9 +75,9 @@ def get_user_task_list(uid: int) -> dict:
     """
     if not uid:
         raise RuntimeError(f"param_uid_null_err {uid}")
-    sql = f"select * from doc_file_info where uid = {uid} order by task_id desc limit 100"
+    sql = "select * from doc_file_info where uid = ? order by task_id desc limit 100"
     # logger.info(f"get_user_docx_task_list_by_uid_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    my_dt = meta_db.query(sql, (uid,))
     # logger.info(f"get_user_docx_task_list_by_uid_dt {my_dt}")
     return my_dt
 
@@ -98,9 +85,9 @@ def get_processing_file_list()-> list:
     """
     获取需要处理的docx任务信息清单
     """
-    sql = f"select * from doc_file_info where percent != 100 limit 100"
+    sql = "select * from doc_file_info where percent != 100 limit 100"
     # logger.info(f"get_docx_processing_file_list_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    my_dt = meta_db.query(sql)
     # logger.info(f"get_docx_processing_file_list_dt {my_dt}")
     return my_dt
 
@@ -110,14 +97,9 @@ def delete_task(task_id: int):
     :param task_id: process task id
     :return:
     """
-    sql = f"delete from doc_file_info where task_id ={task_id}"
-    if platform.system() == "Linux":
-        sql += " limit 1"
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        logger.info(f"delete_docx_info_by_task_id_sql, {sql}")
-        my_dt = insert_del_sqlite(my_conn, sql)
+    sql = "delete from doc_file_info where task_id = ?" + LIMIT_1
+    logger.info(f"delete_docx_info_by_task_id_sql, {sql}, {task_id}")
+    my_dt = meta_db.execute(sql, (task_id,))
     logger.info(f"delete_docx_info_by_task_id_dt {my_dt}")
     return my_dt
 
@@ -127,12 +109,9 @@ def delete_doc_para_task(task_id: int):
     :param task_id: process task id
     :return:
     """
-    sql = f"delete from doc_para_info where task_id ={task_id}"
-    if not os.path.exists(CFG_DB_FILE):
-        raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-    with sqlite3.connect(CFG_DB_FILE) as my_conn:
-        logger.info(f"delete_doc_para_info_by_task_id_sql, {sql}")
-        my_dt = insert_del_sqlite(my_conn, sql)
+    sql = "delete from doc_para_info where task_id = ?"
+    logger.info(f"delete_doc_para_info_by_task_id_sql, {sql}, {task_id}")
+    my_dt = meta_db.execute(sql, (task_id,))
     logger.info(f"delete_doc_para_info_by_task_id_dt {my_dt}")
     return my_dt
 
@@ -149,13 +128,13 @@ def update_process_info(uid: int, task_id: int, process_info: str, percent = -1)
     if not task_id or not process_info:
         raise RuntimeError(f"{uid}, param_null_err, {task_id}, {process_info}")
     if percent == -1:
-        sql = f"update doc_file_info set process_info = '{process_info}' where uid = {uid} and task_id = {task_id}"
+        sql = "update doc_file_info set process_info = ? where uid = ? and task_id = ?" + LIMIT_1
+        params = (process_info, uid, task_id)
     else:
-        sql = f"update doc_file_info set process_info = '{process_info}', percent= {percent} where uid = {uid} and task_id = {task_id}"
-    if platform.system() == "Linux":
-        sql += " limit 1"
-    logger.debug(f"{uid}, {task_id}, update_doc_file_info_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "update doc_file_info set process_info = ?, percent = ? where uid = ? and task_id = ?" + LIMIT_1
+        params = (process_info, percent, uid, task_id)
+    logger.debug(f"{uid}, {task_id}, update_doc_file_info_sql, {sql}, {params}")
+    my_dt = meta_db.execute(sql, params)
     logger.debug(f"{uid}, {task_id}, update_doc_file_info_dt, {my_dt}")
     return my_dt
 
@@ -168,11 +147,9 @@ def set_doc_info_para_task_created_flag(uid: int, task_id: int):
     """
     if not task_id:
         raise RuntimeError(f"{uid}, param_null_err, {task_id}")
-    sql = f"update doc_file_info set is_para_task_created = 1 where task_id = {task_id}"
-    if platform.system() == "Linux":
-        sql += " limit 1"
-    logger.info(f"{uid}, update_doc_file_info_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = "update doc_file_info set is_para_task_created = 1 where task_id = ?" + LIMIT_1
+    logger.info(f"{uid}, update_doc_file_info_sql, {sql}, {task_id}")
+    my_dt = meta_db.execute(sql, (task_id,))
     logger.info(f"{uid}, update_doc_file_info_dt, {my_dt}")
     return my_dt
 
@@ -187,35 +164,24 @@ def save_para_task(uid: int, task_id: int, tasks: list):
     """
     if not task_id or not tasks:
         raise RuntimeError(f"{uid}, save_para_task_param_null_err, {task_id}, {tasks}")
-    my_values = ""
+    create_time = get_time_str()
+    rows = []
     for task in tasks:
         if isinstance(task['current_heading'], list):
-            heading_str = json.dumps(task['current_heading'], ensure_ascii=False)
+            heading = json.dumps(task['current_heading'], ensure_ascii=False)
         else:
-            heading_str = str(task['current_heading'])
-        heading = heading_str.replace("'", "''")
-        unique_key = task['unique_key'].replace("'", "''")
-        para_text = task['para_text'].replace("'", "''")
-        user_comment = task['user_comment'].replace("'", "''")
-        current_sub_title = task['current_sub_title'].replace("'", "''")
+            heading = str(task['current_heading'])
         namespaces = task.get('namespaces', '')
         if namespaces is None:
             namespaces = ''
-        namespaces = str(namespaces).replace("'", "''")
-        create_time = get_time_str()
-        value_item = (f"({uid}, {task_id},{task['para_id']},'{heading}','{unique_key}',"
-                      f"'{para_text}','{user_comment}','{current_sub_title}',"
-                      f"'{namespaces}','{create_time}')")  # 注意 namespaces 和 create_time 之间用逗号分隔
-
-        if my_values:
-            my_values = f"{my_values}, {value_item}"
-        else:
-            my_values = value_item
+        rows.append((uid, task_id, task['para_id'], heading, task['unique_key'], task['para_text'],
+                     task['user_comment'], task['current_sub_title'], str(namespaces), create_time))
 
-    sql = (f"insert into doc_para_info (uid, task_id, para_id, heading, unique_key, "
-           f"para_text, user_comment, current_sub_title, namespaces, create_time) values {my_values}")
-    logger.debug(f"save_doc_para_info_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = ("insert into doc_para_info (uid, task_id, para_id, heading, unique_key, "
+           "para_text, user_comment, current_sub_title, namespaces, create_time) "
+           "values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    logger.debug(f"save_doc_para_info_sql, {sql}, {len(rows)} rows")
+    my_dt = meta_db.executemany(sql, rows)
     logger.debug(f"save_doc_para_info_dt, {my_dt}")
     return my_dt
 
@@ -231,14 +197,11 @@ def save_gen_para_txt(task_id: int, para_id: int, gen_txt: str, word_count: int,
     """
     if not task_id or not para_id or not gen_txt:
         raise RuntimeError(f"param_null_err, {task_id}, {para_id}, {gen_txt}")
-    escaped_gen_txt = gen_txt.replace("'", "''")
     update_time = get_time_str()
-    sql = (f"update doc_para_info set gen_txt='{escaped_gen_txt}',word_count={word_count},contains_mermaid={contains_mermaid},"
-       f"update_time='{update_time}',status=1 where task_id={task_id} and para_id = {para_id}")
-    if platform.system() == "Linux":
-        sql += " limit 1"
-    logger.info(f"save_gen_para_txt_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = ("update doc_para_info set gen_txt = ?, word_count = ?, contains_mermaid = ?, "
+           "update_time = ?, status = 1 where task_id = ? and para_id = ?" + LIMIT_1)
+    logger.info(f"save_gen_para_txt_sql, {sql}, {task_id}, {para_id}, {word_count}")
+    my_dt = meta_db.execute(sql, (gen_txt, word_count, contains_mermaid, update_time, task_id, para_id))
     logger.info(f"save_gen_para_txt_dt, {my_dt}")
     return my_dt
 
@@ -252,12 +215,14 @@ def get_para_info(task_id: int, para_id: int=-1)-> list:
     if not task_id:
         raise RuntimeError(f"param_null_err, {task_id}")
     if para_id == -1:
-        sql = f"select * from doc_para_info where task_id = {task_id}"
+        sql = "select * from doc_para_info where task_id = ?"
+        params = (task_id,)
     else:
-        sql = f"select * from doc_para_info where task_id = {task_id} and para_id = {para_id} limit 1"
-    logger.info(f"get_para_info_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
-    logger.info(f"get_para_info_dt, {my_dt}")
+        sql = "select * from doc_para_info where task_id = ? and para_id = ? limit 1"
+        params = (task_id, para_id)
+    logger.info(f"get_para_info_sql, {sql}, {params}")
+    my_dt = meta_db.query(sql, params)
+    logger.info(f"get_para_info_dt, {len(my_dt)} rows")
     return my_dt
 
 def get_para_list_with_status(task_id: int, status: int, is_order_by_para_id_desc: bool=True)-> list:
@@ -270,27 +235,32 @@ def get_para_list_with_status(task_id: int, status: int, is_order_by_para_id_des
     """
     if not task_id:
         raise RuntimeError(f"param_null_err, {task_id}")
-    base_sql = f"select * from doc_para_info where task_id = {task_id} and status = {status}"
+    base_sql = "select * from doc_para_info where task_id = ? and status = ?"
     if is_order_by_para_id_desc:
         sql = f"{base_sql} order by para_id desc"
     else:
         sql = f"{base_sql} order by para_id"
-    logger.info(f"get_para_info_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
-    logger.info(f"get_para_info_dt, {my_dt}")
+    logger.info(f"get_para_info_sql, {sql}, {task_id}, {status}")
+    my_dt = meta_db.query(sql, (task_id, status))
+    logger.info(f"get_para_info_dt, {len(my_dt)} rows")
     return my_dt
 
-def count_para_task(task_id: int)-> list:
+def count_para_task(task_id: int, status: int | None = None)-> list:
     """
     查询用户文档生成需求的并行子任务清单,一个文档写作任务的任务ID task_id 对应多个para_info
     :param task_id: 文档处理的任务 ID
+    :param status: 只统计指定状态的段落， 0： LLM 尚未生成对应的文本， 1:LLM 已生成对应的文本；None 统计全部
     :return:
     """
     if not task_id:
         raise RuntimeError(f"param_null_err, {task_id}")
-    sql = f"select count(1) from doc_para_info where task_id = {task_id}"
-    logger.info(f"get_para_info_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = "select count(1) from doc_para_info where task_id = ?"
+    params = (task_id,)
+    if status is not None:
+        sql += " and status = ?"
+        params = (task_id, status)
+    logger.info(f"get_para_info_sql, {sql}, {params}")
+    my_dt = meta_db.query(sql, params)
     logger.info(f"get_para_info_dt, {my_dt}")
     return my_dt
 
@@ -302,9 +272,9 @@ def count_mermaid_para(task_id: int)-> list:
     """
     if not task_id:
         raise RuntimeError(f"param_null_err, {task_id}")
-    sql = f"select count(1) from doc_para_info where task_id = {task_id} and contains_mermaid = 1"
-    logger.info(f"get_para_info_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = "select count(1) from doc_para_info where task_id = ? and contains_mermaid = 1"
+    logger.info(f"get_para_info_sql, {sql}, {task_id}")
+    my_dt = meta_db.query(sql, (task_id,))
     logger.info(f"get_para_info_dt, {my_dt}")
     return my_dt
 
@@ -317,11 +287,9 @@ def update_gen_txt_count_by_task_id(task_id: int, word_count: int):
     """
     if not task_id or not word_count:
         raise RuntimeError(f"param_null_err, {task_id}, {word_count}")
-    sql = f"update doc_file_info set word_count = {word_count} where task_id = {task_id}"
-    if platform.system() == "Linux":
-        sql += " limit 1"
-    logger.info(f"update_docx_gen_txt_count_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = "update doc_file_info set word_count = ? where task_id = ?" + LIMIT_1
+    logger.info(f"update_docx_gen_txt_count_sql, {sql}, {task_id}, {word_count}")
+    my_dt = meta_db.execute(sql, (word_count, task_id))
     logger.info(f"update_docx_gen_txt_count_dt {my_dt}")
     return my_dt
 def save_outline_by_task_id(task_id: int, outline: str):
@@ -330,11 +298,9 @@ def save_outline_by_task_id(task_id: int, outline: str):
     """
     if not task_id or not outline:
         raise RuntimeError(f"param_null_err, {task_id}, {outline}")
-    sql = f"update doc_file_info set outline = '{outline}' where task_id = {task_id}"
-    if platform.system() == "Linux":
-        sql += " limit 1"
-    logger.info(f"update_docx_outline_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = "update doc_file_info set outline = ? where task_id = ?" + LIMIT_1
+    logger.info(f"update_docx_outline_sql, {sql}, {task_id}")
+    my_dt = meta_db.execute(sql, (outline, task_id))
     logger.info(f"update_docx_outline_dt {my_dt}")
     return my_dt
 
@@ -344,11 +310,9 @@ def update_img_count_by_task_id(task_id: int, img_count: int):
     """
     if not task_id or not img_count:
         raise RuntimeError(f"param_null_err, {task_id}, {img_count}")
-    sql = f"update doc_file_info set img_count = {img_count} where task_id = {task_id}"
-    if platform.system() == "Linux":
-        sql += " limit 1"
-    logger.info(f"update_img_count_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = "update doc_file_info set img_count = ? where task_id = ?" + LIMIT_1
+    logger.info(f"update_img_count_sql, {sql}, {task_id}, {img_count}")
+    my_dt = meta_db.execute(sql, (img_count, task_id))
     logger.info(f"update_img_count_dt {my_dt}")
     return my_dt
 
@@ -356,11 +320,11 @@ def get_img_count_by_task_id(task_id: int)-> int:
     """
     获取需要处理的docx任务中的图片数量
     """
-    sql = f"select img_count from doc_file_info where task_id = {task_id} limit 1"
-    logger.info(f"get_img_count_sql, {sql}")
-    my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+    sql = "select img_count from doc_file_info where task_id = ? limit 1"
+    logger.info(f"get_img_count_sql, {sql}, {task_id}")
+    my_dt = meta_db.query_one(sql, (task_id,))
     logger.info(f"get_img_count_dt, {my_dt}")
-    if my_dt and my_dt[0]:
-        return int(my_dt[0][0])
+    if my_dt and my_dt['img_count']:
+        return int(my_dt['img_count'])
     else:
         return 0
\ No newline at end of file
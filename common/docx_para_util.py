@@ -19,7 +19,7 @@ from docx.text.paragraph import Paragraph
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 
 from common.const import MIN_DESC_TXT_LEN
-from common.vdb_util import search_txt
+from common.vdb_util import search_txt, search_txt_batch
 from common.sys_init import init_yml_cfg
 
 log_config_path = 'logging.conf'
@@ -56,6 +56,27 @@ def get_reference_from_vdb(keywords: str, vdb_dir: str, sys_cfg: dict) -> str:
     return reference
 
 
+def get_references_from_vdb(keywords_list: list[str], vdb_dir: str, sys_cfg: dict) -> list[str]:
+    """
+    批量获取vdb中与各组关键词相关的文本，只打开一次向量库，查询向量批量生成
+    :param keywords_list: 关键词列表
+    :param vdb_dir: 向量数据库目录
+    :param sys_cfg: 系统配置
+    :return: 与 keywords_list 一一对应的文本列表
+    """
+    references = [""] * len(keywords_list)
+    if not vdb_dir or not keywords_list:
+        return references
+    if not os.path.exists(vdb_dir):
+        logger.warning(f"vdb_dir_not_exist: {vdb_dir}, get no references")
+        return references
+    try:
+        references = [r.strip() for r in search_txt_batch(keywords_list, vdb_dir, 0.2, sys_cfg, 2)]
+    except Exception as exp:
+        logger.exception(f"get_references_from_vdb_batch_failed, {len(keywords_list)} keywords")
+    return references
+
+
 def extract_catalogue(target_doc: str) -> str:
     """
     生成 docx 文档的三级目录清单
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+
+"""
+embedding 向量磁盘缓存（内容寻址）
+以 sha256(模型名 + 规范化文本) 为键缓存向量（float32），各 embedding 客户端先查缓存，
+只把未命中的文本去重后一次性交给上游计算，结果写回缓存。
+缓存需由应用显式启用（configure_cache，db_path 取自应用配置），未配置时不缓存、不创建数据库文件。
+默认后端为 SQLite（WAL），按最近访问时间做 LRU 淘汰，并支持 TTL 过期；
+读命中时访问时间只记在内存中，写入、淘汰或积累到一定数量/时间时再批量落盘，读路径不做写事务。
+其他后端只需实现 get_many / put_many / stats 即可替换，见 configure_cache(backend=...)。
+命中率与节省的 token 数通过 common.statistic_util 汇总。
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Callable
+
+import numpy as np
+
+from common import statistic_util
+from common.cm_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "embedding_cache.db"
+DEFAULT_MAX_ENTRIES = 200000
+DEFAULT_TTL_DAYS = 30
+# 超出上限时一次多淘汰的比例，避免每次写入都触发淘汰
+EVICT_SLACK = 0.05
+# SQLite 单条语句变量数上限（旧版本为 999）
+SQL_BATCH = 500
+# 读命中的访问时间在内存中积累到该数量或距上次落盘超过该秒数时批量写回
+TOUCH_FLUSH_BATCH = 1000
+TOUCH_FLUSH_INTERVAL_S = 60
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：NFKC 归一（全角转半角等）、合并连续空白、去掉首尾空白"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingCache:
+    """基于 SQLite 的 embedding 缓存，线程安全"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_days: float = DEFAULT_TTL_DAYS):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_days * 86400 if ttl_days else 0
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> 最近访问时间，尚未写回数据库
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embedding_cache_accessed ON embedding_cache(accessed_at)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """批量读取，返回命中的 key -> 向量；命中条目刷新访问时间（延迟批量落盘），过期条目视为未命中"""
+        found = {}
+        now = time.time()
+        expire_before = now - self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            for i in range(0, len(keys), SQL_BATCH):
+                part = keys[i:i + SQL_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embedding_cache "
+                    f"WHERE key IN ({','.join('?' * len(part))}) AND created_at >= ?",
+                    (*part, expire_before),
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                self._touched.update(dict.fromkeys(found, now))
+                if len(self._touched) >= TOUCH_FLUSH_BATCH or \
+                        time.monotonic() - self._last_flush >= TOUCH_FLUSH_INTERVAL_S:
+                    self._flush_touched()
+                    self._conn.commit()
+        return found
+
+    def put_many(self, model: str, items: dict[str, np.ndarray]):
+        """批量写入 key -> 向量，超出 max_entries 时按最近访问时间淘汰"""
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, model, int(vec.shape[0]), np.asarray(vec, dtype=np.float32).tobytes(), now, now)
+                for key, vec in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, model, dim, vector, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._flush_touched()
+            self._conn.commit()
+            self._count += len(rows)
+            if self.max_entries and self._count > self.max_entries:
+                self._evict()
+
+    def flush(self):
+        """把内存中积累的访问时间写回数据库"""
+        with self._lock:
+            if self._touched:
+                self._flush_touched()
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "sqlite", "path": self.db_path, "entries": self._count,
+                    "max_entries": self.max_entries, "ttl_seconds": self.ttl_seconds}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embedding_cache")
+            self._conn.commit()
+            self._count = 0
+            self._touched.clear()
+
+    def _flush_touched(self):
+        """批量更新访问时间，由调用方提交事务（调用方持有锁）"""
+        self._last_flush = time.monotonic()
+        if not self._touched:
+            return
+        self._conn.executemany("UPDATE embedding_cache SET accessed_at=? WHERE key=?",
+                               [(ts, key) for key, ts in self._touched.items()])
+        self._touched.clear()
+
+    def _evict(self):
+        """先清理过期条目，仍超限则删除最久未访问的条目（调用方持有锁）"""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM embedding_cache WHERE created_at < ?",
+                               (time.time() - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        target = int(self.max_entries * (1 - EVICT_SLACK))
+        if count > target:
+            self._conn.execute(
+                "DELETE FROM embedding_cache WHERE key IN "
+                "(SELECT key FROM embedding_cache ORDER BY accessed_at LIMIT ?)", (count - target,))
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        logger.info("embedding cache evicted, before=%d, after=%d", count, self._count)
+
+
+# ====================================================================
+# 进程级共享缓存
+# ====================================================================
+_cache_lock = threading.Lock()
+_cache = None
+
+
+def configure_cache(enabled: bool = True, db_path: str = DEFAULT_DB_PATH,
+                    max_entries: int = DEFAULT_MAX_ENTRIES, ttl_days: float = DEFAULT_TTL_DAYS,
+                    backend=None):
+    """设置进程内共享的缓存；backend 可传入自定义实现（需提供 get_many / put_many / stats）"""
+    global _cache
+    with _cache_lock:
+        if not enabled:
+            _cache = None
+        elif backend is not None:
+            _cache = backend
+        else:
+            _cache = SQLiteEmbeddingCache(db_path, max_entries, ttl_days)
+    logger.info("embedding cache configured, enabled=%s, backend=%s", enabled,
+                type(_cache).__name__ if _cache is not None else None)
+    return _cache
+
+
+def get_cache():
+    """返回共享缓存；应用未调用 configure_cache 启用时返回 None（不缓存）"""
+    return _cache
+
+
+def embed_with_cache(model: str, texts: list[str], embed_fn: Callable[[list[str]], list],
+                     cache=None) -> list[np.ndarray]:
+    """先查缓存，未命中的文本去重后一次性调用 embed_fn，按输入顺序返回 float32 向量。
+
+    cache 为空时使用共享缓存；共享缓存未启用时直接调用 embed_fn。
+    缓存读写异常不影响主流程，退化为直接调用上游。
+    """
+    if not texts:
+        return []
+    cache = cache if cache is not None else get_cache()
+    if cache is None:
+        return [np.asarray(v, dtype=np.float32) for v in embed_fn(texts)]
+
+    keys = [cache_key(model, t) for t in texts]
+    try:
+        found = cache.get_many(list(dict.fromkeys(keys)))
+    except Exception as e:
+        logger.warning("embedding cache read failed: %s", e)
+        found = {}
+
+    # 未命中的文本按 key 去重，保持首次出现的顺序
+    miss = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in miss:
+            miss[key] = text
+    if miss:
+        vectors = embed_fn(list(miss.values()))
+        if len(vectors) != len(miss):
+            raise ValueError(f"embedding 返回数量不匹配: {len(vectors)} vs {len(miss)}")
+        computed = {key: np.asarray(vec, dtype=np.float32) for key, vec in zip(miss, vectors)}
+        try:
+            cache.put_many(model, computed)
+        except Exception as e:
+            logger.warning("embedding cache write failed: %s", e)
+        found.update(computed)
+
+    # 除每个未命中 key 的首次出现外，其余文本都无需上游计算
+    hits, saved_tokens, first_miss = 0, 0, set()
+    for key, text in zip(keys, texts):
+        if key in miss and key not in first_miss:
+            first_miss.add(key)
+            continue
+        hits += 1
+        saved_tokens += estimate_tokens(text)
+    statistic_util.add_embedding_cache_stats(model, hits, len(miss), saved_tokens)
+    return [found[k] for k in keys]
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+
+"""
+embedding 向量传输编码
+OpenAI 兼容接口的 encoding_format="base64"：向量按小端 float32 排列后做 base64 编码，
+体积约为 JSON 浮点数组的 1/4，客户端可直接 frombuffer 解码为 NumPy 数组，省去 JSON 浮点解析。
+"""
+import base64
+
+import numpy as np
+
+ENCODING_FORMAT = "base64"
+_LE_FLOAT32 = np.dtype("<f4")
+
+
+def encode_vector(vec) -> str:
+    """向量 -> 小端 float32 的 base64 字符串"""
+    return base64.b64encode(np.asarray(vec, dtype=_LE_FLOAT32).tobytes()).decode("ascii")
+
+
+def decode_vector(value) -> np.ndarray:
+    """解码单条 embedding：base64 字符串或（未按 base64 返回的服务端给出的）浮点列表"""
+    if isinstance(value, str):
+        return np.frombuffer(base64.b64decode(value), dtype=_LE_FLOAT32).astype(np.float32, copy=False)
+    return np.asarray(value, dtype=np.float32)
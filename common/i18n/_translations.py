@@ -1415,6 +1415,12 @@ TRANSLATIONS = {
             "fr": "Titre ou type de document non soumis. Veuillez fournir.",
             "ar": "عنوان او نوع المستند غير مقدم. يرجى تقديمه.",
         },
+        "task_is_running": {
+            "zh": "任务正在执行中，请稍后再试",
+            "en": "Task is running. Please try again later.",
+            "fr": "La tache est en cours d'execution. Veuillez reessayer plus tard.",
+            "ar": "المهمة قيد التنفيذ. يرجى المحاولة لاحقا.",
+        },
         "task_init_started": {
             "zh": "任务开始初始化",
             "en": "Task initialization started",
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+"""
+进程级大模型请求调度器
+- 所有调用方共用一组限制：同时在途请求数、每秒请求数、每秒 token 数（令牌桶）
+- 排队的请求按 key（如 (uid, task_id)）轮转放行，一个大任务不会占满全部名额，其他用户/任务的请求同样能及时执行
+- 上游返回 429 或 5xx 时自适应退避：在途上限减半并暂停放行一段时间（优先使用 Retry-After），
+  之后每连续成功一轮在途上限加 1，逐步恢复到配置值
+- 记录排队等待耗时，metrics() 汇总分位数供监控
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IN_FLIGHT = 16
+DEFAULT_REQUESTS_PER_S = 0          # 0 表示不限制
+DEFAULT_TOKENS_PER_S = 0            # 0 表示不限制
+DEFAULT_BACKOFF_S = 2
+DEFAULT_MAX_BACKOFF_S = 60
+# metrics() 统计最近多少个请求的排队耗时分位数
+METRICS_WINDOW = 1000
+
+
+class LlmSchedulerTimeout(Exception):
+    """排队等待调度超时"""
+
+
+class TokenBucket:
+    """令牌桶，rate <= 0 时不限制；调用方负责加锁"""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.level = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self._last:
+            self.level = min(self.capacity, self.level + (now - self._last) * self.rate)
+            self._last = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """还需等待多少秒才能取出 amount 个令牌；超过桶容量的请求在桶满时放行"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def consume(self, amount: float, now: float):
+        """取出令牌，允许透支（之后的请求等待补足）"""
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self.level -= amount
+
+
+def error_status(error: BaseException | None) -> int | None:
+    """从异常中取 HTTP 状态码（openai/httpx/requests 异常），取不到返回 None"""
+    if error is None:
+        return None
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: BaseException) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Waiter:
+    __slots__ = ("key", "est_tokens")
+
+    def __init__(self, key, est_tokens: int):
+        self.key = key
+        self.est_tokens = est_tokens
+
+
+class LlmSlot:
+    """一次已放行的请求；with 语句结束时归还名额，并根据异常类型决定是否退避"""
+
+    def __init__(self, scheduler, key, wait_s: float):
+        self._scheduler = scheduler
+        self.key = key
+        self.wait_s = wait_s
+        self.output_tokens = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # 流式输出被调用方提前关闭（GeneratorExit）不算请求失败
+        self._scheduler.release(self, None if isinstance(exc_val, GeneratorExit) else exc_val)
+        return False
+
+
+class LlmScheduler:
+    """线程安全的大模型请求调度器"""
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, requests_per_s: float = DEFAULT_REQUESTS_PER_S,
+                 tokens_per_s: float = DEFAULT_TOKENS_PER_S, backoff_s: float = DEFAULT_BACKOFF_S,
+                 max_backoff_s: float = DEFAULT_MAX_BACKOFF_S):
+        if max_in_flight <= 0:
+            raise ValueError("max_in_flight must be greater than 0")
+        self.max_in_flight = max_in_flight
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self._req_bucket = TokenBucket(requests_per_s)
+        self._token_bucket = TokenBucket(tokens_per_s)
+        self._cond = threading.Condition()
+        self._queues = {}           # key -> deque[_Waiter]
+        self._order = deque()       # 有排队请求的 key，按轮转顺序放行
+        self._limit = max_in_flight
+        self._in_flight = 0
+        self._success_streak = 0
+        self._current_backoff = 0.0
+        self._paused_until = 0.0
+        self._recent_wait_ms = deque(maxlen=METRICS_WINDOW)
+        self._counters = {"granted": 0, "completed": 0, "errors": 0, "throttled": 0, "timeouts": 0}
+
+    def slot(self, key, est_tokens: int = 0, timeout: float | None = None) -> LlmSlot:
+        """排队获取一个请求名额，用法：with scheduler.slot(key, est_tokens) as slot: ...
+
+        key 相同的请求按提交顺序放行，不同 key 之间轮转；timeout 秒内未放行抛 LlmSchedulerTimeout。
+        """
+        waiter = _Waiter(key, est_tokens)
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._order.append(key)
+            queue.append(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._grant_delay(waiter, now)
+                    if delay == 0:
+                        self._grant(waiter, now)
+                        break
+                    if deadline is not None:
+                        if now >= deadline:
+                            self._counters["timeouts"] += 1
+                            raise LlmSchedulerTimeout(f"llm scheduler busy, waited {timeout}s")
+                        delay = deadline - now if delay is None else min(delay, deadline - now)
+                    self._cond.wait(delay)
+            except BaseException:
+                self._remove(waiter)
+                self._cond.notify_all()
+                raise
+        wait_s = time.monotonic() - start
+        self._recent_wait_ms.append(round(wait_s * 1000, 1))
+        if wait_s >= 1:
+            logger.info(f"llm_slot_granted, key={key}, wait={wait_s:.1f}s")
+        return LlmSlot(self, key, wait_s)
+
+    def release(self, slot: LlmSlot, error: BaseException | None = None):
+        """归还名额；429/5xx 触发退避，成功则逐步恢复在途上限"""
+        status = error_status(error)
+        with self._cond:
+            now = time.monotonic()
+            self._in_flight -= 1
+            self._counters["completed"] += 1
+            self._token_bucket.consume(slot.output_tokens, now)
+            if status is not None and (status == 429 or status >= 500):
+                self._counters["throttled"] += 1
+                self._limit = max(1, self._limit // 2)
+                self._success_streak = 0
+                self._current_backoff = min(self.max_backoff_s, self._current_backoff * 2 or self.backoff_s)
+                pause = _retry_after(error) or self._current_backoff
+                self._paused_until = max(self._paused_until, now + pause)
+                logger.warning(f"llm_upstream_throttled, status={status}, limit={self._limit}, pause={pause}s")
+            elif error is not None:
+                self._counters["errors"] += 1
+            else:
+                self._current_backoff = 0.0
+                self._success_streak += 1
+                if self._limit < self.max_in_flight and self._success_streak >= self._limit:
+                    self._limit += 1
+                    self._success_streak = 0
+            self._cond.notify_all()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            result = dict(self._counters)
+            result["in_flight"] = self._in_flight
+            result["queued"] = sum(len(q) for q in self._queues.values())
+            result["queued_keys"] = len(self._order)
+            result["limit"] = self._limit
+            result["max_in_flight"] = self.max_in_flight
+            result["paused_s"] = round(max(0.0, self._paused_until - time.monotonic()), 1)
+            values = sorted(self._recent_wait_ms)
+        result["queue_wait_ms"] = {
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99),
+            "max": values[-1] if values else None,
+        }
+        return result
+
+    def _grant_delay(self, waiter: _Waiter, now: float) -> float | None:
+        """0：可以放行；>0：需等待的秒数；None：等待其他请求释放名额或轮到该请求"""
+        if self._queues[self._order[0]][0] is not waiter or self._in_flight >= self._limit:
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+        return max(self._req_bucket.delay(1, now), self._token_bucket.delay(waiter.est_tokens, now))
+
+    def _grant(self, waiter: _Waiter, now: float):
+        self._req_bucket.consume(1, now)
+        self._token_bucket.consume(waiter.est_tokens, now)
+        self._in_flight += 1
+        self._counters["granted"] += 1
+        self._remove(waiter)
+        self._cond.notify_all()
+
+    def _remove(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.key)
+        if not queue or waiter not in queue:
+            return
+        is_head = queue[0] is waiter
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.key]
+            self._order.remove(waiter.key)
+        elif is_head and self._order[0] == waiter.key:
+            # 放行后该 key 排到队尾，其他 key 的请求先执行
+            self._order.rotate(-1)
+
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+# ====================================================================
+# 进程级共享调度器
+# ====================================================================
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def configure_scheduler(max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, requests_per_s: float = DEFAULT_REQUESTS_PER_S,
+                        tokens_per_s: float = DEFAULT_TOKENS_PER_S, backoff_s: float = DEFAULT_BACKOFF_S,
+                        max_backoff_s: float = DEFAULT_MAX_BACKOFF_S) -> LlmScheduler:
+    """设置进程内共享的调度器"""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = LlmScheduler(max_in_flight, requests_per_s, tokens_per_s, backoff_s, max_backoff_s)
+    logger.info(f"llm scheduler configured, max_in_flight={max_in_flight}, "
+                f"requests_per_s={requests_per_s}, tokens_per_s={tokens_per_s}")
+    return _scheduler
+
+
+def get_scheduler() -> LlmScheduler:
+    """返回共享调度器；未显式配置时按默认参数创建"""
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LlmScheduler()
+    return _scheduler
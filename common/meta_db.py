@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (c) [2025] [liuyngchng@hotmail.com] - All rights reserved.
+"""
+元数据库（默认 cfg.db）访问层
+- 每个线程每个数据库文件复用一个持久连接（WAL 模式），不再每次调用新建连接
+- 只使用参数化语句，调用方不再手工拼接、转义 SQL 字符串
+- 查询结果直接返回 list[dict]（列名 -> 值），不再经过 pandas DataFrame 和 JSON 序列化往返
+- 批量写入使用 executemany，在一个事务内提交
+"""
+import logging
+import os
+import platform
+import sqlite3
+import threading
+
+from common.const import CFG_DB_FILE
+
+logger = logging.getLogger(__name__)
+
+BUSY_TIMEOUT_MS = 30000
+# 按主键以外条件更新/删除时只影响一行（Linux 下的 SQLite 编译了 UPDATE/DELETE LIMIT 支持）
+LIMIT_1 = " limit 1" if platform.system() == "Linux" else ""
+
+_local = threading.local()
+
+
+def get_conn(db_file: str = CFG_DB_FILE) -> sqlite3.Connection:
+    """获取当前线程到 db_file 的持久连接，首次使用时创建"""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    db_file = os.path.abspath(db_file)
+    conn = conns.get(db_file)
+    if conn is None:
+        if not os.path.exists(db_file):
+            raise FileNotFoundError(f"数据库文件 {db_file} 不存在")
+        # isolation_level=None：单条语句自动提交，批量写入显式开启事务
+        conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conns[db_file] = conn
+        logger.debug(f"meta_db_conn_opened, {db_file}, thread {threading.current_thread().name}")
+    return conn
+
+
+def close_conn(db_file: str = None):
+    """关闭当前线程的持久连接（db_file 为空时关闭全部）"""
+    conns = getattr(_local, "conns", None) or {}
+    for name in [os.path.abspath(db_file)] if db_file else list(conns):
+        conn = conns.pop(name, None)
+        if conn is not None:
+            conn.close()
+
+
+def query(sql: str, params=(), db_file: str = CFG_DB_FILE) -> list[dict]:
+    """执行查询，返回 list[dict]"""
+    cursor = get_conn(db_file).execute(sql, params)
+    if not cursor.description:
+        return []
+    columns = [desc[0] for desc in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def query_one(sql: str, params=(), db_file: str = CFG_DB_FILE) -> dict | None:
+    """执行查询，返回第一行或 None"""
+    cursor = get_conn(db_file).execute(sql, params)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([desc[0] for desc in cursor.description], row))
+
+
+def execute(sql: str, params=(), db_file: str = CFG_DB_FILE) -> dict:
+    """执行单条 insert/update/delete，返回值与 cfg_util.insert_del_sqlite 一致"""
+    try:
+        cursor = get_conn(db_file).execute(sql, params)
+        return {"result": True, "affected_rows": cursor.rowcount, "last_row_id": cursor.lastrowid}
+    except sqlite3.Error as e:
+        logger.error(f"save_data_err: {e}, sql {sql}")
+        return {"result": False, "error": "save data failed"}
+
+
+def executemany(sql: str, seq_of_params, db_file: str = CFG_DB_FILE) -> dict:
+    """在一个事务内批量执行同一条语句，失败时整体回滚"""
+    conn = get_conn(db_file)
+    try:
+        conn.execute("BEGIN")
+        cursor = conn.executemany(sql, seq_of_params)
+        conn.execute("COMMIT")
+        return {"result": True, "affected_rows": cursor.rowcount}
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        logger.error(f"save_data_err: {e}, sql {sql}")
+        return {"result": False, "error": "save data failed"}
@@ -4,10 +4,15 @@
 
 """
 数据统计客户端 — 调用 statistics_service HTTP API
+计数类上报（访问次数、Token 用量）先在进程内按 (uid, app, 字段) 累加，由后台线程按时间间隔
+或累计条目数批量提交到 /statistics/bulk，不阻塞请求路径；失败会合并回队列重试，进程退出前会再提交一次。
 """
 
+import atexit
 import logging.config
 import os
+import threading
+import time
 
 import requests
 import urllib3
@@ -75,14 +80,164 @@ def get_access_count_by_uid(uid: int) -> int:
     return -1
 
 
+# ---------------------------------------------------------------------------
+# 计数上报聚合器
+# ---------------------------------------------------------------------------
+FLUSH_INTERVAL_S = 5        # 后台提交间隔（秒）
+FLUSH_THRESHOLD = 200       # 待提交条目数达到该值时立即提交
+MAX_PENDING = 10000         # 待提交条目数上限，超出时丢弃新增计数
+MAX_RETRIES = 3             # 同一批计数连续提交失败的最大次数，超过后丢弃
+BULK_TIMEOUT_S = 5
+
+
+class UsageMeter:
+    """按 (uid, app, field) 累加计数并在后台批量提交"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL_S, flush_threshold=FLUSH_THRESHOLD,
+                 max_pending=MAX_PENDING, max_retries=MAX_RETRIES, api_base=None):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._api_base = api_base
+        self._pending: dict[tuple, int] = {}
+        self._retries = 0
+        self._lock = threading.Lock()
+        # 保证同一时刻只有一次提交（后台线程与退出前的提交）
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._session = None
+        self._stats = {"added": 0, "dropped": 0, "flushes": 0, "flushed_items": 0, "failures": 0}
+
+    def add(self, uid: int, app: str, field: str, count: int) -> bool:
+        """累加一次计数，立即返回；队列已满时丢弃并返回 False"""
+        if not uid or not count:
+            return False
+        if self._api_base is None:
+            # 在调用方线程解析地址（可能依赖 Flask 应用上下文）
+            self._api_base = _get_stats_api_base()
+        key = (int(uid), app or "", field)
+        with self._lock:
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                self._stats["dropped"] += 1
+                logger.warning(f"usage_meter_queue_full_drop, uid={uid}, app={app}, field={field}, count={count}")
+                return False
+            self._pending[key] = self._pending.get(key, 0) + count
+            self._stats["added"] += 1
+            size = len(self._pending)
+            self._ensure_started()
+        if size >= self.flush_threshold:
+            self._wakeup.set()
+        return True
+
+    def flush(self) -> bool:
+        """同步提交当前累计的计数，失败时合并回队列"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return True
+            items = [{"uid": uid, "app": app, "field": field, "count": count}
+                     for (uid, app, field), count in batch.items()]
+            ok = self._post_bulk(items)
+            with self._lock:
+                self._stats["flushes"] += 1
+                if ok:
+                    self._retries = 0
+                    self._stats["flushed_items"] += len(items)
+                    return True
+                self._stats["failures"] += 1
+                self._retries += 1
+                if self._retries > self.max_retries:
+                    self._retries = 0
+                    self._stats["dropped"] += len(items)
+                    logger.error(f"usage_meter_drop_after_retries, items={len(items)}")
+                    return False
+                # 合并回队列等待下次提交，已有的同 key 计数继续累加
+                for key, count in batch.items():
+                    if key in self._pending or len(self._pending) < self.max_pending:
+                        self._pending[key] = self._pending.get(key, 0) + count
+                    else:
+                        self._stats["dropped"] += 1
+            return False
+
+    def close(self):
+        """停止后台线程并提交剩余计数"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=BULK_TIMEOUT_S * 2)
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        return stats
+
+    def _ensure_started(self):
+        """调用方持有 self._lock"""
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="usage_meter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                if not self.flush() and self._retries:
+                    # 服务不可用时退避，避免频繁重试
+                    time.sleep(min(self.flush_interval * 2 ** self._retries, 60))
+            except Exception as e:
+                logger.exception(f"usage_meter_flush_error, err={e}")
+
+    def _post_bulk(self, items: list[dict]) -> bool:
+        try:
+            if self._session is None:
+                self._session = requests.Session()
+            resp = self._session.post(f"{self._api_base}/statistics/bulk", json={"items": items},
+                                      timeout=BULK_TIMEOUT_S, verify=False)
+            if resp.status_code == 200:
+                return True
+            logger.error(f"stats_api_bulk_failed, status={resp.status_code}, items={len(items)}")
+        except Exception as e:
+            logger.error(f"stats_api_bulk_failed, items={len(items)}, err={e}")
+        return False
+
+
+_meter_lock = threading.Lock()
+_meter: UsageMeter | None = None
+
+
+def get_usage_meter() -> UsageMeter:
+    """进程内共享的计数聚合器（首次使用时创建，进程退出前自动提交剩余计数）"""
+    global _meter
+    if _meter is None:
+        with _meter_lock:
+            if _meter is None:
+                _meter = UsageMeter()
+                atexit.register(_meter.close)
+    return _meter
+
+
+def _add_count(uid: int, field: str, count: int, app_name: str) -> bool:
+    try:
+        return get_usage_meter().add(uid, app_name, field, count)
+    except Exception as e:
+        logger.error(f"usage_meter_add_failed, uid={uid}, field={field}, err={e}")
+        return False
+
+
 def add_access_count_by_uid(uid: int, access_count: int, app_name: str = "") -> bool:
     """
     更新用户的访问次数
     """
-    body = {"uid": uid, "count": access_count, "app":""}
-    if app_name:
-        body["app"] = app_name
-    return _post("/statistics/access", body)
+    return _add_count(uid, "access_count", access_count, app_name)
 
 
 def get_input_token_by_uid(uid: int) -> int | None:
@@ -95,10 +250,7 @@ def get_input_token_by_uid(uid: int) -> int | None:
 
 def add_input_token_by_uid(uid: int, input_token: int, app_name: str = "") -> bool:
     """更新用户输入 Token 用量"""
-    body = {"uid": uid, "count": input_token, "app":""}
-    if app_name:
-        body["app"] = app_name
-    return _post("/statistics/input-token", body)
+    return _add_count(uid, "input_token", input_token, app_name)
 
 
 def get_embedding_token_by_uid(uid: int) -> int | None:
@@ -111,10 +263,7 @@ def get_embedding_token_by_uid(uid: int) -> int | None:
 
 def add_embedding_token_by_uid(uid: int, embedding_token: int, app_name: str = "") -> bool:
     """更新用户嵌入 Token 用量"""
-    body = {"uid": uid, "count": embedding_token, "app":""}
-    if app_name:
-        body["app"] = app_name
-    return _post("/statistics/embedding-token", body)
+    return _add_count(uid, "embedding_token", embedding_token, app_name)
 
 
 def get_output_token_by_uid(uid: int) -> int | None:
@@ -127,7 +276,31 @@ def get_output_token_by_uid(uid: int) -> int | None:
 
 def add_output_token_by_uid(uid: int, output_token: int, app_name: str = "") -> bool:
     """更新用户输出 Token 用量"""
-    body = {"uid": uid, "count": output_token, "app":""}
-    if app_name:
-        body["app"] = app_name
-    return _post("/statistics/output-token", body)
+    return _add_count(uid, "output_token", output_token, app_name)
+
+
+# ---------------------------------------------------------------------------
+# embedding 缓存统计（进程内累计，见 common.embedding_cache）
+# ---------------------------------------------------------------------------
+_emb_cache_lock = threading.Lock()
+_emb_cache_stats: dict[str, dict] = {}
+
+
+def add_embedding_cache_stats(model: str, hits: int, misses: int, saved_tokens: int) -> None:
+    """累计某个 embedding 模型的缓存命中数、未命中数和节省的 Token 数"""
+    with _emb_cache_lock:
+        item = _emb_cache_stats.setdefault(model, {"hits": 0, "misses": 0, "saved_tokens": 0})
+        item["hits"] += hits
+        item["misses"] += misses
+        item["saved_tokens"] += saved_tokens
+    logger.debug(f"embedding_cache, model={model}, hits={hits}, misses={misses}, saved_tokens={saved_tokens}")
+
+
+def get_embedding_cache_stats() -> dict:
+    """按模型返回 embedding 缓存统计，含命中率"""
+    with _emb_cache_lock:
+        result = {model: dict(item) for model, item in _emb_cache_stats.items()}
+    for item in result.values():
+        total = item["hits"] + item["misses"]
+        item["hit_rate"] = round(item["hits"] / total, 4) if total else 0.0
+    return result
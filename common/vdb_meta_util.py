@@ -5,17 +5,12 @@
 向量库元数据管理
 """
 import os
-import platform
-import sqlite3
 import time
 
-from common import cfg_util
-from common.cfg_util import sqlite_output, insert_del_sqlite
-from common.const import CFG_DB_URI, CFG_DB_FILE
+from common import cfg_util, meta_db
+from common.meta_db import LIMIT_1
 import logging.config
 
-from common.my_enums import DataType
-
 log_config_path = 'logging.conf'
 if os.path.exists(log_config_path):
     logging.config.fileConfig(log_config_path, encoding="utf-8")
@@ -33,29 +28,31 @@ class VdbMeta:
     def get_vdb_info_by_id(vdb_id: int):
         if not vdb_id:
             return None
-        sql = f"select * from vdb_info where id = {vdb_id} limit 1"
-        logger.info(f"get_vdb_info_by_id_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "select * from vdb_info where id = ? limit 1"
+        logger.info(f"get_vdb_info_by_id_sql, {sql}, {vdb_id}")
+        my_dt = meta_db.query(sql, (vdb_id,))
         return my_dt
 
     @staticmethod
     def get_vdb_info_by_uid(uid: int, kdb_name='', include_others_public=True):
         if not uid:
             raise RuntimeError("uid_null_err")
-        sql = f"select * from vdb_info where uid = {uid}"
+        sql = "select * from vdb_info where uid = ?"
+        params = (uid,)
         if kdb_name and kdb_name.strip() != '':
-            sql += f" and name = '{kdb_name}'"
-        logger.debug(f"get_my_vdb_info_by_uid_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+            sql += " and name = ?"
+            params = (uid, kdb_name)
+        logger.debug(f"get_my_vdb_info_by_uid_sql, {sql}, {params}")
+        my_dt = meta_db.query(sql, params)
         if not include_others_public:
             for item in my_dt:
                 if item.get('is_default', -1) == 1:  # 自己的知识库
                     item['name'] = '(默认)' + item.get('name', '')
             logger.debug(f"get_my_vdb_info_by_uid_dt {my_dt}")
             return my_dt
-        sql = f"select * from vdb_info where uid != {uid} and is_public = '1'"
-        logger.info(f"get_vdb_info_by_not_uid_and_is_public_sql, {sql}")
-        public_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "select * from vdb_info where uid != ? and is_public = '1'"
+        logger.info(f"get_vdb_info_by_not_uid_and_is_public_sql, {sql}, {uid}")
+        public_dt = meta_db.query(sql, (uid,))
         merged_dt = my_dt + public_dt
         for item in merged_dt:
             if uid == int(item.get('uid', -1)):                    # 自己的知识库
@@ -78,12 +75,9 @@ class VdbMeta:
         timestamp = time.time()
         # 生成类似格式（UTC时间）
         iso_str = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
-        sql = f"insert into vdb_info (name, uid, is_public, create_time) values ('{kdb_name}', {uid}, '{is_public}','{iso_str}')"
-        if not os.path.exists(CFG_DB_FILE):
-            raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-        with sqlite3.connect(CFG_DB_FILE) as my_conn:
-            logger.info(f"create_vdb_info_sql, {sql}")
-            my_dt = insert_del_sqlite(my_conn, sql)
+        sql = "insert into vdb_info (name, uid, is_public, create_time) values (?, ?, ?, ?)"
+        logger.info(f"create_vdb_info_sql, {sql}, {kdb_name}, {uid}, {is_public}")
+        my_dt = meta_db.execute(sql, (kdb_name, uid, str(is_public), iso_str))
         logger.info(f"create_vdb_info_dt {my_dt}")
         return my_dt
 
@@ -91,11 +85,9 @@ class VdbMeta:
     def active_vdb_file_info(file_id: int, file_path: str):
         if not file_id or not file_path:
             raise RuntimeError(f"param_null_err, {file_id}, {file_path}")
-        sql = f"update vdb_file_info set file_path = '{file_path}' where id = {file_id}"
-        if platform.system() == "Linux":
-            sql += " limit 1"
-        logger.info(f"update_file_info_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "update vdb_file_info set file_path = ? where id = ?" + LIMIT_1
+        logger.info(f"update_file_info_sql, {sql}, {file_id}, {file_path}")
+        my_dt = meta_db.execute(sql, (file_path, file_id))
         logger.info(f"update_file_info_dt {my_dt}")
         return my_dt
 
@@ -104,12 +96,9 @@ class VdbMeta:
         if not uid or not kb_id:
             logger.error(f"uid_or_kb_id_null_err, uid = {uid}, kb_id = {kb_id}")
             raise RuntimeError("uid_or_kb_id_null_err")
-        sql = f"delete from vdb_info where uid = {uid} and id = {kb_id}"
-        if not os.path.exists(CFG_DB_FILE):
-            raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-        with sqlite3.connect(CFG_DB_FILE) as my_conn:
-            logger.info(f"delete_vdb_by_uid_and_kb_id_sql, {sql}")
-            my_dt = insert_del_sqlite(my_conn, sql)
+        sql = "delete from vdb_info where uid = ? and id = ?"
+        logger.info(f"delete_vdb_by_uid_and_kb_id_sql, {sql}, {uid}, {kb_id}")
+        my_dt = meta_db.execute(sql, (uid, kb_id))
         logger.info(f"delete_vdb_by_uid_and_kb_id_dt {my_dt}")
         return my_dt
 
@@ -117,17 +106,17 @@ class VdbMeta:
     def get_vdb_file_list(uid: int, vdb_id: int):
         if not uid or not vdb_id:
             raise RuntimeError(f"get_vdb_file_list_param_null_err, {uid}, {vdb_id}")
-        sql = f"select * from vdb_file_info where uid = {uid} and vdb_id = {vdb_id}"
-        logger.debug(f"get_vdb_file_list_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "select * from vdb_file_info where uid = ? and vdb_id = ?"
+        logger.debug(f"get_vdb_file_list_sql, {sql}, {uid}, {vdb_id}")
+        my_dt = meta_db.query(sql, (uid, vdb_id))
         logger.debug(f"get_vdb_file_list_dt, {my_dt}")
         return my_dt
 
     @staticmethod
     def get_vdb_file_processing_list():
-        sql = f"select * from vdb_file_info where percent != 100 limit 100"
+        sql = "select * from vdb_file_info where percent != 100 limit 100"
         # logger.debug(f"get_vdb_processing_file_list_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        my_dt = meta_db.query(sql)
         # logger.debug(f"get_vdb_processing_file_list_dt {my_dt}")
         return my_dt
 
@@ -135,9 +124,9 @@ class VdbMeta:
     def get_user_default_vdb(uid: int):
         if not uid:
             raise RuntimeError(f"get_default_vdb_param_null_err, {uid}")
-        sql = f"select id, name from vdb_info where uid = {uid} and is_default = 1 limit 1"
-        logger.debug(f"get_default_vdb_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "select id, name from vdb_info where uid = ? and is_default = 1 limit 1"
+        logger.debug(f"get_default_vdb_sql, {sql}, {uid}")
+        my_dt = meta_db.query(sql, (uid,))
         logger.debug(f"get_default_vdb_dt {my_dt}")
         return my_dt
 
@@ -145,9 +134,9 @@ class VdbMeta:
     def get_vdb_by_id(vbd_id: int):
         if not vbd_id:
             raise RuntimeError(f"get_vdb_by_id_param_null_err, {vbd_id}")
-        sql = f"select id, name from vdb_info where id = {vbd_id} limit 1"
-        logger.debug(f"get_vdb_by_id_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "select id, name from vdb_info where id = ? limit 1"
+        logger.debug(f"get_vdb_by_id_sql, {sql}, {vbd_id}")
+        my_dt = meta_db.query(sql, (vbd_id,))
         logger.debug(f"get_vdb_by_id_dt {my_dt}")
         return my_dt
 
@@ -155,15 +144,13 @@ class VdbMeta:
     def set_user_default_vdb(uid: int, vdb_id: int):
         if not uid or not vdb_id:
             raise RuntimeError(f"set_default_vdb_param_null_err, {uid}, {vdb_id}")
-        sql = f"update vdb_info set is_default = 1 where uid = {uid} and id = {vdb_id}"
-        if platform.system() == "Linux":
-            sql += " limit 1"
-        logger.debug(f"set_default_vdb_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "update vdb_info set is_default = 1 where uid = ? and id = ?" + LIMIT_1
+        logger.debug(f"set_default_vdb_sql, {sql}, {uid}, {vdb_id}")
+        my_dt = meta_db.execute(sql, (uid, vdb_id))
         logger.debug(f"set_default_vdb_dt {my_dt}")
-        sql = f"update vdb_info set is_default = 0 where uid = {uid} and id != {vdb_id}"
-        logger.debug(f"set_default_vdb_exclude_sql, {sql}")
-        my_dt1 = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "update vdb_info set is_default = 0 where uid = ? and id != ?"
+        logger.debug(f"set_default_vdb_exclude_sql, {sql}, {uid}, {vdb_id}")
+        my_dt1 = meta_db.execute(sql, (uid, vdb_id))
         logger.debug(f"set_default_vdb_exclude_dt {my_dt1}")
         return my_dt
 
@@ -171,9 +158,9 @@ class VdbMeta:
     def get_vdb_file_info_by_file_name(file_name: str, uid: int, vdb_id: int) -> list:
         if not uid or not file_name or not vdb_id:
             raise RuntimeError(f"param_null_err {file_name}, {uid}, {vdb_id}")
-        sql = f"select * from vdb_file_info where name = '{file_name}' and uid = {uid} and vdb_id = {vdb_id} limit 1"
-        logger.debug(f"get_file_info_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "select * from vdb_file_info where name = ? and uid = ? and vdb_id = ? limit 1"
+        logger.debug(f"get_file_info_sql, {sql}, {file_name}, {uid}, {vdb_id}")
+        my_dt = meta_db.query(sql, (file_name, uid, vdb_id))
         logger.debug(f"get_file_info_dt {my_dt}")
         return my_dt
 
@@ -181,9 +168,9 @@ class VdbMeta:
     def get_vdb_file_info_by_md5(file_md5: str, uid: int, vdb_id: int) -> list:
         if not uid or not file_md5 or not vdb_id:
             raise RuntimeError(f"param_null_err {file_md5}, {uid}, {vdb_id}")
-        sql = f"select * from vdb_file_info where file_md5 = '{file_md5}' and uid = {uid} and vdb_id = {vdb_id} limit 1"
-        logger.debug(f"get_file_info_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "select * from vdb_file_info where file_md5 = ? and uid = ? and vdb_id = ? limit 1"
+        logger.debug(f"get_file_info_sql, {sql}, {file_md5}, {uid}, {vdb_id}")
+        my_dt = meta_db.query(sql, (file_md5, uid, vdb_id))
         logger.debug(f"get_file_info_dt {my_dt}")
         return my_dt
 
@@ -191,9 +178,9 @@ class VdbMeta:
     def get_vdb_file_info_by_task_id(task_id: int) -> dict:
         if not task_id:
             raise RuntimeError(f"param_null_err {task_id}")
-        sql = f"select * from vdb_file_info where task_id = {task_id} limit 1"
-        logger.debug(f"get_file_info_by_task_id, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "select * from vdb_file_info where task_id = ? limit 1"
+        logger.debug(f"get_file_info_by_task_id, {sql}, {task_id}")
+        my_dt = meta_db.query(sql, (task_id,))
         logger.debug(f"get_file_info_by_task_id_dt {my_dt}")
         return my_dt
 
@@ -201,35 +188,25 @@ class VdbMeta:
     def get_vdb_file_info_by_id(file_id: int):
         if not file_id:
             raise RuntimeError(f"file_id_param_null_err {file_id}")
-        sql = f"select * from vdb_file_info where id = {file_id} limit 1"
-        logger.debug(f"get_file_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "select * from vdb_file_info where id = ? limit 1"
+        logger.debug(f"get_file_sql, {sql}, {file_id}")
+        my_dt = meta_db.query(sql, (file_id,))
         logger.debug(f"get_file_info_by_id_dt {my_dt}")
         return my_dt
 
     @staticmethod
     def delete_vdb_file_by_uid_vbd_id_file_name(file_name: str, uid: int, vdb_id: int):
-        sql = f"delete from vdb_file_info where name ='{file_name}' and uid={uid} and vdb_id={vdb_id}"
-        if platform.system() == "Linux":
-            sql += " limit 1"
-        if not os.path.exists(CFG_DB_FILE):
-            raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-        with sqlite3.connect(CFG_DB_FILE) as my_conn:
-            logger.info(f"delete_file_by_uid_vbd_id_file_name_sql, {sql}")
-            my_dt = insert_del_sqlite(my_conn, sql)
+        sql = "delete from vdb_file_info where name = ? and uid = ? and vdb_id = ?" + LIMIT_1
+        logger.info(f"delete_file_by_uid_vbd_id_file_name_sql, {sql}, {file_name}, {uid}, {vdb_id}")
+        my_dt = meta_db.execute(sql, (file_name, uid, vdb_id))
         logger.info(f"delete_file_by_uid_vbd_id_file_name_dt {my_dt}")
         return my_dt
 
     @staticmethod
     def delete_vdb_file_by_task_id(task_id: int):
-        sql = f"delete from vdb_file_info where task_id={task_id}"
-        if platform.system() == "Linux":
-            sql += " limit 1"
-        if not os.path.exists(CFG_DB_FILE):
-            raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-        with sqlite3.connect(CFG_DB_FILE) as my_conn:
-            logger.info(f"delete_file_by_vbd_task_id_sql, {sql}")
-            my_dt = insert_del_sqlite(my_conn, sql)
+        sql = "delete from vdb_file_info where task_id = ?" + LIMIT_1
+        logger.info(f"delete_file_by_vbd_task_id_sql, {sql}, {task_id}")
+        my_dt = meta_db.execute(sql, (task_id,))
         logger.info(f"delete_file_by_vbd_task_id_dt {my_dt}")
         return my_dt
 
@@ -238,38 +215,25 @@ class VdbMeta:
         if not file_id:
             logger.error(f"file_id_null_err, {file_id}")
             return
-        sql = f"delete from vdb_file_info where id={file_id}"
-        if platform.system() == "Linux":
-            sql += " limit 1"
-        if not os.path.exists(CFG_DB_FILE):
-            raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-        with sqlite3.connect(CFG_DB_FILE) as my_conn:
-            logger.info(f"delete_file_sql, {sql}")
-            my_dt = insert_del_sqlite(my_conn, sql)
+        sql = "delete from vdb_file_info where id = ?" + LIMIT_1
+        logger.info(f"delete_file_sql, {sql}, {file_id}")
+        my_dt = meta_db.execute(sql, (file_id,))
         logger.info(f"delete_file_dt {my_dt}")
         return my_dt
 
     @staticmethod
     def delete_vdb_file_by_uid_vbd_id_file_id(file_id: int, uid: int, vdb_id: int):
-        sql = f"delete from vdb_file_info where id ={file_id} and uid={uid} and vdb_id={vdb_id}"
-        if platform.system() == "Linux":
-            sql += " limit 1"
-        if not os.path.exists(CFG_DB_FILE):
-            raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-        with sqlite3.connect(CFG_DB_FILE) as my_conn:
-            logger.info(f"delete_file_by_uid_vbd_id_file_id_sql, {sql}")
-            my_dt = insert_del_sqlite(my_conn, sql)
+        sql = "delete from vdb_file_info where id = ? and uid = ? and vdb_id = ?" + LIMIT_1
+        logger.info(f"delete_file_by_uid_vbd_id_file_id_sql, {sql}, {file_id}, {uid}, {vdb_id}")
+        my_dt = meta_db.execute(sql, (file_id, uid, vdb_id))
         logger.info(f"delete_file_by_uid_vbd_id_file_id_dt {my_dt}")
         return my_dt
 
     @staticmethod
     def delete_vdb_file_by_uid_vbd_id(uid: int, vdb_id: int):
-        sql = f"delete from vdb_file_info where uid={uid} and vdb_id={vdb_id}"
-        if not os.path.exists(CFG_DB_FILE):
-            raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-        with sqlite3.connect(CFG_DB_FILE) as my_conn:
-            logger.info(f"delete_file_by_uid_vbd_id_sql, {sql}")
-            my_dt = insert_del_sqlite(my_conn, sql)
+        sql = "delete from vdb_file_info where uid = ? and vdb_id = ?"
+        logger.info(f"delete_file_by_uid_vbd_id_sql, {sql}, {uid}, {vdb_id}")
+        my_dt = meta_db.execute(sql, (uid, vdb_id))
         logger.info(f"delete_file_by_uid_vbd_id_dt {my_dt}")
         return my_dt
 
@@ -279,13 +243,11 @@ class VdbMeta:
         timestamp = time.time()
         # 生成类似格式（UTC时间）
         iso_str = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
-        sql = (f"insert into vdb_file_info (name, uid, vdb_id, file_path, task_id, file_md5, create_time) values"
-               f" ('{original_file_name}', {uid}, {vdb_id}, '{saved_file_name}', {task_id}, '{file_md5}', '{iso_str}')")
-        if not os.path.exists(CFG_DB_FILE):
-            raise FileNotFoundError(f"数据库文件 {os.path.abspath(CFG_DB_FILE)} 不存在")
-        with sqlite3.connect(CFG_DB_FILE) as my_conn:
-            logger.info(f"save_file_info_sql, {sql}")
-            my_dt = insert_del_sqlite(my_conn, sql)
+        sql = ("insert into vdb_file_info (name, uid, vdb_id, file_path, task_id, file_md5, create_time) "
+               "values (?, ?, ?, ?, ?, ?, ?)")
+        params = (original_file_name, uid, vdb_id, saved_file_name, task_id, file_md5, iso_str)
+        logger.info(f"save_file_info_sql, {sql}, {params}")
+        my_dt = meta_db.execute(sql, params)
         logger.info(f"save_file_info_dt, {my_dt}")
         return my_dt
 
@@ -293,11 +255,9 @@ class VdbMeta:
     def update_vdb_file_path(file_id: int, file_path: str):
         if not file_id or not file_path:
             raise RuntimeError(f"param_null_err, {file_id}, {file_path}")
-        sql = f"update vdb_file_info set file_path = '{file_path}' where id = {file_id}"
-        if platform.system() == "Linux":
-            sql += " limit 1"
-        logger.info(f"update_file_info_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+        sql = "update vdb_file_info set file_path = ? where id = ?" + LIMIT_1
+        logger.info(f"update_file_info_sql, {sql}, {file_id}, {file_path}")
+        my_dt = meta_db.execute(sql, (file_path, file_id))
         logger.info(f"update_file_info_dt {my_dt}")
         return my_dt
 
@@ -306,13 +266,13 @@ class VdbMeta:
         if not file_id or not process_info:
             raise RuntimeError(f"param_null_err, {file_id}, {process_info}")
         if percent == -1:
-            sql = f"update vdb_file_info set process_info = '{process_info}' where id = {file_id}"
+            sql = "update vdb_file_info set process_info = ? where id = ?" + LIMIT_1
+            params = (process_info, file_id)
         else:
-            sql = f"update vdb_file_info set process_info = '{process_info}', percent={percent} where id = {file_id}"
-        if platform.system() == "Linux":
-            sql += " limit 1"
-        logger.debug(f"update_file_info_sql, {sql}")
-        my_dt = sqlite_output(CFG_DB_URI, sql, DataType.JSON.value)
+            sql = "update vdb_file_info set process_info = ?, percent = ? where id = ?" + LIMIT_1
+            params = (process_info, percent, file_id)
+        logger.debug(f"update_file_info_sql, {sql}, {params}")
+        my_dt = meta_db.execute(sql, params)
         logger.debug(f"update_file_info_dt {my_dt}")
         return my_dt
 
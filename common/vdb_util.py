@@ -32,6 +32,8 @@ from common.const import MAX_EMBEDDING_TXT_LENGTH
 from common.vdb_meta_util import VdbMeta
 from common.statistic_util import add_embedding_token_by_uid
 from common.cm_utils import estimate_tokens
+from common.embedding_cache import embed_with_cache
+from common.embedding_codec import ENCODING_FORMAT, decode_vector
 from common.xmind_util import XMindLoader
 
 # 配置日志
@@ -43,6 +45,9 @@ else:
     logging.basicConfig(level=logging.INFO,format= LOG_FORMATTER, force=True)
 logger = logging.getLogger(__name__)
 
+# 批量检索时每次 collection.query 提交的查询向量数
+VECTOR_QUERY_BATCH_SIZE = 64
+
 
 class RemoteChromaEmbedder(EmbeddingFunction):
     """Chroma兼容的远程嵌入适配器"""
@@ -53,47 +58,42 @@ class RemoteChromaEmbedder(EmbeddingFunction):
         # super().__init__(*args, **kwargs)
 
     def __call__(self, doc: Documents) -> Embeddings:
-        """批量获取文本嵌入向量，支持超长文本自动分割"""
+        """批量获取文本嵌入向量，支持超长文本自动分割；已缓存的文本不再请求远程接口"""
+        processed = []
+        for text in doc:
+            if len(text) > self.max_input_length:
+                # 如果文本超长，进一步分割
+                logger.warning(f"文本长度 {len(text)} 超过限制 {self.max_input_length}，进行二次分割")
+                processed.extend(self._split_long_text(text))
+            else:
+                processed.append(text)
+
+        return embed_with_cache(self.model_name, processed, self._embed_remote)
+
+    def embed_queries(self, queries: list[str]) -> list[np.ndarray]:
+        """为检索查询生成向量，每个查询恰好对应一个向量（超长查询只取分割后的第一块）"""
+        processed = [q if len(q) <= self.max_input_length else self._split_long_text(q)[0] for q in queries]
+        return embed_with_cache(self.model_name, processed, self._embed_remote)
+
+    def _embed_remote(self, texts: list[str]) -> list[np.ndarray]:
+        """按批调用远程 embedding 接口"""
         batch_size = 32
         embeddings = []
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i:i + batch_size]
+            try:
+                # base64 传输（小端 float32），直接解码为 NumPy 数组
+                resp = self.client.embeddings.create(model=self.model_name, input=batch,
+                                                     encoding_format=ENCODING_FORMAT)
+                batch_embeddings = [decode_vector(item.embedding) for item in resp.data]
+
+                if i == 0 and batch_embeddings:
+                    logger.info(f"{self.model_name}, embedding_model_dimension, {len(batch_embeddings[0])}")
 
-        for i in range(0, len(doc), batch_size):
-            batch = doc[i:i + batch_size]
-
-            # 检查并处理超长文本
-            processed_batch = []
-            for text in batch:
-                if len(text) > self.max_input_length:
-                    # 如果文本超长，进一步分割
-                    logger.warning(f"文本长度 {len(text)} 超过限制 {self.max_input_length}，进行二次分割")
-                    chunks = self._split_long_text(text)
-                    processed_batch.extend(chunks)
-                else:
-                    processed_batch.append(text)
-
-            if not processed_batch:
-                continue
-
-            # 处理后的批次可能超过限制，需要分批发送
-            for j in range(0, len(processed_batch), batch_size):
-                sub_batch = processed_batch[j:j + batch_size]
-                if not sub_batch:
-                    continue
-
-                try:
-                    resp = self.client.embeddings.create(model=self.model_name, input=sub_batch)
-
-                    if i == 0 and j == 0 and resp.data:
-                        dimension = len(resp.data[0].embedding)
-                        logger.info(f"{self.model_name}, embedding_model_dimension, {dimension}")
-
-                    embeddings.extend([
-                        np.array(item.embedding, dtype=np.float32)
-                        for item in resp.data
-                    ])
-                except Exception as e:
-                    logger.error(f"嵌入API调用失败: {str(e)}")
-                    raise
+                embeddings.extend(batch_embeddings)
+            except Exception as e:
+                logger.error(f"嵌入API调用失败: {str(e)}")
+                raise
 
         return embeddings
 
@@ -452,23 +452,24 @@ def update_doc(task_id: int, thread_lock, task_progress: dict, prev_file_path: s
     vector_file(task_id, cur_file_path, vector_db, llm_cfg)
 
 
-def load_vdb(vector_db: str, llm_cfg: dict) -> Optional[chromadb.Collection]:
+def build_embedder(llm_cfg: dict) -> RemoteChromaEmbedder:
+    return RemoteChromaEmbedder(
+        build_client(llm_cfg),
+        llm_cfg['embedding_model_name'],
+        max_input_length=llm_cfg.get('embedding_max_input_length', MAX_EMBEDDING_TXT_LENGTH)
+    )
+
+
+def load_vdb(vector_db: str, llm_cfg: dict, embedder: RemoteChromaEmbedder = None) -> Optional[chromadb.Collection]:
     """加载Chroma矢量数据库集合"""
     if not os.path.exists(vector_db):
         logger.info(f"vector_db_dir_not_exists_return_none, {vector_db}")
         return None
 
     try:
-        openai_client = build_client(llm_cfg)
-        embed_model = RemoteChromaEmbedder(
-            openai_client,
-            llm_cfg['embedding_model_name'],
-            max_input_length=llm_cfg.get('embedding_max_input_length', MAX_EMBEDDING_TXT_LENGTH)
-        )
-
         return get_chroma_client(vector_db).get_collection(
             name="knowledge_base",
-            embedding_function=embed_model
+            embedding_function=embedder or build_embedder(llm_cfg)
         )
     except Exception as e:
         logger.error(f"加载向量数据库失败: {str(e)}", exc_info=True)
@@ -479,46 +480,52 @@ def search(query: str, score_threshold: float, vector_db: str,llm_cfg: dict, top
     """
     相似度搜索并返回格式化结果
     """
-    collection = load_vdb(vector_db, llm_cfg)
-    if not collection:
-        logger.info(f"vdb_collection_null_return_empty_list_for_q, {query}")
+    return search_batch([query], score_threshold, vector_db, llm_cfg, top_k)[0]
+
+
+def search_batch(queries: list[str], score_threshold: float, vector_db: str, llm_cfg: dict,
+                 top_k=3) -> list[list[dict]]:
+    """
+    批量相似度搜索：只打开一次集合，全部查询一起做 embedding，再分批提交 collection.query
+    :return: 与 queries 一一对应的结果列表
+    """
+    if not queries:
         return []
+    embedder = build_embedder(llm_cfg)
+    collection = load_vdb(vector_db, llm_cfg, embedder)
+    if not collection:
+        logger.info(f"vdb_collection_null_return_empty_list_for_q, {len(queries)} queries")
+        return [[] for _ in queries]
 
     # 使用远程embedding获取查询向量
-    openai_client = build_client(llm_cfg)
-    embedder = RemoteChromaEmbedder(
-        openai_client,
-        llm_cfg['embedding_model_name'],
-        max_input_length=llm_cfg.get('embedding_max_input_length', MAX_EMBEDDING_TXT_LENGTH)
-    )
-    query_embedding = embedder([query])[0]
+    query_embeddings = embedder.embed_queries(queries)
+
+    all_results = []
+    for start in range(0, len(query_embeddings), VECTOR_QUERY_BATCH_SIZE):
+        results: QueryResult = collection.query(
+            query_embeddings=query_embeddings[start:start + VECTOR_QUERY_BATCH_SIZE],
+            n_results=top_k,
+            include=["documents", "metadatas", "distances"]
+        )
+        all_results.extend(_format_query_results(results, qi, score_threshold)
+                           for qi in range(len(results['ids'])))
+    return all_results
 
-    # 执行查询
-    results: QueryResult = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k,
-        include=["documents", "metadatas", "distances"]
-    )
 
-    # 处理结果并计算相似度分数
+def _format_query_results(results: QueryResult, qi: int, score_threshold: float) -> list[dict]:
+    """处理第 qi 个查询的结果并计算相似度分数，按分数降序排序"""
     formatted_results = []
-    for i in range(len(results['ids'][0])):
-        doc_id = results['ids'][0][i]
-        content = results['documents'][0][i]
-        metadata = results['metadatas'][0][i]
-        distance = results['distances'][0][i]
-
+    for i in range(len(results['ids'][qi])):
         # 将距离转换为相似度分数 (1-距离)
-        similarity_score = max(0.0, min(1.0, 1.0 - distance))
+        similarity_score = max(0.0, min(1.0, 1.0 - results['distances'][qi][i]))
 
         if similarity_score >= score_threshold:
             formatted_results.append({
-                "id": doc_id,
-                "content": content,
-                "metadata": metadata,
+                "id": results['ids'][qi][i],
+                "content": results['documents'][qi][i],
+                "metadata": results['metadatas'][qi][i],
                 "score": similarity_score
             })
-    # 按分数降序排序
     return sorted(formatted_results, key=lambda x: x["score"], reverse=True)
 
 
@@ -638,6 +645,10 @@ def _get_or_build_bm25(vector_db_dir: str) -> tuple:
 def _keyword_search(query: str, vector_db_dir: str, top_k: int = 3) -> list[dict]:
     """BM25 关键词检索"""
     index, documents = _get_or_build_bm25(vector_db_dir)
+    return _bm25_top_k(index, documents, query, top_k)
+
+
+def _bm25_top_k(index, documents: list[str], query: str, top_k: int) -> list[dict]:
     if not index or not documents:
         return []
 
@@ -687,7 +698,40 @@ def hybrid_search(query: str, vector_db_dir: str, score_threshold: float,
         logger.warning(f"hybrid_keyword_err, {e}")
 
     logger.info(f"hybrid_search, vector={len(vector_results)}, keyword={len(keyword_results)}, q={query[:50]}")
+    return _rrf_merge(vector_results, keyword_results, top_k)
+
+
+def hybrid_search_batch(queries: list[str], vector_db_dir: str, score_threshold: float,
+                        llm_cfg: dict, top_k: int = 3) -> list[list[dict]]:
+    """
+    批量混合检索：向量检索共用一次集合加载和批量 embedding，BM25 索引只取一次
+    """
+    vector_results = [[] for _ in queries]
+    try:
+        vector_results = search_batch(queries, score_threshold, vector_db_dir, llm_cfg, top_k)
+    except Exception as e:
+        logger.warning(f"hybrid_vector_batch_err, {e}")
 
+    index, documents = None, []
+    try:
+        index, documents = _get_or_build_bm25(vector_db_dir)
+    except Exception as e:
+        logger.warning(f"hybrid_keyword_batch_err, {e}")
+
+    merged = []
+    for query, v_results in zip(queries, vector_results):
+        k_results = []
+        try:
+            k_results = _bm25_top_k(index, documents, query, top_k)
+        except Exception as e:
+            logger.warning(f"hybrid_keyword_err, {e}")
+        merged.append(_rrf_merge(v_results, k_results, top_k))
+    logger.info(f"hybrid_search_batch, queries={len(queries)}, "
+                f"with_results={sum(1 for m in merged if m)}, vdb={vector_db_dir}")
+    return merged
+
+
+def _rrf_merge(vector_results: list[dict], keyword_results: list[dict], top_k: int) -> list[dict]:
     # 如果只有一侧有结果，直接返回
     if not keyword_results:
         return vector_results[:top_k]
@@ -718,7 +762,7 @@ def hybrid_search(query: str, vector_db_dir: str, score_threshold: float,
         doc["rrf_score"] = rrf_score
         merged.append(doc)
 
-    logger.info(f"hybrid_merged, total={len(merged)}")
+    logger.debug(f"hybrid_merged, total={len(merged)}")
     return merged
 
 
@@ -738,11 +782,26 @@ def search_txt(txt: str, vector_db_dir: str, score_threshold: float,
         search_results = hybrid_search(txt, vector_db_dir, score_threshold, llm_cfg, txt_num)
     except Exception as e:
         logger.exception(f"search_txt_err, embedding uri: {llm_cfg['embedding_api_uri']}, err={e}", exc_info=True)
-
-    all_txt = ""
     if not search_results:
         logger.info(f"no_search_results_return_for: {txt}")
-        return all_txt
+    return _join_search_results(search_results)
+
+
+def search_txt_batch(txts: list[str], vector_db_dir: str, score_threshold: float,
+        llm_cfg: dict, txt_num: int) -> list[str]:
+    """
+    search_txt 的批量版本，返回与 txts 一一对应的检索文本
+    """
+    search_results = [[] for _ in txts]
+    try:
+        search_results = hybrid_search_batch(txts, vector_db_dir, score_threshold, llm_cfg, txt_num)
+    except Exception as e:
+        logger.exception(f"search_txt_batch_err, embedding uri: {llm_cfg['embedding_api_uri']}, err={e}")
+    return [_join_search_results(s_r) for s_r in search_results]
+
+
+def _join_search_results(search_results: list[dict]) -> str:
+    all_txt = ""
     for s_r in search_results:
         s_r_txt = s_r.get("content", "").replace("\n", "")
         if "......................." in s_r_txt:
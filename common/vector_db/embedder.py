@@ -14,6 +14,8 @@ import logging
 from openai import OpenAI
 from chromadb import EmbeddingFunction
 
+from common.embedding_cache import embed_with_cache
+from common.embedding_codec import ENCODING_FORMAT, decode_vector
 from .types import EmbeddingConfig
 
 logger = logging.getLogger(__name__)
@@ -28,20 +30,22 @@ class RemoteChromaEmbedder(EmbeddingFunction):
         self._batch_size = kwargs.get('batch_size', 32)
 
     def __call__(self, inputs: List[str]) -> List[List[float]]:
-        """批量获取文本嵌入向量"""
+        """批量获取文本嵌入向量，已缓存的文本不再请求远程接口"""
+        return [vec.tolist() for vec in embed_with_cache(self.model_name, inputs, self._embed_remote)]
+
+    def _embed_remote(self, inputs: List[str]) -> List[np.ndarray]:
         embeddings = []
 
         for i in range(0, len(inputs), self._batch_size):
             batch = inputs[i:i + self._batch_size]
             try:
+                # base64 传输（小端 float32），直接解码为 NumPy 数组
                 response = self.client.embeddings.create(
                     model=self.model_name,
-                    input=batch
+                    input=batch,
+                    encoding_format=ENCODING_FORMAT
                 )
-                batch_embeddings = [
-                    np.array(item.embedding, dtype=np.float32).tolist()
-                    for item in response.data
-                ]
+                batch_embeddings = [decode_vector(item.embedding) for item in response.data]
                 embeddings.extend(batch_embeddings)
             except Exception as e:
                 logger.error(f"嵌入批量处理失败: {e}")
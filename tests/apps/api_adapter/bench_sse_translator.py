@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OpenAI SSE -> Anthropic SSE 转换吞吐对比：旧版 generate_anthropic_sse vs sse_translator.translate_stream。
+回放一段 OpenAI 流式响应（默认合成 DeepSeek 风格的 思考 + 正文 + 工具调用 流，也可用 --file 指定抓包的 SSE 原文），
+按 --lines-per-read 条 SSE 事件一个网络读取批次切分，报告每秒处理的上游事件数与输出帧数。
+    python tests/apps/api_adapter/bench_sse_translator.py --tokens 2000 --repeat 20
+    python tests/apps/api_adapter/bench_sse_translator.py --file recorded.sse
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+
+import requests
+import urllib3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.api_adapter.sse_translator import FINISH_REASON_MAP, translate_stream
+
+logger = logging.getLogger(__name__)
+
+
+class Replay:
+    """按网络读取批次回放录制的 SSE 字节"""
+
+    def __init__(self, reads):
+        self.reads = reads
+
+    def iter_content(self, chunk_size=None):
+        return iter(self.reads)
+
+    def iter_lines(self, decode_unicode=False):
+        pending = b""
+        for chunk in self.reads:
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            yield from lines
+        if pending:
+            yield pending
+
+
+def make_stream(tokens):
+    """合成 DeepSeek 风格的流：思考 -> 正文 -> 工具调用 -> usage -> [DONE]"""
+    base = {"id": "chatcmpl-" + uuid.uuid4().hex, "object": "chat.completion.chunk",
+            "created": 1730000000, "model": "deepseek-reasoner", "system_fingerprint": "fp_1"}
+    words = ["燃气", "费用", "怎么", "缴纳", "，", "可以", "通过", "营业厅", "或", "线上", "渠道", "。", " the", " bill"]
+    events = []
+
+    def add(delta, finish=None, usage=None):
+        chunk = dict(base, choices=[{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish}])
+        if usage:
+            chunk["usage"] = usage
+        events.append(chunk)
+
+    add({"role": "assistant", "content": ""})
+    for i in range(tokens // 3):
+        add({"reasoning_content": words[i % len(words)], "content": None})
+    for i in range(tokens - tokens // 3 - 20):
+        add({"content": words[i % len(words)]})
+    add({"tool_calls": [{"index": 0, "id": "call_1", "type": "function",
+                         "function": {"name": "query_bill", "arguments": ""}}]})
+    for part in ['{"user', '_id": ', '"1001', '", "mon', 'th": "', '2025-', '06"}'] * 3:
+        add({"tool_calls": [{"index": 0, "function": {"arguments": part}}]})
+    add({}, finish="tool_calls", usage={"prompt_tokens": 100, "completion_tokens": tokens, "total_tokens": tokens + 100})
+    return [f"data: {json.dumps(e, ensure_ascii=False)}\n\n".encode() for e in events] + [b"data: [DONE]\n\n"]
+
+
+def run(fn, reads, repeat):
+    best, frames, size = float("inf"), 0, 0
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        out = list(fn(Replay(reads)))
+        best = min(best, time.perf_counter() - begin)
+        frames, size = len(out), sum(len(b) for b in out)
+    return best, frames, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--file", default="", help="录制的 OpenAI SSE 原文")
+    parser.add_argument("--lines-per-read", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            events = [e + b"\n\n" for e in f.read().split(b"\n\n") if e.strip()]
+    else:
+        events = make_stream(args.tokens)
+    reads = [b"".join(events[i:i + args.lines_per_read]) for i in range(0, len(events), args.lines_per_read)]
+
+    modes = [
+        ("legacy", lambda r: legacy_generate_anthropic_sse(r, "claude")),
+        ("fast", lambda r: translate_stream(r.iter_content(), "claude")),
+        ("fast+20ms", lambda r: translate_stream(r.iter_content(), "claude", coalesce_ms=20)),
+    ]
+    print(f"{len(events)} upstream events, {len(reads)} reads")
+    print(f"{'mode':>10} {'ms':>9} {'events/s':>12} {'frames':>8} {'bytes':>10}")
+    for name, fn in modes:
+        elapsed, frames, size = run(fn, reads, args.repeat)
+        print(f"{name:>10} {elapsed * 1000:9.2f} {len(events) / elapsed:12.0f} {frames:>8} {size:>10}")
+
+
+def legacy_generate_anthropic_sse(openai_stream_response, anthropic_model):
+    """旧版实现（逐行 json.loads / json.dumps），作为对比基线"""
+    msg_id = f"msg_{uuid.uuid4().hex[:12]}"
+    thinking_block_index = -1    # 推理/思考内容块的 Anthropic content index
+    text_block_index = -1        # 文本内容块的 Anthropic content index
+    tool_block_indices = {}      # OpenAI tool_call index -> Anthropic content index
+    next_block_index = 0         # 下一个可用的 Anthropic content index
+    closed_blocks = set()        # 已提前关闭的 content block index
+    input_tokens = 0
+    output_tokens = 0
+    finish_reason = None
+    last_ping = time.time()
+    ping_interval = 30           # 每 30 秒发送一次 ping，防止连接超时
+
+    # message_start
+    start_event = {
+        "type": "message_start",
+        "message": {
+            "id": msg_id,
+            "type": "message",
+            "role": "assistant",
+            "content": [],
+            "model": anthropic_model,
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {"input_tokens": 0, "output_tokens": 0}
+        }
+    }
+    yield (f"event: message_start\ndata: {json.dumps(start_event, ensure_ascii=False)}\n\n").encode('utf-8')
+
+    def _emit_block_start(index, block):
+        event = {
+            "type": "content_block_start",
+            "index": index,
+            "content_block": block
+        }
+        return (f"event: content_block_start\ndata: {json.dumps(event, ensure_ascii=False)}\n\n").encode('utf-8')
+
+    def _emit_block_delta(index, delta):
+        event = {
+            "type": "content_block_delta",
+            "index": index,
+            "delta": delta
+        }
+        return (f"event: content_block_delta\ndata: {json.dumps(event, ensure_ascii=False)}\n\n").encode('utf-8')
+
+    def _emit_block_stop(index):
+        event = {"type": "content_block_stop", "index": index}
+        return (f"event: content_block_stop\ndata: {json.dumps(event, ensure_ascii=False)}\n\n").encode('utf-8')
+
+    line_count = 0
+    try:
+        for line in openai_stream_response.iter_lines(decode_unicode=False):
+            line_count += 1
+            if not line:
+                continue
+
+            try:
+                line_str = line.decode('utf-8')
+            except UnicodeDecodeError:
+                line_str = line.decode('utf-8', errors='replace')
+            except AttributeError:
+                line_str = line
+
+            if not line_str.startswith("data: "):
+                continue
+
+            data_str = line_str[6:].strip()
+            if data_str == "[DONE]":
+                break
+
+            try:
+                chunk = json.loads(data_str)
+            except json.JSONDecodeError:
+                continue
+
+            # 先提取 usage（可能和 choices 在同一个 chunk 中）
+            chunk_usage = chunk.get("usage")
+            if chunk_usage:
+                input_tokens = chunk_usage.get("prompt_tokens", input_tokens)
+                output_tokens = chunk_usage.get("completion_tokens", output_tokens)
+
+            choices = chunk.get("choices", [])
+            if not choices:
+                continue
+
+            choice = choices[0]
+            delta = choice.get("delta", {})
+            chunk_finish = choice.get("finish_reason")
+            if chunk_finish:
+                finish_reason = chunk_finish
+
+            # 处理推理/思考 delta（如 DeepSeek-R1 的 reasoning_content）
+            reasoning_text = delta.get("reasoning_content") or ""
+            if reasoning_text:
+                if thinking_block_index < 0:
+                    thinking_block_index = next_block_index
+                    next_block_index += 1
+                    yield _emit_block_start(thinking_block_index, {
+                        "type": "thinking", "thinking": "", "signature": ""
+                    })
+                yield _emit_block_delta(thinking_block_index, {
+                    "type": "thinking_delta", "thinking": reasoning_text
+                })
+
+            # 处理文本 delta
+            content_text = delta.get("content") or ""
+            if content_text:
+                # 如果 thinking 内容块还开着，先关闭（推理结束后才开始正文）
+                if thinking_block_index >= 0 and thinking_block_index not in closed_blocks:
+                    yield _emit_block_stop(thinking_block_index)
+                    closed_blocks.add(thinking_block_index)
+
+                if text_block_index < 0:
+                    text_block_index = next_block_index
+                    next_block_index += 1
+                    yield _emit_block_start(text_block_index, {"type": "text", "text": ""})
+
+                yield _emit_block_delta(text_block_index, {"type": "text_delta", "text": content_text})
+
+            # 处理 tool_calls delta
+            for tc in delta.get("tool_calls", []):
+                tc_index = tc.get("index", 0)
+
+                if tc_index not in tool_block_indices:
+                    tool_block_indices[tc_index] = next_block_index
+                    next_block_index += 1
+                    tc_id = tc.get("id", "")
+                    tc_name = tc.get("function", {}).get("name", "")
+                    yield _emit_block_start(tool_block_indices[tc_index], {
+                        "type": "tool_use",
+                        "id": tc_id,
+                        "name": tc_name,
+                        "input": {}
+                    })
+
+                args = tc.get("function", {}).get("arguments", "")
+                if args:
+                    yield _emit_block_delta(tool_block_indices[tc_index], {
+                        "type": "input_json_delta",
+                        "partial_json": args
+                    })
+
+            # 定期发送 ping 事件，防止代理/网关因超时断开 SSE 连接
+            now = time.time()
+            if now - last_ping >= ping_interval:
+                yield f"event: ping\ndata: {{}}\n\n".encode('utf-8')
+                last_ping = now
+
+    except (requests.exceptions.ChunkedEncodingError,
+            requests.exceptions.ConnectionError,
+            urllib3.exceptions.ProtocolError) as e:
+        logger.warning(f"Upstream stream connection lost after {line_count} lines: {e}")
+    except Exception as e:
+        logger.warning(f"Unexpected error reading upstream stream after {line_count} lines: {e}", exc_info=True)
+
+    # 为每个未关闭的 content block 发送 content_block_stop
+    for i in range(next_block_index):
+        if i not in closed_blocks:
+            yield _emit_block_stop(i)
+
+    anthropic_stop = FINISH_REASON_MAP.get(finish_reason, "end_turn") if finish_reason else "end_turn"
+
+    # message_delta
+    msg_delta = {
+        "type": "message_delta",
+        "delta": {
+            "stop_reason": anthropic_stop,
+            "stop_sequence": None
+        },
+        "usage": {"output_tokens": output_tokens}
+    }
+    yield (f"event: message_delta\ndata: {json.dumps(msg_delta, ensure_ascii=False)}\n\n").encode('utf-8')
+
+    # message_stop
+    msg_stop = {"type": "message_stop"}
+    yield (f"event: message_stop\ndata: {json.dumps(msg_stop, ensure_ascii=False)}\n\n").encode('utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""SSE 转换测试：事件序列、同批次增量合并、跨块断行拼接、合并窗口上限、[DONE] 与 stop_reason"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.api_adapter.sse_translator import translate_stream, MAX_COALESCE_MS
+
+
+def sse(delta=None, finish=None, usage=None):
+    chunk = {"choices": [{"index": 0, "delta": delta or {}, "finish_reason": finish}]}
+    if usage:
+        chunk["usage"] = usage
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode()
+
+
+def parse(output):
+    """把输出字节流解析为 (event, data) 列表"""
+    events = []
+    for frame in b"".join(output).decode().split("\n\n"):
+        if not frame:
+            continue
+        name, data = frame.split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def collect(events, kind, field):
+    return "".join(d["delta"][field] for e, d in events
+                   if e == "content_block_delta" and d["delta"]["type"] == kind)
+
+
+def test_event_sequence():
+    reads = [
+        sse({"reasoning_content": "想"}) + sse({"reasoning_content": "一想"}),
+        sse({"content": "你好"}) + sse({"content": "，世界"}),
+        sse({"tool_calls": [{"index": 0, "id": "call_1", "function": {"name": "f", "arguments": '{"a"'}}]}),
+        sse({"tool_calls": [{"index": 0, "function": {"arguments": ": 1}"}}]}),
+        sse(finish="tool_calls", usage={"completion_tokens": 9}) + b"data: [DONE]\n\n",
+        sse({"content": "ignored"}),
+    ]
+    events = parse(translate_stream(reads, "claude"))
+    names = [e for e, _ in events]
+    assert names == [
+        "message_start",
+        "content_block_start", "content_block_delta", "content_block_stop",
+        "content_block_start", "content_block_delta",
+        "content_block_start", "content_block_delta", "content_block_delta",
+        "content_block_stop", "content_block_stop",
+        "message_delta", "message_stop",
+    ]
+    assert events[0][1]["message"]["model"] == "claude"
+    assert collect(events, "thinking_delta", "thinking") == "想一想"
+    assert collect(events, "text_delta", "text") == "你好，世界"
+    assert json.loads(collect(events, "input_json_delta", "partial_json")) == {"a": 1}
+    assert events[6][1]["content_block"] == {"type": "tool_use", "id": "call_1", "name": "f", "input": {}}
+    assert events[-2][1]["delta"]["stop_reason"] == "tool_use"
+    assert events[-2][1]["usage"]["output_tokens"] == 9
+
+
+def test_coalesce_within_read_and_split_lines():
+    payload = b"".join(sse({"content": c}) for c in "abcdef") + sse(finish="length")
+    # 第一次读取在一行中间截断
+    reads = [payload[:30], payload[30:]]
+    output = list(translate_stream(reads, "m"))
+    events = parse(output)
+    deltas = [d for e, d in events if e == "content_block_delta"]
+    assert "".join(d["delta"]["text"] for d in deltas) == "abcdef"
+    assert len(deltas) <= 2
+    assert events[-2][1]["delta"]["stop_reason"] == "max_tokens"
+
+
+def test_coalesce_across_reads():
+    reads = [sse({"content": c}) for c in "abcdef"]
+    events = parse(translate_stream(reads, "m"))
+    assert len([e for e, _ in events if e == "content_block_delta"]) == 6
+
+    events = parse(translate_stream(reads, "m", coalesce_ms=MAX_COALESCE_MS))
+    deltas = [d for e, d in events if e == "content_block_delta"]
+    assert [d["delta"]["text"] for d in deltas] == ["abcdef"]
+    # 上游未给出 finish_reason，按 end_turn 结束
+    assert events[-2][1]["delta"]["stop_reason"] == "end_turn"
+
+
+def test_coalesce_window_is_capped():
+    def slow_reads():
+        for c in "abc":
+            yield sse({"content": c})
+            time.sleep(MAX_COALESCE_MS / 1000 * 2)
+
+    # 超出上限的配置值按 MAX_COALESCE_MS 处理：停顿超过窗口后下一次读取即发出缓冲
+    events = parse(translate_stream(slow_reads(), "m", coalesce_ms=10_000))
+    deltas = [d["delta"]["text"] for e, d in events if e == "content_block_delta"]
+    assert deltas == ["ab", "c"]
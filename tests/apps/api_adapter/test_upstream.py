@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""上游客户端测试：keep-alive 连接复用、并发限制与排队超时、耗时拆分统计（本地桩服务）"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.api_adapter.upstream import UpstreamClient, UpstreamOverloaded
+
+
+class StubUpstream(ThreadingHTTPServer):
+    """OpenAI 兼容 /chat/completions 桩服务，记录客户端端口与最大并发"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubUpstreamHandler)
+        self.delay = 0.0
+        self.client_ports = set()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def uri(self):
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        srv = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with srv.lock:
+            srv.client_ports.add(self.client_address[1])
+            srv.active += 1
+            srv.max_active = max(srv.max_active, srv.active)
+        try:
+            time.sleep(srv.delay)
+            if body.get("stream"):
+                chunks = [{"choices": [{"delta": {"content": c}}]} for c in "abc"]
+                payload = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+                content_type = "text/event-stream"
+            else:
+                payload = json.dumps({"choices": [{"message": {"content": "abc"}}]})
+                content_type = "application/json"
+            data = payload.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with srv.lock:
+                srv.active -= 1
+
+
+@pytest.fixture
+def server():
+    srv = StubUpstream()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+
+
+def test_connections_are_reused(server):
+    client = UpstreamClient(server.uri, "k", pool_size=4, max_concurrency=4)
+    for _ in range(5):
+        call = client.post_chat({"stream": False}, stream=False)
+        assert call.json()["choices"][0]["message"]["content"] == "abc"
+        call.close()
+    call = client.post_chat({"stream": True}, stream=True)
+    lines = [line for line in call.iter_lines() if line]
+    call.close()
+    assert lines[-1] == b"data: [DONE]"
+    assert len(server.client_ports) == 1
+
+    m = client.metrics()
+    assert m["requests"] == 6 and m["errors"] == 0 and m["in_flight"] == 0
+    assert m["last"]["ttfb_ms"] is not None and m["last"]["stream_ms"] is not None
+
+
+def test_concurrency_limit_queues_and_rejects(server):
+    server.delay = 0.2
+    client = UpstreamClient(server.uri, "k", max_concurrency=2, queue_timeout=5)
+
+    def one(_):
+        call = client.post_chat({"stream": False}, stream=False)
+        call.json()
+        call.close()
+        return call.timing.as_dict()["queue_ms"]
+
+    with ThreadPoolExecutor(6) as pool:
+        queue_ms = list(pool.map(one, range(6)))
+    assert server.max_active == 2
+    assert max(queue_ms) >= 150
+
+    # 名额被占满且排队超时：拒绝
+    client = UpstreamClient(server.uri, "k", max_concurrency=1, queue_timeout=0.05)
+    held = client.post_chat({"stream": True}, stream=True)
+    with pytest.raises(UpstreamOverloaded):
+        client.post_chat({"stream": False}, stream=False)
+    held.close()
+    assert client.metrics()["rejected"] == 1
+    assert client.metrics()["in_flight"] == 0
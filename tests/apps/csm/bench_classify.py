@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+意图分类 classify() 关键词 → fastText 路径延迟基准测试。
+
+对比:
+  subprocess  旧版实现，每条消息 fork 一次 `fasttext predict-prob` 并重新加载 model.ftz
+  resident    常驻 FastTextPredictor（进程内模型或常驻 CLI 子进程）
+关键词命中的查询在第一层即返回，其余查询落到 fastText 层。
+
+用法:
+    python tests/apps/csm/bench_classify.py --model-dir dt/ft --repeat 200
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.csm_engine import CsmEngine
+from apps.csm.engine import FastTextPredictor, _parse_predict_output, _tokenize, classify
+
+KEYWORD_QUERIES = ["我家漏气了", "怎么缴费", "我要过户", "热水器打不着火", "营业时间是几点"]
+FASTTEXT_QUERIES = ["家里有股怪味道", "这个月怎么扣了这么多", "新房子想通燃气", "灶台火苗发黄", "今天天气真好"]
+
+
+class SubprocessPredictor(FastTextPredictor):
+    """旧版实现：每次预测启动一个 fasttext 进程"""
+
+    def predict(self, query: str):
+        model_path = os.path.join(self.work_dir, "model.ftz")
+        result = subprocess.run(
+            ["fasttext", "predict-prob", model_path, "-", "1"],
+            input=_tokenize(query) + "\n", capture_output=True, text=True, timeout=10,
+        )
+        parsed = _parse_predict_output(result.stdout.strip())
+        if not parsed or parsed["label"] == "none":
+            return None
+        return parsed
+
+
+def bench(name: str, predictor, queries: list[str], repeat: int):
+    classify(CsmEngine.CSM_CLASSIFIER, queries[0], ft_predictor=predictor)  # 预热
+    latencies = []
+    for i in range(repeat):
+        query = queries[i % len(queries)]
+        begin = time.perf_counter()
+        classify(CsmEngine.CSM_CLASSIFIER, query, ft_predictor=predictor)
+        latencies.append((time.perf_counter() - begin) * 1000)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:>24} {statistics.mean(latencies):10.3f} {latencies[len(latencies) // 2]:10.3f} {p99:10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default="dt/ft")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    resident = FastTextPredictor(args.model_dir)
+    if not resident.is_trained():
+        print(f"模型不存在: {args.model_dir}/model.ftz")
+        return
+
+    print(f"{'path':>24} {'mean_ms':>10} {'p50_ms':>10} {'p99_ms':>10}")
+    bench("keyword", resident, KEYWORD_QUERIES, args.repeat)
+    bench("fasttext/resident", resident, FASTTEXT_QUERIES, args.repeat)
+    try:
+        subprocess.run(["fasttext"], capture_output=True)
+        bench("fasttext/subprocess", SubprocessPredictor(args.model_dir), FASTTEXT_QUERIES, args.repeat)
+    except FileNotFoundError:
+        print(f"{'fasttext/subprocess':>24} fasttext CLI 未安装，跳过")
+    resident.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LocalVectorStore 检索延迟基准测试：旧版逐行 Python 余弦 vs. float32 矩阵检索。
+
+用法:
+    python tests/apps/csm/bench_vdb_search.py --sizes 10000 100000 500000 --dim 1024
+旧版实现在大规模下非常慢，超过 --legacy-max 条时跳过旧版测试。
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm import vdb_store
+from apps.csm.vdb_store import LocalVectorStore
+
+
+def legacy_search(docs: list, query_vector: list, top_k: int, score_threshold: float) -> list:
+    """旧版实现：遍历 list[dict]，逐行纯 Python 计算余弦相似度"""
+    scored = []
+    for doc in docs:
+        a, b = query_vector, doc["vector"]
+        dot_product = sum(x * y for x, y in zip(a, b))
+        norm_a = sum(x * x for x in a)
+        norm_b = sum(x * x for x in b)
+        if norm_a == 0 or norm_b == 0:
+            continue
+        score = dot_product / (math.sqrt(norm_a) * math.sqrt(norm_b))
+        if score >= score_threshold:
+            scored.append({"id": doc["id"], "content": doc["content"],
+                           "metadata": {"source": doc["source"]}, "score": score})
+    scored.sort(key=lambda x: x["score"], reverse=True)
+    return scored[:top_k]
+
+
+def _time_it(fn, repeat: int) -> float:
+    fn()
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - begin) / repeat * 1000
+
+
+def bench(size: int, dim: int, top_k: int, repeat: int, legacy_max: int):
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    ids = [f"chunk_{i}" for i in range(size)]
+    contents = [f"content {i}" for i in range(size)]
+    sources = ["bench.txt"] * size
+    query = rng.standard_normal(dim, dtype=np.float32).tolist()
+
+    vs = LocalVectorStore(1)
+    vs._append_rows(ids, vectors)
+    new_ms = _time_it(lambda: vs.search(query, top_k, 0.0), repeat)
+    vs.close()
+
+    legacy_ms = None
+    if size <= legacy_max:
+        docs = [{"id": ids[i], "content": contents[i], "vector": vectors[i].tolist(),
+                 "source": sources[i]} for i in range(size)]
+        legacy_ms = _time_it(lambda: legacy_search(docs, query, top_k, 0.0), 1)
+
+    legacy_txt = f"{legacy_ms:10.2f}" if legacy_ms is not None else f"{'skipped':>10}"
+    speedup = f"{legacy_ms / new_ms:8.1f}x" if legacy_ms is not None else f"{'-':>9}"
+    print(f"{size:>8} {dim:>6} {legacy_txt} {new_ms:10.2f} {speedup}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--legacy-max", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vdb_store.VDB_DIR = tmp_dir
+        vdb_store.VECTORS_DB = os.path.join(tmp_dir, "vectors.db")
+        print(f"{'vectors':>8} {'dim':>6} {'legacy_ms':>10} {'matrix_ms':>10} {'speedup':>9}")
+        for size in args.sizes:
+            bench(size, args.dim, args.top_k, args.repeat, args.legacy_max)
+
+
+if __name__ == "__main__":
+    main()
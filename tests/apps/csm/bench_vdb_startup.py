@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LocalVectorStore 启动耗时与常驻内存基准测试。
+
+依次在独立子进程中测量:
+  legacy      旧版 _load_mem, float64 BLOB 全量解码为 Python 列表
+  migrate     首次打开旧库, float64 -> float32 迁移并生成旁路文件
+  mmap_f32    重启后 memmap 打开 float32 旁路文件
+  build_i8    首次以 int8 打开, 从 SQLite 重建量化旁路文件
+  mmap_i8     重启后 memmap 打开 int8 旁路文件
+每项输出启动耗时、启动后 RSS 增量及首次检索耗时。
+
+用法:
+    python tests/apps/csm/bench_vdb_startup.py --size 50000 --dim 1024
+"""
+
+import argparse
+import os
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+sys.path.insert(0, ROOT)
+
+from apps.csm import vdb_store
+
+SCENARIOS = ["legacy", "migrate", "mmap_f32", "build_i8", "mmap_i8"]
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def prepare(db_path: str, size: int, dim: int):
+    """生成旧版格式的向量库: float64 BLOB, 无 vector_meta"""
+    rng = np.random.default_rng(7)
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE vectors (
+            id TEXT NOT NULL, vdb_id INTEGER NOT NULL, content TEXT NOT NULL,
+            vector BLOB NOT NULL, source TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (vdb_id, id))
+    """)
+    batch = 5000
+    for start in range(0, size, batch):
+        vectors = rng.standard_normal((min(batch, size - start), dim))
+        conn.executemany(
+            "INSERT INTO vectors (id, vdb_id, content, vector, source) VALUES (?, 1, ?, ?, 'bench.txt')",
+            [(f"chunk_{start + i}", f"content {start + i} " * 20, struct.pack(f"{dim}d", *v))
+             for i, v in enumerate(vectors)],
+        )
+    conn.commit()
+    conn.close()
+
+
+def legacy_load(db_path: str) -> list:
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT id, content, vector, source FROM vectors WHERE vdb_id = 1").fetchall()
+    docs = []
+    for row in rows:
+        count = len(row[2]) // 8
+        docs.append({"id": row[0], "content": row[1],
+                     "vector": list(struct.unpack(f"{count}d", row[2])), "source": row[3]})
+    conn.close()
+    return docs
+
+
+def run_child(scenario: str, work_dir: str, dim: int):
+    db_path = os.path.join(work_dir, "vectors.db")
+    vdb_store.VDB_DIR = work_dir
+    vdb_store.VECTORS_DB = db_path
+    query = np.random.default_rng(3).standard_normal(dim).tolist()
+
+    rss_before = _rss_mb()
+    begin = time.perf_counter()
+    if scenario == "legacy":
+        docs = legacy_load(db_path)
+        startup_ms = (time.perf_counter() - begin) * 1000
+        rss_delta = _rss_mb() - rss_before
+        print(f"{scenario} {startup_ms:.1f} {rss_delta:.1f} - {len(docs)}")
+        return
+
+    dtype = "int8" if scenario.endswith("i8") else "float32"
+    vs = vdb_store.LocalVectorStore(1, dtype)
+    startup_ms = (time.perf_counter() - begin) * 1000
+    rss_delta = _rss_mb() - rss_before
+    begin = time.perf_counter()
+    vs.search(query, 5, 0.0)
+    query_ms = (time.perf_counter() - begin) * 1000
+    print(f"{scenario} {startup_ms:.1f} {rss_delta:.1f} {query_ms:.1f} {vs.count}")
+    vs.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--child", choices=SCENARIOS)
+    parser.add_argument("--work-dir")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.work_dir, args.dim)
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"准备 {args.size} 条 {args.dim} 维旧版向量 ...")
+        prepare(os.path.join(work_dir, "vectors.db"), args.size, args.dim)
+        print(f"{'scenario':>10} {'startup_ms':>11} {'rss_mb':>8} {'1st_query_ms':>13} {'rows':>8}")
+        for scenario in SCENARIOS:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", scenario,
+                 "--work-dir", work_dir, "--dim", str(args.dim)],
+                capture_output=True, text=True, check=True, cwd=ROOT,
+            ).stdout.split()
+            name, startup_ms, rss_mb, query_ms, rows = out[-5:]
+            print(f"{name:>10} {startup_ms:>11} {rss_mb:>8} {query_ms:>13} {rows:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作流最终节点首字延迟（TTFT）基准测试。
+
+启动本地 OpenAI 兼容桩服务，按固定间隔逐 token 返回 SSE；非流式请求在全部 token
+生成后一次性返回。对比:
+  sync    旧版实现，最终节点调用 chat()，完整结果返回后才产生 chunk 事件
+  stream  最终节点调用 chat_stream()，每个片段立即产生 chunk 事件
+
+用法:
+    python tests/apps/csm/bench_workflow_ttft.py --tokens 64 --token-ms 20 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.engine import EngineEvent, WorkflowEngine
+
+
+def make_handler(tokens: int, token_s: float):
+    class StubLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not body.get("stream"):
+                time.sleep(tokens * token_s)
+                data = json.dumps({"choices": [{"message": {"content": "字" * tokens}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for _ in range(tokens):
+                time.sleep(token_s)
+                delta = {"choices": [{"delta": {"content": "字"}}]}
+                self._write_chunk(f"data: {json.dumps(delta, ensure_ascii=False)}\n\n".encode())
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return StubLLMHandler
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # 客户端 Session 回收时断开的空闲连接
+
+
+class FakeStore:
+    def get_agent(self, agent_id):
+        return {"id": agent_id, "name": "bench", "system_prompt": "", "vdb_ids": ""}
+
+
+class SyncFinalEngine(WorkflowEngine):
+    """旧版实现：最终节点同步调用，结束后产生一个 chunk 事件"""
+
+    def _execute_node_internal(self, node, step, total, vars_dict, uid, user_query, mu):
+        agent = self.store.get_agent(node.get("agent_id"))
+        output = self._get_llm_client(agent).chat("", user_query)
+        vars_dict[node.get("id", "")] = output
+        if not node.get("next_nodes"):
+            yield EngineEvent("chunk", content=output, step=step, total=total, node_id=node.get("id", ""))
+
+
+def bench(name: str, engine, workflow: dict, repeat: int):
+    ttft, total = [], []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        first = None
+        for evt in engine.execute_stream(workflow, [], "bench", "hello"):
+            if evt.type == "chunk" and first is None:
+                first = time.perf_counter() - begin
+        total.append((time.perf_counter() - begin) * 1000)
+        ttft.append(first * 1000)
+    print(f"{name:>8} {statistics.median(ttft):12.1f} {statistics.median(total):12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    server = QuietServer(("127.0.0.1", 0), make_handler(args.tokens, args.token_ms / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cfg = {"api": {"llm_api_uri": f"http://127.0.0.1:{server.server_port}", "llm_api_key": "",
+                   "llm_model_name": "stub"},
+           "kb": {}, "llm": {}, "workflow": {}}
+
+    workflows = {
+        "linear": {"nodes": [{"id": "final", "agent_id": 1}]},
+        # start -> (final, side)，最终节点位于并行层
+        "dag": {"nodes": [{"id": "start", "agent_id": 1, "next_nodes": ["final", "side"]},
+                          {"id": "final", "agent_id": 1, "next_nodes": []},
+                          {"id": "side", "agent_id": 1, "next_nodes": []}]},
+    }
+
+    print(f"tokens={args.tokens}, token_ms={args.token_ms}, repeat={args.repeat}")
+    for wf_name, workflow in workflows.items():
+        print(f"[{wf_name}]\n{'mode':>8} {'ttft_ms':>12} {'total_ms':>12}")
+        bench("sync", SyncFinalEngine(cfg, None, FakeStore()), workflow, args.repeat)
+        bench("stream", WorkflowEngine(cfg, None, FakeStore()), workflow, args.repeat)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
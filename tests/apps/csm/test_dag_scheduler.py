@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""WorkflowEngine DAG 调度测试：节点的上游全部完成后立即执行"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.engine import EngineEvent, WorkflowEngine
+
+CFG = {"api": {"llm_api_uri": "http://127.0.0.1:1", "llm_api_key": "", "llm_model_name": "m"},
+       "kb": {}, "llm": {}, "workflow": {"pool_size": 8, "max_concurrency": 4}}
+
+
+class TimedEngine(WorkflowEngine):
+    """用 sleep 代替 LLM 调用，记录每个节点的开始/结束时间"""
+
+    def __init__(self, durations: dict, fail: set = ()):
+        super().__init__(CFG, None, None)
+        self.durations = durations
+        self.fail = fail
+        self.timeline = {}
+        self.active = 0
+        self.peak = 0
+        self._mu = threading.Lock()
+
+    def _execute_node_internal(self, node, step, total, vars_dict, uid, user_query, mu):
+        nid = node["id"]
+        with self._mu:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        start = time.time()
+        time.sleep(self.durations.get(nid, 0.01))
+        with self._mu:
+            self.active -= 1
+        self.timeline[nid] = (start, time.time())
+        if nid in self.fail:
+            yield EngineEvent("error", content=f"{nid} failed", node_id=nid)
+            return
+        with mu:
+            vars_dict[nid] = nid
+        if not node.get("next_nodes"):
+            yield EngineEvent("chunk", content=nid, step=step, total=total, node_id=nid)
+
+
+def _node(nid, next_nodes=(), **kw):
+    return dict(id=nid, agent_name=nid, next_nodes=list(next_nodes), **kw)
+
+
+def _run(engine, nodes, max_concurrency=4):
+    return list(engine._execute_dag(nodes, {}, "intent", "u", "q", max_concurrency))
+
+
+def test_node_starts_when_its_own_dependencies_finish():
+    # slow 与 fast 同层；fast_next 只依赖 fast，不应等待 slow
+    nodes = [_node("slow", ["sink"]), _node("fast", ["fast_next"]),
+             _node("fast_next", ["sink"]), _node("sink")]
+    engine = TimedEngine({"slow": 0.4, "fast": 0.02, "fast_next": 0.02})
+    events = _run(engine, nodes)
+
+    assert engine.timeline["fast_next"][1] < engine.timeline["slow"][1]
+    assert engine.timeline["sink"][0] >= engine.timeline["slow"][1]
+    assert [e.content for e in events if e.type == "chunk"] == ["sink"]
+    # 同层多节点仍发送并行进度事件，step/total 按层级计算
+    progress = [e for e in events if e.type == "progress"]
+    assert {e.node_id for e in progress} == {"slow", "fast"}
+    assert all(e.total == 3 and e.step == 1 for e in progress)
+
+
+def test_max_concurrency_is_respected():
+    nodes = [_node(f"n{i}", ["sink"]) for i in range(6)] + [_node("sink")]
+    engine = TimedEngine({f"n{i}": 0.05 for i in range(6)})
+    _run(engine, nodes, max_concurrency=2)
+    assert engine.peak == 2
+    assert len(engine.timeline) == 7
+
+
+def test_non_positive_max_concurrency_still_runs_nodes():
+    nodes = [_node("a", ["b"]), _node("b")]
+    engine = TimedEngine({})
+    events = list(engine.execute_stream({"nodes": nodes, "max_concurrency": -1}, [], "u", "q"))
+    assert set(engine.timeline) == {"a", "b"}
+    assert [e.content for e in events if e.type == "chunk"] == ["b"]
+
+    cfg = dict(CFG, workflow={"pool_size": 2, "max_concurrency": 0})
+    assert WorkflowEngine(cfg, None, None).max_concurrency == 1
+
+
+def test_condition_skip_releases_downstream():
+    nodes = [_node("a", ["c"], condition="billing"), _node("b", ["c"]), _node("c")]
+    engine = TimedEngine({})
+    events = list(engine._execute_dag(nodes, {"intent": "repair"}, "intent", "u", "q", 4))
+    assert "a" not in engine.timeline
+    assert any(e.agent == "a (已跳过)" for e in events)
+    assert [e.content for e in events if e.type == "chunk"] == ["c"]
+
+
+def test_error_aborts_remaining_nodes():
+    nodes = [_node("a", ["b"]), _node("b")]
+    engine = TimedEngine({}, fail={"a"})
+    events = _run(engine, nodes)
+    assert events[-1].type == "error"
+    assert "b" not in engine.timeline
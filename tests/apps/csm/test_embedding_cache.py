@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""embedding 磁盘缓存测试：去重发送未命中文本、文本规范化、LRU/TTL 淘汰、读命中延迟写访问时间、统计上报、共享缓存需显式启用"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.embedding_client import EmbeddingClient
+from common import embedding_cache, statistic_util
+from common.embedding_cache import SQLiteEmbeddingCache, embed_with_cache
+
+
+class CountingEmbedder:
+    """按文本长度生成向量，记录每次上游调用的输入"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [np.array([len(t), 1.0, 2.0], dtype=np.float32) for t in texts]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLiteEmbeddingCache(str(tmp_path / "emb.db"), max_entries=100, ttl_days=30)
+
+
+def test_only_misses_sent_upstream_once(cache):
+    fn = CountingEmbedder()
+    first = embed_with_cache("m1", ["a", "bb", "a"], fn, cache=cache)
+    assert fn.calls == [["a", "bb"]]
+    assert [v[0] for v in first] == [1.0, 2.0, 1.0]
+
+    second = embed_with_cache("m1", ["bb", "ccc", "a"], fn, cache=cache)
+    assert fn.calls[-1] == ["ccc"]
+    assert [v[0] for v in second] == [2.0, 3.0, 1.0]
+    assert all(v.dtype == np.float32 for v in second)
+
+    # 模型名是键的一部分
+    embed_with_cache("m2", ["a"], fn, cache=cache)
+    assert fn.calls[-1] == ["a"]
+
+
+def test_normalized_text_hits(cache):
+    fn = CountingEmbedder()
+    embed_with_cache("m1", ["燃气费 怎么交"], fn, cache=cache)
+    embed_with_cache("m1", ["  燃气费\n怎么交 ", "燃气费　怎么交"], fn, cache=cache)
+    assert len(fn.calls) == 1
+
+
+def test_lru_eviction_and_ttl(tmp_path):
+    cache = SQLiteEmbeddingCache(str(tmp_path / "emb.db"), max_entries=10, ttl_days=30)
+    fn = CountingEmbedder()
+    embed_with_cache("m", [f"t{i}" for i in range(10)], fn, cache=cache)
+    time.sleep(0.01)
+    embed_with_cache("m", ["t0"], fn, cache=cache)      # 刷新 t0 的访问时间
+    embed_with_cache("m", ["new"], fn, cache=cache)     # 超限，淘汰最久未访问的条目
+    assert cache.stats()["entries"] <= 10
+
+    fn.calls.clear()
+    embed_with_cache("m", ["t0", "t1"], fn, cache=cache)
+    assert fn.calls == [["t1"]]
+
+    expired = SQLiteEmbeddingCache(str(tmp_path / "emb.db"), max_entries=10, ttl_days=1e-9)
+    time.sleep(0.01)
+    fn.calls.clear()
+    embed_with_cache("m", ["t0"], fn, cache=expired)
+    assert fn.calls == [["t0"]]
+
+
+def test_stats_reported(cache):
+    model = "stats-model"
+    fn = CountingEmbedder()
+    embed_with_cache(model, ["燃气费怎么交", "报修"], fn, cache=cache)
+    embed_with_cache(model, ["燃气费怎么交", "报修", "过户"], fn, cache=cache)
+    stats = statistic_util.get_embedding_cache_stats()[model]
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+    assert stats["saved_tokens"] > 0
+    assert stats["hit_rate"] == 0.4
+
+
+def test_client_uses_shared_cache(cache, monkeypatch):
+    fn = CountingEmbedder()
+    embedding_cache.configure_cache(backend=cache)
+    try:
+        client = EmbeddingClient("http://127.0.0.1:1/v1", "k", "bge")
+        monkeypatch.setattr(client, "_embed_remote", fn)
+        assert client.embed(["a", "bb"]) == [[1.0, 1.0, 2.0], [2.0, 1.0, 2.0]]
+        assert client.embed(["bb"]) == [[2.0, 1.0, 2.0]]
+        assert fn.calls == [["a", "bb"]]
+
+        probe = EmbeddingClient("http://127.0.0.1:1/v1", "k", "bge", use_cache=False)
+        monkeypatch.setattr(probe, "_embed_remote", fn)
+        probe.embed(["a"])
+        assert fn.calls[-1] == ["a"]
+    finally:
+        embedding_cache.configure_cache(enabled=False)
+
+
+def test_reads_defer_access_time_writes(cache):
+    fn = CountingEmbedder()
+    embed_with_cache("m", ["a"], fn, cache=cache)
+    key = embedding_cache.cache_key("m", "a")
+
+    def accessed_at():
+        return cache._conn.execute("SELECT accessed_at FROM embedding_cache WHERE key=?", (key,)).fetchone()[0]
+
+    before = accessed_at()
+    time.sleep(0.01)
+    embed_with_cache("m", ["a"], fn, cache=cache)
+    assert accessed_at() == before and not cache._conn.in_transaction
+    cache.flush()
+    assert accessed_at() > before
+
+
+def test_shared_cache_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # 模拟从未调用 configure_cache 的进程（如只导入 vdb_util 的应用）
+    monkeypatch.setattr(embedding_cache, "_cache", None)
+    fn = CountingEmbedder()
+    embed_with_cache("m", ["a"], fn)
+    embed_with_cache("m", ["a"], fn)
+    assert len(fn.calls) == 2
+    assert embedding_cache.get_cache() is None
+    assert not os.path.exists(embedding_cache.DEFAULT_DB_PATH)
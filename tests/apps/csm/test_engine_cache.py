@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""WorkflowEngine Agent 定义缓存与 LLM 客户端池测试"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.engine import WorkflowEngine
+from apps.csm.store import SQLiteStore
+
+CFG = {"api": {"llm_api_uri": "http://127.0.0.1:1", "llm_api_key": "", "llm_model_name": "m"},
+       "kb": {}, "llm": {"temperature": 0.7, "top_p": 0.9, "max_tokens": 2048},
+       "workflow": {"pool_size": 2, "max_concurrency": 2}}
+
+
+class CountingStore(SQLiteStore):
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.reads = 0
+
+    def get_agent(self, id):
+        self.reads += 1
+        return super().get_agent(id)
+
+
+@pytest.fixture
+def store(tmp_path):
+    db_path = str(tmp_path / "cfg.db")
+    sqlite3.connect(db_path).close()
+    s = CountingStore(db_path)
+    yield s
+    s.close()
+
+
+def test_agent_cached_until_update_or_delete(store):
+    agent_id = store.create_agent("a", system_prompt="v1")
+    engine = WorkflowEngine(CFG, None, store)
+
+    for _ in range(5):
+        assert engine._get_agent(agent_id)["system_prompt"] == "v1"
+    assert store.reads == 1
+
+    store.update_agent(agent_id, system_prompt="v2")
+    assert engine._get_agent(agent_id)["system_prompt"] == "v2"
+    assert store.reads == 2
+
+    store.delete_agent(agent_id)
+    assert engine._get_agent(agent_id) is None
+    # 不存在的 Agent 不缓存，重新创建后可立即读到
+    assert engine._get_agent(agent_id) is None
+    assert store.reads == 4
+
+    stats = engine.cache_stats()
+    assert stats["agent_hit"] == 4 and stats["agent_miss"] == 4
+
+
+def test_llm_clients_pooled_by_params(store):
+    engine = WorkflowEngine(CFG, None, store)
+    a = engine._get_llm_client({"model_name": "", "temperature": None})
+    # 与默认参数一致时复用 base_llm，连接池共享
+    assert a is engine.base_llm
+    b = engine._get_llm_client({"model_name": "x", "temperature": 0.1})
+    c = engine._get_llm_client({"model_name": "x", "temperature": 0.1, "top_p": None})
+    d = engine._get_llm_client({"model_name": "x", "temperature": 0.2})
+    assert b is c and b is not d
+    assert b._session is c._session
+    stats = engine.cache_stats()
+    assert stats["client_hit"] == 2 and stats["client_miss"] == 2
+    assert stats["client_pooled"] == 3
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""FAQ 内存索引测试"""
+
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.handler.faq import FaqHandler
+from apps.csm.store import SQLiteStore
+
+VOCAB = {"密码": [1, 0, 0], "支付": [0, 1, 0], "客服": [0, 0, 1]}
+
+
+class KeywordEmbedder:
+    """按关键词生成确定性向量, 并记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        return [self._vec(t) for t in texts]
+
+    def embed_single(self, text):
+        return self.embed([text])[0]
+
+    @staticmethod
+    def _vec(text):
+        vec = [0.01, 0.01, 0.01]
+        for word, v in VOCAB.items():
+            if word in text:
+                vec = [a + b for a, b in zip(vec, v)]
+        return vec
+
+
+@pytest.fixture
+def store(tmp_path):
+    db_path = str(tmp_path / "cfg.db")
+    sqlite3.connect(db_path).close()
+    s = SQLiteStore(db_path)
+    yield s
+    s.close()
+
+
+def test_match_uses_index_and_tracks_updates(store):
+    handler = FaqHandler(store, KeywordEmbedder())
+    handler._create_faq_entry(["忘记密码怎么办"], "重置密码", "")
+    handler._create_faq_entry(["支持哪些支付方式"], "微信支付宝", "")
+
+    assert handler.get_faq_count() == 2
+    assert handler.match_faq("密码忘了", 0.8)[0] == "重置密码"
+    assert handler.match_faq("转客服", 0.8)[0] is None
+
+    # 删除后索引同步更新, 不再命中
+    entry_id = next(e["id"] for e in store.get_faq_entries() if e["answer"] == "重置密码")
+    store.delete_faq_entry(entry_id)
+    handler.index.remove(entry_id)
+    assert handler.match_faq("密码忘了", 0.8)[0] is None
+    assert handler.get_faq_count() == 1
+
+
+def test_index_built_from_store_on_first_use(store):
+    FaqHandler(store, KeywordEmbedder())._create_faq_entry(["找客服"], "人工客服热线", "f.txt")
+
+    fresh = FaqHandler(store, KeywordEmbedder())
+    answer, score = fresh.match_faq("联系客服", 0.8)
+    assert answer == "人工客服热线"
+    assert score > 0.9
+
+
+def test_embeddings_stored_as_binary_and_legacy_json_migrated(store, tmp_path):
+    FaqHandler(store, KeywordEmbedder())._create_faq_entry(["支付"], "a", "")
+    blob = store.conn.execute("SELECT embedding FROM faq_questions").fetchone()[0]
+    assert isinstance(blob, bytes) and len(blob) == 12
+
+    entry_id = store.create_faq_entry("legacy", "")
+    store.conn.execute("INSERT INTO faq_questions (entry_id, question, embedding) VALUES (?, ?, ?)",
+                       (entry_id, "密码", json.dumps([1.0, 0.0, 0.0])))
+    store.conn.commit()
+    store.close()
+
+    reopened = SQLiteStore(str(tmp_path / "cfg.db"))
+    try:
+        types = {r[0] for r in reopened.conn.execute("SELECT typeof(embedding) FROM faq_questions")}
+        assert types == {"blob"}
+        assert FaqHandler(reopened, KeywordEmbedder()).match_faq("密码", 0.8)[0] == "legacy"
+    finally:
+        reopened.close()
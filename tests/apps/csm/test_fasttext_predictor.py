@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""常驻 fastText 预测器测试（CLI 子进程模式使用假的 fasttext 可执行文件）"""
+
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.engine import FastTextPredictor
+
+# 假 CLI: 读取模型文件首行作为标签, 每行输入输出一行 "__label__<标签> <概率>"
+FAKE_CLI = textwrap.dedent("""\
+    #!{python}
+    import sys
+    label = open(sys.argv[2], encoding="utf-8").read().strip()
+    for line in sys.stdin:
+        if "无关" in line.replace(" ", ""):
+            print("__label__none 0.99", flush=True)
+        else:
+            print(f"__label__{{label}} 0.9", flush=True)
+""")
+
+
+@pytest.fixture
+def cli_predictor(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    cli = bin_dir / "fasttext"
+    cli.write_text(FAKE_CLI.format(python=sys.executable))
+    cli.chmod(cli.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setitem(sys.modules, "fasttext", None)  # 强制走 CLI 子进程
+
+    work_dir = tmp_path / "ft"
+    predictor = FastTextPredictor(str(work_dir))
+    (work_dir / "model.ftz").write_text("billing")
+    yield predictor, work_dir
+    predictor.close()
+
+
+def test_cli_process_is_reused(cli_predictor):
+    predictor, _ = cli_predictor
+    assert predictor.predict("交燃气费") == {"label": "billing", "confidence": 0.9}
+    pid = predictor._backend.proc.pid
+    assert predictor.predict("查账单")["label"] == "billing"
+    assert predictor._backend.proc.pid == pid
+
+
+def test_predict_many_keeps_order_and_filters_none(cli_predictor):
+    predictor, _ = cli_predictor
+    results = predictor.predict_many(["交费", "", "无关问题", "多行\n问题"])
+    assert [r["label"] if r else None for r in results] == ["billing", None, None, "billing"]
+
+
+def test_hot_reload_on_model_change(cli_predictor):
+    predictor, work_dir = cli_predictor
+    assert predictor.predict("报修")["label"] == "billing"
+    old_pid = predictor._backend.proc.pid
+
+    model = work_dir / "model.ftz"
+    model.write_text("repair!")  # 大小变化即触发重新加载
+    assert predictor.predict("报修")["label"] == "repair!"
+    assert predictor._backend.proc.pid != old_pid
+
+
+def test_missing_model_returns_none(tmp_path):
+    predictor = FastTextPredictor(str(tmp_path / "empty"))
+    assert predictor.predict("你好") is None
+    assert not predictor.is_trained()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""KBManager 多知识库并发检索测试"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.kb_manager import KBManager
+
+CFG = {"api": {}, "kb": {"top_k": 3, "score_threshold": 0.1, "search_workers": 4}}
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_single(self, text):
+        self.calls += 1
+        return [1.0, 0.0]
+
+
+class FakeVectorStore:
+    def __init__(self, vdb_id, scores, delay=0.0, fail=False):
+        self.vdb_id = vdb_id
+        self.scores = scores
+        self.delay = delay
+        self.fail = fail
+
+    def search(self, query_vec, top_k, score_threshold):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("broken")
+        hits = [{"id": f"{self.vdb_id}-{i}", "content": f"kb{self.vdb_id}\nchunk{i}",
+                 "metadata": {"source": f"{self.vdb_id}.txt"}, "score": s}
+                for i, s in enumerate(self.scores) if s >= score_threshold]
+        return hits[:top_k]
+
+
+class FakeMetaStore:
+    def get_vdb_by_id(self, vdb_id):
+        return {"id": vdb_id, "name": f"知识库{vdb_id}"}
+
+    def get_user_vdbs(self, uid):
+        return [{"id": 1, "name": "甲"}, {"id": 2, "name": "乙"}]
+
+
+def _manager(stores):
+    mgr = KBManager(CFG, FakeMetaStore())
+    mgr._emb_client = CountingEmbedder()
+    mgr._stores = {vs.vdb_id: vs for vs in stores}
+    return mgr
+
+
+def test_global_top_k_embeds_once_and_searches_concurrently():
+    mgr = _manager([FakeVectorStore(1, [0.9, 0.5, 0.2], delay=0.2),
+                    FakeVectorStore(2, [0.8, 0.7], delay=0.2),
+                    FakeVectorStore(3, [0.95], delay=0.2),
+                    FakeVectorStore(4, [], fail=True)])
+    begin = time.time()
+    results = mgr.retrieve("q", [1, 2, 3, 4])
+    assert time.time() - begin < 0.5
+    assert mgr._emb_client.calls == 1
+    assert [r["id"] for r in results] == ["3-0", "1-0", "2-0"]
+    assert results[0] == {"vdb_id": 3, "kb_name": "知识库3", "id": "3-0", "content": "kb3chunk0",
+                          "source": "3.txt", "score": 0.95}
+
+
+def test_per_kb_quota_and_formatting():
+    mgr = _manager([FakeVectorStore(1, [0.9, 0.85, 0.8]), FakeVectorStore(2, [0.3])])
+    results = mgr.retrieve("q", [1, 2], top_k=3, per_kb_quota=2)
+    assert [r["id"] for r in results] == ["1-0", "1-1", "2-0"]
+
+    assert mgr.search_in_kb("q", 1, "u") == "kb1chunk0\nkb1chunk1\nkb1chunk2"
+    assert mgr.search_all_kbs("q", "u", top_k=2) == "[甲]\nkb1chunk0\nkb1chunk1"
+    assert mgr.search_in_kbs("q", [2], "u") == "[知识库2]\nkb2chunk0"
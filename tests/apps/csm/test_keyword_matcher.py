@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""关键词层 Aho–Corasick 自动机测试"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm import engine
+from apps.csm.csm_engine import CsmEngine
+from apps.csm.engine import KeywordMatcher, classify, classify_with_details
+
+
+def _legacy_match(query, categories):
+    """旧版实现：逐类别逐关键词子串查找"""
+    query_lower = query.lower()
+    best_match, best_len = "", 0
+    for cat in categories:
+        for kw in cat.get("keywords", []):
+            if kw.lower() in query_lower and len(kw) > best_len:
+                best_len, best_match = len(kw), cat.get("name", "")
+    return best_match
+
+
+def test_longest_match_wins():
+    cfg = {"categories": [
+        {"name": "a", "keywords": ["火", "VIP"]},
+        {"name": "b", "keywords": ["打不着火", "vip客户"]},
+        {"name": "c", "keywords": ["着火"]},
+    ]}
+    assert engine._match_keyword("灶台打不着火了", cfg) == "b"
+    assert engine._match_keyword("家里着火", cfg) == "c"
+    assert engine._match_keyword("我是VIP客户", cfg) == "b"
+    assert engine._match_keyword("vip", cfg) == "a"
+    assert engine._match_keyword("你好", cfg) == ""
+
+
+def test_same_result_as_legacy_scan(monkeypatch):
+    categories = CsmEngine.CSM_CLASSIFIER["categories"]
+    keywords = [kw for cat in categories for kw in cat["keywords"]]
+    rng = random.Random(0)
+    queries = ["".join(rng.choice(keywords + ["的", "我", "吗"]) for _ in range(rng.randint(1, 4)))
+               for _ in range(300)]
+
+    matcher = KeywordMatcher(categories)
+    for q in queries:
+        assert matcher.match(q) == _legacy_match(q, categories)
+
+    # 未安装 pyahocorasick 时的退化实现结果一致
+    monkeypatch.setitem(sys.modules, "ahocorasick", None)
+    fallback = KeywordMatcher(categories)
+    assert fallback._automaton is None
+    for q in queries:
+        assert fallback.match(q) == _legacy_match(q, categories)
+
+
+def test_matcher_cached_per_config_and_shared_by_classify():
+    cfg = {"prompt": "p", "categories": [{"name": "billing", "keywords": ["账单"]}]}
+    assert classify(cfg, "查账单") == "billing"
+    tiers, name = classify_with_details(cfg, "查账单")
+    assert name == "billing" and tiers[0].name == "keyword"
+    assert engine._get_keyword_matcher(cfg) is engine._get_keyword_matcher(dict(cfg))
+
+    changed = {"prompt": "p", "categories": [{"name": "billing", "keywords": ["发票"]}]}
+    assert engine._get_keyword_matcher(changed) is not engine._get_keyword_matcher(cfg)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Rerank 客户端与 KBManager rerank 阶段测试（本地桩服务）"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.kb_manager import KBManager
+from apps.csm.rerank_client import RerankClient
+
+
+class StubRerankServer(ThreadingHTTPServer):
+    """按文本中包含 query 的字数打分；delay 模拟模型耗时，tei 切换响应格式"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubRerankHandler)
+        self.delay = 0.0
+        self.tei = False
+        self.requests = []
+
+    @property
+    def uri(self):
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+
+class StubRerankHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        time.sleep(self.server.delay)
+        scores = [sum(ch in doc for ch in body["query"]) / len(body["query"]) for doc in body["documents"]]
+        if self.server.tei:
+            data = [{"index": i, "score": s} for i, s in enumerate(scores)]
+        else:
+            data = {"results": [{"index": i, "relevance_score": s} for i, s in enumerate(scores)]}
+        out = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+@pytest.fixture
+def server():
+    srv = StubRerankServer()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+
+
+class FakeVectorStore:
+    """向量分数与真实相关性相反：最相关的文本排在最后"""
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    def search(self, query_vec, top_k, score_threshold):
+        return [{"id": f"c{i}", "content": t, "metadata": {"source": "a.txt"}, "score": 0.9 - i * 0.01}
+                for i, t in enumerate(self.texts)][:top_k]
+
+
+class FakeEmbedder:
+    def embed_single(self, text):
+        return [1.0]
+
+
+class FakeMetaStore:
+    def get_vdb_by_id(self, vdb_id):
+        return {"id": vdb_id, "name": "kb"}
+
+
+def _manager(server, timeout_ms):
+    cfg = {"api": {"rerank_api_uri": server.uri, "rerank_api_key": "", "rerank_model_name": "stub"},
+           "kb": {"top_k": 2, "score_threshold": 0.1, "rerank_enabled": True,
+                  "rerank_retrieve_n": 6, "rerank_timeout_ms": timeout_ms}}
+    mgr = KBManager(cfg, FakeMetaStore())
+    mgr._emb_client = FakeEmbedder()
+    texts = ["天气晴朗", "营业厅地址", "缴费方式", "发票开具", "燃气报修电话", "燃气报修流程"]
+    mgr._stores = {1: FakeVectorStore(texts)}
+    return mgr
+
+
+def test_rerank_improves_precision_and_caches(server):
+    mgr = _manager(server, 2000)
+    results = mgr.retrieve("燃气报修", [1])
+    # 向量顺序的前 2 条为 "天气晴朗"、"营业厅地址"，rerank 后取到真正相关的文本
+    assert [r["content"] for r in results] == ["燃气报修电话", "燃气报修流程"]
+    assert results[0]["rerank_score"] == 1.0
+    assert len(server.requests) == 1 and len(server.requests[0]["documents"]) == 6
+
+    # 相同 (query, chunk) 命中缓存，不再请求
+    mgr.retrieve("燃气报修", [1])
+    assert len(server.requests) == 1
+    assert mgr._rerank_client.stats()["cache_hit"] == 6
+
+    # 文件重新上传：chunk id 不变、内容变化，不命中旧分数
+    mgr._stores = {1: FakeVectorStore(["燃气报修电话", "天气晴朗", "营业厅地址", "缴费方式", "发票开具", "其他"])}
+    results = mgr.retrieve("燃气报修", [1])
+    assert len(server.requests) == 2 and len(server.requests[1]["documents"]) == 1
+    assert [r["content"] for r in results][0] == "燃气报修电话"
+
+
+def test_timeout_budget_falls_back_to_vector_order(server):
+    server.delay = 0.5
+    mgr = _manager(server, 100)
+    begin = time.time()
+    results = mgr.retrieve("燃气报修", [1])
+    elapsed = time.time() - begin
+    assert elapsed < 0.4
+    assert [r["content"] for r in results] == ["天气晴朗", "营业厅地址"]
+    assert "rerank_score" not in results[0]
+    assert mgr._rerank_client.stats()["timeout"] == 1
+
+
+def test_client_batches_and_parses_tei_format(server):
+    server.tei = True
+    client = RerankClient(server.uri, "", "stub", batch_size=2)
+    scores = client.rerank("燃气报修", ["报修", "缴费", "燃气", "无关", "燃气报修"], 2000)
+    assert scores == [0.5, 0.0, 0.5, 0.0, 1.0]
+    assert sorted(len(r["documents"]) for r in server.requests) == [1, 2, 2]
+
+
+def test_config_change_rebuilds_client_once_and_closes_old(server):
+    mgr = _manager(server, 2000)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = list(pool.map(lambda _: mgr._get_rerank_client(), range(32)))
+    first = clients[0]
+    assert all(c is first for c in clients)
+
+    mgr.cfg["api"]["rerank_model_name"] = "stub2"
+    second = mgr._get_rerank_client()
+    assert second is not first and second.model_name == "stub2"
+    assert mgr._get_rerank_client() is second
+    assert first._pool._shutdown
+    # 仍持有旧客户端的调用回退到向量顺序，不抛异常
+    assert first.rerank("燃气报修", ["燃气"], 2000) is None
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""LocalVectorStore 矩阵检索测试"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm import vdb_store
+from apps.csm.vdb_store import LocalVectorStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(vdb_store, "VDB_DIR", str(tmp_path))
+    monkeypatch.setattr(vdb_store, "VECTORS_DB", str(tmp_path / "vectors.db"))
+    vs = LocalVectorStore(1)
+    yield vs
+    vs.close()
+
+
+def _records(vectors, source="a.txt", prefix="c"):
+    return [{"id": f"{prefix}{i}", "vector": list(v), "content": f"text {prefix}{i}",
+             "metadata": {"source": source}} for i, v in enumerate(vectors)]
+
+
+def _brute_force(vectors, query, top_k):
+    m = np.asarray(vectors, dtype=np.float64)
+    q = np.asarray(query, dtype=np.float64)
+    scores = m @ q / (np.linalg.norm(m, axis=1) * np.linalg.norm(q))
+    return list(np.argsort(-scores)[:top_k])
+
+
+def test_search_matches_brute_force(store):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 32))
+    store.insert(_records(vectors))
+    query = rng.normal(size=32)
+
+    results = store.search(list(query), 10, -1.0)
+
+    assert [r["id"] for r in results] == [f"c{i}" for i in _brute_force(vectors, query, 10)]
+    scores = [r["score"] for r in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_search_applies_threshold_and_dimension(store):
+    store.insert(_records([[1, 0], [0, 1], [-1, 0]]))
+
+    results = store.search([1, 0], 5, 0.5)
+    assert [r["id"] for r in results] == ["c0"]
+    assert results[0]["score"] == pytest.approx(1.0)
+    assert store.search([1, 0, 0], 5, 0.0) == []
+
+
+def test_insert_replaces_existing_id(store):
+    store.insert(_records([[1, 0], [0, 1]]))
+    store.insert([{"id": "c0", "vector": [0, 1], "content": "new", "metadata": {"source": "b.txt"}}])
+
+    assert store.count == 2
+    results = store.search([0, 1], 2, 0.9)
+    assert {r["id"] for r in results} == {"c0", "c1"}
+    assert store.list_by_source("b.txt")[0]["content"] == "new"
+
+
+def test_delete_keeps_remaining_rows_consistent(store):
+    store.insert(_records([[1, 0], [0, 1], [1, 1]], source="a.txt"))
+    store.insert(_records([[-1, 0], [0, -1]], source="b.txt", prefix="d"))
+
+    store.delete_by_ids(["c1"])
+    store.delete_by_source("b.txt")
+
+    assert store.count == 2
+    assert [d["id"] for d in store.list_by_source("a.txt")] == ["c0", "c2"]
+    assert store.search([1, 1], 1, 0.0)[0]["id"] == "c2"
+
+
+def test_reload_from_sqlite(store):
+    store.insert(_records([[3, 4], [4, 3]]))
+
+    reloaded = LocalVectorStore(1)
+    try:
+        assert reloaded.count == 2
+        assert reloaded.search([3, 4], 1, 0.0)[0]["id"] == "c0"
+    finally:
+        reloaded.close()
+
+
+def test_purge(store):
+    store.insert(_records([[1, 0]]))
+    store.purge()
+    assert store.count == 0
+    assert store.search([1, 0], 3, 0.0) == []
+
+
+def test_reopen_maps_sidecar_after_flush(store):
+    store.insert(_records([[1, 0], [0, 1]]))
+    store.flush()
+
+    reopened = LocalVectorStore(1)
+    try:
+        assert isinstance(reopened._matrix, np.memmap)
+        assert reopened.search([0, 1], 1, 0.0)[0]["content"] == "text c1"
+        # 写入后从 memmap 切换为可写内存矩阵
+        reopened.insert(_records([[1, 1]], prefix="d"))
+        assert reopened.count == 3
+    finally:
+        reopened.close()
+
+    # 旁路文件版本落后于 SQLite 时重建
+    store.delete_by_ids(["c0"])
+    rebuilt = LocalVectorStore(1)
+    try:
+        assert {r["id"] for r in rebuilt.search([1, 1], 5, -1.0)} == {"c1", "d0"}
+    finally:
+        rebuilt.close()
+
+
+def test_migrates_legacy_float64_blobs(store):
+    import struct
+    store.conn.execute("DELETE FROM vector_meta")
+    for i, vec in enumerate([[1.0, 0.0], [0.6, 0.8]]):
+        store.conn.execute(
+            "INSERT INTO vectors (id, vdb_id, content, vector, source) VALUES (?, ?, ?, ?, ?)",
+            (f"old{i}", 2, f"legacy {i}", struct.pack("2d", *vec), "old.txt"))
+    store.conn.commit()
+
+    legacy = LocalVectorStore(2)
+    try:
+        assert legacy.dim == 2
+        blob = legacy.conn.execute("SELECT vector FROM vectors WHERE id = 'old1'").fetchone()[0]
+        assert len(blob) == 8
+        assert legacy.search([0.6, 0.8], 1, 0.0)[0]["content"] == "legacy 1"
+    finally:
+        legacy.close()
+
+
+def test_int8_quantized_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(vdb_store, "VDB_DIR", str(tmp_path))
+    monkeypatch.setattr(vdb_store, "VECTORS_DB", str(tmp_path / "vectors.db"))
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(300, 64))
+    query = rng.normal(size=64)
+
+    vs = LocalVectorStore(3, dtype="int8")
+    try:
+        vs.insert(_records(vectors))
+        vs.flush()
+        assert vs._matrix.dtype == np.int8
+        results = vs.search(list(query), 5, -1.0)
+        expected = [f"c{i}" for i in _brute_force(vectors, query, 5)]
+        assert results[0]["id"] == expected[0]
+        assert len(set(r["id"] for r in results) & set(expected)) >= 4
+    finally:
+        vs.close()
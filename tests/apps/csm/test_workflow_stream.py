@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""WorkflowEngine 最终节点流式输出测试"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.engine import WorkflowEngine
+
+CFG = {"api": {"llm_api_uri": "http://127.0.0.1:1", "llm_api_key": "", "llm_model_name": "m"},
+       "kb": {}, "llm": {}, "workflow": {"pool_size": 8, "max_concurrency": 4}}
+
+
+class FakeStore:
+    def get_agent(self, agent_id):
+        return {"id": agent_id, "name": f"agent{agent_id}", "system_prompt": "", "vdb_ids": ""}
+
+
+class GatedClient:
+    """第一个片段发出后等待消费方确认，确认超时说明片段没有被实时转发"""
+
+    model_name = "m"
+
+    def __init__(self, pieces, gate: threading.Event, fail_after: bool = False):
+        self.pieces = pieces
+        self.gate = gate
+        self.fail_after = fail_after
+        self.streamed_incrementally = None
+
+    def chat_stream(self, system_prompt, user_message):
+        yield self.pieces[0]
+        self.streamed_incrementally = self.gate.wait(timeout=2)
+        yield from self.pieces[1:]
+        if self.fail_after:
+            raise RuntimeError("boom")
+
+    def chat(self, system_prompt, user_message):
+        return "upstream"
+
+
+class StreamEngine(WorkflowEngine):
+    def __init__(self, client):
+        super().__init__(CFG, None, FakeStore())
+        self.client = client
+        self.vars = None
+
+    def _get_llm_client(self, agent):
+        return self.client
+
+    def _execute_node_internal(self, node, step, total, vars_dict, uid, user_query, mu):
+        self.vars = vars_dict
+        yield from super()._execute_node_internal(node, step, total, vars_dict, uid, user_query, mu)
+
+
+def _consume(engine, workflow, gate):
+    chunks = []
+    for evt in engine.execute_stream(workflow, [], "u", "q"):
+        if evt.type == "chunk":
+            chunks.append(evt.content)
+            gate.set()
+    return chunks
+
+
+def test_linear_final_node_streams_chunks():
+    gate = threading.Event()
+    client = GatedClient(["你", "好", "！"], gate)
+    engine = StreamEngine(client)
+    workflow = {"nodes": [{"id": "n1", "agent_id": 1, "output_var": "answer"}]}
+
+    chunks = _consume(engine, workflow, gate)
+    assert chunks == ["你", "好", "！"]
+    assert client.streamed_incrementally is True
+    assert engine.vars["answer"] == "你好！"
+    assert engine.vars["n1"] == "你好！"
+
+
+def test_dag_final_node_streams_inside_parallel_level():
+    gate = threading.Event()
+    client = GatedClient(["a", "b"], gate, fail_after=True)
+    engine = StreamEngine(client)
+    # start -> (final, side)；final 与 side 同层并行，final 为最终节点
+    workflow = {"nodes": [
+        {"id": "start", "agent_id": 1, "next_nodes": ["final", "side"]},
+        {"id": "final", "agent_id": 2, "output_var": "out"},
+        {"id": "side", "agent_id": 3, "next_nodes": []},
+    ]}
+
+    events = []
+    for evt in engine.execute_stream(workflow, [], "u", "q"):
+        if evt.type == "chunk":
+            events.append((evt.node_id, evt.content))
+            gate.set()
+    assert client.streamed_incrementally is True
+    # 两个最终节点同时流式输出：同一时刻只转发一个节点，另一个节点缓存后整段输出，不交错
+    first, second = events[0][0], events[3][0]
+    assert {first, second} == {"final", "side"}
+    assert events == [(first, "a"), (first, "b"), (first, "[错误] boom"),
+                      (second, "a"), (second, "b"), (second, "[错误] boom")]
+    assert engine.vars["start"] == "upstream"
+    assert engine.vars["out"] == "ab[错误] boom"
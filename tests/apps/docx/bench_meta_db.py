@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+元数据常用调用的吞吐对比（ops/sec）：
+  legacy   旧版 cfg_util.sqlite_output：每次新建连接、pandas DataFrame、to_json 再 json.loads
+  meta_db  common.meta_db：线程内持久 WAL 连接、参数化语句、直接返回 dict 行
+覆盖 update_process_info、get_para_list_with_status、update_vdb_file_process_info
+    python tests/apps/docx/bench_meta_db.py --ops 2000 --paras 60
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from common import docx_meta_util, meta_db
+from common.vdb_meta_util import VdbMeta
+
+SCHEMA = """
+CREATE TABLE doc_file_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER, task_id INTEGER, doc_type TEXT, doc_title TEXT,
+    doc_outline TEXT, keywords TEXT, input_file_path TEXT, vdb_id INTEGER, is_include_para_txt INTEGER,
+    doc_ctx TEXT, output_file_path TEXT, vdb_dir TEXT, output_file_type INTEGER, create_time TEXT,
+    process_info TEXT, percent INTEGER DEFAULT 0, word_count INTEGER, img_count INTEGER DEFAULT 0,
+    outline TEXT, is_para_task_created INTEGER DEFAULT 0);
+CREATE TABLE doc_para_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER, task_id INTEGER, para_id INTEGER, heading TEXT,
+    unique_key TEXT, para_text TEXT, user_comment TEXT, current_sub_title TEXT, namespaces TEXT,
+    create_time TEXT, gen_txt TEXT, word_count INTEGER, contains_mermaid INTEGER DEFAULT 0,
+    update_time TEXT, status INTEGER DEFAULT 0);
+CREATE TABLE vdb_file_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, uid INTEGER, vdb_id INTEGER, file_path TEXT,
+    task_id INTEGER, file_md5 TEXT, create_time TEXT, process_info TEXT, percent INTEGER DEFAULT 0);
+"""
+
+
+def legacy_sqlite_output(db_file, sql):
+    """旧版 sqlite_output(..., 'json') 的执行路径"""
+    import pandas as pd
+    with sqlite3.connect(db_file) as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        df = pd.DataFrame(cursor.fetchall(), columns=columns)
+        dt = df.to_json(force_ascii=False, orient='records')
+    conn.close()
+    return json.loads(dt)
+
+
+def legacy_calls(db_file):
+    return {
+        "update_process_info": lambda i: legacy_sqlite_output(
+            db_file, f"update doc_file_info set process_info = '第 {i} 段处理中', percent= {i % 100} "
+                     f"where uid = 1 and task_id = 100"),
+        "get_para_list_with_status": lambda i: legacy_sqlite_output(
+            db_file, "select * from doc_para_info where task_id = 100 and status = 0 order by para_id desc"),
+        "update_vdb_file_process_info": lambda i: legacy_sqlite_output(
+            db_file, f"update vdb_file_info set process_info = '第 {i} 块向量化', percent={i % 100} where id = 1"),
+    }
+
+
+def new_calls():
+    return {
+        "update_process_info": lambda i: docx_meta_util.update_process_info(1, 100, f"第 {i} 段处理中", i % 100),
+        "get_para_list_with_status": lambda i: docx_meta_util.get_para_list_with_status(100, 0),
+        "update_vdb_file_process_info": lambda i: VdbMeta.update_vdb_file_process_info(1, f"第 {i} 块向量化",
+                                                                                         i % 100),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--paras", type=int, default=60, help="文档段落数（get_para_list_with_status 返回行数）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        with sqlite3.connect("cfg.db") as conn:
+            conn.executescript(SCHEMA)
+        conn.close()
+        docx_meta_util.save_doc_info(1, 100, "报告", "标题", "", "", "", 0, 0, "", "", "")
+        docx_meta_util.save_para_task(1, 100, [
+            {"para_id": i, "current_heading": ["一、总体", f"{i}. 小节"], "unique_key": f"k{i}",
+             "para_text": "原文" * 50, "user_comment": "", "current_sub_title": f"子标题{i}"}
+            for i in range(1, args.paras + 1)])
+        VdbMeta.save_vdb_file_info("a.docx", "/tmp/a.docx", 1, 2, 3, "md5")
+
+        legacy, new = legacy_calls("cfg.db"), new_calls()
+        print(f"{args.ops} ops per call, {args.paras} paras")
+        print(f"{'call':>30} {'legacy ops/s':>14} {'meta_db ops/s':>14} {'speedup':>8}")
+        for name in legacy:
+            rates = []
+            for fn in (legacy[name], new[name]):
+                begin = time.perf_counter()
+                for i in range(args.ops):
+                    fn(i)
+                rates.append(args.ops / (time.perf_counter() - begin))
+            print(f"{name:>30} {rates[0]:14.0f} {rates[1]:14.0f} {rates[1] / rates[0]:7.1f}x")
+        meta_db.close_conn()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""段落参考资料批量预检索测试：批量结果与逐条检索一致、向量库只打开一次、DocxWriter 按批提交并记录分阶段耗时"""
+
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from common import docx_meta_util, embedding_cache, meta_db, vdb_util
+from apps.docx import doc_writer
+from apps.docx.doc_writer import DocxWriter
+
+LLM_CFG = {"embedding_api_uri": "http://127.0.0.1:1/v1", "embedding_model_name": "stub"}
+
+
+class StubEmbedder(vdb_util.RemoteChromaEmbedder):
+    """按字符哈希生成向量，记录远程调用次数"""
+    calls = 0
+
+    def __init__(self):
+        super().__init__(None, "stub")
+
+    def _embed_remote(self, texts):
+        StubEmbedder.calls += 1
+        vectors = []
+        for text in texts:
+            v = np.zeros(32, dtype=np.float32)
+            for ch in text:
+                v[ord(ch) % 32] += 1
+            vectors.append(v / (np.linalg.norm(v) or 1))
+        return vectors
+
+
+@pytest.fixture
+def vdb_dir(tmp_path, monkeypatch):
+    embedding_cache.configure_cache(enabled=False)
+    monkeypatch.setattr(vdb_util, "build_embedder", lambda llm_cfg: StubEmbedder())
+    path = str(tmp_path / "vdb")
+    collection = vdb_util.get_chroma_client(path).get_or_create_collection(
+        "knowledge_base", embedding_function=StubEmbedder(), metadata={"hnsw:space": "cosine"})
+    topics = ["安检", "缴费", "报修", "开户"]
+    docs = [f"燃气{topics[i % 4]}业务说明第{i}条" for i in range(80)]
+    collection.add(ids=[str(i) for i in range(80)], documents=docs)
+    opened = []
+    real_client = vdb_util.get_chroma_client
+    monkeypatch.setattr(vdb_util, "get_chroma_client", lambda p: opened.append(p) or real_client(p))
+    StubEmbedder.calls = 0
+    yield path, opened
+    embedding_cache.configure_cache(enabled=False)
+
+
+def test_batch_matches_single(vdb_dir):
+    path, opened = vdb_dir
+    queries = [f"怎么办理{t}{i}" for i in range(10) for t in ["安检", "缴费", "报修", "开户"]]
+
+    batch = vdb_util.search_txt_batch(queries, path, 0.2, LLM_CFG, 2)
+    batch_opens, batch_calls = len(opened), StubEmbedder.calls
+    single = [vdb_util.search_txt(q, path, 0.2, LLM_CFG, 2) for q in queries]
+
+    assert batch == single
+    assert all(batch)
+    # 批量：向量检索打开一次集合（另一次为首次构建 BM25 索引），全部查询一次提交 embedding
+    assert batch_opens == 2 and batch_calls == 1
+    assert len(opened) - batch_opens == len(queries)
+    assert StubEmbedder.calls - batch_calls == len(queries)
+
+
+def test_missing_vdb_returns_empty(tmp_path):
+    refs = doc_writer.get_references_from_vdb(["a", "b"], str(tmp_path / "none"), LLM_CFG)
+    assert refs == ["", ""]
+
+
+SCHEMA = """
+CREATE TABLE doc_file_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER, task_id INTEGER, process_info TEXT,
+    percent INTEGER DEFAULT 0);
+CREATE TABLE doc_para_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER, task_id INTEGER, para_id INTEGER, heading TEXT,
+    unique_key TEXT, para_text TEXT, user_comment TEXT, current_sub_title TEXT, namespaces TEXT,
+    create_time TEXT, gen_txt TEXT, word_count INTEGER, contains_mermaid INTEGER DEFAULT 0,
+    update_time TEXT, status INTEGER DEFAULT 0);
+"""
+
+
+def test_writer_prefetches_in_batches(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with sqlite3.connect("cfg.db") as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("insert into doc_file_info (uid, task_id) values (1, 100)")
+    conn.close()
+    docx_meta_util.save_para_task(1, 100, [
+        {"para_id": i, "current_heading": [], "unique_key": f"para_{i}", "para_text": f"要求{i}",
+         "user_comment": "", "current_sub_title": "标题"} for i in range(1, 11)])
+
+    batches = []
+
+    def fake_references(keywords_list, vdb_dir, api_cfg):
+        batches.append(list(keywords_list))
+        return [f"参考{k}" for k in keywords_list]
+
+    def fake_gen_txt(**kwargs):
+        return f"{kwargs['para_text']}|{kwargs['references']}"
+
+    monkeypatch.setattr(doc_writer, "get_references_from_vdb", fake_references)
+    monkeypatch.setattr(doc_writer, "get_reference_from_vdb", lambda *a: pytest.fail("per-paragraph retrieval"))
+    monkeypatch.setattr(doc_writer, "gen_txt", fake_gen_txt)
+
+    writer = DocxWriter(max_workers=2)
+    try:
+        doc_info = {"start_time": 0, "vdb_dir": "vdb", "doc_ctx": "", "doc_outline": ""}
+        results = writer._submit_tasks(1, 100, doc_info, {"api": {}, "docx": {"retrieval_batch_size": 4}})
+    finally:
+        writer.shutdown()
+        meta_db.close_conn()
+
+    assert [len(b) for b in batches] == [4, 4, 2]
+    assert len(results) == 10 and all(r["success"] for r in results.values())
+    done = docx_meta_util.get_para_list_with_status(100, 1, False)
+    assert [p["gen_txt"] for p in done] == [f"要求{i}|参考要求{i}" for i in range(1, 11)]
+    assert writer.stage_timings["para_count"] == 10
+    assert "参考资料检索" in writer._stage_timing_info()
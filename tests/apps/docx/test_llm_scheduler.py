@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""大模型请求调度器测试：在途上限、按 key 轮转放行、令牌桶限速、429 退避与恢复"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from common.llm_scheduler import LlmScheduler, LlmSchedulerTimeout
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _wait_queued(scheduler, n):
+    deadline = time.monotonic() + 5
+    while scheduler.metrics()["queued"] < n:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_max_in_flight_and_queue_metrics():
+    scheduler = LlmScheduler(max_in_flight=3)
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def one(i):
+        with scheduler.slot(("u", i % 2)):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    m = scheduler.metrics()
+    assert active[1] == 3
+    assert m["granted"] == 10 and m["completed"] == 10 and m["in_flight"] == 0 and m["queued"] == 0
+    assert m["queue_wait_ms"]["max"] >= 40
+
+
+def test_keys_are_served_round_robin():
+    scheduler = LlmScheduler(max_in_flight=1)
+    order = []
+
+    def one(key):
+        with scheduler.slot(key):
+            order.append(key)
+
+    held = scheduler.slot("holder")
+    threads = []
+    for i, key in enumerate(["big", "big", "big", "small", "small"]):
+        t = threading.Thread(target=one, args=(key,))
+        t.start()
+        threads.append(t)
+        _wait_queued(scheduler, i + 1)
+    held.__exit__(None, None, None)
+    for t in threads:
+        t.join()
+    assert order == ["big", "small", "big", "small", "big"]
+
+    held = scheduler.slot("holder")
+    with pytest.raises(LlmSchedulerTimeout):
+        scheduler.slot("late", timeout=0.05)
+    held.__exit__(None, None, None)
+    assert scheduler.metrics()["timeouts"] == 1 and scheduler.metrics()["queued"] == 0
+
+
+def test_token_bucket_limits_rate():
+    scheduler = LlmScheduler(max_in_flight=8, tokens_per_s=1000)
+    start = time.monotonic()
+    for _ in range(3):
+        with scheduler.slot("u", est_tokens=500):
+            pass
+    # 桶容量 1000：前两个请求立即放行，第三个等待约 0.5 秒
+    assert 0.4 <= time.monotonic() - start < 2
+
+
+def test_throttle_backoff_and_recovery():
+    scheduler = LlmScheduler(max_in_flight=4, backoff_s=0.2)
+    with pytest.raises(FakeStatusError):
+        with scheduler.slot("u"):
+            raise FakeStatusError(429)
+    m = scheduler.metrics()
+    assert m["throttled"] == 1 and m["limit"] == 2 and m["paused_s"] > 0
+
+    start = time.monotonic()
+    with scheduler.slot("u"):
+        pass
+    assert time.monotonic() - start >= 0.15
+
+    # 非 429/5xx 的错误不触发退避
+    with pytest.raises(FakeStatusError):
+        with scheduler.slot("u"):
+            raise FakeStatusError(400)
+    assert scheduler.metrics()["errors"] == 1 and scheduler.metrics()["limit"] == 2
+
+    for _ in range(10):
+        with scheduler.slot("u"):
+            pass
+    assert scheduler.metrics()["limit"] == 4
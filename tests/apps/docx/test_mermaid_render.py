@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Mermaid 渲染测试：并发渲染、相同脚本只渲染一次、磁盘缓存命中与清理、连接池大小、渲染失败不影响其他图表（本地 Kroki 桩服务）"""
+
+import io
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from docx import Document
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.docx import mermaid_render
+from apps.docx.mermaid_render import MermaidRenderer, prune_cache
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (80, 40), "white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class StubKroki(ThreadingHTTPServer):
+    """Kroki /png 桩服务，记录收到的脚本与最大并发"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubKrokiHandler)
+        self.scripts = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def uri(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class StubKrokiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    png = _png()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        srv = self.server
+        script = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        with srv.lock:
+            srv.scripts.append(script)
+            srv.active += 1
+            srv.max_active = max(srv.max_active, srv.active)
+        try:
+            time.sleep(0.1)
+            status, data = (400, b"syntax error") if "bad" in script else (200, self.png)
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with srv.lock:
+                srv.active -= 1
+
+
+@pytest.fixture
+def kroki():
+    srv = StubKroki()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+
+
+def _make_doc(path, scripts):
+    doc = Document()
+    for i, script in enumerate(scripts):
+        doc.add_paragraph(f"段落{i}<mermaid>{script}</mermaid>")
+    doc.save(path)
+
+
+def test_concurrent_render_dedup_and_cache(kroki, tmp_path):
+    scripts = ['flowchart TD\n A["开始"] --> B', "flowchart TD\n C --> D", 'flowchart TD\n A["开始"] --> B',
+               "flowchart TD\n E --> F", "bad"]
+    doc_path = str(tmp_path / "a.docx")
+    _make_doc(doc_path, scripts)
+    renderer = MermaidRenderer(kroki.uri, max_workers=4, cache_dir=str(tmp_path / "cache"))
+
+    assert renderer.batch_process_mermaid_in_docx(1, doc_path) == 5
+    assert sorted(kroki.scripts) == sorted(set(scripts))
+    assert kroki.max_active > 1
+    doc = Document(doc_path)
+    assert len(doc.inline_shapes) == 4
+    texts = [p.text for p in doc.paragraphs]
+    assert "段落0" in texts and "段落1" in texts
+    # 渲染失败的脚本保留在原段落中
+    assert "段落4<mermaid>bad</mermaid>" in texts
+
+    # 重新生成的文档：成功渲染过的图表直接读缓存
+    kroki.scripts.clear()
+    doc_path = str(tmp_path / "b.docx")
+    _make_doc(doc_path, scripts[:4])
+    renderer.batch_process_mermaid_in_docx(2, doc_path)
+    assert kroki.scripts == []
+    assert len(Document(doc_path).inline_shapes) == 4
+
+
+def test_render_without_cache(kroki):
+    renderer = MermaidRenderer(kroki.uri, max_workers=2, cache_dir=None)
+    results = renderer.render_scripts(["flowchart TD\n A --> B", "bad", "flowchart TD\n A --> B"])
+    assert results[0] == results[2] and results[0][:4] == b"\x89PNG"
+    assert isinstance(results[1], Exception)
+    assert len(kroki.scripts) == 2
+
+
+def test_prune_cache_by_age_and_size(tmp_path):
+    now = time.time()
+    # 按修改时间从旧到新：old 已过期，其余每个 400KB
+    for name, age_days in [("old", 40), ("a", 3), ("b", 2), ("c", 1)]:
+        path = tmp_path / f"{name}.png"
+        path.write_bytes(b"x" * 400 * 1024)
+        os.utime(path, (now - age_days * 86400, now - age_days * 86400))
+
+    assert prune_cache(str(tmp_path), max_mb=1, max_age_days=30) == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["b.png", "c.png"]
+    assert prune_cache(str(tmp_path), max_mb=1, max_age_days=30) == 0
+    assert prune_cache(None) == 0
+
+
+def test_cache_hit_refreshes_mtime_and_session_follows_workers(kroki, tmp_path):
+    renderer = MermaidRenderer(kroki.uri, max_workers=12, cache_dir=str(tmp_path))
+    renderer.render_script_to_img("flowchart TD\n A --> B")
+    assert mermaid_render._session_pool_size >= 12
+    cached = next(tmp_path.iterdir())
+    os.utime(cached, (0, 0))
+    renderer.render_script_to_img("flowchart TD\n A --> B")
+    assert len(kroki.scripts) == 1
+    assert cached.stat().st_mtime > time.time() - 60
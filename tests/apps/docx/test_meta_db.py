@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""元数据访问层测试：参数化语句（含单引号文本）、dict 行、executemany 批量写入、线程内连接复用"""
+
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from common import docx_meta_util, meta_db
+from common.vdb_meta_util import VdbMeta
+
+SCHEMA = """
+CREATE TABLE doc_file_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER, task_id INTEGER, doc_type TEXT, doc_title TEXT,
+    doc_outline TEXT, keywords TEXT, input_file_path TEXT, vdb_id INTEGER, is_include_para_txt INTEGER,
+    doc_ctx TEXT, output_file_path TEXT, vdb_dir TEXT, output_file_type INTEGER, create_time TEXT,
+    process_info TEXT, percent INTEGER DEFAULT 0, word_count INTEGER, img_count INTEGER DEFAULT 0,
+    outline TEXT, is_para_task_created INTEGER DEFAULT 0);
+CREATE TABLE doc_para_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER, task_id INTEGER, para_id INTEGER, heading TEXT,
+    unique_key TEXT, para_text TEXT, user_comment TEXT, current_sub_title TEXT, namespaces TEXT,
+    create_time TEXT, gen_txt TEXT, word_count INTEGER, contains_mermaid INTEGER DEFAULT 0,
+    update_time TEXT, status INTEGER DEFAULT 0);
+CREATE TABLE vdb_file_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, uid INTEGER, vdb_id INTEGER, file_path TEXT,
+    task_id INTEGER, file_md5 TEXT, create_time TEXT, process_info TEXT, percent INTEGER DEFAULT 0);
+"""
+
+
+@pytest.fixture
+def cfg_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with sqlite3.connect("cfg.db") as conn:
+        conn.executescript(SCHEMA)
+    conn.close()
+    yield tmp_path / "cfg.db"
+    meta_db.close_conn()
+
+
+def para_tasks(n):
+    return [{"para_id": i, "current_heading": ["一、总体", f"{i}. it's"], "unique_key": f"k'{i}",
+             "para_text": "原文 'quoted'", "user_comment": "", "current_sub_title": f"子标题{i}",
+             "namespaces": None} for i in range(1, n + 1)]
+
+
+def test_doc_task_round_trip(cfg_db):
+    docx_meta_util.save_doc_info(1, 100, "报告", "O'Brien 的方案", "", "", "", 0, 0, "", "", "")
+    assert docx_meta_util.save_para_task(1, 100, para_tasks(5))["affected_rows"] == 5
+    assert docx_meta_util.count_para_task(100)[0]["count(1)"] == 5
+
+    docx_meta_util.update_process_info(1, 100, "正在处理 'para 3'", 30)
+    row = docx_meta_util.get_doc_info(100)[0]
+    assert row["doc_title"] == "O'Brien 的方案"
+    assert row["process_info"] == "正在处理 'para 3'" and row["percent"] == 30
+
+    docx_meta_util.save_gen_para_txt(100, 2, "生成的 'text'", 8, 1)
+    done = docx_meta_util.get_para_list_with_status(100, 1)
+    todo = docx_meta_util.get_para_list_with_status(100, 0, False)
+    assert [p["para_id"] for p in done] == [2]
+    assert [p["para_id"] for p in todo] == [1, 3, 4, 5]
+    assert done[0]["gen_txt"] == "生成的 'text'" and done[0]["unique_key"] == "k'2"
+    assert docx_meta_util.count_mermaid_para(100)[0]["count(1)"] == 1
+
+    docx_meta_util.update_img_count_by_task_id(100, 3)
+    assert docx_meta_util.get_img_count_by_task_id(100) == 3
+
+
+def test_bulk_insert_rolls_back_on_error(cfg_db):
+    tasks = para_tasks(3)
+    tasks[2]["para_text"] = object()    # 不可绑定的参数，整个批次回滚
+    assert not docx_meta_util.save_para_task(1, 7, tasks)["result"]
+    assert docx_meta_util.count_para_task(7)[0]["count(1)"] == 0
+
+
+def test_vdb_file_process_info(cfg_db):
+    VdbMeta.save_vdb_file_info("a'b.docx", "/tmp/a.docx", 1, 2, 3, "md5")
+    file_id = VdbMeta.get_vdb_file_info_by_file_name("a'b.docx", 1, 2)[0]["id"]
+    VdbMeta.update_vdb_file_process_info(file_id, "已完成", 100)
+    info = VdbMeta.get_vdb_file_info_by_id(file_id)[0]
+    assert info["process_info"] == "已完成" and info["percent"] == 100
+    assert VdbMeta.get_vdb_file_processing_list() == []
+
+
+def test_connection_per_thread(cfg_db):
+    main_conn = meta_db.get_conn()
+    assert meta_db.get_conn() is main_conn
+    other = []
+    t = threading.Thread(target=lambda: other.append(meta_db.get_conn()))
+    t.start()
+    t.join()
+    assert other[0] is not main_conn
+    assert meta_db.query_one("PRAGMA journal_mode")["journal_mode"] == "wal"
+
+
+def test_missing_db_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        docx_meta_util.get_doc_info(1)
+    assert not os.path.exists(tmp_path / "cfg.db")
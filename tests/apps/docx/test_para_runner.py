@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""段落任务执行器测试：小文档段落优先执行、按段落判断超时、超时后不再重试、调度排队不计入超时、重新执行任务时只生成 status=0 的段落"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from common import docx_meta_util, meta_db
+from apps.docx import doc_writer, para_runner, txt_gen_util
+from apps.docx.doc_writer import DocxWriter
+from apps.docx.para_runner import ParaTaskRunner, PRIORITY_BATCH, PRIORITY_INTERACTIVE, priority_for
+
+SCHEMA = """
+CREATE TABLE doc_file_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER, task_id INTEGER, process_info TEXT,
+    percent INTEGER DEFAULT 0);
+CREATE TABLE doc_para_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER, task_id INTEGER, para_id INTEGER, heading TEXT,
+    unique_key TEXT, para_text TEXT, user_comment TEXT, current_sub_title TEXT, namespaces TEXT,
+    create_time TEXT, gen_txt TEXT, word_count INTEGER, contains_mermaid INTEGER DEFAULT 0,
+    update_time TEXT, status INTEGER DEFAULT 0);
+"""
+
+
+def test_interactive_jobs_run_before_queued_batch_jobs():
+    runner = ParaTaskRunner(1)
+    gate = threading.Event()
+    order = []
+    blocker = runner.submit(gate.wait, priority=PRIORITY_BATCH)
+    while not blocker.running():
+        time.sleep(0.01)
+    batch = [runner.submit(order.append, f"batch_{i}", priority=PRIORITY_BATCH) for i in range(3)]
+    interactive = [runner.submit(order.append, f"small_{i}", priority=PRIORITY_INTERACTIVE) for i in range(2)]
+    assert runner.stats()["queued"] == {PRIORITY_BATCH: 3, PRIORITY_INTERACTIVE: 2}
+    gate.set()
+    for f in [blocker] + batch + interactive:
+        f.result(timeout=5)
+    runner.shutdown()
+    assert order == ["small_0", "small_1", "batch_0", "batch_1", "batch_2"]
+    assert blocker.started_at is not None
+
+    assert priority_for(10, 30) == PRIORITY_INTERACTIVE
+    assert priority_for(31, 30) == PRIORITY_BATCH
+
+
+def test_burst_after_idle_uses_multiple_workers():
+    runner = ParaTaskRunner(8)
+    runner.submit(lambda: None).result(timeout=5)
+    time.sleep(0.05)
+    start = time.monotonic()
+    futures = [runner.submit(time.sleep, 0.05) for _ in range(40)]
+    for f in futures:
+        f.result(timeout=10)
+    elapsed = time.monotonic() - start
+    runner.shutdown()
+    assert runner.stats()["workers"] == 8
+    assert elapsed < 1
+
+
+def test_gen_txt_stops_retrying_when_para_would_time_out(monkeypatch):
+    calls = []
+
+    def failing_model(cfg, **kwargs):
+        calls.append(time.monotonic())
+        raise RuntimeError("llm_connection_lost")
+
+    monkeypatch.setattr(txt_gen_util.cfg_util, "get_usr_prompt_template", lambda name, cfg: "{paragraph_prompt}")
+    monkeypatch.setattr(txt_gen_util.agt_util, "get_model", failing_model)
+    # dispose() 只负责释放 GPU 显存
+    monkeypatch.setattr(txt_gen_util, "dispose", lambda model: None)
+    cfg = {"api": {"llm_api_uri": "http://127.0.0.1:1/v1"}}
+    runner = ParaTaskRunner(1)
+    try:
+        # 剩余时间不足第一次重试的等待时间（5 秒）：失败一次后直接抛出
+        future = runner.submit(txt_gen_util.gen_txt, 1, "", "", "要求", "", "", "标题", cfg, timeout_s=3)
+        start = time.monotonic()
+        try:
+            future.result(timeout=5)
+            assert False, "expected RuntimeError"
+        except RuntimeError as e:
+            assert str(e) == "llm_connection_lost"
+        assert len(calls) == 1 and time.monotonic() - start < 1
+
+        assert runner.submit(para_runner.remaining_s, timeout_s=10).result(timeout=5) > 9
+        assert runner.submit(para_runner.remaining_s).result(timeout=5) is None
+    finally:
+        runner.shutdown()
+    assert para_runner.remaining_s() is None
+
+
+def test_paused_clock_excludes_scheduler_wait():
+    runner = ParaTaskRunner(1)
+    in_wait = threading.Event()
+    release = threading.Event()
+
+    def job():
+        with para_runner.clock_paused():
+            in_wait.set()
+            release.wait(5)
+        return para_runner.remaining_s()
+
+    try:
+        future = runner.submit(job, timeout_s=1)
+        assert in_wait.wait(5)
+        time.sleep(0.3)
+        # 排队期间已执行时间保持不变
+        assert para_runner.elapsed_s(future) < 0.1
+        release.set()
+        assert future.result(timeout=5) > 0.9
+        assert para_runner.elapsed_s(future) < 0.1
+    finally:
+        release.set()
+        runner.shutdown()
+    with para_runner.clock_paused():
+        pass
+
+
+def test_para_timeout_and_resume_pending_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with sqlite3.connect("cfg.db") as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("insert into doc_file_info (uid, task_id) values (1, 200)")
+    conn.close()
+    docx_meta_util.save_para_task(1, 200, [
+        {"para_id": i, "current_heading": [], "unique_key": f"para_{i}", "para_text": f"要求{i}",
+         "user_comment": "", "current_sub_title": "标题"} for i in range(1, 5)])
+
+    stuck = threading.Event()
+    generated = []
+
+    def fake_gen_txt(**kwargs):
+        generated.append(kwargs["para_text"])
+        if kwargs["para_text"] == "要求2" and not stuck.is_set():
+            stuck.wait(10)
+            raise RuntimeError("llm_connection_lost")
+        return f"{kwargs['para_text']}|生成"
+
+    monkeypatch.setattr(doc_writer, "get_references_from_vdb", lambda keywords_list, *a: [""] * len(keywords_list))
+    monkeypatch.setattr(doc_writer, "gen_txt", fake_gen_txt)
+
+    writer = DocxWriter(max_workers=2)
+    doc_info = {"start_time": 0, "vdb_dir": "", "doc_ctx": "", "doc_outline": ""}
+    sys_cfg = {"api": {}, "docx": {"para_timeout_s": 0.5}}
+    try:
+        results = writer._submit_tasks(1, 200, doc_info, sys_cfg)
+        assert results["para_2"] == {"success": False, "error": "段落生成超时"}
+        assert sum(r["success"] for r in results.values()) == 3
+        pending = docx_meta_util.get_para_list_with_status(200, 0, False)
+        assert [p["para_id"] for p in pending] == [2]
+        assert docx_meta_util.count_para_task(200, 0)[0]["count(1)"] == 1
+
+        # 中断的调用结束后重新执行任务：只重新生成超时的段落
+        stuck.set()
+        generated.clear()
+        results = writer._submit_tasks(1, 200, doc_info, sys_cfg)
+        assert generated == ["要求2"]
+        assert results == {"para_2": {"success": True}}
+        assert docx_meta_util.count_para_task(200, 0)[0]["count(1)"] == 0
+    finally:
+        stuck.set()
+        writer.shutdown()
+        meta_db.close_conn()
+
+
+def test_shared_runner_survives_writer_shutdown():
+    first = DocxWriter()
+    first.shutdown()
+    second = DocxWriter()
+    assert second.executor is first.executor
+    assert second.executor.submit(lambda: 42).result(timeout=5) == 42
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+embedding 服务压测：不同并发下的 p50/p99 延迟与 texts/s。
+
+本地模式（默认）: 在子进程中启动 uvicorn 桩服务，模拟编码耗时（固定开销 + 每条文本耗时，近似批量推理），对比
+  direct   旧版实现，async 端点中直接调用阻塞的 encode，每个请求单独编码
+  batched  EmbeddingBatcher 合并并发请求，在工作线程中编码
+HTTP 模式: 压测已启动的 embedding 服务（--url）
+    python tests/apps/embedding/bench_embedding_load.py --concurrency 1,8,32,128
+    python tests/apps/embedding/bench_embedding_load.py --url http://127.0.0.1:17000 --key sk-xxxx
+"""
+
+import argparse
+import asyncio
+import os
+import multiprocessing
+import socket
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.embedding.batcher import EmbeddingBatcher
+
+TEXTS = ["燃气费怎么交", "家里有股燃气味怎么办，需要马上报修吗", "过户需要带哪些材料",
+         "热水器打不着火", "营业厅的地址和营业时间是什么"]
+
+
+def make_encoder(overhead_ms, per_text_ms, dim):
+    def encode(texts):
+        time.sleep((overhead_ms + per_text_ms * len(texts)) / 1000)
+        return np.zeros((len(texts), dim), dtype=np.float32)
+    return encode
+
+
+async def run_clients(call, concurrency, requests_per_client, texts_per_request):
+    latencies = []
+
+    async def client(cid):
+        for i in range(requests_per_client):
+            texts = [TEXTS[(cid + i + j) % len(TEXTS)] for j in range(texts_per_request)]
+            begin = time.perf_counter()
+            await call(texts)
+            latencies.append((time.perf_counter() - begin) * 1000)
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(concurrency)))
+    return time.perf_counter() - begin, latencies
+
+
+def report(name, concurrency, elapsed, latencies, texts_per_request):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    rate = len(latencies) * texts_per_request / elapsed
+    print(f"{name:>8} {concurrency:>6} {p50:10.1f} {p99:10.1f} {rate:12.1f}")
+
+
+def serve_stub(port, overhead_ms, per_text_ms, dim, max_wait_ms, max_batch_texts):
+    """桩服务：/direct 为旧版实现，/batched 使用 EmbeddingBatcher"""
+    import uvicorn
+    from fastapi import FastAPI
+
+    encode = make_encoder(overhead_ms, per_text_ms, dim)
+    batcher = EmbeddingBatcher(encode, max_wait_ms=max_wait_ms, max_batch_texts=max_batch_texts)
+    app = FastAPI()
+
+    @app.post("/direct/v1/embeddings")
+    async def direct(body: dict):
+        return {"data": encode(body["input"]).tolist()}
+
+    @app.post("/batched/v1/embeddings")
+    async def batched(body: dict):
+        return {"data": (await batcher.encode(body["input"])).tolist()}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=300)
+
+
+def start_stub_server(args):
+    """在独立进程中启动桩服务，避免与压测客户端争用 GIL"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    proc = multiprocessing.Process(target=serve_stub, daemon=True, args=(
+        port, args.overhead_ms, args.per_text_ms, args.dim, args.max_wait_ms, args.max_batch_texts))
+    proc.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return f"http://127.0.0.1:{port}"
+
+
+async def bench_http(name, url, key, concurrency, args):
+    import httpx
+    headers = {"Authorization": f"Bearer {key}"} if key else {}
+    async with httpx.AsyncClient(base_url=url.rstrip("/"), headers=headers, timeout=120,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def call(texts):
+            resp = await client.post("/v1/embeddings", json={"model": "bge", "input": texts})
+            resp.raise_for_status()
+
+        elapsed, latencies = await run_clients(call, concurrency, args.requests, args.texts)
+        report(name, concurrency, elapsed, latencies, args.texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32,128")
+    parser.add_argument("--requests", type=int, default=20, help="每个客户端的请求数")
+    parser.add_argument("--texts", type=int, default=1, help="每个请求的文本条数")
+    parser.add_argument("--overhead-ms", type=float, default=8)
+    parser.add_argument("--per-text-ms", type=float, default=0.3)
+    parser.add_argument("--dim", type=int, default=768, help="模拟向量维度")
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--max-batch-texts", type=int, default=64)
+    parser.add_argument("--url", default="")
+    parser.add_argument("--key", default="")
+    args = parser.parse_args()
+
+    if args.url:
+        targets = [("http", args.url)]
+    else:
+        base = start_stub_server(args)
+        targets = [("direct", f"{base}/direct"), ("batched", f"{base}/batched")]
+
+    print(f"{'mode':>8} {'conc':>6} {'p50_ms':>10} {'p99_ms':>10} {'texts/s':>12}")
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        for name, url in targets:
+            asyncio.run(bench_http(name, url, args.key, concurrency, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+embedding 传输格式对比：JSON 浮点数组 vs base64（小端 float32）。
+按 OpenAI 兼容响应格式构造 N 条 dim 维向量的响应体，统计线上字节数、
+服务端序列化耗时、客户端解析为 NumPy 数组的耗时。
+    python tests/apps/embedding/bench_embedding_transport.py --texts 1000 --dim 1024
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from common.embedding_codec import decode_vector, encode_vector
+
+
+def serialize(vectors, fmt):
+    if fmt == "base64":
+        data = [{"object": "embedding", "index": i, "embedding": encode_vector(v)} for i, v in enumerate(vectors)]
+    else:
+        data = [{"object": "embedding", "index": i, "embedding": v} for i, v in enumerate(vectors.tolist())]
+    return json.dumps({"object": "list", "data": data, "model": "bge"}).encode()
+
+
+def parse(body):
+    return [decode_vector(item["embedding"]) for item in json.loads(body)["data"]]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - begin)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # 归一化向量，与 bge 输出的数值分布一致
+    vectors = np.random.default_rng(0).standard_normal((args.texts, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    print(f"{args.texts} texts x {args.dim} dim")
+    print(f"{'format':>8} {'bytes':>12} {'bytes/text':>11} {'encode_ms':>10} {'decode_ms':>10}")
+    for fmt in ("float", "base64"):
+        encode_ms, body = best_of(lambda: serialize(vectors, fmt), args.repeat)
+        decode_ms, decoded = best_of(lambda: parse(body), args.repeat)
+        assert np.allclose(np.stack(decoded), vectors, atol=1e-6)
+        print(f"{fmt:>8} {len(body):>12,} {len(body) // args.texts:>11,} {encode_ms:10.1f} {decode_ms:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""embedding 动态微批处理测试"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.embedding.batcher import EmbeddingBatcher
+
+
+class FakeEncoder:
+    """向量 = [文本长度, 首字符编码]，记录每批输入与调用线程"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+        self.threads = set()
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("encode failed")
+        return np.asarray([[len(t), ord(t[0])] for t in texts], dtype=np.float32)
+
+
+def test_concurrent_requests_coalesced_sorted_and_split():
+    encoder = FakeEncoder()
+    batcher = EmbeddingBatcher(encoder, max_wait_ms=50, max_batch_texts=64)
+    inputs = [["cccc", "a"], ["bb"], ["dddddd", "e", "fff"]]
+
+    async def main():
+        return await asyncio.gather(*(batcher.encode(t) for t in inputs))
+
+    results = asyncio.run(main())
+    assert len(encoder.batches) == 1
+    assert encoder.batches[0] == sorted(sum(inputs, []), key=len)
+    for texts, emb in zip(inputs, results):
+        assert emb.tolist() == [[len(t), ord(t[0])] for t in texts]
+    assert all(name.startswith("emb_encode") for name in encoder.threads)
+    stats = batcher.stats()
+    assert stats["batches"] == 1 and stats["requests"] == 3 and stats["texts"] == 6
+
+
+def test_batch_flushes_when_full_and_loop_stays_responsive():
+    encoder = FakeEncoder(delay=0.2)
+    batcher = EmbeddingBatcher(encoder, max_wait_ms=1000, max_batch_texts=4)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        begin = time.perf_counter()
+        await asyncio.gather(*(batcher.encode([f"t{i}"]) for i in range(4)))
+        elapsed = time.perf_counter() - begin
+        tick_task.cancel()
+        return elapsed, ticks
+
+    elapsed, ticks = asyncio.run(main())
+    # 凑满 4 条立即编码，无需等待 1s 窗口；编码期间事件循环仍在调度其他协程
+    assert elapsed < 0.5
+    assert ticks >= 10
+    assert len(encoder.batches) == 1
+
+
+def test_encode_error_propagates_to_each_request():
+    batcher = EmbeddingBatcher(FakeEncoder(fail=True), max_wait_ms=10)
+
+    async def main():
+        return await asyncio.gather(batcher.encode(["a"]), batcher.encode(["b"]), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.encode(["c"]))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""base64 embedding 传输测试：编解码、旧服务端浮点列表兼容、客户端端到端（本地桩服务）"""
+
+import base64
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.csm.embedding_client import EmbeddingClient
+from common.embedding_codec import decode_vector, encode_vector
+
+
+class StubEmbeddingServer(ThreadingHTTPServer):
+    """按请求的 encoding_format 返回 base64 或浮点列表；legacy 时忽略 encoding_format"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubEmbeddingHandler)
+        self.legacy = False
+        self.requests = []
+
+    @property
+    def uri(self):
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+
+class StubEmbeddingHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        vectors = [np.array([len(t), 0.5, -1.25], dtype=np.float32) for t in body["input"]]
+        if body.get("encoding_format") == "base64" and not self.server.legacy:
+            data = [{"index": i, "embedding": encode_vector(v)} for i, v in enumerate(vectors)]
+        else:
+            data = [{"index": i, "embedding": v.tolist()} for i, v in enumerate(vectors)]
+        payload = json.dumps({"object": "list", "data": data}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def server():
+    srv = StubEmbeddingServer()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+
+
+def test_round_trip_little_endian():
+    vec = np.random.default_rng(0).standard_normal(1024).astype(np.float32)
+    encoded = encode_vector(vec)
+    assert base64.b64decode(encoded)[:4] == vec[:1].astype("<f4").tobytes()
+    decoded = decode_vector(encoded)
+    assert decoded.dtype == np.float32
+    assert np.array_equal(decoded, vec)
+    # 未按 base64 返回的浮点列表同样可以解码
+    assert np.array_equal(decode_vector(vec.tolist()), vec)
+
+
+def test_client_requests_base64(server):
+    client = EmbeddingClient(server.uri, "k", "bge", use_cache=False)
+    assert client.embed(["ab", "c"]) == [[2.0, 0.5, -1.25], [1.0, 0.5, -1.25]]
+    assert server.requests[-1]["encoding_format"] == "base64"
+
+    # 服务端不支持 base64 时仍能正常解析
+    server.legacy = True
+    assert client.embed_single("abcd") == [4.0, 0.5, -1.25]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+连续批处理压测。
+
+本地模式（默认）: 进程内使用 Mock 后端，对比 max_batch_size=1（等价于逐请求串行生成）与连续批处理
+  python tests/apps/llm/bench_batch_scheduler.py --clients 16 --requests 64 --step-ms 20
+HTTP 模式: 压测已启动的 LLM 服务（is_mock: true 即可），输出吞吐与服务端 /health 中的调度器统计
+  python tests/apps/llm/bench_batch_scheduler.py --url http://127.0.0.1:16000 --key your-secret-key
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.llm.batch_scheduler import BatchScheduler, MockBatchBackend
+
+REPLY = "这是一个模拟响应。在实际环境中，这里会显示真实的AI回复。"
+
+
+def run_local(max_batch_size, clients, requests_n, step_ms):
+    scheduler = BatchScheduler(MockBatchBackend(lambda p, n, t: REPLY, step_ms=step_ms),
+                               max_batch_size=max_batch_size)
+    peak_queue = [0]
+
+    def one(i):
+        begin = time.perf_counter()
+        req = scheduler.submit(f"q{i}", 256, 0.7)
+        ttft = None
+        for _ in req.stream():
+            if ttft is None:
+                ttft = time.perf_counter() - begin
+        peak_queue[0] = max(peak_queue[0], scheduler.stats()["queue_depth"])
+        return ttft, time.perf_counter() - begin, req.completion_tokens
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        results = list(pool.map(one, range(requests_n)))
+    elapsed = time.perf_counter() - begin
+    stats = scheduler.stats()
+    scheduler.close()
+    return elapsed, results, stats, peak_queue[0]
+
+
+def run_http(url, key, clients, requests_n, max_tokens):
+    import requests
+    session = requests.Session()
+    headers = {"Authorization": f"Bearer {key}"} if key else {}
+    payload = {"messages": [{"role": "user", "content": "你好"}], "stream": True, "max_tokens": max_tokens}
+
+    def one(_):
+        begin = time.perf_counter()
+        ttft, chunks = None, 0
+        with session.post(f"{url}/v1/doc_forge/completions", json=payload, headers=headers,
+                          stream=True, timeout=300) as resp:
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                delta = json.loads(line[6:])["choices"][0]["delta"]
+                if delta.get("content"):
+                    chunks += 1
+                    if ttft is None:
+                        ttft = time.perf_counter() - begin
+        return ttft or 0, time.perf_counter() - begin, chunks
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        results = list(pool.map(one, range(requests_n)))
+    elapsed = time.perf_counter() - begin
+    health = session.get(f"{url}/health", timeout=10).json()
+    return elapsed, results, health.get("scheduler"), None
+
+
+def report(name, elapsed, results, stats, peak_queue):
+    ttfts = [r[0] * 1000 for r in results]
+    latencies = [r[1] * 1000 for r in results]
+    tokens = sum(r[2] for r in results)
+    line = (f"{name:>12} {elapsed:8.2f}s {tokens / elapsed:10.1f} tok/s "
+            f"ttft_p50={statistics.median(ttfts):8.1f}ms latency_p50={statistics.median(latencies):8.1f}ms")
+    if stats:
+        line += f" occupancy_avg={stats['batch_occupancy_avg']:.2f}"
+    if peak_queue is not None:
+        line += f" peak_queue={peak_queue}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--step-ms", type=float, default=20)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--url", default="")
+    parser.add_argument("--key", default="")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    args = parser.parse_args()
+
+    print(f"clients={args.clients}, requests={args.requests}")
+    if args.url:
+        report("http", *run_http(args.url.rstrip("/"), args.key, args.clients, args.requests, args.max_tokens))
+        return
+    report("batch=1", *run_local(1, args.clients, args.requests, args.step_ms))
+    report(f"batch={args.max_batch_size}",
+           *run_local(args.max_batch_size, args.clients, args.requests, args.step_ms))
+
+
+if __name__ == "__main__":
+    main()
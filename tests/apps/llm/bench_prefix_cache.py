@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+prompt 前缀 KV cache 基准测试：回放请求序列，统计 prefill 节省。
+
+请求序列为 JSONL，每行一个 /v1/doc_forge/completions 请求体（含 messages）；
+不指定 --mix 时使用 csm 智能体系统提示词合成的请求序列。
+
+  --model 指定模型目录时，分别在无缓存 / 有缓存两种情况下执行 prefill 并计时；
+  未指定时只用字符作为 token 统计可复用的 prefill token 数（无需 torch）。
+
+用法:
+    python tests/apps/llm/bench_prefix_cache.py --requests 200
+    python tests/apps/llm/bench_prefix_cache.py --model /data/Qwen2.5-0.5B-Instruct --mix requests.jsonl
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.llm.prefix_cache import PrefixCache, cache_object, legacy_kv
+
+QUERIES = ["家里有股燃气味怎么办", "这个月燃气费怎么这么高", "我想办理过户", "热水器打不着火",
+           "营业厅几点下班", "怎么在手机上缴费", "新房子怎么开通燃气", "灶台火苗发黄正常吗"]
+
+
+def build_prompt(messages):
+    """与 apps/llm/app.py build_prompt 一致"""
+    prompt = ""
+    for msg in messages:
+        role, content = msg.get("role", ""), msg.get("content", "")
+        if role in ("system", "user", "assistant"):
+            prompt += f"{role}: {content}\n"
+    return prompt + "assistant: "
+
+
+def synth_mix(n, seed=0):
+    from apps.csm.csm_engine import CsmEngine
+    from apps.csm.store import DEFAULT_AGENT_PROMPT
+    systems = [CsmEngine.CSM_EMERGENCY_PROMPT, CsmEngine.CSM_BILLING_PROMPT, CsmEngine.CSM_BUSINESS_PROMPT,
+               CsmEngine.CSM_REPAIR_PROMPT, CsmEngine.CSM_FAQ_PROMPT]
+    rng = random.Random(seed)
+    mix = []
+    for _ in range(n):
+        query = rng.choice(QUERIES)
+        if rng.random() < 0.5:
+            system = rng.choice(systems)
+        else:
+            # 工作流智能体：模板固定，知识库上下文随检索结果变化
+            kb = "\n".join(rng.sample(QUERIES, 3))
+            system = DEFAULT_AGENT_PROMPT.split("知识库内容：")[0] + "知识库内容：\n---\n" + kb
+        mix.append({"messages": [{"role": "system", "content": system}, {"role": "user", "content": query}]})
+    return mix
+
+
+def load_mix(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_dry(prompts, block_size):
+    """字符级 token，统计可复用的 prefill token 数"""
+    cache = PrefixCache(max_bytes=1 << 40, block_size=block_size)
+    for prompt in prompts:
+        ids = [ord(c) for c in prompt]
+        cached_len, _ = cache.lookup(ids)
+        cache.insert(ids, [(_FakeKV(len(ids)), _FakeKV(len(ids)))], cached_len)
+    stats = cache.stats()
+    total = stats["lookup_tokens"]
+    print(f"requests={len(prompts)}, prefill_tokens={total}, cached_tokens={stats['hit_tokens']}, "
+          f"saved={stats['hit_token_ratio'] * 100:.1f}%, hits={stats['hits']}")
+
+
+class _FakeKV:
+    """dry-run 使用的 KV 占位，按 token 数计算大小"""
+
+    def __init__(self, length):
+        self.length = length
+        self.nbytes = length
+
+    def __getitem__(self, item):
+        return _FakeKV(min(self.length, item[2].stop))
+
+    def copy(self):
+        return self
+
+
+def run_model(prompts, model_path, block_size, max_mb):
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.bfloat16, device_map="cpu",
+                                                 low_cpu_mem_usage=True, trust_remote_code=True)
+    cache = PrefixCache(max_mb * 1024 * 1024, block_size)
+    encoded = [tokenizer(p, return_tensors="pt")["input_ids"] for p in prompts]
+
+    def prefill(ids, use_cache):
+        token_ids = ids[0].tolist()
+        cached_len, kv = cache.lookup(token_ids) if use_cache else (0, None)
+        begin = time.perf_counter()
+        with torch.no_grad():
+            out = model(input_ids=ids[:, cached_len:],
+                        attention_mask=torch.ones_like(ids),
+                        past_key_values=cache_object(kv) if kv is not None else None,
+                        position_ids=torch.arange(cached_len, ids.shape[1]).unsqueeze(0),
+                        use_cache=True)
+        elapsed = time.perf_counter() - begin
+        if use_cache:
+            cache.insert(token_ids, legacy_kv(out.past_key_values), cached_len)
+        return elapsed
+
+    prefill(encoded[0], False)  # 预热
+    baseline = sum(prefill(ids, False) for ids in encoded)
+    cached = sum(prefill(ids, True) for ids in encoded)
+    stats = cache.stats()
+    print(f"requests={len(prompts)}, prefill_tokens={stats['lookup_tokens']}, cached_tokens={stats['hit_tokens']}")
+    print(f"prefill no-cache={baseline * 1000:.0f}ms, prefix-cache={cached * 1000:.0f}ms, "
+          f"saved={(baseline - cached) * 1000:.0f}ms ({(1 - cached / baseline) * 100:.1f}%), "
+          f"cache_mb={stats['bytes'] / 1024 / 1024:.1f}, evictions={stats['evictions']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", default="", help="请求序列 JSONL")
+    parser.add_argument("--requests", type=int, default=200, help="合成请求数（未指定 --mix 时）")
+    parser.add_argument("--model", default="")
+    parser.add_argument("--block-size", type=int, default=32)
+    parser.add_argument("--max-mb", type=int, default=512)
+    args = parser.parse_args()
+
+    mix = load_mix(args.mix) if args.mix else synth_mix(args.requests)
+    prompts = [build_prompt(req.get("messages", [])) for req in mix]
+    if args.model:
+        run_model(prompts, args.model, args.block_size, args.max_mb)
+    else:
+        run_dry(prompts, args.block_size)
+
+
+if __name__ == "__main__":
+    main()
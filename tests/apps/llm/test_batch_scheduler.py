@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""连续批处理调度器测试（Mock 后端，无需模型）"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.llm.batch_scheduler import BatchScheduler, MockBatchBackend
+
+
+def _respond(prompt, max_tokens, temperature):
+    return f"回复:{prompt}"
+
+
+class ByteBackend(MockBatchBackend):
+    """token 为 UTF-8 单字节，中文字符需 3 个 token 才能完整解码"""
+
+    def prefill(self, reqs):
+        time.sleep(self.prefill_s)
+        out = {}
+        for req in reqs:
+            self._pending[req] = list(self.respond(req.prompt, 0, 0).encode("utf-8"))
+            out[req] = self._next(req)
+        return out
+
+    def _next(self, req):
+        pending = self._pending[req]
+        return pending.pop(0) if pending else self.eos_token_id
+
+    @staticmethod
+    def detokenize(tokens):
+        return bytes(tokens).decode("utf-8", errors="replace")
+
+
+def test_concurrent_requests_share_batch():
+    scheduler = BatchScheduler(MockBatchBackend(_respond, step_ms=10, prefill_ms=0), max_batch_size=4)
+    reqs = [scheduler.submit(f"q{i}", 64, 0.7) for i in range(6)]
+    results = [r.result(timeout=5) for r in reqs]
+    assert results == [f"回复:q{i}" for i in range(6)]
+    assert all(r.finish_reason == "stop" for r in reqs)
+
+    stats = scheduler.stats()
+    assert stats["admitted"] == 6 and stats["finished"] == 6
+    assert stats["queue_depth"] == 0 and stats["running"] == 0
+    # 6 个请求各 5 个字符，批大小 4：远少于串行所需的步数
+    assert stats["decode_steps"] < 6 * 5
+    assert stats["batch_occupancy_avg"] > 0.5
+    scheduler.close()
+
+
+def test_max_tokens_and_cancel():
+    scheduler = BatchScheduler(MockBatchBackend(lambda p, n, t: "x" * 1000, step_ms=5, prefill_ms=0),
+                               max_batch_size=2)
+    short = scheduler.submit("a", 3, 0.7)
+    assert short.result(timeout=5) == "xxx"
+    assert short.finish_reason == "length"
+
+    long_req = scheduler.submit("b", 1000, 0.7)
+    it = long_req.stream(timeout=5)
+    next(it)
+    long_req.cancel()
+    assert "".join(it).count("x") < 100
+    assert long_req.finish_reason == "cancelled"
+    assert scheduler.stats()["cancelled"] == 1
+    scheduler.close()
+
+
+def test_late_request_joins_running_batch():
+    scheduler = BatchScheduler(MockBatchBackend(lambda p, n, t: "y" * 40, step_ms=10, prefill_ms=0),
+                               max_batch_size=4)
+    first = scheduler.submit("a", 100, 0.7)
+    it = first.stream(timeout=5)
+    next(it)
+    # 第一个请求仍在生成时提交第二个，两者并行完成
+    second = scheduler.submit("b", 100, 0.7)
+    done = threading.Event()
+    threading.Thread(target=lambda: (second.result(timeout=5), done.set())).start()
+    "".join(it)
+    assert done.wait(timeout=1)
+    assert scheduler.stats()["decode_steps"] < 60
+    scheduler.close()
+
+
+def test_multibyte_characters_not_split():
+    scheduler = BatchScheduler(ByteBackend(_respond, step_ms=0, prefill_ms=0), max_batch_size=2)
+    req = scheduler.submit("燃气", 100, 0.7)
+    pieces = list(req.stream(timeout=5))
+    assert "".join(pieces) == "回复:燃气"
+    assert all("\ufffd" not in p for p in pieces)
+    assert len(pieces) == 5
+    scheduler.close()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""prompt 前缀 KV cache 测试（numpy 数组代替 KV 张量）"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.llm.prefix_cache import PrefixCache
+
+LAYERS, HEADS, DIM = 2, 2, 4
+
+
+def _kv(token_ids):
+    """每个位置的 KV 取值等于该位置的 token id，便于校验截断是否正确"""
+    t = np.asarray(token_ids, dtype=np.float32).reshape(1, 1, -1, 1)
+    k = np.broadcast_to(t, (1, HEADS, len(token_ids), DIM)).copy()
+    return [(k, k + 0.5) for _ in range(LAYERS)]
+
+
+def _entry_bytes(length):
+    return LAYERS * 2 * HEADS * length * DIM * 4
+
+
+def test_shared_system_prefix_hits_at_block_boundary():
+    cache = PrefixCache(max_bytes=1 << 20, block_size=4)
+    system = list(range(100, 110))            # 10 个 token 的系统提示词
+    a = system + [1, 2, 3, 4, 5]
+    b = system + [7, 8, 9]
+
+    assert cache.lookup(a) == (0, None)
+    cache.insert(a, _kv(a))                    # 缓存前 12 个 token（不含最后一个）
+
+    length, kv = cache.lookup(b)
+    # b 与 a 共享前 10 个 token，最长对齐边界为 8
+    assert length == 8
+    assert kv[0][0].shape == (1, HEADS, 8, DIM)
+    assert np.array_equal(kv[0][0][0, 0, :, 0], np.asarray(system[:8], dtype=np.float32))
+
+    length, _ = cache.lookup(a)
+    assert length == 12
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["hit_tokens"] == 20
+
+
+def test_insert_copies_and_skips_covered_prefix():
+    cache = PrefixCache(max_bytes=1 << 20, block_size=4)
+    a = list(range(20))
+    kv = _kv(a)
+    cache.insert(a, kv)
+    assert cache.stats()["bytes"] == _entry_bytes(16)
+    kv[0][0][:] = -1                            # 调用方后续修改不影响缓存
+    assert cache.lookup(a)[1][0][0][0, 0, 0, 0] == 0
+
+    # 命中长度已覆盖完整前缀时不重复存储
+    cache.insert(a, kv, cached_len=16)
+    assert cache.stats()["inserts"] == 1
+
+
+def test_lru_eviction_bounded_by_bytes():
+    cache = PrefixCache(max_bytes=_entry_bytes(8) * 2, block_size=4)
+    p1, p2, p3 = [[i] * 9 for i in (1, 2, 3)]
+    cache.insert(p1, _kv(p1))
+    cache.insert(p2, _kv(p2))
+    cache.lookup(p1)                           # p1 最近使用
+    cache.insert(p3, _kv(p3))
+
+    assert cache.lookup(p2) == (0, None)
+    assert cache.lookup(p1)[0] == 8 and cache.lookup(p3)[0] == 8
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] <= cache.max_bytes
+
+
+def test_evicted_entry_keeps_shorter_boundary_of_other_entry():
+    cache = PrefixCache(max_bytes=_entry_bytes(12) + _entry_bytes(8), block_size=4)
+    common = [9] * 8
+    a = common + [1] * 5
+    b = common + [2] * 5
+    cache.insert(a, _kv(a))
+    cache.insert(b, _kv(b))                    # 超限，淘汰 a；公共前缀仍由 b 提供
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup(common + [3] * 5)[0] == 8
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+statistics_service 写入吞吐对比（updates/sec）：
+  legacy   旧版 _add_field：每次查 nickname（模拟 auth_service 耗时）、新建连接、SELECT/INSERT/UPDATE 并提交
+  upsert   StatsStore.add：持久 WAL 连接、单条 UPSERT、nickname TTL 缓存
+  bulk     StatsStore.add_many：每批多条增量在一个事务内写入
+    python tests/apps/statistics_service/bench_stats_ingest.py --updates 2000 --users 50 --auth-ms 2
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.statistics_service.stats_store import COUNTER_FIELDS, StatsStore
+
+APPS = ["docx", "portal", "chat2kb", "paper_review"]
+
+
+def make_resolver(auth_ms):
+    def resolve(uid):
+        time.sleep(auth_ms / 1000)
+        return f"user{uid}"
+    return resolve
+
+
+def legacy_add_field(db_file, resolve, uid, field, count, app_name):
+    """旧版 _add_field 的写入路径"""
+    nickname = resolve(uid)
+    today = datetime.today().strftime('%Y-%m-%d')
+    with sqlite3.connect(db_file) as conn:
+        row = conn.execute(
+            "SELECT access_count, input_token, output_token, embedding_token, app "
+            "FROM statistics WHERE uid=? AND date=? AND app=?", (uid, today, app_name)).fetchone()
+        if not row:
+            conn.execute("INSERT INTO statistics (uid, nickname, date, app) VALUES (?, ?, ?, ?)",
+                         (uid, nickname, today, app_name))
+            conn.commit()
+        conn.execute(f"UPDATE statistics SET {field}={field}+? WHERE uid=? AND date=? AND app=?",
+                     (count, uid, today, app_name))
+        conn.commit()
+    conn.close()
+
+
+def legacy_db(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+            CREATE TABLE statistics (
+                id INTEGER NOT NULL UNIQUE, uid INTEGER NOT NULL, nickname TEXT NOT NULL,
+                app TEXT NOT NULL DEFAULT '', date TEXT NOT NULL,
+                access_count INTEGER NOT NULL DEFAULT 0, input_token INTEGER NOT NULL DEFAULT 0,
+                output_token INTEGER NOT NULL DEFAULT 0, embedding_token INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY("id" AUTOINCREMENT))
+        """)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--auth-ms", type=float, default=2, help="模拟 auth_service 查询 nickname 的耗时")
+    parser.add_argument("--bulk-size", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    updates = [(rng.randint(1, args.users), rng.choice(APPS), rng.choice(COUNTER_FIELDS), rng.randint(1, 500))
+               for _ in range(args.updates)]
+    resolve = make_resolver(args.auth_ms)
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "legacy.db")
+        legacy_db(path)
+        begin = time.perf_counter()
+        for uid, app_name, field, count in updates:
+            legacy_add_field(path, resolve, uid, field, count, app_name)
+        results.append(("legacy", time.perf_counter() - begin))
+
+        store = StatsStore(os.path.join(tmp, "upsert.db"), resolve)
+        begin = time.perf_counter()
+        for uid, app_name, field, count in updates:
+            store.add(uid, field, count, app_name)
+        results.append(("upsert", time.perf_counter() - begin))
+        store.close()
+
+        store = StatsStore(os.path.join(tmp, "bulk.db"), resolve)
+        begin = time.perf_counter()
+        for i in range(0, len(updates), args.bulk_size):
+            store.add_many(updates[i:i + args.bulk_size])
+        results.append(("bulk", time.perf_counter() - begin))
+        store.close()
+
+    print(f"{args.updates} updates, {args.users} users, auth {args.auth_ms}ms")
+    print(f"{'mode':>8} {'seconds':>10} {'updates/s':>12}")
+    for name, elapsed in results:
+        print(f"{name:>8} {elapsed:10.3f} {args.updates / elapsed:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
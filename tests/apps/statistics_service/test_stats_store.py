@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""统计存储测试：UPSERT 累加、批量事务、nickname TTL 缓存、旧表重复行合并"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from apps.statistics_service.stats_store import StatsStore
+
+
+class Resolver:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, uid):
+        self.calls += 1
+        return "" if uid == 404 else f"user{uid}"
+
+
+def test_upsert_accumulates(tmp_path):
+    resolver = Resolver()
+    store = StatsStore(str(tmp_path / "s.db"), resolver)
+    assert store.add(1, "input_token", 10, "docx")
+    assert store.add(1, "input_token", 5, "docx")
+    assert store.add(1, "output_token", 7, "docx")
+    assert store.add(1, "access_count", 1, "")
+    assert not store.add(404, "input_token", 1, "docx")
+    assert not store.add(1, "nickname", 1, "docx")
+
+    rows = {row[2]: row for row in store.list()}
+    assert rows["docx"][1] == "user1"
+    assert rows["docx"][4:8] == (0, 15, 7, 0)
+    assert rows[""][4] == 1
+    # nickname 命中缓存，只查询一次（404 不缓存）
+    assert resolver.calls == 2
+
+
+def test_bulk_in_one_transaction(tmp_path):
+    store = StatsStore(str(tmp_path / "s.db"), Resolver())
+    items = [(uid, "portal", "access_count", 1) for uid in range(1, 51) for _ in range(4)]
+    items.append((404, "portal", "access_count", 1))
+    items.append((1, "portal", "bogus", 1))
+    assert store.add_many(items) == (200, 2)
+    rows = store.list(1000)
+    assert len(rows) == 50
+    assert all(row[4] == 4 for row in rows)
+
+
+def test_merges_legacy_duplicates(tmp_path):
+    path = str(tmp_path / "s.db")
+    today = datetime.today().strftime('%Y-%m-%d')
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+            CREATE TABLE statistics (
+                id INTEGER NOT NULL UNIQUE, uid INTEGER NOT NULL, nickname TEXT NOT NULL,
+                app TEXT NOT NULL DEFAULT '', date TEXT NOT NULL,
+                access_count INTEGER NOT NULL DEFAULT 0, input_token INTEGER NOT NULL DEFAULT 0,
+                output_token INTEGER NOT NULL DEFAULT 0, embedding_token INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY("id" AUTOINCREMENT))
+        """)
+        conn.executemany("INSERT INTO statistics (uid, nickname, app, date, access_count, input_token) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         [(1, "user1", "docx", today, 1, 10), (1, "user1", "docx", today, 2, 20)])
+
+    store = StatsStore(path, Resolver())
+    store.add(1, "access_count", 3, "docx")
+    rows = store.list()
+    assert len(rows) == 1
+    assert rows[0][4:6] == (6, 30)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""计数上报聚合器测试：按 key 累加、阈值触发批量提交、失败重试与队列上限（本地桩服务）"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from common.statistic_util import UsageMeter
+
+
+class StubStatsServer(ThreadingHTTPServer):
+    """记录 /statistics/bulk 收到的批次；fail 为真时返回 500"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubStatsHandler)
+        self.fail = False
+        self.batches = []
+
+    @property
+    def uri(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def totals(self):
+        totals = {}
+        for items in self.batches:
+            for it in items:
+                key = (it["uid"], it["app"], it["field"])
+                totals[key] = totals.get(key, 0) + it["count"]
+        return totals
+
+
+class StubStatsHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        status = 500 if self.server.fail else 200
+        if status == 200:
+            self.server.batches.append(body["items"])
+        payload = json.dumps({"status": "ok"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def server():
+    srv = StubStatsServer()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+
+
+def test_aggregate_and_flush_on_close(server):
+    meter = UsageMeter(flush_interval=60, api_base=server.uri)
+    for _ in range(10):
+        meter.add(1, "docx", "input_token", 5)
+    meter.add(1, "docx", "output_token", 7)
+    meter.add(2, "", "access_count", 1)
+    assert not meter.add(0, "docx", "input_token", 5)
+    assert server.batches == []
+
+    meter.close()
+    assert len(server.batches) == 1
+    assert server.totals() == {(1, "docx", "input_token"): 50, (1, "docx", "output_token"): 7,
+                               (2, "", "access_count"): 1}
+
+
+def test_threshold_triggers_background_flush(server):
+    meter = UsageMeter(flush_interval=60, flush_threshold=3, api_base=server.uri)
+    for uid in range(1, 4):
+        meter.add(uid, "portal", "access_count", 1)
+    deadline = time.time() + 2
+    while not server.batches and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(server.batches) == 1 and len(server.batches[0]) == 3
+    meter.close()
+
+
+def test_failed_flush_is_retried(server):
+    meter = UsageMeter(flush_interval=60, api_base=server.uri)
+    meter.add(1, "asr", "input_token", 3)
+    server.fail = True
+    assert not meter.flush()
+    meter.add(1, "asr", "input_token", 4)
+    server.fail = False
+    assert meter.flush()
+    assert server.totals() == {(1, "asr", "input_token"): 7}
+    assert meter.stats()["failures"] == 1
+    meter.close()
+
+
+def test_bounded_queue_drops(server):
+    meter = UsageMeter(flush_interval=60, flush_threshold=100, max_pending=2, api_base=server.uri)
+    assert meter.add(1, "", "access_count", 1)
+    assert meter.add(2, "", "access_count", 1)
+    assert meter.add(1, "", "access_count", 1)      # 已有 key 继续累加
+    assert not meter.add(3, "", "access_count", 1)
+    assert meter.stats()["dropped"] == 1
+    meter.close()
+    assert server.totals() == {(1, "", "access_count"): 2, (2, "", "access_count"): 1}